@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AnimalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'animales'
+
+    def ready(self):
+        import animales.checks  # Registrar los checks del sistema
@@ -0,0 +1,213 @@
+"""
+Índice de texto completo de animales (chapeta, nombre, raza, ubicación y notas).
+
+- SQLite: tabla virtual FTS5 `animales_busqueda` con rowid = id del animal,
+  índices de prefijo para el autocompletado y orden por bm25.
+- PostgreSQL: tabla `animales_busqueda` con un tsvector ponderado por
+  columna e índice GIN, orden por ts_rank.
+
+Cada palabra de la consulta se busca como prefijo, así que 'ES-01' encuentra
+'ES-0123'. La chapeta se indexa también sin separadores ('ES0123') para que
+funcione el prefijo escrito sin guion. El índice se mantiene desde las
+señales de Animal; en otros motores se recurre a icontains.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Animal
+
+TABLA = 'animales_busqueda'
+TAMANO_LOTE = 1000
+CAMPOS = ('chapeta', 'nombre', 'raza', 'ubicacion_actual', 'notas')
+# Pesos por columna indexada: chapeta, chapeta_compacta, nombre, raza, ubicacion, notas
+PESOS_BM25 = (10.0, 10.0, 5.0, 2.0, 2.0, 1.0)
+PESOS_TSVECTOR = ('A', 'A', 'B', 'C', 'C', 'D')
+
+_SQL_SQLITE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} USING fts5("
+    "chapeta, chapeta_compacta, nombre, raza, ubicacion_actual, notas, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4')"
+)
+_SQL_POSTGRES = (
+    f"CREATE TABLE IF NOT EXISTS {TABLA} ("
+    "animal_id bigint PRIMARY KEY REFERENCES animales_animal(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "documento tsvector NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS {TABLA}_gin ON {TABLA} USING GIN (documento)",
+)
+
+# Existencia de la tabla del índice por base de datos (se consulta una vez)
+_disponible = {}
+
+
+def motor(conexion=None):
+    """'sqlite', 'postgresql' o None si no hay índice para la base de datos"""
+    conexion = conexion or connection
+    if conexion.vendor not in ('sqlite', 'postgresql'):
+        return None
+    return conexion.vendor
+
+
+def crear_indice(conexion=None):
+    """Crear la tabla del índice; devuelve False si el motor no lo admite"""
+    conexion = conexion or connection
+    vendor = motor(conexion)
+    with conexion.cursor() as cursor:
+        if vendor == 'sqlite':
+            try:
+                cursor.execute(_SQL_SQLITE)
+            except Exception as e:
+                print(f"⚠️ SQLite sin FTS5, la búsqueda usará icontains: {e}")
+                return False
+        elif vendor == 'postgresql':
+            for sql in _SQL_POSTGRES:
+                cursor.execute(sql)
+        else:
+            return False
+    _disponible.clear()
+    return True
+
+
+def eliminar_indice(conexion=None):
+    conexion = conexion or connection
+    if motor(conexion):
+        with conexion.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLA}')
+    _disponible.clear()
+
+
+def disponible():
+    if motor() is None:
+        return False
+    clave = (connection.alias, str(connection.settings_dict['NAME']))
+    if clave not in _disponible:
+        _disponible[clave] = TABLA in connection.introspection.table_names()
+    return _disponible[clave]
+
+
+def _compacta(chapeta):
+    return re.sub(r'\W+', '', chapeta or '')
+
+
+def indexar(filas):
+    """
+    Añadir o sustituir en el índice las filas (id, chapeta, nombre, raza,
+    ubicacion_actual, notas).
+    """
+    filas = [tuple(fila) for fila in filas]
+    if not filas or not disponible():
+        return 0
+
+    vendor = motor()
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(filas), TAMANO_LOTE):
+            lote = filas[inicio:inicio + TAMANO_LOTE]
+            if vendor == 'sqlite':
+                cursor.executemany(f'DELETE FROM {TABLA} WHERE rowid = %s', [(fila[0],) for fila in lote])
+                cursor.executemany(
+                    f'INSERT INTO {TABLA} (rowid, chapeta, chapeta_compacta, nombre, raza, ubicacion_actual, notas) '
+                    'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+                    [(a, chapeta, _compacta(chapeta), *resto) for a, chapeta, *resto in lote]
+                )
+            else:
+                documento = ' || '.join(
+                    f"setweight(to_tsvector('simple', coalesce(%s, '')), '{peso}')"
+                    for peso in PESOS_TSVECTOR
+                )
+                cursor.executemany(
+                    f'INSERT INTO {TABLA} (animal_id, documento) VALUES (%s, {documento}) '
+                    'ON CONFLICT (animal_id) DO UPDATE SET documento = EXCLUDED.documento',
+                    [(a, chapeta, _compacta(chapeta), *resto) for a, chapeta, *resto in lote]
+                )
+    return len(filas)
+
+
+def indexar_animales(animal_ids):
+    """Reindexar los animales indicados leyendo sus campos de la base de datos"""
+    animal_ids = list(animal_ids)
+    total = 0
+    for inicio in range(0, len(animal_ids), TAMANO_LOTE):
+        total += indexar(
+            Animal.objects.filter(id__in=animal_ids[inicio:inicio + TAMANO_LOTE]).values_list('id', *CAMPOS)
+        )
+    return total
+
+
+def indexar_animal(animal):
+    return indexar([(animal.pk, *(getattr(animal, campo) for campo in CAMPOS))])
+
+
+def desindexar(animal_id):
+    if not disponible():
+        return
+    columna = 'rowid' if motor() == 'sqlite' else 'animal_id'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA} WHERE {columna} = %s', [animal_id])
+
+
+@transaction.atomic
+def reconstruir_indice():
+    """Vaciar y volver a llenar el índice con todo el rebaño"""
+    if not disponible() and not crear_indice():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA}')
+
+    total, lote = 0, []
+    for fila in Animal.objects.values_list('id', *CAMPOS).iterator(chunk_size=TAMANO_LOTE):
+        lote.append(fila)
+        if len(lote) == TAMANO_LOTE:
+            total += indexar(lote)
+            lote = []
+    return total + indexar(lote)
+
+
+def terminos(consulta):
+    """Palabras de la consulta en minúsculas (letras y dígitos)"""
+    return re.findall(r'\w+', (consulta or '').lower())
+
+
+def buscar(consulta, limite=20):
+    """Ids de los animales que casan con todas las palabras (como prefijo), por relevancia"""
+    palabras = terminos(consulta)
+    if not palabras:
+        return []
+
+    vendor = motor() if disponible() else None
+    if vendor == 'sqlite':
+        expresion = ' '.join(f'"{palabra}"*' for palabra in palabras)
+        sql = (
+            f'SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s '
+            f'ORDER BY bm25({TABLA}, {", ".join(str(peso) for peso in PESOS_BM25)}) LIMIT %s'
+        )
+        parametros = [expresion, limite]
+    elif vendor == 'postgresql':
+        expresion = ' & '.join(f'{palabra}:*' for palabra in palabras)
+        sql = (
+            f"SELECT animal_id FROM {TABLA} WHERE documento @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank(documento, to_tsquery('simple', %s)) DESC, animal_id LIMIT %s"
+        )
+        parametros = [expresion, expresion, limite]
+    else:
+        return _buscar_sin_indice(palabras, limite)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _buscar_sin_indice(palabras, limite):
+    """Alternativa sin índice: cada palabra debe aparecer en algún campo"""
+    filtro = Q()
+    for palabra in palabras:
+        filtro &= Q(*(Q(**{f'{campo}__icontains': palabra}) for campo in CAMPOS), _connector=Q.OR)
+    primero = Case(
+        When(chapeta__istartswith=palabras[0], then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField()
+    )
+    return list(
+        Animal.objects.filter(filtro).annotate(primero=primero).order_by('primero', 'chapeta')
+        .values_list('id', flat=True)[:limite]
+    )
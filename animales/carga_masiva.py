@@ -0,0 +1,183 @@
+"""
+Carga masiva de animales (POST /api/animales/bulk/) desde NDJSON o CSV.
+
+Las filas se leen a medida que llegan y se procesan por trozos: cada fila se
+valida con AnimalCargaSerializer, la unicidad de chapetas y la existencia de
+los padres se comprueban con una consulta por trozo y los válidos se
+insertan con bulk_create. bulk_create no dispara post_save ni m2m_changed, así
+que no hay difusión por WebSocket ni log por animal: al terminar se escribe
+un único log de resumen y se envía un único evento a `animal_updates`.
+
+El informe se genera como un flujo de objetos (uno por fila con errores y un
+resumen final) para poder devolverlo mientras se procesa. Cuando falla algo
+a mitad, la respuesta ya ha empezado con un 200: el error va en el propio
+flujo, seguido del resumen de lo cargado hasta entonces.
+"""
+import csv
+import json
+import re
+import time
+import traceback
+
+from django.db import IntegrityError, transaction
+
+from logs.utils import registrar_log
+from utils.websocket_utils import send_animal_bulk_update
+from .models import Animal
+from .pedigree import Enlace
+from .serializers import AnimalCargaSerializer
+from .importacion import registrar_derivados
+from . import parentesco
+
+FILAS_POR_TROZO = 500
+
+
+def leer_filas(lineas, formato):
+    """(número de fila, datos o None, error o None) para cada fila de un NDJSON o CSV"""
+    if formato == 'csv':
+        for numero, fila in enumerate(csv.DictReader(lineas), start=1):
+            fila = {clave.strip(): valor for clave, valor in fila.items() if clave and valor not in (None, '')}
+            if 'padres' in fila:
+                # En CSV los ids de los padres van en una sola columna: "12;34"
+                fila['padres'] = [padre for padre in re.split(r'[;|\s]+', fila['padres']) if padre]
+            yield numero, fila, None
+        return
+
+    numero = 0
+    for linea in lineas:
+        if not linea.strip():
+            continue
+        numero += 1
+        try:
+            fila = json.loads(linea)
+        except json.JSONDecodeError as e:
+            yield numero, None, {'non_field_errors': [f'JSON no válido: {e.msg}']}
+            continue
+        if not isinstance(fila, dict):
+            yield numero, None, {'non_field_errors': ['Se esperaba un objeto JSON']}
+            continue
+        yield numero, fila, None
+
+
+def _validar_trozo(trozo, vistas):
+    """Separar las filas válidas de las erróneas; `vistas` acumula las chapetas del archivo"""
+    validas, errores = [], []
+    for numero, fila, error in trozo:
+        if error:
+            errores.append((numero, error))
+            continue
+        serializer = AnimalCargaSerializer(data=fila)
+        if serializer.is_valid():
+            validas.append((numero, serializer.validated_data))
+        else:
+            errores.append((numero, serializer.errors))
+
+    chapetas = [datos['chapeta'] for _, datos in validas]
+    registradas = set(Animal.objects.filter(chapeta__in=chapetas).values_list('chapeta', flat=True))
+    padres = {padre_id for _, datos in validas for padre_id in datos.get('padres', [])}
+    existentes = set(Animal.objects.filter(id__in=padres).values_list('id', flat=True))
+
+    aceptadas = []
+    for numero, datos in validas:
+        chapeta = datos['chapeta']
+        desconocidos = [padre_id for padre_id in datos.get('padres', []) if padre_id not in existentes]
+        if chapeta in registradas:
+            errores.append((numero, {'chapeta': ['Ya existe un animal con esta chapeta']}))
+        elif chapeta in vistas:
+            errores.append((numero, {'chapeta': ['Chapeta repetida en el archivo']}))
+        elif desconocidos:
+            errores.append((numero, {'padres': [f'Progenitores inexistentes: {desconocidos}']}))
+        elif len(set(datos.get('padres', []))) != len(datos.get('padres', [])):
+            errores.append((numero, {'padres': ['Progenitor repetido']}))
+        else:
+            vistas.add(chapeta)
+            aceptadas.append((numero, datos))
+    return aceptadas, errores
+
+
+@transaction.atomic
+def _insertar_trozo(aceptadas, usuario):
+    """Crear los animales y sus enlaces con los padres; devuelve (ids, pares, versión)"""
+    animales = Animal.objects.bulk_create([
+        Animal(**{campo: valor for campo, valor in datos.items() if campo != 'padres'}, creado_por=usuario)
+        for _, datos in aceptadas
+    ])
+    enlaces = [
+        Enlace(from_animal_id=padre_id, to_animal_id=animal.pk)
+        for (_, datos), animal in zip(aceptadas, animales)
+        for padre_id in datos.get('padres', [])
+    ]
+    Enlace.objects.bulk_create(enlaces)
+    creados = [animal.pk for animal in animales]
+    pares = [(enlace.from_animal_id, enlace.to_animal_id) for enlace in enlaces]
+    return creados, pares, registrar_derivados(creados, pares)
+
+
+def cargar_animales(filas, usuario=None, filas_por_trozo=FILAS_POR_TROZO):
+    """
+    Procesar las filas (de leer_filas) por trozos. Genera un diccionario por
+    cada fila rechazada y, al final, uno con el resumen.
+    """
+    inicio_reloj = time.monotonic()
+    creados, vistas = [], set()
+    leidas = rechazadas = 0
+    error = None
+
+    def procesar(trozo):
+        nonlocal rechazadas
+        aceptadas, errores = _validar_trozo(trozo, vistas)
+        if aceptadas:
+            try:
+                ids, _, version = _insertar_trozo(aceptadas, usuario)
+            except IntegrityError as e:
+                # Otra petición registró alguna chapeta entre la validación y la inserción
+                errores.extend((numero, {'non_field_errors': [f'Trozo rechazado: {e}']}) for numero, _ in aceptadas)
+            else:
+                creados.extend(ids)
+                parentesco.actualizar_almacen(set(ids), version)
+        rechazadas += len(errores)
+        for numero, detalle in sorted(errores, key=lambda par: par[0]):
+            yield {'fila': numero, 'errores': detalle}
+
+    try:
+        trozo = []
+        for fila in filas:
+            leidas += 1
+            trozo.append(fila)
+            if len(trozo) == filas_por_trozo:
+                yield from procesar(trozo)
+                trozo = []
+        if trozo:
+            yield from procesar(trozo)
+    except UnicodeDecodeError:
+        error = 'El archivo debe estar en UTF-8'
+    except Exception as e:
+        print(f"❌ Error en la carga masiva: {e}")
+        traceback.print_exc()
+        error = f'Error en la carga masiva: {str(e)}'
+    finally:
+        resumen = {
+            'leidas': leidas,
+            'creadas': len(creados),
+            'rechazadas': rechazadas,
+            'completa': error is None,
+            'duracion_segundos': round(time.monotonic() - inicio_reloj, 3),
+        }
+        if creados:
+            try:
+                registrar_log(
+                    usuario=usuario,
+                    tipo_accion='carga_masiva',
+                    entidad_afectada='animal',
+                    entidad_id=f'{creados[0]}-{creados[-1]}',
+                    cambios=resumen,
+                    observaciones=f'Carga masiva: {len(creados)} animales creados, {rechazadas} filas rechazadas'
+                )
+                send_animal_bulk_update('created', creados)
+            except Exception as e:
+                print(f"⚠️ Error notificando la carga masiva: {e}")
+        print(f"📦 Carga masiva: {len(creados)} creados, {rechazadas} rechazados de {leidas}")
+
+    if error:
+        yield {'error': error}
+    yield {'resumen': resumen}
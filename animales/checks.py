@@ -0,0 +1,15 @@
+from django.core import checks
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def cache_identificadores(app_configs, **kwargs):
+    """Avisar en despliegue si el mapa de chapetas tiene que consultar la base de datos en cada resolución"""
+    from .identificadores import cache_local
+    if not cache_local():
+        return []
+    return [checks.Warning(
+        'La caché por defecto es local a cada proceso: la versión del mapa de chapetas se lee de la base '
+        'de datos en cada resolución para que todos los workers vean los cambios.',
+        hint='Configura una caché compartida (p. ej. RedisCache en CACHES) para resolver sin consultas.',
+        id='animales.W001',
+    )]
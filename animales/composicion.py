@@ -0,0 +1,165 @@
+"""
+Composición racial propagada por el pedigrí.
+
+La composición de un animal es la media de las de sus padres; un progenitor
+desconocido aporta la raza declarada del propio animal, y un fundador es
+100 % de su raza. Se calcula en un único recorrido topológico de
+`descendencia` y se guarda en ComposicionRacial. Cuando cambian los padres o
+la raza de un animal solo se recalculan él y sus descendientes (leídos de la
+tabla de cierre), partiendo de la composición guardada de los demás padres.
+
+Las razas se guardan normalizadas ('Aberdeen Angus' -> 'aberdeen_angus')
+para poder filtrar con ?min_fraccion_<raza>=.
+"""
+from collections import defaultdict, deque
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.text import slugify
+
+from .models import Animal, AnimalAncestro, ComposicionRacial
+from .pedigree import Enlace, MAXIMO_PADRES
+
+TAMANO_LOTE = 1000
+# Las fracciones menores se descartan para no arrastrar razas residuales
+FRACCION_MINIMA = 1e-6
+RAZA_DESCONOCIDA = 'desconocida'
+
+PREFIJO_MINIMO = 'min_fraccion_'
+PREFIJO_MAXIMO = 'max_fraccion_'
+
+
+def normalizar_raza(raza):
+    return slugify(raza or '').replace('-', '_') or RAZA_DESCONOCIDA
+
+
+def calcular_composicion(razas, enlaces, conocidas=None):
+    """
+    Composición {animal: {raza: fraccion}} de los animales de `razas`
+    ({animal: raza declarada}) a partir de los pares (padre, hijo) cuyo hijo
+    está en `razas`. `conocidas` da la composición ya calculada de los padres
+    que quedan fuera. Función pura: también la usa la migración de relleno.
+    """
+    conocidas = conocidas or {}
+    padres = defaultdict(list)
+    hijos = defaultdict(list)
+    for padre_id, hijo_id in enlaces:
+        padres[hijo_id].append(padre_id)
+        if padre_id in razas:
+            hijos[padre_id].append(hijo_id)
+
+    pendientes = {animal_id: sum(1 for p in padres[animal_id] if p in razas) for animal_id in razas}
+    cola = deque(animal_id for animal_id, n in pendientes.items() if n == 0)
+    resultado = {}
+
+    while cola:
+        animal_id = cola.popleft()
+        propia = normalizar_raza(razas[animal_id])
+        composicion = defaultdict(float)
+        for padre_id in padres[animal_id]:
+            origen = resultado.get(padre_id) or conocidas.get(padre_id) or {RAZA_DESCONOCIDA: 1.0}
+            for raza, fraccion in origen.items():
+                composicion[raza] += fraccion / MAXIMO_PADRES
+        composicion[propia] += max(MAXIMO_PADRES - len(padres[animal_id]), 0) / MAXIMO_PADRES
+        resultado[animal_id] = {
+            raza: fraccion for raza, fraccion in composicion.items() if fraccion >= FRACCION_MINIMA
+        }
+
+        for hijo_id in hijos[animal_id]:
+            pendientes[hijo_id] -= 1
+            if pendientes[hijo_id] == 0:
+                cola.append(hijo_id)
+
+    if len(resultado) != len(razas):
+        raise ValidationError('El pedigrí contiene ciclos')
+    return resultado
+
+
+def _filas(composiciones):
+    return (
+        ComposicionRacial(animal_id=animal_id, raza=raza, fraccion=fraccion)
+        for animal_id, composicion in composiciones.items()
+        for raza, fraccion in composicion.items()
+    )
+
+
+def _por_lotes(ids):
+    ids = list(ids)
+    for inicio in range(0, len(ids), TAMANO_LOTE):
+        yield ids[inicio:inicio + TAMANO_LOTE]
+
+
+@transaction.atomic
+def reconstruir_composicion():
+    """Recalcular la composición de todo el rebaño en un único recorrido"""
+    razas = dict(Animal.objects.values_list('id', 'raza').iterator(chunk_size=TAMANO_LOTE))
+    enlaces = Enlace.objects.values_list('from_animal_id', 'to_animal_id').iterator(chunk_size=TAMANO_LOTE)
+    composiciones = calcular_composicion(razas, enlaces)
+
+    ComposicionRacial.objects.all().delete()
+    ComposicionRacial.objects.bulk_create(_filas(composiciones), batch_size=TAMANO_LOTE)
+    return len(composiciones)
+
+
+@transaction.atomic
+def actualizar_composicion(animal_ids):
+    """Recalcular la composición de los animales indicados y de todos sus descendientes"""
+    animal_ids = set(animal_ids)
+    if not animal_ids:
+        return 0
+
+    afectados = set(animal_ids)
+    for lote in _por_lotes(animal_ids):
+        afectados.update(
+            AnimalAncestro.objects.filter(ancestro_id__in=lote).values_list('descendiente_id', flat=True)
+        )
+
+    razas, enlaces = {}, []
+    for lote in _por_lotes(afectados):
+        razas.update(Animal.objects.filter(id__in=lote).values_list('id', 'raza'))
+        enlaces.extend(Enlace.objects.filter(to_animal_id__in=lote).values_list('from_animal_id', 'to_animal_id'))
+
+    conocidas = defaultdict(dict)
+    externos = {padre_id for padre_id, _ in enlaces} - afectados
+    for lote in _por_lotes(externos):
+        for animal_id, raza, fraccion in ComposicionRacial.objects.filter(
+            animal_id__in=lote
+        ).values_list('animal_id', 'raza', 'fraccion'):
+            conocidas[animal_id][raza] = fraccion
+
+    composiciones = calcular_composicion(razas, enlaces, conocidas)
+    for lote in _por_lotes(afectados):
+        ComposicionRacial.objects.filter(animal_id__in=lote).delete()
+    ComposicionRacial.objects.bulk_create(_filas(composiciones), batch_size=TAMANO_LOTE)
+    return len(composiciones)
+
+
+def filtrar_por_composicion(queryset, parametros):
+    """
+    Aplicar ?min_fraccion_<raza>=x y ?max_fraccion_<raza>=x. Un animal sin
+    fila para la raza tiene fracción 0.
+    """
+    for clave, valor in parametros.items():
+        if clave.startswith(PREFIJO_MINIMO):
+            raza, minimo = clave[len(PREFIJO_MINIMO):], True
+        elif clave.startswith(PREFIJO_MAXIMO):
+            raza, minimo = clave[len(PREFIJO_MAXIMO):], False
+        else:
+            continue
+
+        try:
+            fraccion = float(valor)
+        except (TypeError, ValueError):
+            fraccion = None
+        if fraccion is None or not 0 <= fraccion <= 1:
+            raise ValueError(f'{clave} debe ser un número entre 0 y 1')
+
+        filas = ComposicionRacial.objects.filter(raza=normalizar_raza(raza))
+        if minimo:
+            if fraccion > 0:
+                filas = filas.filter(fraccion__gte=fraccion - FRACCION_MINIMA)
+                queryset = queryset.filter(id__in=filas.values('animal_id'))
+        else:
+            filas = filas.filter(fraccion__gt=fraccion + FRACCION_MINIMA)
+            queryset = queryset.exclude(id__in=filas.values('animal_id'))
+    return queryset
@@ -86,6 +86,20 @@ class AnimalConsumer(AsyncWebsocketConsumer):
             'data': event['data']
         }))
 
+    async def animal_bulk_created(self, event):
+        """Notificar una carga masiva de animales"""
+        await self.send(text_data=json.dumps({
+            'type': 'animal_bulk_created',
+            'data': event['data']
+        }))
+
+    async def animal_bulk_updated(self, event):
+        """Notificar una actualización masiva de animales"""
+        await self.send(text_data=json.dumps({
+            'type': 'animal_bulk_updated',
+            'data': event['data']
+        }))
+
     async def subscribe_to_animal(self, animal_id):
         """Suscribirse a updates de un animal específico"""
         group_name = f'animal_{animal_id}'
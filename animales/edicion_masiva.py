@@ -0,0 +1,220 @@
+"""
+Edición masiva de animales (PATCH /api/animales/bulk/).
+
+Dos formas de petición:
+- {"animales": [{"id": 1, "cambios": {...}}, ...]} (o la lista sola): cambios
+  distintos por animal, aplicados con bulk_update.
+- {"filtro": {...}, "cambios": {...}}: los mismos cambios para todos los
+  animales que cumplen el filtro, aplicados con UPDATE ... WHERE id IN (...).
+
+Los cambios se validan con el serializer antes de tocar nada; si hay errores
+no se aplica ninguno. Se leen solo los campos modificados para calcular el
+antes/después de cada animal, los logs se escriben con bulk_create en la
+misma transacción y al final se envía un único evento a `animal_updates`.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from logs.models import Log
+from ubicaciones import movimientos
+from utils.websocket_utils import send_animal_bulk_update
+from .models import Animal
+from .serializers import AnimalCargaSerializer, AnimalSerializer
+from . import busqueda, composicion
+
+TAMANO_LOTE = 1000
+MAXIMO_ERRORES = 1000
+# Campos que se pueden cambiar en bloque (la chapeta y el pedigrí van por animal;
+# el peso, con pesajes en /api/pesajes/)
+CAMPOS_EDITABLES = (
+    'nombre', 'sexo', 'fecha_nacimiento', 'raza', 'estado_reproductivo', 'estado_productivo',
+    'salud', 'ubicacion_actual', 'fecha_baja_sistema', 'foto_perfil_url', 'notas',
+)
+# Filtros admitidos además de 'ids' y 'grupo'
+CAMPOS_FILTRO = ('estado_productivo', 'estado_reproductivo', 'sexo', 'raza', 'ubicacion_actual')
+
+
+class ErrorEdicionMasiva(ValueError):
+    def __init__(self, mensaje, errores=None):
+        super().__init__(mensaje)
+        self.errores = errores or []
+
+
+def validar_cambios(cambios):
+    """Cambios validados con el serializer; lanza ValueError con los errores"""
+    if not isinstance(cambios, dict) or not cambios:
+        raise ValueError('"cambios" debe ser un objeto con al menos un campo')
+    no_editables = sorted(set(cambios) - set(CAMPOS_EDITABLES))
+    if no_editables:
+        raise ValueError(f'Campos no editables en bloque: {", ".join(no_editables)}')
+    serializer = AnimalCargaSerializer(data=cambios, partial=True)
+    if not serializer.is_valid():
+        raise ValueError(serializer.errors)
+    return dict(serializer.validated_data)
+
+
+def filtrar(filtro):
+    """Queryset de los animales que cumplen el filtro ('ids', 'grupo' y CAMPOS_FILTRO)"""
+    if not isinstance(filtro, dict) or not filtro:
+        raise ErrorEdicionMasiva('"filtro" debe indicar al menos un criterio')
+    desconocidos = sorted(set(filtro) - set(CAMPOS_FILTRO) - {'ids', 'grupo'})
+    if desconocidos:
+        raise ErrorEdicionMasiva(f'Filtros no válidos: {", ".join(desconocidos)}')
+
+    queryset = Animal.objects.all()
+    try:
+        if 'ids' in filtro:
+            queryset = queryset.filter(id__in=[int(animal_id) for animal_id in filtro['ids']])
+        if 'grupo' in filtro:
+            queryset = queryset.filter(grupos__id=int(filtro['grupo']))
+    except (TypeError, ValueError):
+        raise ErrorEdicionMasiva('"ids" debe ser una lista de enteros y "grupo" un entero')
+    return queryset.filter(**{campo: filtro[campo] for campo in CAMPOS_FILTRO if campo in filtro})
+
+
+def _representar(campos):
+    """Funciones que pasan cada campo a su forma JSON (la misma que en los logs por animal)"""
+    fields = AnimalSerializer().fields
+    return {campo: fields[campo].to_representation for campo in campos}
+
+
+def _diferencias(actual, cambios, representar):
+    return {
+        campo: {
+            'antes': None if actual[campo] is None else representar[campo](actual[campo]),
+            'despues': None if valor is None else representar[campo](valor),
+        }
+        for campo, valor in cambios.items()
+        if actual[campo] != valor
+    }
+
+
+def _logs(modificados, usuario):
+    """Logs 'editar' por animal, como los de AnimalViewSet.update, para bulk_create"""
+    return [
+        Log(
+            usuario=usuario,
+            tipo_accion='editar',
+            entidad_afectada='animal',
+            entidad_id=str(animal_id),
+            cambios=diferencias,
+            observaciones=f'Animal {chapeta} actualizado (edición masiva)'
+        )
+        for animal_id, chapeta, diferencias in modificados
+    ]
+
+
+def _actualizar_derivados(modificados):
+    """Composición racial e índice de búsqueda de los animales cuyos campos lo requieren"""
+    por_raza = [animal_id for animal_id, _, diferencias in modificados if 'raza' in diferencias]
+    por_texto = [
+        animal_id for animal_id, _, diferencias in modificados
+        if any(campo in busqueda.CAMPOS for campo in diferencias)
+    ]
+    composicion.actualizar_composicion(por_raza)
+    busqueda.indexar_animales(por_texto)
+
+
+def _registrar_movimientos(modificados, usuario):
+    """Estancias nuevas de los animales que cambian de ubicación, agrupados por destino"""
+    por_destino = defaultdict(list)
+    for animal_id, _, diferencias in modificados:
+        if 'ubicacion_actual' in diferencias:
+            por_destino[diferencias['ubicacion_actual']['despues']].append(animal_id)
+    for ubicacion, animal_ids in por_destino.items():
+        movimientos.mover(animal_ids, ubicacion, usuario=usuario, motivo='edicion_masiva', actualizar_animales=False)
+
+
+def actualizar_por_animal(elementos, usuario=None):
+    """Aplicar [{id, cambios}] con bulk_update; devuelve un resumen"""
+    if not isinstance(elementos, list) or not elementos:
+        raise ErrorEdicionMasiva('"animales" debe ser una lista de {id, cambios}')
+
+    peticion, errores = {}, []
+    for numero, elemento in enumerate(elementos, start=1):
+        try:
+            animal_id = int(elemento['id'])
+            if animal_id in peticion:
+                raise ValueError('Animal repetido en la petición')
+            peticion[animal_id] = validar_cambios(elemento.get('cambios'))
+        except (KeyError, TypeError, AttributeError):
+            errores.append({'elemento': numero, 'error': 'Cada elemento debe ser {id, cambios}'})
+        except ValueError as e:
+            errores.append({'elemento': numero, 'id': elemento.get('id'), 'error': e.args[0]})
+
+    campos = sorted({campo for cambios in peticion.values() for campo in cambios})
+    with transaction.atomic():
+        animales = Animal.objects.select_for_update().only('id', 'chapeta', *campos).in_bulk(list(peticion))
+        errores.extend(
+            {'id': animal_id, 'error': 'Animal no encontrado'}
+            for animal_id in peticion if animal_id not in animales
+        )
+        if errores:
+            raise ErrorEdicionMasiva(f'{len(errores)} elementos con errores: no se ha modificado nada', errores[:MAXIMO_ERRORES])
+
+        representar = _representar(campos)
+        modificados = []
+        for animal_id, cambios in peticion.items():
+            animal = animales[animal_id]
+            diferencias = _diferencias({campo: getattr(animal, campo) for campo in cambios}, cambios, representar)
+            if diferencias:
+                for campo, valor in cambios.items():
+                    setattr(animal, campo, valor)
+                animal.modificado_por = usuario
+                modificados.append((animal_id, animal.chapeta, diferencias))
+
+        Animal.objects.bulk_update(
+            [animales[animal_id] for animal_id, _, _ in modificados],
+            campos + ['modificado_por'],
+            batch_size=TAMANO_LOTE
+        )
+        Log.objects.bulk_create(_logs(modificados, usuario), batch_size=TAMANO_LOTE)
+        _actualizar_derivados(modificados)
+        _registrar_movimientos(modificados, usuario)
+
+    return _terminar(modificados, len(peticion), campos)
+
+
+def actualizar_por_filtro(filtro, cambios, usuario=None):
+    """Aplicar los mismos cambios a los animales del filtro con UPDATE por lotes de ids"""
+    queryset = filtrar(filtro)
+    try:
+        cambios = validar_cambios(cambios)
+    except ValueError as e:
+        raise ErrorEdicionMasiva('Cambios no válidos', [{'error': e.args[0]}])
+
+    campos = sorted(cambios)
+    representar = _representar(campos)
+    with transaction.atomic():
+        modificados, total = [], 0
+        for fila in queryset.select_for_update().values('id', 'chapeta', *campos).iterator(chunk_size=TAMANO_LOTE):
+            total += 1
+            diferencias = _diferencias(fila, cambios, representar)
+            if diferencias:
+                modificados.append((fila['id'], fila['chapeta'], diferencias))
+
+        ids = [animal_id for animal_id, _, _ in modificados]
+        for inicio in range(0, len(ids), TAMANO_LOTE):
+            Animal.objects.filter(id__in=ids[inicio:inicio + TAMANO_LOTE]).update(**cambios, modificado_por=usuario)
+        Log.objects.bulk_create(_logs(modificados, usuario), batch_size=TAMANO_LOTE)
+        _actualizar_derivados(modificados)
+        _registrar_movimientos(modificados, usuario)
+
+    return _terminar(modificados, total, campos)
+
+
+def _terminar(modificados, total, campos):
+    ids = [animal_id for animal_id, _, _ in modificados]
+    if ids:
+        try:
+            send_animal_bulk_update('updated', ids)
+        except Exception as e:
+            print(f"⚠️ Error notificando la edición masiva: {e}")
+    print(f"✏️ Edición masiva: {len(ids)} de {total} animales modificados ({', '.join(campos)})")
+    return {
+        'seleccionados': total,
+        'actualizados': len(ids),
+        'sin_cambios': total - len(ids),
+        'campos': campos,
+    }
@@ -0,0 +1,136 @@
+"""
+Resolución chapeta/RFID -> id de animal sin consultar la base de datos.
+
+Cada proceso guarda en memoria el mapa completo de identificadores junto con
+la versión de la caché compartida (settings.CACHES) con la que se leyó. Las
+señales animal_saved y animal_deleted, al confirmarse la transacción, suben
+esa versión con cache.incr (atómico) cuando se crea o borra un animal o
+cambia su chapeta o RFID, y aplican el cambio al mapa del propio proceso. Las
+cargas con bulk_create, que no disparan señales, llaman a invalidar().
+
+Un proceso con la versión atrasada toma la copia del mapa que haya dejado otro
+proceso en la caché compartida o, si no la hay, lo vuelve a leer de la base de
+datos y la deja allí. Con el mapa al día, resolver una chapeta es una lectura
+de la versión compartida y una búsqueda en un dict.
+
+Si la caché es local al proceso (LocMemCache, DummyCache) los demás workers
+no verían la versión, así que se guarda en la base de datos
+(VersionPedigree.version_identificadores): cada resolución cuesta entonces
+una lectura por clave primaria. El check animales.W001 avisa de ello.
+"""
+import random
+import threading
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Animal, VersionPedigree
+
+CLAVE_VERSION = 'animales:identificadores:version'
+CLAVE_MAPA = 'animales:identificadores:mapa'
+TAMANO_LOTE = 5000
+
+_local = {'version': None, 'mapa': {}}
+_cerrojo = threading.Lock()
+
+
+def cache_local():
+    """Indica si la caché por defecto es propia de cada proceso"""
+    return isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _version_compartida():
+    if cache_local():
+        return VersionPedigree.objects.filter(pk=1).values_list('version_identificadores', flat=True).first() or 0
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Si la caché ha perdido la versión se empieza por una al azar para que
+        # ningún proceso confunda su mapa con el de la nueva versión
+        cache.add(CLAVE_VERSION, random.randrange(1, 2 ** 62), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def _leer_mapa():
+    mapa = {}
+    for animal_id, chapeta, rfid in Animal.objects.values_list('id', 'chapeta', 'rfid').iterator(chunk_size=TAMANO_LOTE):
+        mapa[chapeta] = animal_id
+        if rfid:
+            mapa[rfid] = animal_id
+    return mapa
+
+
+def mapa_actual():
+    """Mapa {chapeta o RFID: id} al día con la versión compartida"""
+    version = _version_compartida()
+    if _local['version'] == version:
+        return _local['mapa']
+    with _cerrojo:
+        if _local['version'] != version:
+            copia = None if cache_local() else cache.get(CLAVE_MAPA)
+            if copia is not None and copia[0] == version:
+                mapa = copia[1]
+            else:
+                mapa = _leer_mapa()
+                if not cache_local():
+                    cache.set(CLAVE_MAPA, (version, mapa), timeout=None)
+                print(f"🏷️ Mapa de identificadores cargado: {len(mapa)} entradas")
+            _local['version'], _local['mapa'] = version, mapa
+        return _local['mapa']
+
+
+def resolver(identificador):
+    """Id del animal con esa chapeta o RFID, o None"""
+    return mapa_actual().get(identificador)
+
+
+def resolver_varios(identificadores):
+    """{identificador: id o None}"""
+    mapa = mapa_actual()
+    return {identificador: mapa.get(identificador) for identificador in identificadores}
+
+
+def _subir_version():
+    if cache_local():
+        if not VersionPedigree.objects.filter(pk=1).update(version_identificadores=F('version_identificadores') + 1):
+            VersionPedigree.objects.get_or_create(pk=1)
+            VersionPedigree.objects.filter(pk=1).update(version_identificadores=F('version_identificadores') + 1)
+        return _version_compartida()
+    try:
+        return cache.incr(CLAVE_VERSION)
+    except ValueError:
+        _version_compartida()
+        return cache.incr(CLAVE_VERSION)
+
+
+def _publicar(cambios):
+    nueva = _subir_version()
+    with _cerrojo:
+        # Solo si nadie más ha cambiado nada desde nuestra versión basta con
+        # aplicar el cambio; si no, el mapa se recargará en la próxima consulta
+        if _local['version'] is not None and _local['version'] + 1 == nueva:
+            for identificador, animal_id in cambios.items():
+                if animal_id is None:
+                    _local['mapa'].pop(identificador, None)
+                else:
+                    _local['mapa'][identificador] = animal_id
+            _local['version'] = nueva
+
+
+def actualizar(animal_id, anteriores, nuevos):
+    """
+    Registrar que el animal pasa de los identificadores (chapeta, rfid)
+    `anteriores` a `nuevos` (None si se crea o se borra)
+    """
+    cambios = {identificador: None for identificador in (anteriores or ()) if identificador}
+    cambios.update({identificador: animal_id for identificador in (nuevos or ()) if identificador})
+    if cambios:
+        transaction.on_commit(lambda: _publicar(cambios))
+
+
+def invalidar():
+    """Forzar la recarga del mapa en todos los procesos (tras un bulk_create)"""
+    transaction.on_commit(_subir_version)
@@ -0,0 +1,350 @@
+"""
+Importación masiva de pedigrí desde CSV o NDJSON.
+
+Cada registro trae chapeta, chapeta del padre, chapeta de la madre y fecha de
+nacimiento (y opcionalmente sexo, raza y nombre). Las chapetas se resuelven
+con un mapa en memoria (las del propio archivo más una consulta por lotes de
+las ya registradas), se rechazan autoparentescos, duplicados y ciclos, y los
+animales se insertan con bulk_create generación a generación en orden
+topológico, de modo que los padres siempre existen antes que sus crías.
+
+No pasa por el serializer ni dispara señales por animal: la tabla de cierre,
+la composición racial, el índice de búsqueda y el almacén de parentesco se
+actualizan una vez para todo el lote.
+"""
+import csv
+import json
+import time
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+
+from .models import Animal
+from .pedigree import Enlace, incorporar_lote
+from . import busqueda, composicion, identificadores, parentesco
+from pesajes import sesiones
+from ubicaciones import movimientos
+
+TAMANO_LOTE = 1000
+MAXIMO_ERRORES = 1000
+RAZA_POR_DEFECTO = 'Desconocida'
+ESTADO_REPRODUCTIVO_POR_DEFECTO = 'vacío'
+ESTADO_PRODUCTIVO_POR_DEFECTO = 'activo'
+
+# Nombres de columna aceptados para cada campo
+COLUMNAS = {
+    'chapeta': ('chapeta', 'animal', 'id'),
+    'padre': ('padre', 'chapeta_padre', 'sire'),
+    'madre': ('madre', 'chapeta_madre', 'dam'),
+    'fecha_nacimiento': ('fecha_nacimiento', 'nacimiento', 'birth_date'),
+    'sexo': ('sexo', 'sex'),
+    'raza': ('raza', 'breed'),
+    'nombre': ('nombre', 'name'),
+}
+SEXOS = {'macho': 'macho', 'm': 'macho', 'hembra': 'hembra', 'h': 'hembra', 'f': 'hembra'}
+
+
+class ErrorImportacion(ValueError):
+    def __init__(self, mensaje, errores=None):
+        super().__init__(mensaje)
+        self.errores = errores or []
+
+
+def _normalizar(registro):
+    """Registro con los nombres de campo canónicos y los valores limpios"""
+    claves = {str(clave).strip().lower(): valor for clave, valor in registro.items()}
+    resultado = {}
+    for campo, nombres in COLUMNAS.items():
+        for nombre in nombres:
+            valor = claves.get(nombre)
+            if valor not in (None, ''):
+                resultado[campo] = str(valor).strip()
+                break
+    return resultado
+
+
+def leer_registros(lineas, formato):
+    """Recorrer las líneas de un CSV (con cabecera) o de un NDJSON como diccionarios"""
+    if formato == 'csv':
+        for registro in csv.DictReader(lineas):
+            yield _normalizar(registro)
+    elif formato == 'ndjson':
+        for numero, linea in enumerate(lineas, start=1):
+            if not linea.strip():
+                continue
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError as e:
+                raise ErrorImportacion(f'Línea {numero}: JSON no válido ({e.msg})')
+            if not isinstance(registro, dict):
+                raise ErrorImportacion(f'Línea {numero}: se esperaba un objeto JSON')
+            yield _normalizar(registro)
+    else:
+        raise ErrorImportacion("Formato no válido: usa 'csv' o 'ndjson'")
+
+
+def formato_por_nombre(nombre):
+    return 'ndjson' if str(nombre).lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def _existentes(chapetas):
+    """{chapeta: (id, sexo)} de los animales ya registrados, consultados por lotes"""
+    chapetas = list(chapetas)
+    resultado = {}
+    for inicio in range(0, len(chapetas), TAMANO_LOTE):
+        resultado.update(
+            (chapeta, (animal_id, sexo))
+            for animal_id, chapeta, sexo in Animal.objects.filter(
+                chapeta__in=chapetas[inicio:inicio + TAMANO_LOTE]
+            ).values_list('id', 'chapeta', 'sexo')
+        )
+    return resultado
+
+
+def planificar(registros, sexo_por_defecto=None):
+    """
+    Validar los registros y ordenarlos por generaciones. Devuelve
+    (generaciones, existentes, errores, omitidos): listas de registros válidos
+    por generación, {chapeta: (id, sexo)} de los animales ya registrados,
+    los errores por registro y las chapetas ya registradas que se omiten.
+    El sexo sale de la columna 'sexo', del papel de progenitor en el archivo
+    o, si no, de `sexo_por_defecto`.
+    """
+    filas, errores = {}, []
+    for numero, registro in enumerate(registros, start=1):
+        chapeta = registro.get('chapeta')
+        if not chapeta:
+            errores.append({'registro': numero, 'error': 'Falta la chapeta'})
+            continue
+        if chapeta in filas:
+            errores.append({'registro': numero, 'chapeta': chapeta, 'error': 'Chapeta repetida en el archivo'})
+            continue
+        registro['numero'] = numero
+        filas[chapeta] = registro
+
+    referenciadas = {
+        registro[rol] for registro in filas.values() for rol in ('padre', 'madre') if registro.get(rol)
+    }
+    existentes = _existentes(filas.keys() | referenciadas)
+    omitidos = [chapeta for chapeta in filas if chapeta in existentes]
+    for chapeta in omitidos:
+        del filas[chapeta]
+
+    # Sexo declarado por el papel de progenitor dentro del archivo
+    por_papel = defaultdict(set)
+    for registro in filas.values():
+        if registro.get('padre'):
+            por_papel[registro['padre']].add('macho')
+        if registro.get('madre'):
+            por_papel[registro['madre']].add('hembra')
+
+    invalidos = {}
+    for chapeta, registro in filas.items():
+        problema = None
+        padre, madre = registro.get('padre'), registro.get('madre')
+        declarado = SEXOS.get(registro.get('sexo', '').lower()) if registro.get('sexo') else None
+        papeles = por_papel.get(chapeta, set())
+
+        if chapeta in (padre, madre):
+            problema = 'El animal no puede ser su propio progenitor'
+        elif padre and padre == madre:
+            problema = 'El padre y la madre no pueden ser el mismo animal'
+        elif registro.get('sexo') and declarado is None:
+            problema = f"Sexo no válido: {registro['sexo']}"
+        elif len(papeles) > 1 or (declarado and papeles and declarado not in papeles):
+            problema = 'El animal aparece como padre y como madre, o con un sexo contradictorio'
+        elif not (declarado or papeles or sexo_por_defecto):
+            problema = 'Falta el sexo y no puede deducirse del pedigrí'
+        else:
+            for rol, sexo in (('padre', 'macho'), ('madre', 'hembra')):
+                progenitor = registro.get(rol)
+                if progenitor and progenitor not in filas and progenitor not in existentes:
+                    problema = f'{rol.capitalize()} desconocido: {progenitor}'
+                elif progenitor in existentes and existentes[progenitor][1] != sexo:
+                    problema = f'El {rol} {progenitor} está registrado como {existentes[progenitor][1]}'
+                if problema:
+                    break
+
+        if problema is None:
+            try:
+                registro['fecha_nacimiento'] = date.fromisoformat(registro.get('fecha_nacimiento', ''))
+            except ValueError:
+                problema = 'Fecha de nacimiento no válida (AAAA-MM-DD)'
+        if problema:
+            invalidos[chapeta] = problema
+        else:
+            registro['sexo'] = declarado or next(iter(papeles), sexo_por_defecto)
+
+    # Kahn por generaciones dentro del archivo; lo que queda sin procesar forma ciclos
+    hijos = defaultdict(list)
+    pendientes = {}
+    for chapeta, registro in filas.items():
+        internos = [registro[rol] for rol in ('padre', 'madre') if registro.get(rol) in filas]
+        pendientes[chapeta] = len(internos)
+        for progenitor in internos:
+            hijos[progenitor].append(chapeta)
+
+    generaciones, descartados = [], set()
+    actual = [chapeta for chapeta, n in pendientes.items() if n == 0]
+    while actual:
+        validos, siguiente = [], []
+        for chapeta in actual:
+            if chapeta in invalidos or chapeta in descartados:
+                descartados.add(chapeta)
+            else:
+                validos.append(filas[chapeta])
+            for hijo in hijos[chapeta]:
+                if chapeta in descartados:
+                    descartados.add(hijo)
+                pendientes[hijo] -= 1
+                if pendientes[hijo] == 0:
+                    siguiente.append(hijo)
+        if validos:
+            generaciones.append(validos)
+        actual = siguiente
+
+    # Lo que queda son los ciclos y los descendientes de animales en un ciclo
+    restantes = {chapeta for chapeta, n in pendientes.items() if n > 0}
+    for chapeta in _en_ciclo(restantes, hijos):
+        invalidos.setdefault(chapeta, 'El pedigrí contiene un ciclo')
+    descartados |= restantes
+    for chapeta in descartados - invalidos.keys():
+        invalidos[chapeta] = 'Algún progenitor del archivo tiene errores'
+    errores.extend(
+        {'registro': filas[chapeta]['numero'], 'chapeta': chapeta, 'error': problema}
+        for chapeta, problema in invalidos.items()
+    )
+    errores.sort(key=lambda error: error['registro'])
+    return generaciones, existentes, errores, omitidos
+
+
+def _en_ciclo(nodos, hijos):
+    """
+    Nodos que forman parte de un ciclo (componente fuertemente conexa de más
+    de un nodo, o con un lazo) del grafo `hijos` restringido a `nodos`.
+    Tarjan iterativo, para no depender del límite de recursión.
+    """
+    indice, minimo, en_pila = {}, {}, set()
+    pila, resultado = [], set()
+    for raiz in nodos:
+        if raiz in indice:
+            continue
+        indice[raiz] = minimo[raiz] = len(indice)
+        pila.append(raiz)
+        en_pila.add(raiz)
+        recorrido = [(raiz, iter(hijos[raiz]))]
+        while recorrido:
+            nodo, sucesores = recorrido[-1]
+            for hijo in sucesores:
+                if hijo not in nodos:
+                    continue
+                if hijo not in indice:
+                    indice[hijo] = minimo[hijo] = len(indice)
+                    pila.append(hijo)
+                    en_pila.add(hijo)
+                    recorrido.append((hijo, iter(hijos[hijo])))
+                    break
+                if hijo in en_pila:
+                    minimo[nodo] = min(minimo[nodo], indice[hijo])
+            else:
+                recorrido.pop()
+                if recorrido:
+                    padre = recorrido[-1][0]
+                    minimo[padre] = min(minimo[padre], minimo[nodo])
+                if minimo[nodo] == indice[nodo]:
+                    componente = []
+                    while True:
+                        miembro = pila.pop()
+                        en_pila.discard(miembro)
+                        componente.append(miembro)
+                        if miembro == nodo:
+                            break
+                    if len(componente) > 1 or nodo in hijos[nodo]:
+                        resultado.update(componente)
+    return resultado
+
+
+@transaction.atomic
+def _insertar(generaciones, existentes, usuario):
+    """Crear animales y enlaces generación a generación; devuelve (ids creados, pares, versión)"""
+    ids = {chapeta: animal_id for chapeta, (animal_id, _) in existentes.items()}
+    creados, pares = [], []
+    for generacion in generaciones:
+        for inicio in range(0, len(generacion), TAMANO_LOTE):
+            trozo = generacion[inicio:inicio + TAMANO_LOTE]
+            animales = Animal.objects.bulk_create([
+                Animal(
+                    chapeta=registro['chapeta'],
+                    nombre=registro.get('nombre'),
+                    sexo=registro['sexo'],
+                    fecha_nacimiento=registro['fecha_nacimiento'],
+                    raza=registro.get('raza') or RAZA_POR_DEFECTO,
+                    estado_reproductivo=ESTADO_REPRODUCTIVO_POR_DEFECTO,
+                    estado_productivo=ESTADO_PRODUCTIVO_POR_DEFECTO,
+                    creado_por=usuario
+                )
+                for registro in trozo
+            ])
+            enlaces = []
+            for registro, animal in zip(trozo, animales):
+                ids[registro['chapeta']] = animal.pk
+                creados.append(animal.pk)
+                for rol in ('padre', 'madre'):
+                    if registro.get(rol):
+                        enlaces.append(Enlace(from_animal_id=ids[registro[rol]], to_animal_id=animal.pk))
+            Enlace.objects.bulk_create(enlaces)
+            pares.extend((enlace.from_animal_id, enlace.to_animal_id) for enlace in enlaces)
+
+    return creados, pares, registrar_derivados(creados, pares)
+
+
+def registrar_derivados(creados, pares):
+    """
+    Actualizar de una vez, para animales creados con bulk_create (sin
+    señales), la tabla de cierre, la composición racial, el índice de
+    búsqueda, el mapa de chapetas, la estancia en su ubicación inicial y el
+    pesaje de alta. Devuelve la nueva versión del pedigrí.
+    """
+    version = incorporar_lote(pares)
+    composicion.actualizar_composicion(creados)
+    busqueda.indexar_animales(creados)
+    movimientos.registrar_altas(creados)
+    sesiones.registrar_altas(creados)
+    if creados:
+        identificadores.invalidar()
+    return version
+
+
+def importar_pedigree(lineas, formato, usuario=None, omitir_errores=False, sexo_por_defecto=None):
+    """
+    Importar el pedigrí leído de `lineas`. Con errores y sin `omitir_errores`
+    no se inserta nada; con `omitir_errores` se insertan los registros válidos
+    (y no los descendientes de los erróneos). Devuelve un resumen.
+    """
+    inicio_reloj = time.monotonic()
+    if sexo_por_defecto not in (None, 'macho', 'hembra'):
+        raise ErrorImportacion("sexo_por_defecto debe ser 'macho' o 'hembra'")
+    generaciones, existentes, errores, omitidos = planificar(leer_registros(lineas, formato), sexo_por_defecto)
+    if errores and not omitir_errores:
+        raise ErrorImportacion(
+            f'{len(errores)} registros con errores: no se ha importado nada',
+            errores[:MAXIMO_ERRORES]
+        )
+
+    creados, pares, version = _insertar(generaciones, existentes, usuario)
+    # Si el almacén estaba al día basta con añadir las filas del lote; si no, se reconstruye en segundo plano
+    almacen = bool(creados) and parentesco.actualizar_almacen(set(creados), version)
+    print(f"🧬 Pedigrí importado: {len(creados)} animales, {len(pares)} enlaces, {len(generaciones)} generaciones")
+
+    return {
+        'creados': len(creados),
+        'enlaces': len(pares),
+        'generaciones': len(generaciones),
+        'omitidos_existentes': len(omitidos),
+        'con_errores': len(errores),
+        'errores': errores[:MAXIMO_ERRORES],
+        'version_pedigree': version,
+        'almacen_parentesco_actualizado': almacen,
+        'duracion_segundos': round(time.monotonic() - inicio_reloj, 3),
+    }
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from animales.importacion import importar_pedigree, formato_por_nombre, ErrorImportacion
+
+
+class Command(BaseCommand):
+    help = 'Importa un pedigrí completo desde CSV o NDJSON (chapeta, padre, madre, fecha_nacimiento)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ruta', help='Archivo CSV con cabecera o NDJSON')
+        parser.add_argument('--formato', choices=['csv', 'ndjson'], help='Por defecto se deduce de la extensión')
+        parser.add_argument(
+            '--omitir-errores',
+            action='store_true',
+            help='Importar los registros válidos aunque otros tengan errores'
+        )
+        parser.add_argument(
+            '--sexo-por-defecto',
+            choices=['macho', 'hembra'],
+            help='Sexo de los animales sin columna sexo ni descendencia en el archivo'
+        )
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or formato_por_nombre(options['ruta'])
+        try:
+            with open(options['ruta'], encoding='utf-8-sig', newline='') as lineas:
+                resumen = importar_pedigree(
+                    lineas,
+                    formato,
+                    omitir_errores=options['omitir_errores'],
+                    sexo_por_defecto=options['sexo_por_defecto']
+                )
+        except ErrorImportacion as e:
+            for error in e.errores[:20]:
+                self.stderr.write(f"  registro {error['registro']}: {error.get('chapeta', '')} {error['error']}")
+            raise CommandError(str(e))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resumen['creados']} animales y {resumen['enlaces']} enlaces importados "
+            f"en {resumen['generaciones']} generaciones ({resumen['duracion_segundos']} s)"
+        ))
+        if resumen['omitidos_existentes'] or resumen['con_errores']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ {resumen['omitidos_existentes']} chapetas ya registradas, {resumen['con_errores']} registros con errores"
+            ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from animales.busqueda import reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Regenera el índice de texto completo de animales'
+
+    def handle(self, *args, **options):
+        total = reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(f'✅ Índice de búsqueda regenerado: {total} animales'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from animales.composicion import reconstruir_composicion
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la composición racial de todo el rebaño a partir del pedigrí'
+
+    def handle(self, *args, **options):
+        total = reconstruir_composicion()
+        self.stdout.write(self.style.SUCCESS(f'✅ Composición racial recalculada: {total} animales'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from animales.parentesco import reconstruir_almacen
+
+
+class Command(BaseCommand):
+    help = 'Recalcula y persiste las filas de parentesco (factor L) de todo el rebaño'
+
+    def handle(self, *args, **options):
+        motor = reconstruir_almacen()
+        if motor is not None:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Almacén de parentesco regenerado: {len(motor.ids)} animales (pedigrí v{motor.version})'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING('⚠️ El pedigrí cambió durante el cálculo, vuelve a ejecutarlo'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from animales.pedigree import reconstruir_cierre
+
+
+class Command(BaseCommand):
+    help = 'Regenera la tabla de cierre del pedigrí a partir de Animal.descendencia'
+
+    def handle(self, *args, **options):
+        total = reconstruir_cierre()
+        self.stdout.write(self.style.SUCCESS(f'✅ Tabla de cierre regenerada: {total} filas'))
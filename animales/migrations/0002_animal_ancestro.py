@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def rellenar_cierre(apps, schema_editor):
+    """Construir la tabla de cierre para los pedigrís ya existentes"""
+    from animales.pedigree import calcular_cierre
+
+    Animal = apps.get_model('animales', 'Animal')
+    AnimalAncestro = apps.get_model('animales', 'AnimalAncestro')
+    enlaces = Animal.descendencia.through.objects.values_list('from_animal_id', 'to_animal_id')
+    AnimalAncestro.objects.bulk_create(
+        (
+            AnimalAncestro(
+                ancestro_id=ancestro_id,
+                descendiente_id=descendiente_id,
+                profundidad=profundidad,
+                caminos=caminos
+            )
+            for (ancestro_id, descendiente_id, profundidad), caminos in calcular_cierre(enlaces).items()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimalAncestro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profundidad', models.PositiveSmallIntegerField()),
+                ('caminos', models.PositiveBigIntegerField(default=1)),
+                ('ancestro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierre_descendientes', to='animales.animal')),
+                ('descendiente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierre_ancestros', to='animales.animal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendiente', 'profundidad'], name='ancestro_desc_prof_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestro', 'descendiente', 'profundidad'), name='animal_ancestro_unico')],
+            },
+        ),
+        migrations.RunPython(rellenar_cierre, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animales', '0002_animal_ancestro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionPedigree',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
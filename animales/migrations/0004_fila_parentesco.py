@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def marcar_almacen_desfasado(apps, schema_editor):
+    """Con pedigrí previo el almacén vacío no es válido: forzar su cálculo"""
+    Animal = apps.get_model('animales', 'Animal')
+    VersionPedigree = apps.get_model('animales', 'VersionPedigree')
+    if not Animal.descendencia.through.objects.exists():
+        return
+    estado, _ = VersionPedigree.objects.get_or_create(pk=1)
+    estado.version += 1
+    estado.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animales', '0003_version_pedigree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilaParentesco',
+            fields=[
+                ('animal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fila_parentesco', serialize=False, to='animales.animal')),
+                ('consanguinidad', models.FloatField(default=0)),
+                ('varianza_mendeliana', models.FloatField(default=1)),
+                ('ancestros', models.BinaryField()),
+                ('coeficientes', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='versionpedigree',
+            name='version_relaciones',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(marcar_almacen_desfasado, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def rellenar_composicion(apps, schema_editor):
+    """Calcular la composición racial de los animales ya existentes"""
+    from animales.composicion import calcular_composicion
+
+    Animal = apps.get_model('animales', 'Animal')
+    ComposicionRacial = apps.get_model('animales', 'ComposicionRacial')
+    razas = dict(Animal.objects.values_list('id', 'raza'))
+    enlaces = Animal.descendencia.through.objects.values_list('from_animal_id', 'to_animal_id')
+    ComposicionRacial.objects.bulk_create(
+        (
+            ComposicionRacial(animal_id=animal_id, raza=raza, fraccion=fraccion)
+            for animal_id, composicion in calcular_composicion(razas, enlaces).items()
+            for raza, fraccion in composicion.items()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animales', '0004_fila_parentesco'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComposicionRacial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('raza', models.CharField(max_length=100)),
+                ('fraccion', models.FloatField()),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='composicion_racial', to='animales.animal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['raza', 'fraccion'], name='composicion_raza_frac_idx')],
+                'constraints': [models.UniqueConstraint(fields=('animal', 'raza'), name='composicion_racial_unica')],
+            },
+        ),
+        migrations.RunPython(rellenar_composicion, migrations.RunPython.noop),
+    ]
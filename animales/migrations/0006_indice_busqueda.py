@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    """Crear el índice de texto completo y llenarlo con los animales existentes"""
+    from animales.busqueda import crear_indice, indexar, CAMPOS
+
+    if crear_indice(schema_editor.connection):
+        Animal = apps.get_model('animales', 'Animal')
+        indexar(Animal.objects.values_list('id', *CAMPOS))
+
+
+def eliminar_indice(apps, schema_editor):
+    from animales.busqueda import eliminar_indice
+
+    eliminar_indice(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animales', '0005_composicion_racial'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animales', '0006_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='rfid',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animales', '0007_animal_rfid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='versionpedigree',
+            name='version_identificadores',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -4,6 +4,11 @@ from django.utils import timezone
 
 Usuario = get_user_model()
 
+# Campos cuyo cambio tiene efectos derivados al guardar (composición racial,
+# mapa de chapetas e historial de movimientos, ver utils/signals.py)
+CAMPOS_SEGUIDOS = ('raza', 'chapeta', 'rfid', 'ubicacion_actual')
+
+
 class Animal(models.Model):
     SEXO_CHOICES = [
         ('macho', 'Macho'),
@@ -24,6 +29,8 @@ class Animal(models.Model):
     ]
 
     chapeta = models.CharField(max_length=50, unique=True)
+    # Identificador electrónico (bolo o crotal RFID) que leen básculas y lectores
+    rfid = models.CharField(max_length=32, unique=True, blank=True, null=True)
     nombre = models.CharField(max_length=100, blank=True, null=True)
     sexo = models.CharField(max_length=10, choices=SEXO_CHOICES)
     fecha_nacimiento = models.DateField()
@@ -45,3 +52,105 @@ class Animal(models.Model):
 
     def __str__(self):
         return f"{self.chapeta} - {self.nombre or 'Sin nombre'}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.recordar_valores()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self.recordar_valores(fields)
+
+    def recordar_valores(self, campos=None):
+        """Anotar los valores guardados de CAMPOS_SEGUIDOS (los no diferidos)"""
+        campos = CAMPOS_SEGUIDOS if campos is None else [campo for campo in campos if campo in CAMPOS_SEGUIDOS]
+        guardados = self.__dict__.setdefault('_valores_guardados', {})
+        guardados.update({campo: self.__dict__[campo] for campo in campos if campo in self.__dict__})
+
+    def valores_guardados(self):
+        """Valores de CAMPOS_SEGUIDOS en la base de datos, o None si no se conocen todos"""
+        guardados = self.__dict__.get('_valores_guardados', {})
+        if all(campo in guardados for campo in CAMPOS_SEGUIDOS):
+            return guardados
+        return None
+
+
+class AnimalAncestro(models.Model):
+    """
+    Tabla de cierre del pedigrí: una fila por cada ancestro de cada animal
+    y por cada profundidad a la que aparece, con el número de caminos.
+    Se mantiene desde las señales de `Animal.descendencia`.
+    """
+    ancestro = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='cierre_descendientes')
+    descendiente = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='cierre_ancestros')
+    profundidad = models.PositiveSmallIntegerField()
+    caminos = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ancestro', 'descendiente', 'profundidad'],
+                name='animal_ancestro_unico'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['descendiente', 'profundidad'], name='ancestro_desc_prof_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestro_id} -> {self.descendiente_id} ({self.profundidad})"
+
+
+class VersionPedigree(models.Model):
+    """
+    Contador global que cambia con cada modificación del pedigrí.
+    Los cálculos de parentesco se cachean por versión.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    version_relaciones = models.PositiveBigIntegerField(default=0)
+    # Cambios de chapeta/RFID cuando la caché no es compartida (ver animales/identificadores.py)
+    version_identificadores = models.PositiveBigIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Pedigrí v{self.version}"
+
+
+class FilaParentesco(models.Model):
+    """
+    Fila persistida del factor L de la matriz de parentesco (A = L D L').
+    Guarda los ids de los ancestros con coeficiente no nulo (incluido el
+    propio animal) y sus coeficientes, empaquetados como arrays binarios.
+    """
+    animal = models.OneToOneField(Animal, on_delete=models.CASCADE, primary_key=True, related_name='fila_parentesco')
+    consanguinidad = models.FloatField(default=0)
+    varianza_mendeliana = models.FloatField(default=1)
+    ancestros = models.BinaryField()
+    coeficientes = models.BinaryField()
+
+    def __str__(self):
+        return f"Fila de parentesco de {self.animal_id} (F={self.consanguinidad:.4f})"
+
+
+class ComposicionRacial(models.Model):
+    """
+    Fracción de cada raza en un animal, propagada por el pedigrí (media de
+    las composiciones de los padres). Denormalizada para poder filtrar por
+    raza sin recorrer el pedigrí; se mantiene desde las señales.
+    """
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='composicion_racial')
+    raza = models.CharField(max_length=100)
+    fraccion = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['animal', 'raza'], name='composicion_racial_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['raza', 'fraccion'], name='composicion_raza_frac_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.animal_id}: {self.fraccion:.2%} {self.raza}"
@@ -0,0 +1,486 @@
+"""
+Consanguinidad (Wright) y coancestría sobre el pedigrí del rebaño.
+
+La matriz de parentesco se representa factorizada como A = L D L' (Henderson),
+donde cada fila de L es la media de las filas de sus padres más la unidad en
+su propia columna. Las filas se calculan generación a generación con
+productos dispersos, por lo que todo el rebaño se procesa en unas pocas
+operaciones vectorizadas en lugar de una recursión por animal.
+
+Las filas de L se persisten en FilaParentesco. Cuando se registra una cría
+(o cambian los padres de un animal sin descendencia) solo se añade su fila,
+derivada de las filas de sus padres. Cualquier otro cambio (enlaces de
+animales con descendencia, borrados) programa una reconstrucción completa
+en segundo plano al confirmar la transacción (actualizar_almacen); mientras
+tanto las lecturas calculan en memoria sin escribir en el almacén. El
+comando reconstruir_parentesco la lanza a mano.
+"""
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+from scipy import sparse
+
+from .models import Animal, AnimalAncestro, FilaParentesco, VersionPedigree
+from .pedigree import Enlace, version_actual
+
+TAMANO_LOTE = 1000
+# 'segundo_plano' (hilo del proceso), 'sincrona' (al confirmar, en el mismo hilo) o 'manual' (solo el comando)
+RECONSTRUCCION = getattr(settings, 'PARENTESCO_RECONSTRUCCION', 'segundo_plano')
+
+
+class MotorParentesco:
+    """Factorización L, D y F de todo el rebaño para una versión del pedigrí"""
+
+    def __init__(self, version, ids, L, D, F):
+        self.version = version
+        self.ids = ids
+        self.L = L
+        self.D = D
+        self.F = F
+        self.indice = {int(animal_id): posicion for posicion, animal_id in enumerate(ids)}
+
+    def posiciones(self, animal_ids):
+        """Posición de cada animal en L (-1 si es posterior al cálculo y no tiene padres)"""
+        return np.fromiter(
+            (self.indice.get(int(animal_id), -1) for animal_id in animal_ids),
+            dtype=np.int64,
+            count=len(animal_ids)
+        )
+
+    def consanguinidad(self, animal_ids):
+        """Coeficientes de consanguinidad F para una lista de animales"""
+        posiciones = self.posiciones(animal_ids)
+        resultado = np.zeros(len(posiciones))
+        conocidos = posiciones >= 0
+        resultado[conocidos] = self.F[posiciones[conocidos]]
+        return resultado
+
+    def coancestria(self, animales_a, animales_b):
+        """Coancestría f_ab = a_ab / 2 para pares de animales, en bloque"""
+        pos_a = self.posiciones(animales_a)
+        pos_b = self.posiciones(animales_b)
+        resultado = np.zeros(len(pos_a))
+
+        # Un animal fuera de la factorización es un fundador sin parientes
+        mismos = np.asarray(animales_a) == np.asarray(animales_b)
+        resultado[mismos] = 1.0
+
+        conocidos = (pos_a >= 0) & (pos_b >= 0)
+        if conocidos.any():
+            filas_a = self.L[pos_a[conocidos]]
+            filas_b = self.L[pos_b[conocidos]]
+            resultado[conocidos] = np.asarray(filas_a.multiply(filas_b) @ self.D).ravel()
+
+        return resultado / 2
+
+    def matriz_coancestria(self, animales_a, animales_b):
+        """Matriz de coancestría (len(a), len(b)) entre dos conjuntos de animales"""
+        pos_a = self.posiciones(animales_a)
+        pos_b = self.posiciones(animales_b)
+        resultado = np.zeros((len(pos_a), len(pos_b)))
+        resultado[np.asarray(animales_a)[:, None] == np.asarray(animales_b)[None, :]] = 1.0
+
+        conocidos_a = pos_a >= 0
+        conocidos_b = pos_b >= 0
+        if conocidos_a.any() and conocidos_b.any():
+            filas_a = self.L[pos_a[conocidos_a]]
+            filas_b = self.L[pos_b[conocidos_b]]
+            resultado[np.ix_(conocidos_a, conocidos_b)] = (filas_a @ sparse.diags(self.D) @ filas_b.T).toarray()
+
+        return resultado / 2
+
+
+def _generaciones(n, padres, hijos):
+    """Generación de cada animal (0 = fundador) por relajación vectorizada"""
+    generacion = np.zeros(n, dtype=np.int64)
+    for _ in range(n):
+        nueva = generacion.copy()
+        np.maximum.at(nueva, hijos, generacion[padres] + 1)
+        if np.array_equal(nueva, generacion):
+            break
+        generacion = nueva
+    return generacion
+
+
+def calcular_factorizacion(ids, padres, hijos):
+    """
+    Calcular L, D y F a partir de ids de animales y aristas padre -> hijo
+    expresadas como posiciones dentro de `ids`. Devuelve los ids reordenados
+    por generación junto con la factorización en ese mismo orden.
+    """
+    n = len(ids)
+    generacion = _generaciones(n, padres, hijos)
+
+    # Reordenar para que los padres siempre precedan a los hijos
+    orden = np.lexsort((ids, generacion))
+    nueva_posicion = np.empty(n, dtype=np.int64)
+    nueva_posicion[orden] = np.arange(n)
+    ids = ids[orden]
+    generacion = generacion[orden]
+    padres = nueva_posicion[padres]
+    hijos = nueva_posicion[hijos]
+
+    D = np.zeros(n)
+    F = np.zeros(n)
+    L = sparse.csr_matrix((0, n))
+    limites = np.searchsorted(generacion, np.arange(generacion.max(initial=0) + 2))
+
+    for inicio, fin in zip(limites[:-1], limites[1:]):
+        if inicio == fin:
+            continue
+        tamano = fin - inicio
+        en_bloque = (hijos >= inicio) & (hijos < fin)
+        fila = hijos[en_bloque] - inicio
+        columna = padres[en_bloque]
+
+        # D_i = 1 - 1/4 * sum(1 + F_p) sobre los padres conocidos
+        suma_padres = np.bincount(fila, weights=1 + F[columna], minlength=tamano)
+        D[inicio:fin] = 1 - 0.25 * suma_padres
+
+        identidad = sparse.csr_matrix(
+            (np.ones(tamano), (np.arange(tamano), np.arange(inicio, fin))),
+            shape=(tamano, n)
+        )
+        if inicio:
+            seleccion = sparse.csr_matrix(
+                (np.full(len(fila), 0.5), (fila, columna)),
+                shape=(tamano, inicio)
+            )
+            bloque = (seleccion @ L + identidad).tocsr()
+        else:
+            bloque = identidad
+
+        F[inicio:fin] = np.asarray(bloque.multiply(bloque) @ D).ravel() - 1
+        L = sparse.vstack([L, bloque], format='csr')
+
+    return ids, L, D, F
+
+
+def construir_motor(version=None):
+    """Calcular la factorización completa del rebaño desde la base de datos"""
+    if version is None:
+        version = version_actual()
+
+    ids = np.fromiter(
+        Animal.objects.order_by('id').values_list('id', flat=True).iterator(),
+        dtype=np.int64
+    )
+    enlaces = np.array(
+        list(Enlace.objects.values_list('from_animal_id', 'to_animal_id').iterator()),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    padres = np.searchsorted(ids, enlaces[:, 0])
+    hijos = np.searchsorted(ids, enlaces[:, 1])
+
+    ids, L, D, F = calcular_factorizacion(ids, padres, hijos)
+    return MotorParentesco(version, ids, L, D, F)
+
+
+_motor = None
+_bloqueo = threading.Lock()
+
+
+def obtener_motor():
+    """Motor de parentesco cacheado en el proceso para la versión vigente (solo lectura: no toca el almacén)"""
+    global _motor
+    version = version_actual()
+    if _motor is not None and _motor.version == version:
+        return _motor
+
+    with _bloqueo:
+        if _motor is None or _motor.version != version:
+            print(f"🧬 Calculando parentesco del rebaño (pedigrí v{version})")
+            _motor = construir_motor(version)
+    return _motor
+
+
+# ============= ALMACÉN PERSISTIDO DE FILAS DE L =============
+
+def _empaquetar(ancestros, coeficientes):
+    """Convertir una fila de L a los bytes que guarda FilaParentesco"""
+    return (
+        np.asarray(ancestros, dtype='<i8').tobytes(),
+        np.asarray(coeficientes, dtype='<f8').tobytes(),
+    )
+
+
+def _desempaquetar(ancestros, coeficientes):
+    """Recuperar los arrays de una fila guardada"""
+    return (
+        np.frombuffer(bytes(ancestros), dtype='<i8'),
+        np.frombuffer(bytes(coeficientes), dtype='<f8'),
+    )
+
+
+def _estado():
+    """(versión del pedigrí, versión a la que corresponde el almacén)"""
+    return VersionPedigree.objects.filter(pk=1).values_list('version', 'version_relaciones').first() or (0, 0)
+
+
+def almacen_vigente():
+    """Indica si FilaParentesco refleja la versión actual del pedigrí"""
+    version, version_relaciones = _estado()
+    return version == version_relaciones
+
+
+@transaction.atomic
+def guardar_almacen(motor):
+    """Persistir todas las filas de L de un motor (reconstrucción completa)"""
+    estado = VersionPedigree.objects.select_for_update().filter(pk=1).first()
+    if estado is None or estado.version != motor.version:
+        return False
+
+    L = motor.L
+
+    def filas():
+        for posicion, animal_id in enumerate(motor.ids):
+            inicio, fin = L.indptr[posicion], L.indptr[posicion + 1]
+            ancestros, coeficientes = _empaquetar(motor.ids[L.indices[inicio:fin]], L.data[inicio:fin])
+            yield FilaParentesco(
+                animal_id=int(animal_id),
+                consanguinidad=float(motor.F[posicion]),
+                varianza_mendeliana=float(motor.D[posicion]),
+                ancestros=ancestros,
+                coeficientes=coeficientes
+            )
+
+    FilaParentesco.objects.all().delete()
+    FilaParentesco.objects.bulk_create(filas(), batch_size=TAMANO_LOTE)
+    estado.version_relaciones = motor.version
+    estado.save(update_fields=['version_relaciones'])
+    return True
+
+
+@transaction.atomic
+def actualizar_hojas(animal_ids, version):
+    """
+    Recalcular en el almacén las filas de animales cuyos padres acaban de
+    cambiar, a partir de las filas de esos padres. `version` es la versión del
+    pedigrí que produjo el cambio: el almacén debía estar al día justo antes.
+    Solo es válido si los animales no tienen descendencia fuera del propio lote;
+    si no, devuelve False y el almacén queda desfasado.
+    """
+    animal_ids = set(animal_ids)
+    if not animal_ids or version is None:
+        return False
+
+    estado = VersionPedigree.objects.select_for_update().filter(pk=1).first()
+    if estado is None or estado.version != version or estado.version_relaciones != version - 1:
+        return False
+
+    con_descendencia = AnimalAncestro.objects.filter(
+        ancestro_id__in=animal_ids
+    ).exclude(descendiente_id__in=animal_ids).exists()
+    if con_descendencia:
+        return False
+
+    padres = defaultdict(list)
+    for padre_id, hijo_id in Enlace.objects.filter(to_animal_id__in=animal_ids).values_list('from_animal_id', 'to_animal_id'):
+        padres[hijo_id].append(padre_id)
+
+    # Filas conocidas: (ancestros, coeficientes, F). Un padre sin fila es un fundador.
+    filas = {}
+    externos = {padre_id for lista in padres.values() for padre_id in lista} - animal_ids
+    for fila in FilaParentesco.objects.filter(animal_id__in=externos):
+        ancestros, coeficientes = _desempaquetar(fila.ancestros, fila.coeficientes)
+        filas[fila.animal_id] = (ancestros, coeficientes, fila.consanguinidad)
+    for padre_id in externos - filas.keys():
+        filas[padre_id] = (np.array([padre_id], dtype=np.int64), np.ones(1), 0.0)
+
+    todos = np.unique(np.concatenate([ancestros for ancestros, _, _ in filas.values()] or [np.zeros(0, dtype=np.int64)]))
+    varianzas = defaultdict(lambda: 1.0)
+    varianzas.update(
+        FilaParentesco.objects.filter(animal_id__in=todos.tolist()).values_list('animal_id', 'varianza_mendeliana')
+    )
+
+    nuevas = []
+    pendientes = set(animal_ids)
+    while pendientes:
+        listos = [a for a in pendientes if not any(p in pendientes for p in padres[a])]
+        if not listos:
+            return False
+
+        for animal_id in listos:
+            filas_padres = [filas[padre_id] for padre_id in padres[animal_id]]
+            ancestros = np.concatenate([f[0] for f in filas_padres] + [np.array([animal_id], dtype=np.int64)])
+            coeficientes = np.concatenate([0.5 * f[1] for f in filas_padres] + [np.ones(1)])
+            ancestros, inversa = np.unique(ancestros, return_inverse=True)
+            coeficientes = np.bincount(inversa, weights=coeficientes)
+
+            D = 1 - 0.25 * sum(1 + f[2] for f in filas_padres)
+            varianzas[animal_id] = D
+            d = np.fromiter((varianzas[a] for a in ancestros.tolist()), dtype=np.float64, count=len(ancestros))
+            F = float(coeficientes @ (coeficientes * d)) - 1
+
+            filas[animal_id] = (ancestros, coeficientes, F)
+            empaquetados = _empaquetar(ancestros, coeficientes)
+            nuevas.append(FilaParentesco(
+                animal_id=animal_id,
+                consanguinidad=F,
+                varianza_mendeliana=D,
+                ancestros=empaquetados[0],
+                coeficientes=empaquetados[1]
+            ))
+        pendientes.difference_update(listos)
+
+    FilaParentesco.objects.filter(animal_id__in=animal_ids).delete()
+    FilaParentesco.objects.bulk_create(nuevas, batch_size=TAMANO_LOTE)
+    estado.version_relaciones = version
+    estado.save(update_fields=['version_relaciones'])
+    return True
+
+
+def reconstruir_almacen():
+    """Recalcular el rebaño y persistir todas las filas; devuelve el motor o None si el pedigrí cambió entretanto"""
+    global _motor
+    motor = construir_motor()
+    if not guardar_almacen(motor):
+        return None
+    with _bloqueo:
+        if _motor is None or _motor.version <= motor.version:
+            _motor = motor
+    return motor
+
+
+_pendiente = threading.Event()
+_estado_hilo = threading.Lock()
+_hilo = None
+
+
+def _bucle_reconstruccion():
+    """Reconstruir mientras haya peticiones pendientes; varias seguidas se agrupan en una"""
+    global _hilo
+    try:
+        while True:
+            _pendiente.clear()
+            try:
+                if not almacen_vigente():
+                    motor = reconstruir_almacen()
+                    if motor is not None:
+                        print(f"🧬 Almacén de parentesco reconstruido: {len(motor.ids)} animales (pedigrí v{motor.version})")
+            except Exception as e:
+                print(f"❌ Error reconstruyendo el almacén de parentesco: {e}")
+            with _estado_hilo:
+                # Si el pedigrí cambió durante el cálculo, guardar_almacen no escribió nada y hay otra petición
+                if not _pendiente.is_set():
+                    _hilo = None
+                    return
+    finally:
+        connections.close_all()
+
+
+def _lanzar_reconstruccion():
+    global _hilo
+    if RECONSTRUCCION == 'sincrona':
+        reconstruir_almacen()
+        return
+    with _estado_hilo:
+        _pendiente.set()
+        if _hilo is None:
+            _hilo = threading.Thread(target=_bucle_reconstruccion, name='parentesco', daemon=True)
+            _hilo.start()
+
+
+def programar_reconstruccion():
+    """Reconstruir el almacén cuando se confirme la transacción en curso (salvo en modo 'manual')"""
+    if RECONSTRUCCION != 'manual':
+        transaction.on_commit(_lanzar_reconstruccion)
+
+
+def actualizar_almacen(animal_ids, version):
+    """
+    Reflejar en el almacén el cambio de padres de `animal_ids` (versión
+    `version` del pedigrí): por diferencia si son hojas y el almacén estaba al
+    día; si no, con una reconstrucción programada. Devuelve True si el almacén
+    ya queda al día.
+    """
+    if version is None:
+        return almacen_vigente()
+    if actualizar_hojas(animal_ids, version):
+        return True
+    programar_reconstruccion()
+    return False
+
+
+def _filas_almacen(animal_ids):
+    """Submatriz de L y vector D para un conjunto de animales, leída del almacén"""
+    filas = {
+        fila.animal_id: _desempaquetar(fila.ancestros, fila.coeficientes)
+        for fila in FilaParentesco.objects.filter(animal_id__in=animal_ids)
+    }
+    for animal_id in set(animal_ids) - filas.keys():
+        filas[animal_id] = (np.array([animal_id], dtype=np.int64), np.ones(1))
+
+    columnas = np.unique(np.concatenate([ancestros for ancestros, _ in filas.values()]))
+    D = np.ones(len(columnas))
+    for animal_id, varianza in FilaParentesco.objects.filter(
+        animal_id__in=columnas.tolist()
+    ).values_list('animal_id', 'varianza_mendeliana'):
+        D[np.searchsorted(columnas, animal_id)] = varianza
+
+    orden = sorted(filas)
+    indptr = np.cumsum([0] + [len(filas[a][0]) for a in orden])
+    L = sparse.csr_matrix(
+        (
+            np.concatenate([filas[a][1] for a in orden]),
+            np.searchsorted(columnas, np.concatenate([filas[a][0] for a in orden])),
+            indptr,
+        ),
+        shape=(len(orden), len(columnas))
+    )
+    return {animal_id: posicion for posicion, animal_id in enumerate(orden)}, L, D
+
+
+def consanguinidad(animal_ids):
+    """
+    Consanguinidad de varios animales y versión del pedigrí usada.
+    Usa el motor en memoria si está al día, si no el almacén persistido,
+    y en último caso recalcula el rebaño completo.
+    """
+    version, version_relaciones = _estado()
+    if _motor is not None and _motor.version == version:
+        return _motor.consanguinidad(animal_ids), version
+
+    if version == version_relaciones:
+        valores = dict(
+            FilaParentesco.objects.filter(animal_id__in=animal_ids).values_list('animal_id', 'consanguinidad')
+        )
+        return np.array([valores.get(a, 0.0) for a in animal_ids]), version
+
+    motor = obtener_motor()
+    return motor.consanguinidad(animal_ids), motor.version
+
+
+def coancestria(animales_a, animales_b):
+    """Coancestría de pares de animales y versión del pedigrí usada"""
+    version, version_relaciones = _estado()
+    if _motor is not None and _motor.version == version:
+        return _motor.coancestria(animales_a, animales_b), version
+
+    if version == version_relaciones:
+        indice, L, D = _filas_almacen(set(animales_a) | set(animales_b))
+        filas_a = L[[indice[a] for a in animales_a]]
+        filas_b = L[[indice[b] for b in animales_b]]
+        return np.asarray(filas_a.multiply(filas_b) @ D).ravel() / 2, version
+
+    motor = obtener_motor()
+    return motor.coancestria(animales_a, animales_b), motor.version
+
+
+def matriz_coancestria(animales_a, animales_b):
+    """Matriz de coancestría entre dos conjuntos de animales y versión del pedigrí usada"""
+    version, version_relaciones = _estado()
+    if _motor is not None and _motor.version == version:
+        return _motor.matriz_coancestria(animales_a, animales_b), version
+
+    if version == version_relaciones:
+        indice, L, D = _filas_almacen(set(animales_a) | set(animales_b))
+        filas_a = L[[indice[a] for a in animales_a]]
+        filas_b = L[[indice[b] for b in animales_b]]
+        return (filas_a @ sparse.diags(D) @ filas_b.T).toarray() / 2, version
+
+    motor = obtener_motor()
+    return motor.matriz_coancestria(animales_a, animales_b), motor.version
@@ -0,0 +1,357 @@
+from collections import Counter, defaultdict, deque
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Animal, AnimalAncestro, VersionPedigree
+
+# Relación padre -> hijo tal y como la guarda `Animal.descendencia`
+Enlace = Animal.descendencia.through
+
+PROFUNDIDAD_POR_DEFECTO = 4
+PROFUNDIDAD_MAXIMA = 20
+MAXIMO_PADRES = 2
+TAMANO_LOTE = 1000
+
+CAMPOS_NODO = ('id', 'chapeta', 'nombre', 'sexo', 'raza', 'fecha_nacimiento')
+
+
+def calcular_cierre(enlaces, conocidos=None):
+    """
+    Calcular el cierre transitivo completo a partir de pares (padre, hijo).
+    Devuelve un Counter {(ancestro, descendiente, profundidad): caminos}.
+    `conocidos` da los ancestros ya guardados ({animal: Counter{(ancestro,
+    profundidad): caminos}}) de animales sin padres en `enlaces`; sus filas no
+    se vuelven a emitir. Función pura: también la usa la migración de relleno inicial.
+    """
+    conocidos = conocidos or {}
+    padres = defaultdict(list)
+    hijos = defaultdict(list)
+    nodos = set()
+    for padre_id, hijo_id in enlaces:
+        padres[hijo_id].append(padre_id)
+        hijos[padre_id].append(hijo_id)
+        nodos.update((padre_id, hijo_id))
+
+    # Orden topológico (Kahn): cada animal se procesa después de sus padres
+    pendientes = {nodo: len(padres[nodo]) for nodo in nodos}
+    cola = deque(nodo for nodo, n in pendientes.items() if n == 0)
+    ancestros = {}
+    cierre = Counter()
+
+    while cola:
+        nodo = cola.popleft()
+        if nodo in conocidos:
+            ancestros[nodo] = conocidos[nodo]
+            for hijo_id in hijos[nodo]:
+                pendientes[hijo_id] -= 1
+                if pendientes[hijo_id] == 0:
+                    cola.append(hijo_id)
+            continue
+
+        propios = Counter()
+        for padre_id in padres[nodo]:
+            propios[(padre_id, 1)] += 1
+            for (ancestro_id, profundidad), caminos in ancestros[padre_id].items():
+                propios[(ancestro_id, profundidad + 1)] += caminos
+        ancestros[nodo] = propios
+
+        for (ancestro_id, profundidad), caminos in propios.items():
+            cierre[(ancestro_id, nodo, profundidad)] = caminos
+
+        for hijo_id in hijos[nodo]:
+            pendientes[hijo_id] -= 1
+            if pendientes[hijo_id] == 0:
+                cola.append(hijo_id)
+
+    if len(ancestros) != len(nodos):
+        raise ValidationError('El pedigrí contiene ciclos')
+
+    return cierre
+
+
+def version_actual():
+    """Versión vigente del pedigrí (0 si nunca se ha modificado)"""
+    version = VersionPedigree.objects.filter(pk=1).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bloquear():
+    """
+    Bloquear la fila de VersionPedigree hasta el final de la transacción: las
+    validaciones y los cambios de la tabla de cierre (que leen y reescriben
+    `caminos`) de peticiones concurrentes se hacen de uno en uno
+    """
+    if VersionPedigree.objects.select_for_update().filter(pk=1).first() is None:
+        VersionPedigree.objects.get_or_create(pk=1)
+        VersionPedigree.objects.select_for_update().get(pk=1)
+
+
+def incrementar_version():
+    """Marcar el pedigrí como modificado y devolver la nueva versión"""
+    actualizadas = VersionPedigree.objects.filter(pk=1).update(
+        version=F('version') + 1,
+        fecha_actualizacion=timezone.now()
+    )
+    if not actualizadas:
+        VersionPedigree.objects.create(pk=1, version=1)
+    return version_actual()
+
+
+@transaction.atomic
+def reconstruir_cierre():
+    """Regenerar la tabla de cierre desde cero"""
+    bloquear()
+    enlaces = Enlace.objects.values_list('from_animal_id', 'to_animal_id').iterator()
+    cierre = calcular_cierre(enlaces)
+
+    AnimalAncestro.objects.all().delete()
+    AnimalAncestro.objects.bulk_create(
+        (
+            AnimalAncestro(
+                ancestro_id=ancestro_id,
+                descendiente_id=descendiente_id,
+                profundidad=profundidad,
+                caminos=caminos
+            )
+            for (ancestro_id, descendiente_id, profundidad), caminos in cierre.items()
+        ),
+        batch_size=TAMANO_LOTE
+    )
+    incrementar_version()
+    return len(cierre)
+
+
+@transaction.atomic
+def incorporar_lote(pares):
+    """
+    Añadir al índice los enlaces de un lote de animales recién creados (que
+    todavía no tienen descendencia fuera del lote). Solo se leen las filas de
+    cierre de los padres ya existentes, no todo el pedigrí.
+    Devuelve la nueva versión del pedigrí, o None si no había enlaces.
+    """
+    pares = list(pares)
+    if not pares:
+        return None
+
+    bloquear()
+    hijos = {hijo_id for _, hijo_id in pares}
+    externos = list({padre_id for padre_id, _ in pares} - hijos)
+    conocidos = defaultdict(Counter)
+    for inicio in range(0, len(externos), TAMANO_LOTE):
+        for ancestro_id, descendiente_id, profundidad, caminos in AnimalAncestro.objects.filter(
+            descendiente_id__in=externos[inicio:inicio + TAMANO_LOTE]
+        ).values_list('ancestro_id', 'descendiente_id', 'profundidad', 'caminos'):
+            conocidos[descendiente_id][(ancestro_id, profundidad)] = caminos
+    for padre_id in externos:
+        conocidos.setdefault(padre_id, Counter())
+
+    cierre = calcular_cierre(pares, conocidos)
+    AnimalAncestro.objects.bulk_create(
+        (
+            AnimalAncestro(
+                ancestro_id=ancestro_id,
+                descendiente_id=descendiente_id,
+                profundidad=profundidad,
+                caminos=caminos
+            )
+            for (ancestro_id, descendiente_id, profundidad), caminos in cierre.items()
+        ),
+        batch_size=TAMANO_LOTE
+    )
+    return incrementar_version()
+
+
+def validar_ciclos(pares):
+    """Comprobar que los pares (padre, hijo) no crean autoparentesco ni ciclos"""
+    pares = {(padre_id, hijo_id) for padre_id, hijo_id in pares if padre_id is not None and hijo_id is not None}
+    if not pares:
+        return
+
+    for padre_id, hijo_id in pares:
+        if padre_id == hijo_id:
+            raise ValidationError(f'El animal {padre_id} no puede ser su propio progenitor')
+
+    # El hijo no puede ser ya ancestro del padre. Por trozos de pares: los
+    # candidatos salen de dos IN y los pares exactos se comprueban aquí
+    pares = sorted(pares)
+    for inicio in range(0, len(pares), TAMANO_LOTE):
+        trozo = pares[inicio:inicio + TAMANO_LOTE]
+        inversos = {(hijo_id, padre_id) for padre_id, hijo_id in trozo}
+        candidatos = AnimalAncestro.objects.filter(
+            ancestro_id__in={hijo_id for _, hijo_id in trozo},
+            descendiente_id__in={padre_id for padre_id, _ in trozo}
+        ).values_list('ancestro_id', 'descendiente_id').distinct()
+        for conflicto in candidatos.iterator(chunk_size=TAMANO_LOTE):
+            if conflicto in inversos:
+                raise ValidationError(
+                    f'El animal {conflicto[0]} es ancestro de {conflicto[1]}: el enlace crearía un ciclo'
+                )
+
+
+@transaction.atomic
+def validar_enlaces(pares):
+    """
+    Comprobar que los pares (padre, hijo) no crean autoparentesco,
+    ciclos ni animales con más de dos padres. Dentro de una transacción el
+    bloqueo del pedigrí se mantiene hasta que se guardan los enlaces.
+    """
+    pares = set(pares)
+    if not pares:
+        return
+    bloquear()
+    validar_ciclos(pares)
+
+    nuevos = Counter(hijo_id for _, hijo_id in pares)
+    hijos = list(nuevos)
+    existentes = {}
+    for inicio in range(0, len(hijos), TAMANO_LOTE):
+        existentes.update(
+            Enlace.objects.filter(to_animal_id__in=hijos[inicio:inicio + TAMANO_LOTE])
+            .values('to_animal_id')
+            .annotate(total=Count('id'))
+            .values_list('to_animal_id', 'total')
+        )
+    for hijo_id, cantidad in nuevos.items():
+        if existentes.get(hijo_id, 0) + cantidad > MAXIMO_PADRES:
+            raise ValidationError(f'El animal {hijo_id} no puede tener más de {MAXIMO_PADRES} progenitores')
+
+
+def enlaces_existentes(filtro):
+    """Pares (padre, hijo) actualmente guardados que cumplen el filtro"""
+    return list(Enlace.objects.filter(filtro).values_list('from_animal_id', 'to_animal_id'))
+
+
+def _aplicar_enlace(padre_id, hijo_id, signo):
+    """Sumar (signo=1) o restar (signo=-1) los caminos que pasan por un enlace"""
+    arriba = Counter({(padre_id, 0): 1})
+    for ancestro_id, profundidad, caminos in AnimalAncestro.objects.filter(
+        descendiente_id=padre_id
+    ).values_list('ancestro_id', 'profundidad', 'caminos'):
+        arriba[(ancestro_id, profundidad)] = caminos
+
+    abajo = Counter({(hijo_id, 0): 1})
+    for descendiente_id, profundidad, caminos in AnimalAncestro.objects.filter(
+        ancestro_id=hijo_id
+    ).values_list('descendiente_id', 'profundidad', 'caminos'):
+        abajo[(descendiente_id, profundidad)] = caminos
+
+    delta = Counter()
+    for (ancestro_id, prof_arriba), caminos_arriba in arriba.items():
+        for (descendiente_id, prof_abajo), caminos_abajo in abajo.items():
+            clave = (ancestro_id, descendiente_id, prof_arriba + prof_abajo + 1)
+            delta[clave] += caminos_arriba * caminos_abajo
+
+    ancestros_ids = {ancestro_id for ancestro_id, _ in arriba}
+    descendientes_ids = {descendiente_id for descendiente_id, _ in abajo}
+    actuales = {
+        (fila.ancestro_id, fila.descendiente_id, fila.profundidad): fila
+        for fila in AnimalAncestro.objects.filter(
+            ancestro_id__in=ancestros_ids,
+            descendiente_id__in=descendientes_ids
+        )
+    }
+
+    crear, actualizar, borrar = [], [], []
+    for clave, caminos in delta.items():
+        fila = actuales.get(clave)
+        if fila is None:
+            if signo > 0:
+                crear.append(AnimalAncestro(
+                    ancestro_id=clave[0],
+                    descendiente_id=clave[1],
+                    profundidad=clave[2],
+                    caminos=caminos
+                ))
+            continue
+        fila.caminos += signo * caminos
+        if fila.caminos > 0:
+            actualizar.append(fila)
+        else:
+            borrar.append(fila.pk)
+
+    AnimalAncestro.objects.bulk_create(crear, batch_size=TAMANO_LOTE)
+    AnimalAncestro.objects.bulk_update(actualizar, ['caminos'], batch_size=TAMANO_LOTE)
+    if borrar:
+        AnimalAncestro.objects.filter(pk__in=borrar).delete()
+
+
+@transaction.atomic
+def agregar_enlaces(pares):
+    """
+    Incorporar al índice enlaces padre -> hijo recién creados.
+    Devuelve la nueva versión del pedigrí, o None si no había cambios.
+    """
+    if not pares:
+        return None
+    bloquear()
+    for padre_id, hijo_id in pares:
+        _aplicar_enlace(padre_id, hijo_id, 1)
+    return incrementar_version()
+
+
+@transaction.atomic
+def eliminar_enlaces(pares):
+    """
+    Retirar del índice enlaces padre -> hijo que se van a borrar.
+    Devuelve la nueva versión del pedigrí, o None si no había cambios.
+    """
+    if not pares:
+        return None
+    bloquear()
+    for padre_id, hijo_id in pares:
+        _aplicar_enlace(padre_id, hijo_id, -1)
+    return incrementar_version()
+
+
+def _construir_arbol(raiz_id, profundidad, filtro_nodos, pares, clave):
+    """Montar el árbol anidado con una consulta de nodos y otra de enlaces"""
+    nodos = {fila['id']: fila for fila in Animal.objects.filter(filtro_nodos).values(*CAMPOS_NODO)}
+    relacionados = defaultdict(list)
+    for origen, destino in pares:
+        relacionados[origen].append(destino)
+
+    def construir(animal_id, nivel):
+        nodo = dict(nodos[animal_id])
+        nodo['generacion'] = nivel
+        if nivel < profundidad:
+            nodo[clave] = [construir(otro, nivel + 1) for otro in sorted(relacionados[animal_id])]
+        else:
+            nodo[clave] = []
+        return nodo
+
+    return {
+        'profundidad': profundidad,
+        'total': len(nodos) - 1,
+        'arbol': construir(raiz_id, 0),
+    }
+
+
+def obtener_pedigree(animal_id, profundidad=PROFUNDIDAD_POR_DEFECTO):
+    """Árbol de ancestros hasta `profundidad` generaciones en consultas constantes"""
+    ancestros = AnimalAncestro.objects.filter(
+        descendiente_id=animal_id,
+        profundidad__lte=profundidad
+    ).values('ancestro_id')
+    pares = Enlace.objects.filter(
+        Q(to_animal_id=animal_id) | Q(to_animal_id__in=ancestros),
+        from_animal_id__in=ancestros
+    ).values_list('to_animal_id', 'from_animal_id')
+    filtro_nodos = Q(id=animal_id) | Q(id__in=ancestros)
+    return _construir_arbol(animal_id, profundidad, filtro_nodos, pares, 'padres')
+
+
+def obtener_descendientes(animal_id, profundidad=PROFUNDIDAD_POR_DEFECTO):
+    """Árbol de descendientes hasta `profundidad` generaciones en consultas constantes"""
+    descendientes = AnimalAncestro.objects.filter(
+        ancestro_id=animal_id,
+        profundidad__lte=profundidad
+    ).values('descendiente_id')
+    pares = Enlace.objects.filter(
+        Q(from_animal_id=animal_id) | Q(from_animal_id__in=descendientes),
+        to_animal_id__in=descendientes
+    ).values_list('from_animal_id', 'to_animal_id')
+    filtro_nodos = Q(id=animal_id) | Q(id__in=descendientes)
+    return _construir_arbol(animal_id, profundidad, filtro_nodos, pares, 'hijos')
@@ -1,7 +1,166 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
-from .models import Animal
+from .models import Animal, AnimalAncestro
+from .pedigree import validar_ciclos, validar_enlaces, MAXIMO_PADRES
+
+def composicion_racial(animal):
+    """Fracción de cada raza, de mayor a menor"""
+    filas = sorted(animal.composicion_racial.all(), key=lambda fila: -fila.fraccion)
+    return {fila.raza: round(fila.fraccion, 6) for fila in filas}
+
 
 class AnimalSerializer(serializers.ModelSerializer):
+    # Progenitores conocidos al registrar una cría (equivale a añadirla a su descendencia)
+    padres = serializers.PrimaryKeyRelatedField(
+        many=True,
+        write_only=True,
+        required=False,
+        queryset=Animal.objects.all()
+    )
+
+    composicion_racial = serializers.SerializerMethodField()
+
     class Meta:
         model = Animal
         fields = '__all__'
+
+    def get_composicion_racial(self, obj):
+        return composicion_racial(obj)
+
+    def validate_produccion(self, value):
+        """
+        La producción se registra en /api/produccion/registros/: aquí solo se
+        admite el histórico anterior sin cambios (p. ej. en un PUT completo)
+        """
+        actual = self.instance.produccion if self.instance is not None else []
+        if value != actual:
+            raise serializers.ValidationError(
+                'La producción ya no se edita en el animal: usa /api/produccion/registros/ '
+                '(o /api/produccion/registros/lote/ para varios registros)'
+            )
+        return value
+
+    def validate_historial_movimientos(self, value):
+        """Los traslados se registran en /api/ubicaciones/: aquí solo se admite el histórico sin cambios"""
+        actual = self.instance.historial_movimientos if self.instance is not None else []
+        if value != actual:
+            raise serializers.ValidationError(
+                'El historial de movimientos ya no se edita en el animal: cambia ubicacion_actual '
+                'o usa /api/ubicaciones/movimientos/mover/'
+            )
+        return value
+
+    def validate_peso_actual(self, value):
+        """
+        El peso se registra con pesajes en /api/pesajes/: al dar de alta el
+        animal se admite un peso inicial (que pasa a ser su primer pesaje)
+        """
+        if self.instance is not None and value != self.instance.peso_actual:
+            raise serializers.ValidationError(
+                'El peso ya no se edita en el animal: registra un pesaje en /api/pesajes/ '
+                '(o una sesión de báscula en /api/pesajes/sesiones/)'
+            )
+        return value
+
+    def validate_descendencia(self, value):
+        """Rechazar autoparentesco, ciclos y más de dos progenitores"""
+        actuales = set()
+        padre_id = None
+        if self.instance is not None:
+            padre_id = self.instance.pk
+            actuales = set(self.instance.descendencia.values_list('id', flat=True))
+
+        pares = [(padre_id, hijo.pk) for hijo in value if hijo.pk not in actuales]
+        try:
+            validar_enlaces(pares)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+        return value
+
+    def validate_padres(self, value):
+        """Comprobar los progenitores declarados para el animal: número, autoparentesco y ciclos"""
+        if len(value) > MAXIMO_PADRES:
+            raise serializers.ValidationError(f'Un animal no puede tener más de {MAXIMO_PADRES} progenitores')
+        if self.instance is not None:
+            # El número ya está comprobado: set() sustituye a los progenitores actuales
+            try:
+                validar_ciclos([(padre.pk, self.instance.pk) for padre in value])
+            except DjangoValidationError as e:
+                raise serializers.ValidationError(e.messages)
+        return value
+
+    def validate(self, data):
+        """Un progenitor declarado no puede estar en la descendencia ni colgar de ella"""
+        padres = {padre.pk for padre in data.get('padres') or []}
+        hijos = {hijo.pk for hijo in data.get('descendencia') or []}
+        comunes = padres & hijos
+        if comunes:
+            raise serializers.ValidationError(
+                {'padres': [f'El animal {min(comunes)} no puede ser progenitor y descendiente a la vez']}
+            )
+        if padres and hijos:
+            conflicto = (
+                AnimalAncestro.objects.filter(ancestro_id__in=hijos, descendiente_id__in=padres)
+                .values_list('ancestro_id', 'descendiente_id').first()
+            )
+            if conflicto:
+                raise serializers.ValidationError(
+                    {'padres': [f'El animal {conflicto[0]} es ancestro de {conflicto[1]}: el enlace crearía un ciclo']}
+                )
+        return data
+
+    def create(self, validated_data):
+        padres = validated_data.pop('padres', None)
+        # El animal y sus enlaces se guardan juntos: si un enlace falla no queda nada
+        with transaction.atomic():
+            animal = super().create(validated_data)
+            if padres:
+                animal.animal_set.add(*padres)
+                # La composición racial sale de los padres recién enlazados
+                getattr(animal, '_prefetched_objects_cache', {}).pop('composicion_racial', None)
+        return animal
+
+    def update(self, instance, validated_data):
+        padres = validated_data.pop('padres', None)
+        with transaction.atomic():
+            animal = super().update(instance, validated_data)
+            if padres is not None:
+                animal.animal_set.set(padres)
+                getattr(animal, '_prefetched_objects_cache', {}).pop('composicion_racial', None)
+        return animal
+
+
+class AnimalListaSerializer(serializers.ModelSerializer):
+    """Representación compacta para listados: sin blobs JSON ni descendencia"""
+    composicion_racial = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Animal
+        fields = [
+            'id', 'chapeta', 'rfid', 'nombre', 'sexo', 'fecha_nacimiento', 'raza',
+            'estado_reproductivo', 'estado_productivo', 'peso_actual',
+            'ubicacion_actual', 'foto_perfil_url', 'composicion_racial',
+        ]
+        read_only_fields = fields
+
+    def get_composicion_racial(self, obj):
+        return composicion_racial(obj)
+
+
+class AnimalCargaSerializer(serializers.ModelSerializer):
+    """
+    Validación de una fila de la carga masiva. La unicidad de la chapeta y la
+    existencia de los padres se comprueban por trozos, no fila a fila.
+    """
+    chapeta = serializers.CharField(max_length=50)
+    padres = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=MAXIMO_PADRES
+    )
+
+    class Meta:
+        model = Animal
+        # El RFID es único y se asigna por animal, como la chapeta en la edición
+        exclude = ['descendencia', 'produccion', 'historial_movimientos', 'rfid', 'creado_por', 'modificado_por']
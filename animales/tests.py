@@ -1,3 +1,829 @@
+import json
+from datetime import date
+from unittest import mock
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import Animal, AnimalAncestro, ComposicionRacial, FilaParentesco
+from . import busqueda, carga_masiva, composicion, identificadores, parentesco, pedigree
+from .carga_masiva import cargar_animales, leer_filas
+from .edicion_masiva import ErrorEdicionMasiva, actualizar_por_animal, actualizar_por_filtro
+from .importacion import ErrorImportacion, importar_pedigree, planificar
+from logs.models import Log
+from ubicaciones.models import Movimiento
+from usuarios.models import Usuario
+
+
+def crear_animal(chapeta, sexo='hembra', **campos):
+    datos = {
+        'fecha_nacimiento': date(2020, 1, 1),
+        'raza': 'Angus',
+        'estado_reproductivo': 'vacío',
+        'estado_productivo': 'activo',
+    }
+    datos.update(campos)
+    return Animal.objects.create(chapeta=chapeta, sexo=sexo, **datos)
+
+
+def cierre_guardado():
+    """{(ancestro, descendiente, profundidad): caminos} de la tabla de cierre"""
+    return {
+        (ancestro, descendiente, profundidad): caminos
+        for ancestro, descendiente, profundidad, caminos in AnimalAncestro.objects.values_list(
+            'ancestro_id', 'descendiente_id', 'profundidad', 'caminos'
+        )
+    }
+
+
+class CierrePedigreeTests(TestCase):
+    """Tabla de cierre mantenida desde las señales de Animal.descendencia"""
+
+    def setUp(self):
+        # Abuelos A1 x A2 -> padre P; P x M -> cría C (C es el único nieto)
+        self.a1 = crear_animal('A1', 'macho')
+        self.a2 = crear_animal('A2')
+        self.p = crear_animal('P', 'macho')
+        self.m = crear_animal('M')
+        self.c = crear_animal('C')
+        self.p.animal_set.add(self.a1, self.a2)
+        self.c.animal_set.add(self.p, self.m)
+
+    def test_agregar_enlaces(self):
+        a1, a2, p, m, c = (animal.pk for animal in (self.a1, self.a2, self.p, self.m, self.c))
+        self.assertEqual(cierre_guardado(), {
+            (a1, p, 1): 1,
+            (a2, p, 1): 1,
+            (p, c, 1): 1,
+            (m, c, 1): 1,
+            (a1, c, 2): 1,
+            (a2, c, 2): 1,
+        })
+
+    def test_caminos_con_consanguinidad(self):
+        # Dos hermanos completos H1 y H2 tienen una cría X: cada abuelo llega por dos caminos
+        h1 = crear_animal('H1', 'macho')
+        h2 = crear_animal('H2')
+        x = crear_animal('X')
+        h1.animal_set.add(self.p, self.m)
+        h2.animal_set.add(self.p, self.m)
+        x.animal_set.add(h1, h2)
+
+        cierre = cierre_guardado()
+        self.assertEqual(cierre[(self.p.pk, x.pk, 2)], 2)
+        self.assertEqual(cierre[(self.m.pk, x.pk, 2)], 2)
+        self.assertEqual(cierre[(self.a1.pk, x.pk, 3)], 2)
+        self.assertNotIn((self.p.pk, x.pk, 1), cierre)
+
+    def test_eliminar_enlace(self):
+        self.c.animal_set.remove(self.p)
+        cierre = cierre_guardado()
+        self.assertEqual(
+            {clave for clave in cierre if clave[1] == self.c.pk},
+            {(self.m.pk, self.c.pk, 1)}
+        )
+        # Las filas que no pasaban por el enlace siguen igual
+        self.assertEqual(cierre[(self.a1.pk, self.p.pk, 1)], 1)
+
+    def test_borrar_animal(self):
+        self.p.delete()
+        self.assertEqual(cierre_guardado(), {(self.m.pk, self.c.pk, 1): 1})
+
+    def test_coincide_con_reconstruccion(self):
+        h1 = crear_animal('H1', 'macho')
+        h1.animal_set.add(self.c, self.a1)
+        self.c.animal_set.remove(self.m)
+        incremental = cierre_guardado()
+        pedigree.reconstruir_cierre()
+        self.assertEqual(cierre_guardado(), incremental)
+
+    def test_rechaza_ciclo(self):
+        antes = cierre_guardado()
+        # add() no abre savepoint: el error invalidaría la transacción del test
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.a1.animal_set.add(self.c)
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.c.descendencia.add(self.p)
+        self.assertEqual(cierre_guardado(), antes)
+        self.assertFalse(self.a1.animal_set.exists())
+
+    def test_rechaza_autoparentesco(self):
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.m.descendencia.add(self.m)
+        self.assertFalse(AnimalAncestro.objects.filter(ancestro=self.m, descendiente=self.m).exists())
+
+    def test_rechaza_tercer_progenitor(self):
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.c.animal_set.add(self.a1)
+        self.assertEqual(self.c.animal_set.count(), 2)
+
+    def test_validar_muchos_enlaces(self):
+        # Una importación grande no puede generar una única consulta con un OR por par
+        pares = [(1_000_000 + i, 2_000_000 + i) for i in range(20000)]
+        pedigree.validar_ciclos(pares)
+        with self.assertRaisesMessage(ValidationError, f'El animal {self.a1.pk} es ancestro de {self.c.pk}'):
+            pedigree.validar_ciclos(pares + [(self.c.pk, self.a1.pk)])
+
+    def test_cambios_bajo_bloqueo(self):
+        # Validar y aplicar un enlace bloquea el pedigrí; una lista vacía no
+        h1 = crear_animal('H1', 'macho')
+        with mock.patch.object(pedigree, 'bloquear', wraps=pedigree.bloquear) as bloquear:
+            h1.animal_set.add(self.c)
+            self.assertEqual(bloquear.call_count, 2)
+            h1.animal_set.remove(self.c)
+            self.assertEqual(bloquear.call_count, 3)
+            pedigree.agregar_enlaces([])
+            self.assertEqual(bloquear.call_count, 3)
+
+    def test_arbol_de_ancestros(self):
+        arbol = pedigree.obtener_pedigree(self.c.pk, profundidad=1)
+        self.assertEqual(arbol['total'], 2)
+        self.assertEqual(
+            sorted(nodo['chapeta'] for nodo in arbol['arbol']['padres']),
+            ['M', 'P']
+        )
+        self.assertEqual([nodo['padres'] for nodo in arbol['arbol']['padres']], [[], []])
+
+
+# Ejemplo 2.1 de Mrode (Linear Models for the Prediction of Animal Breeding
+# Values): 3 = 1 x 2, 4 = 1 x ?, 5 = 4 x 3, 6 = 5 x 2. A calculada a mano con
+# el método tabular; F5 = F6 = 1/8.
+PEDIGREE_TABULAR = {3: (1, 2), 4: (1, None), 5: (4, 3), 6: (5, 2)}
+A_TABULAR = np.array([
+    [1.0, 0.0, 0.5, 0.5, 0.5, 0.25],
+    [0.0, 1.0, 0.5, 0.0, 0.25, 0.625],
+    [0.5, 0.5, 1.0, 0.25, 0.625, 0.5625],
+    [0.5, 0.0, 0.25, 1.0, 0.625, 0.3125],
+    [0.5, 0.25, 0.625, 0.625, 1.125, 0.6875],
+    [0.25, 0.625, 0.5625, 0.3125, 0.6875, 1.125],
+])
+
+
+def crear_pedigree_tabular():
+    """Animales 1..6 del ejemplo tabular; devuelve sus ids en ese orden"""
+    animales = {
+        numero: crear_animal(f'T{numero}', 'macho' if numero in (1, 4, 5) else 'hembra')
+        for numero in range(1, 7)
+    }
+    for hijo, progenitores in PEDIGREE_TABULAR.items():
+        animales[hijo].animal_set.add(*(animales[p] for p in progenitores if p))
+    return [animales[numero].pk for numero in range(1, 7)]
+
+
+class ParentescoTests(TestCase):
+    """Consanguinidad y coancestría frente a la matriz A calculada a mano"""
+
+    def setUp(self):
+        # El motor se cachea por versión del pedigrí, que se repite entre tests
+        parentesco._motor = None
+        self.ids = crear_pedigree_tabular()
+
+    def tearDown(self):
+        parentesco._motor = None
+
+    def comprobar(self):
+        ids = self.ids
+        F, _ = parentesco.consanguinidad(ids)
+        np.testing.assert_allclose(F, np.diag(A_TABULAR) - 1, atol=1e-12)
+
+        pares = [(a, b) for a in range(6) for b in range(6)]
+        f, _ = parentesco.coancestria([ids[a] for a, _ in pares], [ids[b] for _, b in pares])
+        np.testing.assert_allclose(f, [A_TABULAR[a, b] / 2 for a, b in pares], atol=1e-12)
+
+        matriz, _ = parentesco.matriz_coancestria(ids[:3], ids[3:])
+        np.testing.assert_allclose(matriz, A_TABULAR[:3, 3:] / 2, atol=1e-12)
+
+    def test_motor_en_memoria(self):
+        parentesco.obtener_motor()
+        self.comprobar()
+
+    def test_almacen_persistido(self):
+        parentesco.reconstruir_almacen()
+        parentesco._motor = None
+        self.assertTrue(parentesco.almacen_vigente())
+        self.comprobar()
+
+    def test_factorizacion(self):
+        motor = parentesco.construir_motor()
+        L = motor.L.toarray()
+        orden = motor.posiciones(self.ids)
+        A = (L @ np.diag(motor.D) @ L.T)[np.ix_(orden, orden)]
+        np.testing.assert_allclose(A, A_TABULAR, atol=1e-12)
+
+    def test_animal_sin_pedigree(self):
+        suelto = crear_animal('S')
+        F, _ = parentesco.consanguinidad([suelto.pk])
+        f, _ = parentesco.coancestria([suelto.pk, suelto.pk], [suelto.pk, self.ids[0]])
+        self.assertEqual(F.tolist(), [0.0])
+        self.assertEqual(f.tolist(), [0.5, 0.0])
+
+
+def filas_guardadas():
+    """{animal: (F, D, {ancestro: coeficiente})} del almacén de parentesco"""
+    filas = {}
+    for fila in FilaParentesco.objects.all():
+        ancestros, coeficientes = parentesco._desempaquetar(fila.ancestros, fila.coeficientes)
+        filas[fila.animal_id] = (
+            round(fila.consanguinidad, 12),
+            round(fila.varianza_mendeliana, 12),
+            {int(a): round(float(c), 12) for a, c in zip(ancestros, coeficientes)},
+        )
+    return filas
+
+
+class AlmacenParentescoTests(TestCase):
+    """Actualización por diferencia de las filas de L frente a la reconstrucción completa"""
+
+    def setUp(self):
+        parentesco._motor = None
+        self.ids = crear_pedigree_tabular()
+        parentesco.reconstruir_almacen()
+
+    def tearDown(self):
+        parentesco._motor = None
+
+    def assertCoincideConReconstruccion(self):
+        self.assertTrue(parentesco.almacen_vigente())
+        incremental = filas_guardadas()
+        parentesco.reconstruir_almacen()
+        self.assertEqual(incremental, filas_guardadas())
+
+    def test_cria_nueva(self):
+        # 7 = 6 x 3: hoja con padres consanguíneos y emparentados
+        cria = crear_animal('T7')
+        with mock.patch.object(parentesco, 'programar_reconstruccion') as programar:
+            cria.animal_set.add(self.ids[5], self.ids[2])
+        programar.assert_not_called()
+        self.assertAlmostEqual(filas_guardadas()[cria.pk][0], A_TABULAR[5, 2] / 2)
+        self.assertCoincideConReconstruccion()
+
+    def test_cambio_de_padres_de_una_hoja(self):
+        hoja = Animal.objects.get(pk=self.ids[5])
+        with mock.patch.object(parentesco, 'programar_reconstruccion') as programar:
+            hoja.animal_set.remove(self.ids[1])
+            hoja.animal_set.add(self.ids[3])
+        programar.assert_not_called()
+        self.assertCoincideConReconstruccion()
+
+    def test_cambio_con_descendencia_reconstruye(self):
+        # 4 tiene descendencia (5 y 6): no basta con su fila
+        con_descendencia = Animal.objects.get(pk=self.ids[3])
+        with mock.patch.object(parentesco, 'RECONSTRUCCION', 'sincrona'):
+            with self.captureOnCommitCallbacks(execute=False) as pendientes:
+                con_descendencia.animal_set.add(self.ids[1])
+            self.assertFalse(parentesco.almacen_vigente())
+            for funcion in pendientes:
+                funcion()
+        self.assertCoincideConReconstruccion()
+        self.assertAlmostEqual(filas_guardadas()[self.ids[3]][0], 0.0)
+
+    def test_lectura_no_escribe(self):
+        Animal.objects.get(pk=self.ids[3]).animal_set.add(self.ids[1])
+        antes = filas_guardadas()
+        parentesco._motor = None
+        F, _ = parentesco.consanguinidad(self.ids)
+        self.assertFalse(parentesco.almacen_vigente())
+        self.assertEqual(filas_guardadas(), antes)
+        # La lectura usa el pedigrí nuevo aunque el almacén esté desfasado
+        self.assertGreater(F[5], A_TABULAR[5, 5] - 1)
+
+
+def leer_csv(texto):
+    return texto.strip().splitlines()
+
+
+class ImportacionPedigreeTests(TestCase):
+    """Orden topológico y detección de ciclos en la importación de pedigrí"""
+
+    def test_crias_antes_que_sus_padres(self):
+        crear_animal('ABUELO', 'macho')
+        # Las crías aparecen antes que sus padres y el sexo de P y M sale de su papel
+        lineas = leer_csv("""
+chapeta,padre,madre,fecha_nacimiento,sexo
+NIETO,P,M,2023-01-01,macho
+P,ABUELO,,2021-01-01,
+M,,,2021-01-01,
+""")
+        resumen = importar_pedigree(lineas, 'csv')
+        self.assertEqual((resumen['creados'], resumen['enlaces'], resumen['generaciones']), (3, 3, 2))
+
+        animales = {animal.chapeta: animal for animal in Animal.objects.all()}
+        self.assertEqual((animales['P'].sexo, animales['M'].sexo), ('macho', 'hembra'))
+        self.assertEqual(
+            set(animales['NIETO'].animal_set.values_list('chapeta', flat=True)), {'P', 'M'}
+        )
+        self.assertEqual(
+            AnimalAncestro.objects.get(ancestro=animales['ABUELO'], descendiente=animales['NIETO']).profundidad, 2
+        )
+        incremental = cierre_guardado()
+        pedigree.reconstruir_cierre()
+        self.assertEqual(cierre_guardado(), incremental)
+
+    def test_generaciones_en_orden(self):
+        registros = [
+            {'chapeta': f'G{i}', 'padre': f'G{i - 1}' if i else None, 'fecha_nacimiento': '2020-01-01'}
+            for i in reversed(range(5))
+        ]
+        generaciones, _, errores, _ = planificar(registros, sexo_por_defecto='macho')
+        self.assertEqual(errores, [])
+        self.assertEqual([[r['chapeta'] for r in generacion] for generacion in generaciones],
+                         [['G0'], ['G1'], ['G2'], ['G3'], ['G4']])
+
+    def test_ciclos_y_sus_descendientes(self):
+        # A <-> B forman un ciclo; C (hija de A) y D (hija de C) solo descienden de él.
+        # F -> G -> H -> F es un ciclo de tres; E es válido.
+        registros = [
+            {'chapeta': 'A', 'padre': 'B', 'fecha_nacimiento': '2020-01-01', 'sexo': 'macho'},
+            {'chapeta': 'B', 'padre': 'A', 'fecha_nacimiento': '2020-01-01', 'sexo': 'macho'},
+            {'chapeta': 'C', 'padre': 'A', 'fecha_nacimiento': '2021-01-01', 'sexo': 'hembra'},
+            {'chapeta': 'D', 'madre': 'C', 'fecha_nacimiento': '2022-01-01', 'sexo': 'hembra'},
+            {'chapeta': 'E', 'fecha_nacimiento': '2022-01-01', 'sexo': 'hembra'},
+            {'chapeta': 'F', 'padre': 'G', 'madre': 'H', 'fecha_nacimiento': '2020-01-01', 'sexo': 'macho'},
+            {'chapeta': 'G', 'padre': 'F', 'fecha_nacimiento': '2020-01-01', 'sexo': 'macho'},
+            {'chapeta': 'H', 'padre': 'G', 'fecha_nacimiento': '2020-01-01', 'sexo': 'hembra'},
+        ]
+        generaciones, _, errores, _ = planificar(registros)
+        self.assertEqual([[r['chapeta'] for r in generacion] for generacion in generaciones], [['E']])
+        ciclo = 'El pedigrí contiene un ciclo'
+        progenitor = 'Algún progenitor del archivo tiene errores'
+        self.assertEqual(
+            {error['chapeta']: error['error'] for error in errores},
+            {'A': ciclo, 'B': ciclo, 'C': progenitor, 'D': progenitor, 'F': ciclo, 'G': ciclo, 'H': ciclo}
+        )
+
+    def test_errores_sin_omitir_no_importa_nada(self):
+        lineas = leer_csv("""
+chapeta,padre,madre,fecha_nacimiento,sexo
+OK,,,2020-01-01,macho
+MAL,DESCONOCIDO,,2020-01-01,hembra
+""")
+        with self.assertRaises(ErrorImportacion) as contexto:
+            importar_pedigree(lineas, 'csv')
+        self.assertEqual(contexto.exception.errores[0]['chapeta'], 'MAL')
+        self.assertFalse(Animal.objects.exists())
+
+    def test_omitir_errores(self):
+        crear_animal('YA')
+        lineas = [
+            '{"chapeta": "YA", "fecha_nacimiento": "2020-01-01", "sexo": "hembra"}',
+            '{"chapeta": "P", "fecha_nacimiento": "2020-01-01", "sexo": "macho"}',
+            '{"chapeta": "MALA", "fecha_nacimiento": "2020-13-01", "sexo": "hembra"}',
+            '{"chapeta": "HIJA", "padre": "P", "madre": "MALA", "fecha_nacimiento": "2022-01-01"}',
+            '{"chapeta": "NIETA", "padre": "P", "madre": "YA", "fecha_nacimiento": "2022-01-01"}',
+        ]
+        resumen = importar_pedigree(lineas, 'ndjson', omitir_errores=True, sexo_por_defecto='hembra')
+        self.assertEqual((resumen['creados'], resumen['omitidos_existentes'], resumen['con_errores']), (2, 1, 2))
+        self.assertEqual(
+            {error['chapeta']: error['error'] for error in resumen['errores']},
+            {'MALA': 'Fecha de nacimiento no válida (AAAA-MM-DD)', 'HIJA': 'Algún progenitor del archivo tiene errores'}
+        )
+        self.assertEqual(
+            set(Animal.objects.values_list('chapeta', flat=True)), {'YA', 'P', 'NIETA'}
+        )
+
+
+def fila_carga(chapeta, **campos):
+    datos = {
+        'chapeta': chapeta,
+        'sexo': 'hembra',
+        'fecha_nacimiento': '2022-01-01',
+        'raza': 'Angus',
+        'estado_reproductivo': 'vacío',
+        'estado_productivo': 'activo',
+    }
+    datos.update(campos)
+    return json.dumps(datos)
+
+
+class CargaMasivaTests(TestCase):
+    """Alta masiva: cada fila se acepta o se rechaza por separado"""
+
+    def cargar(self, lineas, **opciones):
+        informe = list(cargar_animales(leer_filas(lineas, 'ndjson'), **opciones))
+        return informe[:-1], informe[-1]['resumen']
+
+    def test_filas_rechazadas_y_aceptadas(self):
+        padre = crear_animal('PADRE', 'macho')
+        crear_animal('YA')
+        rechazos, resumen = self.cargar([
+            fila_carga('C1', padres=[padre.pk]),
+            '{no es json',
+            fila_carga('YA'),
+            fila_carga('C1'),
+            fila_carga('C2', padres=[999999]),
+            fila_carga('C3', sexo='otro'),
+            fila_carga('C4'),
+            fila_carga('C4'),
+        ], filas_por_trozo=3)
+
+        self.assertEqual([rechazo['fila'] for rechazo in rechazos], [2, 3, 4, 5, 6, 8])
+        self.assertIn('non_field_errors', rechazos[0]['errores'])
+        # C1 ya se insertó en el trozo anterior; C4 se repite dentro del mismo trozo
+        self.assertEqual(rechazos[1]['errores'], {'chapeta': ['Ya existe un animal con esta chapeta']})
+        self.assertEqual(rechazos[2]['errores'], {'chapeta': ['Ya existe un animal con esta chapeta']})
+        self.assertEqual(rechazos[3]['errores'], {'padres': ['Progenitores inexistentes: [999999]']})
+        self.assertIn('sexo', rechazos[4]['errores'])
+        self.assertEqual(rechazos[5]['errores'], {'chapeta': ['Chapeta repetida en el archivo']})
+        self.assertEqual(
+            (resumen['leidas'], resumen['creadas'], resumen['rechazadas'], resumen['completa']), (8, 2, 6, True)
+        )
+        cria = Animal.objects.get(chapeta='C1')
+        self.assertEqual(list(cria.animal_set.all()), [padre])
+        self.assertTrue(AnimalAncestro.objects.filter(ancestro=padre, descendiente=cria).exists())
+        self.assertTrue(Animal.objects.filter(chapeta='C4').exists())
+
+    def test_trozo_rechazado_por_la_base_de_datos(self):
+        original = carga_masiva._insertar_trozo
+        llamadas = []
+
+        def insertar(aceptadas, usuario):
+            llamadas.append(len(aceptadas))
+            if len(llamadas) == 1:
+                raise IntegrityError('UNIQUE constraint failed: animales_animal.chapeta')
+            return original(aceptadas, usuario)
+
+        with mock.patch.object(carga_masiva, '_insertar_trozo', insertar):
+            rechazos, resumen = self.cargar([fila_carga(f'T{i}') for i in range(4)], filas_por_trozo=2)
+
+        self.assertEqual([rechazo['fila'] for rechazo in rechazos], [1, 2])
+        self.assertIn('Trozo rechazado', rechazos[0]['errores']['non_field_errors'][0])
+        self.assertEqual((resumen['creadas'], resumen['rechazadas'], resumen['completa']), (2, 2, True))
+        self.assertEqual(set(Animal.objects.values_list('chapeta', flat=True)), {'T2', 'T3'})
+
+    def test_fallo_a_mitad_del_archivo(self):
+        def lineas():
+            yield fila_carga('U1')
+            yield fila_carga('U2')
+            raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+
+        informe = list(cargar_animales(leer_filas(lineas(), 'ndjson'), filas_por_trozo=1))
+        self.assertEqual(informe[-2], {'error': 'El archivo debe estar en UTF-8'})
+        resumen = informe[-1]['resumen']
+        self.assertEqual((resumen['creadas'], resumen['completa']), (2, False))
+        # Lo insertado antes del fallo se conserva
+        self.assertEqual(Animal.objects.count(), 2)
+
+    def test_endpoint_ndjson(self):
+        usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        cliente = APIClient()
+        cliente.force_authenticate(usuario)
+        cuerpo = '\n'.join([fila_carga('E1'), fila_carga('E1'), fila_carga('E2')]) + '\n'
+        respuesta = cliente.post('/api/animales/bulk/?formato=ndjson', cuerpo, content_type='application/x-ndjson')
+        self.assertEqual(respuesta.status_code, 200)
+        lineas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).decode().splitlines()]
+        self.assertEqual(lineas[0]['fila'], 2)
+        self.assertEqual(lineas[-1]['resumen']['creadas'], 2)
+        self.assertEqual(Animal.objects.get(chapeta='E2').creado_por, usuario)
+
+
+class EdicionMasivaTests(TestCase):
+    """Edición masiva: si algún elemento falla no se aplica ninguno"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        self.padre = crear_animal('EP', 'macho', raza='Hereford')
+        self.vacas = [crear_animal(f'EV{i}') for i in range(3)]
+        self.vacas[0].animal_set.add(self.padre)
+
+    def estados(self):
+        return dict(Animal.objects.values_list('chapeta', 'estado_productivo'))
+
+    def test_por_animal_con_errores_no_aplica_nada(self):
+        antes = self.estados()
+        with self.assertRaises(ErrorEdicionMasiva) as contexto:
+            actualizar_por_animal([
+                {'id': self.vacas[0].pk, 'cambios': {'estado_productivo': 'engorde'}},
+                {'id': self.vacas[1].pk, 'cambios': {'estado_productivo': 'jubilada'}},
+                {'id': self.vacas[2].pk, 'cambios': {'chapeta': 'NUEVA'}},
+                {'id': 999999, 'cambios': {'notas': 'x'}},
+                'no es un objeto',
+            ], usuario=self.usuario)
+
+        errores = contexto.exception.errores
+        self.assertEqual(len(errores), 4)
+        self.assertEqual({error.get('id') for error in errores}, {self.vacas[1].pk, self.vacas[2].pk, 999999, None})
+        self.assertEqual(self.estados(), antes)
+        self.assertFalse(Log.objects.exists())
+
+    def test_por_animal(self):
+        resumen = actualizar_por_animal([
+            {'id': self.vacas[0].pk, 'cambios': {'raza': 'Angus', 'estado_productivo': 'engorde'}},
+            {'id': self.vacas[1].pk, 'cambios': {'raza': 'Charolais', 'ubicacion_actual': 'Corral 1'}},
+            {'id': self.vacas[2].pk, 'cambios': {'estado_productivo': 'activo'}},
+        ], usuario=self.usuario)
+
+        self.assertEqual((resumen['seleccionados'], resumen['actualizados'], resumen['sin_cambios']), (3, 2, 1))
+        self.assertEqual(self.estados()['EV0'], 'engorde')
+        # Un log por animal modificado, con el antes y el después de lo que cambió
+        logs = {log.entidad_id: log.cambios for log in Log.objects.filter(tipo_accion='editar')}
+        self.assertEqual(set(logs), {str(self.vacas[0].pk), str(self.vacas[1].pk)})
+        self.assertEqual(logs[str(self.vacas[0].pk)]['estado_productivo'], {'antes': 'activo', 'despues': 'engorde'})
+        self.assertNotIn('raza', logs[str(self.vacas[0].pk)])
+        # Derivados: composición racial y estancia en la nueva ubicación
+        fracciones = dict(self.vacas[1].composicion_racial.values_list('raza', 'fraccion'))
+        self.assertEqual(fracciones, {'charolais': 1.0})
+        self.assertTrue(Movimiento.objects.filter(animal=self.vacas[1], salida__isnull=True).exists())
+
+    def test_por_filtro(self):
+        resumen = actualizar_por_filtro({'raza': 'Angus'}, {'estado_productivo': 'retirado'}, usuario=self.usuario)
+        self.assertEqual((resumen['seleccionados'], resumen['actualizados']), (3, 3))
+        self.assertEqual(self.estados(), {'EP': 'activo', 'EV0': 'retirado', 'EV1': 'retirado', 'EV2': 'retirado'})
+        self.assertEqual(Log.objects.count(), 3)
+
+    def test_por_filtro_no_valido(self):
+        antes = self.estados()
+        with self.assertRaises(ErrorEdicionMasiva):
+            actualizar_por_filtro({'color': 'negro'}, {'estado_productivo': 'retirado'})
+        with self.assertRaises(ErrorEdicionMasiva):
+            actualizar_por_filtro({'raza': 'Angus'}, {'estado_productivo': 'jubilada'})
+        self.assertEqual(self.estados(), antes)
+
+    def test_endpoint(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        respuesta = cliente.patch('/api/animales/bulk/', {
+            'animales': [
+                {'id': self.vacas[0].pk, 'cambios': {'notas': 'revisar'}},
+                {'id': 999999, 'cambios': {'notas': 'revisar'}},
+            ]
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['errores'], [{'id': 999999, 'error': 'Animal no encontrado'}])
+        self.assertIsNone(Animal.objects.get(pk=self.vacas[0].pk).notas)
+
+        respuesta = cliente.patch('/api/animales/bulk/', {
+            'filtro': {'ids': [animal.pk for animal in self.vacas]},
+            'cambios': {'notas': 'revisar'},
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['actualizados'], 3)
+
+
+def composiciones():
+    """{animal: {raza: fracción}} guardadas en ComposicionRacial"""
+    resultado = {}
+    for animal_id, raza, fraccion in ComposicionRacial.objects.values_list('animal_id', 'raza', 'fraccion'):
+        resultado.setdefault(animal_id, {})[raza] = round(fraccion, 9)
+    return resultado
+
+
+class ComposicionRacialTests(TestCase):
+    """Composición propagada por las señales frente a reconstruir_composicion()"""
+
+    def setUp(self):
+        parentesco._motor = None
+        # Angus x Holstein -> cría F1; F1 x Brahman -> nieto
+        self.angus = crear_animal('AN', 'macho', raza='Angus')
+        self.holstein = crear_animal('HO', raza='Holstein')
+        self.brahman = crear_animal('BR', 'macho', raza='Brahman')
+        self.cria = crear_animal('F1', raza='Cruzada')
+        self.cria.animal_set.add(self.angus, self.holstein)
+        self.nieto = crear_animal('F2', 'macho', raza='Cruzada')
+        self.nieto.animal_set.add(self.cria, self.brahman)
+
+    def tearDown(self):
+        parentesco._motor = None
+
+    def assertCoincideConReconstruccion(self):
+        incremental = composiciones()
+        composicion.reconstruir_composicion()
+        self.assertEqual(composiciones(), incremental)
+
+    def test_propagacion(self):
+        actual = composiciones()
+        self.assertEqual(actual[self.angus.pk], {'angus': 1.0})
+        self.assertEqual(actual[self.cria.pk], {'angus': 0.5, 'holstein': 0.5})
+        self.assertEqual(actual[self.nieto.pk], {'angus': 0.25, 'holstein': 0.25, 'brahman': 0.5})
+        self.assertCoincideConReconstruccion()
+
+        # Un progenitor desconocido aporta la raza declarada del animal
+        media = crear_animal('MS', raza='Aberdeen Angus')
+        media.animal_set.add(self.holstein)
+        self.assertEqual(composiciones()[media.pk], {'holstein': 0.5, 'aberdeen_angus': 0.5})
+
+    def test_cambio_de_padre(self):
+        self.cria.animal_set.remove(self.angus)
+        self.assertEqual(composiciones()[self.cria.pk], {'holstein': 0.5, 'cruzada': 0.5})
+        self.cria.animal_set.add(self.brahman)
+        actual = composiciones()
+        self.assertEqual(actual[self.cria.pk], {'holstein': 0.5, 'brahman': 0.5})
+        self.assertEqual(actual[self.nieto.pk], {'holstein': 0.25, 'brahman': 0.75})
+        self.assertCoincideConReconstruccion()
+
+    def test_cambio_de_raza_y_borrado(self):
+        self.holstein.raza = 'Jersey'
+        self.holstein.save()
+        actual = composiciones()
+        self.assertEqual(actual[self.cria.pk], {'angus': 0.5, 'jersey': 0.5})
+        self.assertEqual(actual[self.nieto.pk], {'angus': 0.25, 'jersey': 0.25, 'brahman': 0.5})
+        self.assertCoincideConReconstruccion()
+
+        self.angus.delete()
+        actual = composiciones()
+        self.assertEqual(actual[self.cria.pk], {'jersey': 0.5, 'cruzada': 0.5})
+        self.assertEqual(actual[self.nieto.pk], {'jersey': 0.25, 'cruzada': 0.25, 'brahman': 0.5})
+        self.assertCoincideConReconstruccion()
+
+    def test_filtro_por_fraccion(self):
+        cliente = APIClient()
+        cliente.force_authenticate(Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        ))
+
+        def chapetas(**parametros):
+            respuesta = cliente.get('/api/animales/', parametros)
+            self.assertEqual(respuesta.status_code, 200)
+            datos = respuesta.json()
+            return sorted(fila['chapeta'] for fila in datos.get('results', datos))
+
+        self.assertEqual(chapetas(min_fraccion_angus=0.5), ['AN', 'F1'])
+        self.assertEqual(chapetas(min_fraccion_angus=0.25, max_fraccion_angus=0.5), ['F1', 'F2'])
+        self.assertEqual(chapetas(max_fraccion_brahman=0), ['AN', 'F1', 'HO'])
+        self.assertEqual(cliente.get('/api/animales/', {'min_fraccion_angus': 2}).status_code, 400)
+
+
+class BusquedaTests(TestCase):
+    """Índice de texto completo: prefijos, relevancia y mantenimiento desde las señales"""
+
+    def setUp(self):
+        self.assertTrue(busqueda.disponible())
+        self.lola = crear_animal('ES-0123', nombre='Lucía', ubicacion_actual='Potrero Norte')
+        self.otra = crear_animal('ES-0199', raza='Hereford')
+        self.lejos = crear_animal('ES-0200', notas='Hija de Lucía')
+
+    def ids(self, consulta):
+        return busqueda.buscar(consulta)
+
+    def test_prefijos(self):
+        self.assertEqual(set(self.ids('ES-01')), {self.lola.pk, self.otra.pk})
+        # La chapeta sin separadores también casa como prefijo
+        self.assertEqual(set(self.ids('es01')), {self.lola.pk, self.otra.pk})
+        # Todas las palabras deben casar, en cualquier campo y sin tildes
+        self.assertEqual(self.ids('es-01 lucia'), [self.lola.pk])
+        self.assertEqual(self.ids('hija'), [self.lejos.pk])
+        self.assertEqual(self.ids('potr nor'), [self.lola.pk])
+        self.assertEqual(self.ids('here'), [self.otra.pk])
+        self.assertEqual(self.ids('xyz'), [])
+        self.assertEqual(self.ids(' - '), [])
+
+    def test_relevancia(self):
+        # El nombre pesa más que las notas
+        self.assertEqual(self.ids('lucia'), [self.lola.pk, self.lejos.pk])
+        self.assertEqual(busqueda.buscar('ES', limite=2), self.ids('ES')[:2])
+
+    def test_reindexar_al_cambiar_y_borrar(self):
+        self.lola.chapeta = 'MX-0777'
+        self.lola.save()
+        self.assertEqual(self.ids('ES-01'), [self.otra.pk])
+        self.assertEqual(self.ids('MX-07'), [self.lola.pk])
+        self.assertEqual(self.ids('mx0777'), [self.lola.pk])
+
+        actualizar_por_animal([{'id': self.otra.pk, 'cambios': {'ubicacion_actual': 'Corral Sur'}}])
+        self.assertEqual(self.ids('corral'), [self.otra.pk])
+
+        self.otra.delete()
+        self.assertEqual(self.ids('corral'), [])
+        self.assertEqual(self.ids('ES'), [self.lejos.pk])
+
+    def test_reconstruir_y_sin_indice(self):
+        busqueda.desindexar(self.lola.pk)
+        self.assertEqual(self.ids('lucia'), [self.lejos.pk])
+        self.assertEqual(busqueda.reconstruir_indice(), 3)
+        self.assertEqual(self.ids('lucia'), [self.lola.pk, self.lejos.pk])
+
+        # Sin índice se recurre a icontains (sin quitar tildes) con las mismas coincidencias
+        con_indice = {consulta: set(self.ids(consulta)) for consulta in ('ES-01', 'es-01 potrero', 'hija', 'xyz')}
+        with mock.patch.object(busqueda, 'disponible', return_value=False):
+            for consulta, esperado in con_indice.items():
+                self.assertEqual(set(self.ids(consulta)), esperado, consulta)
+
+    def test_endpoint(self):
+        cliente = APIClient()
+        cliente.force_authenticate(Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        ))
+        respuesta = cliente.get('/api/animales/buscar/', {'q': 'es-01'})
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(datos['total'], 2)
+        self.assertEqual({fila['chapeta'] for fila in datos['results']}, {'ES-0123', 'ES-0199'})
+
+        # Con los filtros del listado y ?fields=
+        datos = cliente.get('/api/animales/buscar/', {'q': 'es', 'raza': 'Hereford', 'fields': 'id'}).json()
+        self.assertEqual(datos['results'], [{'id': self.otra.pk}])
+        self.assertEqual(len(cliente.get('/api/animales/buscar/', {'q': 'es', 'limite': 1}).json()['results']), 1)
+
+        self.assertEqual(cliente.get('/api/animales/buscar/').status_code, 400)
+        self.assertEqual(cliente.get('/api/animales/buscar/', {'q': 'es', 'limite': 'x'}).status_code, 400)
+
+
+class IdentificadoresTests(TestCase):
+    """Mapa chapeta/RFID -> id en memoria al día con altas, cambios y borrados"""
+
+    def setUp(self):
+        identificadores._local.update(version=None, mapa={})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vaca = crear_animal('ID1', rfid='982000000000001')
+        # Primera carga del mapa
+        self.assertEqual(identificadores.resolver('ID1'), self.vaca.pk)
+
+    def tearDown(self):
+        identificadores._local.update(version=None, mapa={})
+
+    def lecturas_del_mapa(self):
+        return mock.patch.object(identificadores, '_leer_mapa', wraps=identificadores._leer_mapa)
+
+    def test_alta_cambio_y_borrado_sin_recargar(self):
+        with self.lecturas_del_mapa() as leer:
+            with self.captureOnCommitCallbacks(execute=True):
+                toro = crear_animal('ID2', 'macho')
+            self.assertEqual(identificadores.resolver('ID2'), toro.pk)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.vaca.chapeta, self.vaca.rfid = 'ID1-B', None
+                self.vaca.save()
+            self.assertEqual(
+                identificadores.resolver_varios(['ID1', '982000000000001', 'ID1-B']),
+                {'ID1': None, '982000000000001': None, 'ID1-B': self.vaca.pk}
+            )
+
+            # Guardar sin cambiar identificadores no sube la versión
+            version = identificadores._local['version']
+            with self.captureOnCommitCallbacks(execute=True):
+                toro.nombre = 'Sultán'
+                toro.save()
+            self.assertEqual(identificadores._local['version'], version)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                toro.delete()
+            self.assertIsNone(identificadores.resolver('ID2'))
+        # Cada cambio se aplicó al mapa del proceso, sin releer la tabla
+        leer.assert_not_called()
+        self.assertEqual(identificadores.mapa_actual(), identificadores._leer_mapa())
+
+    def test_cambio_revertido(self):
+        version = identificadores._local['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                self.vaca.chapeta = 'REVERTIDA'
+                self.vaca.save()
+                raise ValueError
+        self.assertEqual(identificadores._local['version'], version)
+        self.assertEqual(identificadores.resolver('ID1'), self.vaca.pk)
+        self.assertIsNone(identificadores.resolver('REVERTIDA'))
+
+    def test_otro_proceso_atrasado(self):
+        # Un proceso con la versión anterior recarga el mapa al consultar
+        atrasado = dict(identificadores._local, mapa=dict(identificadores._local['mapa']))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vaca.chapeta = 'ID1-C'
+            self.vaca.save()
+        identificadores._local.update(atrasado)
+        with self.lecturas_del_mapa() as leer:
+            self.assertEqual(identificadores.resolver('ID1-C'), self.vaca.pk)
+            self.assertIsNone(identificadores.resolver('ID1'))
+        leer.assert_called_once()
+
+        # Si otro proceso publicó entre medias, el cambio propio no se aplica a
+        # un mapa que no tiene el del otro: se recarga entero
+        identificadores._local['version'] -= 1
+        with self.captureOnCommitCallbacks(execute=True):
+            toro = crear_animal('ID3', 'macho')
+        self.assertIsNone(identificadores._local['mapa'].get('ID3'))
+        with self.lecturas_del_mapa() as leer:
+            self.assertEqual(identificadores.resolver('ID3'), toro.pk)
+        leer.assert_called_once()
+
+    def test_invalidar_tras_bulk_create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            importar_pedigree(leer_csv("""
+chapeta,padre,madre,fecha_nacimiento,sexo
+ID5,ID4,,2023-01-01,macho
+ID4,,,2021-01-01,macho
+"""), 'csv')
+        with self.lecturas_del_mapa() as leer:
+            resueltos = identificadores.resolver_varios(['ID4', 'ID5', 'NO'])
+        leer.assert_called_once()
+        self.assertEqual(resueltos, {
+            'ID4': Animal.objects.get(chapeta='ID4').pk, 'ID5': Animal.objects.get(chapeta='ID5').pk, 'NO': None,
+        })
+
+    def test_endpoints(self):
+        cliente = APIClient()
+        cliente.force_authenticate(Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        ))
+        respuesta = cliente.get('/api/animales/chapeta/982000000000001/')
+        self.assertEqual((respuesta.status_code, respuesta.json()['id']), (200, self.vaca.pk))
+        self.assertEqual(cliente.get('/api/animales/chapeta/NO/').status_code, 404)
 
-# Create your tests here.
+        respuesta = cliente.post('/api/animales/chapeta/', {'chapetas': ['ID1', 'NO']}, format='json')
+        self.assertEqual(respuesta.json(), {'encontrados': {'ID1': self.vaca.pk}, 'no_encontrados': ['NO']})
+        self.assertEqual(cliente.post('/api/animales/chapeta/', {'chapetas': []}, format='json').status_code, 400)
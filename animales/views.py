@@ -2,15 +2,36 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+import io
+import json
 import os
 import uuid
 import traceback
 from datetime import datetime
 from .models import Animal
-from .serializers import AnimalSerializer
+from .serializers import AnimalSerializer, AnimalListaSerializer
+from .pedigree import (
+    obtener_pedigree,
+    obtener_descendientes,
+    PROFUNDIDAD_POR_DEFECTO,
+    PROFUNDIDAD_MAXIMA,
+)
+from .composicion import filtrar_por_composicion
+from .busqueda import buscar as buscar_animales
+from . import identificadores
+from .importacion import importar_pedigree, formato_por_nombre, ErrorImportacion
+from .carga_masiva import cargar_animales, leer_filas
+from .edicion_masiva import actualizar_por_animal, actualizar_por_filtro, ErrorEdicionMasiva
+from .parentesco import consanguinidad as calcular_consanguinidad, coancestria as calcular_coancestria
+from genotipos.models import Genotipo
+from genotipos.paternidad import verificar as verificar_candidatos, buscar_padre
 from utils.permissions import IsAdminUser
+from utils.campos import CamposParcialesMixin, campos_solicitados
+from utils.exportacion import ExportacionMixin, contenido_streaming
 from logs.utils import registrar_log
 
 # Verificar dependencias paso a paso
@@ -36,12 +57,27 @@ except ImportError as e:
     FIREBASE_ADMIN_AVAILABLE = False
     print(f"❌ firebase_admin no disponible: {e}")
 
+MAXIMO_PARES_PARENTESCO = 100000
+# Columnas que el listado no lee salvo que se pidan con ?fields=
+CAMPOS_PESADOS = ('salud', 'produccion', 'historial_movimientos', 'notas')
+ACCIONES_LISTADO = ('list', 'buscar', 'exportar')
+LIMITE_BUSQUEDA = 20
+MAXIMO_LIMITE_BUSQUEDA = 100
+FORMATOS_CARGA = ('csv', 'ndjson')
+MAXIMO_CHAPETAS = 5000
+
 @method_decorator(csrf_exempt, name='dispatch')
-class AnimalViewSet(viewsets.ModelViewSet):
+class AnimalViewSet(CamposParcialesMixin, ExportacionMixin, viewsets.ModelViewSet):
     queryset = Animal.objects.all()
     serializer_class = AnimalSerializer
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['estado_productivo', 'estado_reproductivo', 'sexo', 'raza']
+    filterset_fields = ['estado_productivo', 'estado_reproductivo', 'sexo', 'raza', 'rfid']
+    ordenacion_cursor = ('id',)
+    # Las columnas JSON (salud, produccion, historial) solo si se piden con ?fields=
+    campos_exportacion = (
+        'id', 'chapeta', 'rfid', 'nombre', 'sexo', 'fecha_nacimiento', 'raza', 'estado_reproductivo',
+        'estado_productivo', 'peso_actual', 'ubicacion_actual', 'fecha_alta_sistema', 'fecha_baja_sistema',
+    )
 
     def get_permissions(self):
         """Permisos según la acción"""
@@ -49,6 +85,34 @@ class AnimalViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return [permissions.IsAuthenticated()]  # Cambiado temporalmente para debugging
 
+    def get_serializer_class(self):
+        # El listado usa la representación compacta salvo que se pidan campos con ?fields=
+        incluir, _ = campos_solicitados(self.request)
+        if self.action in ACCIONES_LISTADO and incluir is None:
+            return AnimalListaSerializer
+        return AnimalSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ACCIONES_LISTADO:
+            # AnimalSerializer se usa varias veces por petición (log, WebSocket, respuesta)
+            return queryset.prefetch_related('composicion_racial', 'descendencia')
+
+        # ?min_fraccion_<raza>= / ?max_fraccion_<raza>= sobre la composición racial
+        queryset = filtrar_por_composicion(queryset, self.request.query_params)
+
+        # No leer las columnas JSON pesadas ni la descendencia si no se van a devolver
+        incluir, omitir = campos_solicitados(self.request)
+        necesarios = set(AnimalListaSerializer.Meta.fields if incluir is None else incluir)
+        necesarios -= omitir or set()
+        diferidos = [campo for campo in CAMPOS_PESADOS if campo not in necesarios]
+        if diferidos:
+            queryset = queryset.defer(*diferidos)
+        for relacion in ('composicion_racial', 'descendencia'):
+            if relacion in necesarios:
+                queryset = queryset.prefetch_related(relacion)
+        return queryset
+
     def list(self, request, *args, **kwargs):
         """Listar animales con manejo de errores"""
         try:
@@ -64,7 +128,9 @@ class AnimalViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(queryset, many=True)
             print(f"✅ Devolviendo {len(serializer.data)} animales")
             return Response(serializer.data)
-            
+
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             print(f"❌ Error listando animales: {e}")
             traceback.print_exc()
@@ -100,6 +166,10 @@ class AnimalViewSet(viewsets.ModelViewSet):
                 print(f"❌ Errores de validación: {serializer.errors}")
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
                 
+        except DjangoValidationError as e:
+            # Enlaces del pedigrí rechazados al guardar (p. ej. por una carrera con otra petición)
+            print(f"❌ Pedigrí no válido creando animal: {e.messages}")
+            return Response({"error": e.messages}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             print(f"❌ Error creando animal: {e}")
             traceback.print_exc()
@@ -153,6 +223,10 @@ class AnimalViewSet(viewsets.ModelViewSet):
                 print(f"❌ Errores de validación: {serializer.errors}")
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
                 
+        except DjangoValidationError as e:
+            # Enlaces del pedigrí rechazados al guardar (p. ej. por una carrera con otra petición)
+            print(f"❌ Pedigrí no válido actualizando animal: {e.messages}")
+            return Response({"error": e.messages}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             print(f"❌ Error actualizando animal: {e}")
             traceback.print_exc()
@@ -387,6 +461,406 @@ class AnimalViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _leer_profundidad(self, request):
+        """Leer ?depth=N acotado a PROFUNDIDAD_MAXIMA"""
+        valor = request.query_params.get('depth', PROFUNDIDAD_POR_DEFECTO)
+        try:
+            profundidad = int(valor)
+        except (TypeError, ValueError):
+            return None
+        if profundidad < 1 or profundidad > PROFUNDIDAD_MAXIMA:
+            return None
+        return profundidad
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def pedigree(self, request, pk=None):
+        """Árbol de ancestros del animal hasta N generaciones"""
+        try:
+            animal = self.get_object()
+            profundidad = self._leer_profundidad(request)
+            if profundidad is None:
+                return Response(
+                    {'error': f'depth debe ser un entero entre 1 y {PROFUNDIDAD_MAXIMA}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            print(f"🌳 Pedigrí de {animal.chapeta} ({profundidad} generaciones)")
+            return Response(obtener_pedigree(animal.id, profundidad))
+
+        except Exception as e:
+            print(f"❌ Error obteniendo pedigrí: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error obteniendo pedigrí: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def descendientes(self, request, pk=None):
+        """Árbol de descendientes del animal hasta N generaciones"""
+        try:
+            animal = self.get_object()
+            profundidad = self._leer_profundidad(request)
+            if profundidad is None:
+                return Response(
+                    {'error': f'depth debe ser un entero entre 1 y {PROFUNDIDAD_MAXIMA}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            print(f"🌳 Descendientes de {animal.chapeta} ({profundidad} generaciones)")
+            return Response(obtener_descendientes(animal.id, profundidad))
+
+        except Exception as e:
+            print(f"❌ Error obteniendo descendientes: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error obteniendo descendientes: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def consanguinidad(self, request, pk=None):
+        """Coeficiente de consanguinidad de Wright del animal"""
+        try:
+            animal = self.get_object()
+            valores, version = calcular_consanguinidad([animal.id])
+
+            return Response({
+                'animal': animal.id,
+                'chapeta': animal.chapeta,
+                'consanguinidad': float(valores[0]),
+                'version_pedigree': version,
+            })
+
+        except Exception as e:
+            print(f"❌ Error calculando consanguinidad: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error calculando consanguinidad: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def parentesco(self, request):
+        """Coancestría y parentesco aditivo para muchos pares en una sola pasada"""
+        try:
+            pares = request.data.get('pares') if isinstance(request.data, dict) else None
+            if not isinstance(pares, list) or not pares:
+                return Response(
+                    {'error': 'Se requiere "pares": lista de [animal_a, animal_b]'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if len(pares) > MAXIMO_PARES_PARENTESCO:
+                return Response(
+                    {'error': f'Máximo {MAXIMO_PARES_PARENTESCO} pares por petición'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                animales_a = [int(par[0]) for par in pares]
+                animales_b = [int(par[1]) for par in pares]
+            except (TypeError, ValueError, IndexError, KeyError):
+                return Response(
+                    {'error': 'Cada par debe ser [animal_a, animal_b] con ids numéricos'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            solicitados = set(animales_a) | set(animales_b)
+            existentes = set(Animal.objects.filter(id__in=solicitados).values_list('id', flat=True))
+            faltantes = sorted(solicitados - existentes)
+            if faltantes:
+                return Response(
+                    {'error': 'Animales no encontrados', 'animales': faltantes},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            coancestria, version = calcular_coancestria(animales_a, animales_b)
+
+            return Response({
+                'version_pedigree': version,
+                'resultados': [
+                    {
+                        'animal_a': a,
+                        'animal_b': b,
+                        'coancestria': float(f),
+                        'parentesco': float(2 * f),
+                    }
+                    for a, b, f in zip(animales_a, animales_b, coancestria)
+                ],
+            })
+
+        except Exception as e:
+            print(f"❌ Error calculando parentesco: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error calculando parentesco: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=True, methods=['post'], url_path='verificar-paternidad',
+            permission_classes=[permissions.IsAuthenticated])
+    def verificar_paternidad(self, request, pk=None):
+        """
+        Verificar los progenitores declarados (o los 'candidatos' indicados)
+        contra el genotipo del animal. Con "buscar": true ordena todos los
+        machos genotipados por compatibilidad con la cría.
+        """
+        try:
+            animal = self.get_object()
+            datos = request.data if isinstance(request.data, dict) else {}
+
+            genotipos = Genotipo.objects.select_related('panel', 'animal').filter(animal=animal)
+            if datos.get('panel') is not None:
+                genotipos = genotipos.filter(panel_id=datos['panel'])
+            genotipo = genotipos.order_by('panel_id').first()
+            if genotipo is None:
+                return Response(
+                    {'error': 'El animal no tiene genotipo en el panel indicado'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            respuesta = {
+                'animal': animal.id,
+                'chapeta': animal.chapeta,
+                'panel': genotipo.panel_id,
+            }
+
+            if datos.get('buscar'):
+                sexo = datos.get('sexo', 'macho')
+                if sexo not in dict(Animal.SEXO_CHOICES):
+                    return Response({'error': 'sexo no válido'}, status=status.HTTP_400_BAD_REQUEST)
+                try:
+                    limite = max(1, min(int(datos.get('limite', 10)), 1000))
+                except (TypeError, ValueError):
+                    return Response({'error': 'limite debe ser un entero'}, status=status.HTTP_400_BAD_REQUEST)
+
+                evaluados, ranking = buscar_padre(genotipo, sexo=sexo, limite=limite)
+                print(f"🧬 Búsqueda de progenitor para {animal.chapeta}: {evaluados} candidatos")
+                respuesta.update({'candidatos_evaluados': evaluados, 'ranking': ranking})
+                return Response(respuesta)
+
+            if datos.get('candidatos') is not None:
+                try:
+                    candidatos = [int(c) for c in datos['candidatos']]
+                except (TypeError, ValueError):
+                    return Response(
+                        {'error': 'candidatos debe ser una lista de ids'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                roles = {}
+            else:
+                declarados = list(animal.animal_set.order_by('id').values_list('id', 'sexo'))
+                if not declarados:
+                    return Response(
+                        {'error': 'El animal no tiene progenitores declarados; indica candidatos o usa buscar'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                candidatos = [a for a, _ in declarados]
+                roles = {a: 'padre' if sexo == 'macho' else 'madre' for a, sexo in declarados}
+
+            resultados = verificar_candidatos(genotipo, candidatos)
+            for resultado in resultados:
+                if resultado['candidato'] in roles:
+                    resultado['rol'] = roles[resultado['candidato']]
+            respuesta['resultados'] = resultados
+            return Response(respuesta)
+
+        except Exception as e:
+            print(f"❌ Error verificando paternidad: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error verificando paternidad: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def buscar(self, request):
+        """
+        Búsqueda de texto completo por chapeta, nombre, raza, ubicación y notas.
+        Cada palabra de ?q= casa como prefijo (autocompletado de chapetas).
+        Admite los mismos filtros que el listado y ?limite= (máximo 100).
+        """
+        try:
+            consulta = request.query_params.get('q', '').strip()
+            if not consulta:
+                return Response({'error': 'Indica el texto a buscar en ?q='}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                limite = max(1, min(int(request.query_params.get('limite', LIMITE_BUSQUEDA)), MAXIMO_LIMITE_BUSQUEDA))
+            except (TypeError, ValueError):
+                return Response({'error': 'limite debe ser un entero'}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Con filtros adicionales se piden más candidatos para no quedarse cortos tras filtrar
+            filtrado = any(clave not in ('q', 'limite', 'fields', 'omit') for clave in request.query_params)
+            ids = buscar_animales(consulta, limite * 10 if filtrado else limite)
+            animales = self.filter_queryset(self.get_queryset()).in_bulk(ids)
+            resultados = [animales[animal_id] for animal_id in ids if animal_id in animales][:limite]
+
+            print(f"🔎 Búsqueda '{consulta}': {len(resultados)} animales")
+            return Response({
+                'consulta': consulta,
+                'total': len(resultados),
+                'results': self.get_serializer(resultados, many=True).data,
+            })
+
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error buscando animales: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error buscando animales: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['get'], url_path=r'chapeta/(?P<chapeta>[^/]+)',
+            permission_classes=[permissions.IsAuthenticated])
+    def por_chapeta(self, request, chapeta=None):
+        """Id del animal con esa chapeta (o RFID), resuelto en memoria sin consultar la base de datos"""
+        animal_id = identificadores.resolver(chapeta)
+        if animal_id is None:
+            return Response({'error': f'No hay ningún animal con chapeta {chapeta}'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'chapeta': chapeta, 'id': animal_id})
+
+    @action(detail=False, methods=['post'], url_path='chapeta', permission_classes=[permissions.IsAuthenticated])
+    def por_chapetas(self, request):
+        """Ids de muchas chapetas o RFID a la vez: {"chapetas": [...]} o la lista sola"""
+        chapetas = request.data.get('chapetas') if isinstance(request.data, dict) else request.data
+        if not isinstance(chapetas, list) or not chapetas:
+            return Response({'error': 'Envía una lista de chapetas en "chapetas"'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(chapetas) > MAXIMO_CHAPETAS:
+            return Response(
+                {'error': f'Como máximo {MAXIMO_CHAPETAS} chapetas por petición'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resueltos = identificadores.resolver_varios(str(chapeta) for chapeta in chapetas)
+        return Response({
+            'encontrados': {chapeta: animal_id for chapeta, animal_id in resueltos.items() if animal_id is not None},
+            'no_encontrados': [chapeta for chapeta, animal_id in resueltos.items() if animal_id is None],
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def importar(self, request):
+        """
+        Importar un pedigrí completo subido en 'archivo' (CSV con cabecera o
+        NDJSON: chapeta, padre, madre, fecha_nacimiento y opcionalmente sexo,
+        raza y nombre). "sexo_por_defecto" se aplica a los animales sin sexo
+        ni descendencia en el archivo. Con "omitir_errores" se importan los
+        registros válidos.
+        """
+        try:
+            archivo = request.FILES.get('archivo')
+            if archivo is None:
+                return Response({'error': 'Sube el pedigrí en "archivo"'}, status=status.HTTP_400_BAD_REQUEST)
+            formato = request.data.get('formato') or formato_por_nombre(archivo.name)
+            omitir_errores = str(request.data.get('omitir_errores', '')).lower() in ('1', 'true', 'si', 'sí')
+
+            print(f"📥 Importando pedigrí {archivo.name} ({formato})")
+            lineas = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+            resumen = importar_pedigree(
+                lineas,
+                formato,
+                usuario=request.user,
+                omitir_errores=omitir_errores,
+                sexo_por_defecto=request.data.get('sexo_por_defecto') or None
+            )
+
+            try:
+                registrar_log(
+                    usuario=request.user,
+                    tipo_accion='importar_pedigree',
+                    entidad_afectada='animal',
+                    entidad_id=archivo.name,
+                    cambios={clave: valor for clave, valor in resumen.items() if clave != 'errores'},
+                    observaciones=f"Pedigrí {archivo.name}: {resumen['creados']} animales y {resumen['enlaces']} enlaces importados"
+                )
+            except Exception as log_error:
+                print(f"⚠️ Error registrando log: {log_error}")
+
+            return Response(resumen, status=status.HTTP_201_CREATED)
+
+        except ErrorImportacion as e:
+            return Response({'error': str(e), 'errores': e.errores}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({'error': 'El archivo debe estar en UTF-8'}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error importando pedigrí: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error importando pedigrí: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """
+        Alta masiva de animales: NDJSON o CSV en el cuerpo o en 'archivo'
+        (multipart). Responde en streaming (NDJSON) con una línea por fila
+        rechazada y un resumen final.
+        """
+        try:
+            tipo = (request.content_type or '').split(';')[0].strip().lower()
+            if tipo.startswith('multipart/'):
+                archivo = request.FILES.get('archivo')
+                if archivo is None:
+                    return Response({'error': 'Sube los animales en "archivo"'}, status=status.HTTP_400_BAD_REQUEST)
+                formato = request.query_params.get('formato') or request.data.get('formato') or formato_por_nombre(archivo.name)
+                lineas = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+            else:
+                # El cuerpo se lee línea a línea sin pasar por los parsers de DRF
+                formato = request.query_params.get('formato') or ('csv' if tipo == 'text/csv' else 'ndjson')
+                lineas = (linea.decode('utf-8-sig') for linea in request._request)
+            if formato not in FORMATOS_CARGA:
+                return Response({'error': "Formato no válido: usa 'csv' o 'ndjson'"}, status=status.HTTP_400_BAD_REQUEST)
+
+            print(f"📦 Carga masiva de animales ({formato})")
+            informe = cargar_animales(leer_filas(lineas, formato), usuario=request.user)
+            return StreamingHttpResponse(
+                contenido_streaming(request, (json.dumps(linea, ensure_ascii=False, default=str) + '\n' for linea in informe)),
+                content_type='application/x-ndjson',
+                status=status.HTTP_200_OK
+            )
+
+        except Exception as e:
+            print(f"❌ Error en la carga masiva: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error en la carga masiva: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @bulk.mapping.patch
+    def editar_bulk(self, request):
+        """
+        Edición masiva: {"animales": [{"id", "cambios"}]} (o la lista sola)
+        o {"filtro": {...}, "cambios": {...}}, por ejemplo
+        {"filtro": {"grupo": 3}, "cambios": {"estado_productivo": "engorde"}}.
+        """
+        try:
+            datos = request.data
+            if isinstance(datos, list):
+                resumen = actualizar_por_animal(datos, usuario=request.user)
+            elif 'animales' in datos:
+                resumen = actualizar_por_animal(datos['animales'], usuario=request.user)
+            elif 'filtro' in datos:
+                resumen = actualizar_por_filtro(datos['filtro'], datos.get('cambios'), usuario=request.user)
+            else:
+                return Response(
+                    {'error': 'Envía "animales" con [{id, cambios}] o "filtro" y "cambios"'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return Response(resumen)
+
+        except ErrorEdicionMasiva as e:
+            return Response({'error': str(e), 'errores': e.errores}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error en la edición masiva: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error en la edición masiva: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
     def eliminar_imagen_firebase(self, firebase_url):
         """Método auxiliar para eliminar imagen de Firebase o local"""
         try:
@@ -22,6 +22,7 @@ django_asgi_app = get_asgi_application()
 from notificaciones.consumers import NotificacionConsumer
 from logs.consumers import LogConsumer
 from animales.consumers import AnimalConsumer
+from lecturas.consumers import LecturaConsumer
 
 # Rutas WebSocket
 from django.urls import path
@@ -30,6 +31,7 @@ websocket_urlpatterns = [
     path('ws/notificaciones/', NotificacionConsumer.as_asgi()),
     path('ws/logs/', LogConsumer.as_asgi()),
     path('ws/animales/', AnimalConsumer.as_asgi()),
+    path('ws/lecturas/', LecturaConsumer.as_asgi()),
 ]
 
 application = ProtocolTypeRouter({
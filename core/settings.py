@@ -19,6 +19,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Archivos binarios de genotipos SNP (no se sirven como media)
+GENOTIPOS_ROOT = BASE_DIR / 'genotipos_data'
+# Procesos auxiliares que puede lanzar una petición (GRM, GWAS); los comandos
+# de manage.py no tienen este límite
+GENOTIPOS_PROCESOS_PETICION = 2
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -91,6 +97,12 @@ INSTALLED_APPS = [
     'notificaciones',
     'grupos',
     'logs',
+    'genotipos',
+    'evaluaciones',
+    'produccion',
+    'pesajes',
+    'lecturas',
+    'ubicaciones',
     'utils',  # Utilities
 ]
 
@@ -138,7 +150,7 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'utils.pagination.PaginacionHibrida',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -170,6 +182,30 @@ CHANNEL_LAYERS = {
 #     },
 # }
 
+# Caché (mapa chapeta -> animal). Con una caché en memoria la versión del mapa se
+# lee de la base de datos en cada resolución para que los workers vean los cambios
+# de los demás; con una compartida (Redis) no hace falta consultar nada:
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379/1',
+#     }
+# }
+
+# Ingesta de básculas y lectores RFID: las lecturas se guardan por lotes
+LECTURAS_TAMANO_LOTE = 500
+LECTURAS_INTERVALO_VOLCADO = 2.0  # segundos
+
+# Reconstrucción del almacén de parentesco tras cambios que no son altas de crías:
+# 'segundo_plano', 'sincrona' o 'manual' (solo el comando reconstruir_parentesco)
+PARENTESCO_RECONSTRUCCION = 'segundo_plano'
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # CORS debe estar PRIMERO
     'django.middleware.security.SecurityMiddleware',
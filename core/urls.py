@@ -102,6 +102,8 @@ def api_status(request):
         "events": "/api/eventos/",
         "notifications": "/api/notificaciones/",
         "logs": "/api/logs/",
+        "genotypes": "/api/genotipos/",
+        "genetic_evaluations": "/api/evaluaciones/",
         "swagger": "/swagger/",
     }
     
@@ -134,6 +136,12 @@ urlpatterns = [
     path('api/eventos/', include('eventos.urls')),
     path('api/notificaciones/', include('notificaciones.urls')),
     path('api/logs/', include('logs.urls')),
+    path('api/genotipos/', include('genotipos.urls')),
+    path('api/evaluaciones/', include('evaluaciones.urls')),
+    path('api/produccion/', include('produccion.urls')),
+    path('api/pesajes/', include('pesajes.urls')),
+    path('api/lecturas/', include('lecturas.urls')),
+    path('api/ubicaciones/', include('ubicaciones.urls')),
     
     # Documentación API
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
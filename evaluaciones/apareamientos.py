@@ -0,0 +1,103 @@
+"""
+Asignación de apareamientos: cada hembra recibe un macho de modo que se
+maximice el mérito esperado de las crías, (EBV macho + EBV hembra) / 2,
+sin superar una consanguinidad máxima de la cría (la coancestría de los
+padres, leída del motor o del almacén de parentesco).
+
+Sin límite de hembras por macho el problema se separa por hembra y se
+resuelve con un argmax por filas. Con límite se replica cada macho tantas
+veces como hembras puede cubrir y se resuelve como problema de asignación
+lineal (scipy.optimize.linear_sum_assignment).
+"""
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from animales.parentesco import matriz_coancestria
+from .models import ValorGenetico
+
+# Límite del tamaño de la matriz de asignación (hembras x machos x cupo)
+MAXIMO_CELDAS = 25_000_000
+_INVIABLE = 1e12
+
+
+def asignar(merito, consanguinidad, max_consanguinidad, max_por_macho=None, penalizacion=0.0):
+    """
+    merito y consanguinidad: matrices (hembras, machos). Devuelve, por hembra,
+    la posición del macho asignado o -1 si no hay ninguno viable.
+    """
+    puntuacion = merito - penalizacion * consanguinidad
+    viable = consanguinidad <= max_consanguinidad
+    hembras, machos = puntuacion.shape
+    asignacion = np.full(hembras, -1, dtype=np.int64)
+    if not hembras or not machos:
+        return asignacion
+
+    if max_por_macho is None or max_por_macho >= hembras:
+        puntuacion = np.where(viable, puntuacion, -np.inf)
+        mejor = np.argmax(puntuacion, axis=1)
+        con_opcion = viable.any(axis=1)
+        asignacion[con_opcion] = mejor[con_opcion]
+        return asignacion
+
+    if hembras * machos * max_por_macho > MAXIMO_CELDAS:
+        raise ValueError('Demasiadas combinaciones: reduce hembras, machos o el cupo por macho')
+
+    # Columnas: cada macho repetido max_por_macho veces
+    coste = np.where(viable, -puntuacion, _INVIABLE)
+    coste = np.repeat(coste, max_por_macho, axis=1)
+    filas, columnas = linear_sum_assignment(coste)
+    validas = coste[filas, columnas] < _INVIABLE
+    asignacion[filas[validas]] = columnas[validas] // max_por_macho
+    return asignacion
+
+
+def planificar(hembras, machos, caracter, max_consanguinidad, max_por_macho=None, penalizacion=0.0):
+    """
+    Planificar los apareamientos de las hembras con los machos candidatos.
+    `hembras` y `machos` son listas de (id, chapeta). Devuelve un diccionario
+    listo para la respuesta de la API.
+    """
+    ids_hembras = [a for a, _ in hembras]
+    ids_machos = [a for a, _ in machos]
+    ebv = dict(
+        ValorGenetico.objects.filter(
+            caracter=caracter,
+            animal_id__in=ids_hembras + ids_machos
+        ).values_list('animal_id', 'ebv')
+    )
+    ebv_hembras = np.array([ebv.get(a, 0.0) for a in ids_hembras])
+    ebv_machos = np.array([ebv.get(a, 0.0) for a in ids_machos])
+    merito = (ebv_hembras[:, None] + ebv_machos[None, :]) / 2
+
+    coancestria, version = matriz_coancestria(ids_hembras, ids_machos)
+    asignacion = asignar(merito, coancestria, max_consanguinidad, max_por_macho, penalizacion)
+
+    asignadas = np.flatnonzero(asignacion >= 0)
+    elegidos = asignacion[asignadas]
+    resultados = [
+        {
+            'hembra': ids_hembras[h],
+            'chapeta_hembra': hembras[h][1],
+            'macho': ids_machos[m],
+            'chapeta_macho': machos[m][1],
+            'merito_esperado': float(merito[h, m]),
+            'consanguinidad_cria': float(coancestria[h, m]),
+        }
+        for h, m in zip(asignadas.tolist(), elegidos.tolist())
+    ]
+    return {
+        'caracter': caracter,
+        'version_pedigree': version,
+        'max_consanguinidad': max_consanguinidad,
+        'asignaciones': resultados,
+        'sin_asignar': [ids_hembras[h] for h in np.flatnonzero(asignacion < 0).tolist()],
+        'resumen': {
+            'hembras': len(ids_hembras),
+            'machos_candidatos': len(ids_machos),
+            'asignadas': len(resultados),
+            'machos_usados': int(len(np.unique(elegidos))),
+            'merito_medio': float(merito[asignadas, elegidos].mean()) if len(asignadas) else None,
+            'consanguinidad_media': float(coancestria[asignadas, elegidos].mean()) if len(asignadas) else None,
+            'sin_ebv': sum(1 for a in ids_hembras + ids_machos if a not in ebv),
+        },
+    }
@@ -0,0 +1,193 @@
+"""
+BLUP animal: ecuaciones del modelo mixto de Henderson
+
+    [X'X   X'Z          ] [b]   [X'y]
+    [Z'X   Z'Z + k A^-1 ] [a] = [Z'y],   k = (1 - h2) / h2
+
+con un efecto fijo de grupo contemporáneo (sexo y año del registro) y el
+valor genético aditivo de todos los animales del rebaño. La inversa de A se
+obtiene con las reglas de Henderson (con consanguinidad, Quaas) en forma
+matricial, A^-1 = (I - P)' D^-1 (I - P), donde P tiene 1/2 en (hijo, padre)
+y D son las varianzas mendelianas del motor de parentesco.
+
+El sistema se resuelve con gradiente conjugado precondicionado (Jacobi)
+sobre matrices dispersas, partiendo de la solución de la evaluación anterior.
+Los registros repetidos de un animal entran como observaciones
+independientes (sin efecto de ambiente permanente).
+"""
+import time
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, cg
+
+from animales.models import Animal
+from animales.pedigree import Enlace
+from animales.parentesco import obtener_motor
+from produccion.models import RegistroProduccion
+from .models import EvaluacionGenetica, ValorGenetico
+
+CARACTER_PESO = 'peso'
+TOLERANCIA = 1e-8
+MAXIMO_ITERACIONES = 5000
+TAMANO_LOTE = 1000
+
+
+def registros(caracter):
+    """
+    Registros fenotípicos del carácter: (animal_ids, valores, grupos).
+    'peso' usa peso_actual; el resto sale de los registros de producción
+    (RegistroProduccion) de ese tipo.
+    """
+    animal_ids, valores, grupos = [], [], []
+    if caracter == CARACTER_PESO:
+        consulta = Animal.objects.filter(peso_actual__isnull=False).values_list('id', 'sexo', 'peso_actual')
+        for animal_id, sexo, peso in consulta.iterator(chunk_size=TAMANO_LOTE):
+            animal_ids.append(animal_id)
+            valores.append(peso)
+            grupos.append(sexo)
+        return animal_ids, valores, grupos
+
+    consulta = RegistroProduccion.objects.filter(tipo=caracter).order_by('animal_id', 'fecha').values_list(
+        'animal_id', 'animal__sexo', 'fecha', 'valor'
+    )
+    for animal_id, sexo, fecha, valor in consulta.iterator(chunk_size=TAMANO_LOTE):
+        animal_ids.append(animal_id)
+        valores.append(valor)
+        grupos.append(f"{sexo}-{fecha.year}")
+    return animal_ids, valores, grupos
+
+
+def inversa_parentesco(ids, padres, hijos, D):
+    """A^-1 dispersa para animales en posiciones 0..n-1 y aristas padre -> hijo"""
+    n = len(ids)
+    P = sparse.csr_matrix((np.full(len(hijos), 0.5), (hijos, padres)), shape=(n, n))
+    T = sparse.identity(n, format='csr') - P
+    return (T.T @ sparse.diags(1 / D) @ T).tocsr()
+
+
+def ecuaciones(animal_ids, valores, grupos, ids, Ainv, heredabilidad):
+    """Matriz de coeficientes y lado derecho del modelo mixto"""
+    n = len(ids)
+    niveles, grupo = np.unique(np.asarray(grupos, dtype=str), return_inverse=True)
+    registros_ = len(valores)
+    y = np.asarray(valores, dtype=np.float64)
+    X = sparse.csr_matrix((np.ones(registros_), (np.arange(registros_), grupo)), shape=(registros_, len(niveles)))
+    Z = sparse.csr_matrix(
+        (np.ones(registros_), (np.arange(registros_), np.searchsorted(ids, animal_ids))),
+        shape=(registros_, n)
+    )
+
+    k = (1 - heredabilidad) / heredabilidad
+    C = sparse.bmat([
+        [X.T @ X, X.T @ Z],
+        [Z.T @ X, Z.T @ Z + k * Ainv],
+    ], format='csr')
+    rhs = np.concatenate([X.T @ y, Z.T @ y])
+    return niveles, C, rhs
+
+
+def resolver(C, rhs, x0=None, tolerancia=TOLERANCIA, maximo_iteraciones=MAXIMO_ITERACIONES):
+    """Gradiente conjugado con precondicionador de Jacobi. Devuelve (x, iteraciones, residuo, convergió)"""
+    diagonal = C.diagonal()
+    inversa_diagonal = np.divide(1.0, diagonal, out=np.zeros_like(diagonal), where=diagonal != 0)
+    M = LinearOperator(C.shape, matvec=lambda v: inversa_diagonal * v, dtype=np.float64)
+
+    iteraciones = 0
+
+    def contar(_):
+        nonlocal iteraciones
+        iteraciones += 1
+
+    x, info = cg(C, rhs, x0=x0, rtol=tolerancia, atol=0.0, maxiter=maximo_iteraciones, M=M, callback=contar)
+    norma = np.linalg.norm(rhs)
+    residuo = float(np.linalg.norm(rhs - C @ x) / norma) if norma else 0.0
+    return x, iteraciones, residuo, info == 0
+
+
+def _solucion_anterior(caracter, ids, niveles):
+    """Vector de arranque con los EBV y efectos fijos de la última evaluación, o None"""
+    anterior = EvaluacionGenetica.objects.filter(caracter=caracter).order_by('-fecha', '-id').first()
+    if anterior is None:
+        return None
+
+    efectos = anterior.efectos_fijos or {}
+    x0 = np.zeros(len(niveles) + len(ids))
+    x0[:len(niveles)] = [efectos.get(str(nivel), 0.0) for nivel in niveles]
+    previos = ValorGenetico.objects.filter(caracter=caracter).values_list('animal_id', 'ebv')
+    for animal_id, ebv in previos.iterator(chunk_size=TAMANO_LOTE * 10):
+        posicion = np.searchsorted(ids, animal_id)
+        if posicion < len(ids) and ids[posicion] == animal_id:
+            x0[len(niveles) + posicion] = ebv
+    return x0
+
+
+def evaluar(caracter, heredabilidad, usuario=None, tolerancia=TOLERANCIA,
+            maximo_iteraciones=MAXIMO_ITERACIONES, arranque_en_caliente=True):
+    """Ejecutar el BLUP de un carácter y guardar los EBV de todo el rebaño"""
+    if not 0 < heredabilidad < 1:
+        raise ValueError('La heredabilidad debe estar entre 0 y 1')
+
+    inicio = time.monotonic()
+    animal_ids, valores, grupos = registros(caracter)
+    if not valores:
+        raise ValueError(f'No hay registros para el carácter {caracter}')
+
+    motor = obtener_motor()
+    ids = np.fromiter(Animal.objects.order_by('id').values_list('id', flat=True).iterator(), dtype=np.int64)
+    D = np.ones(len(ids))
+    posiciones = motor.posiciones(ids)
+    conocidos = posiciones >= 0
+    D[conocidos] = motor.D[posiciones[conocidos]]
+
+    enlaces = np.array(
+        list(Enlace.objects.values_list('from_animal_id', 'to_animal_id').iterator()),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    Ainv = inversa_parentesco(ids, np.searchsorted(ids, enlaces[:, 0]), np.searchsorted(ids, enlaces[:, 1]), D)
+
+    niveles, C, rhs = ecuaciones(animal_ids, valores, grupos, ids, Ainv, heredabilidad)
+    x0 = _solucion_anterior(caracter, ids, niveles) if arranque_en_caliente else None
+    print(f"📈 BLUP {caracter}: {len(ids)} animales, {len(valores)} registros, {len(niveles)} grupos")
+
+    x, iteraciones, residuo, convergio = resolver(C, rhs, x0, tolerancia, maximo_iteraciones)
+    ebv = x[len(niveles):]
+
+    with transaction.atomic():
+        evaluacion = EvaluacionGenetica.objects.create(
+            caracter=caracter,
+            heredabilidad=heredabilidad,
+            version_pedigree=motor.version,
+            num_animales=len(ids),
+            num_registros=len(valores),
+            iteraciones=iteraciones,
+            residuo=residuo,
+            convergio=convergio,
+            arranque_en_caliente=x0 is not None,
+            duracion_segundos=time.monotonic() - inicio,
+            efectos_fijos={str(nivel): float(valor) for nivel, valor in zip(niveles, x[:len(niveles)])},
+            ejecutado_por=usuario
+        )
+        ahora = timezone.now()
+        ValorGenetico.objects.bulk_create(
+            (
+                ValorGenetico(
+                    animal_id=int(animal_id),
+                    caracter=caracter,
+                    ebv=float(valor),
+                    evaluacion=evaluacion,
+                    fecha_actualizacion=ahora
+                )
+                for animal_id, valor in zip(ids, ebv)
+            ),
+            batch_size=TAMANO_LOTE,
+            update_conflicts=True,
+            unique_fields=['animal', 'caracter'],
+            update_fields=['ebv', 'evaluacion', 'fecha_actualizacion']
+        )
+        EvaluacionGenetica.objects.filter(pk=evaluacion.pk).update(duracion_segundos=time.monotonic() - inicio)
+
+    evaluacion.refresh_from_db()
+    return evaluacion
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from evaluaciones.blup import evaluar, TOLERANCIA, MAXIMO_ITERACIONES
+
+
+class Command(BaseCommand):
+    help = 'Estima los valores genéticos (BLUP animal) de un carácter para todo el rebaño'
+
+    def add_arguments(self, parser):
+        parser.add_argument('caracter', help="Carácter a evaluar ('peso' o un tipo de producción)")
+        parser.add_argument('--heredabilidad', type=float, required=True)
+        parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+        parser.add_argument('--maximo-iteraciones', type=int, default=MAXIMO_ITERACIONES)
+        parser.add_argument('--desde-cero', action='store_true', help='No partir de la solución anterior')
+
+    def handle(self, *args, **options):
+        try:
+            evaluacion = evaluar(
+                options['caracter'],
+                options['heredabilidad'],
+                tolerancia=options['tolerancia'],
+                maximo_iteraciones=options['maximo_iteraciones'],
+                arranque_en_caliente=not options['desde_cero']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        estilo = self.style.SUCCESS if evaluacion.convergio else self.style.WARNING
+        self.stdout.write(estilo(
+            f'{"✅" if evaluacion.convergio else "⚠️"} BLUP {evaluacion.caracter}: {evaluacion.num_animales} animales, '
+            f'{evaluacion.iteraciones} iteraciones, residuo {evaluacion.residuo:.2e}, '
+            f'{evaluacion.duracion_segundos:.1f} s'
+        ))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('animales', '0004_fila_parentesco'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvaluacionGenetica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caracter', models.CharField(db_index=True, max_length=50)),
+                ('heredabilidad', models.FloatField()),
+                ('version_pedigree', models.PositiveIntegerField()),
+                ('num_animales', models.PositiveIntegerField(default=0)),
+                ('num_registros', models.PositiveIntegerField(default=0)),
+                ('iteraciones', models.PositiveIntegerField(default=0)),
+                ('residuo', models.FloatField(blank=True, null=True)),
+                ('convergio', models.BooleanField(default=False)),
+                ('arranque_en_caliente', models.BooleanField(default=False)),
+                ('duracion_segundos', models.FloatField(default=0)),
+                ('efectos_fijos', models.JSONField(blank=True, default=dict)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('ejecutado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ValorGenetico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caracter', models.CharField(max_length=50)),
+                ('ebv', models.FloatField()),
+                ('fecha_actualizacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valores_geneticos', to='animales.animal')),
+                ('evaluacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='valores', to='evaluaciones.evaluaciongenetica')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['caracter', '-ebv'], name='valor_genetico_ranking_idx')],
+                'constraints': [models.UniqueConstraint(fields=('animal', 'caracter'), name='valor_genetico_animal_caracter_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluaciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evaluaciongenetica',
+            name='version_pedigree',
+            field=models.PositiveBigIntegerField(),
+        ),
+    ]
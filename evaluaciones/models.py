@@ -0,0 +1,45 @@
+from django.db import models
+from django.conf import settings
+from django.utils import timezone
+from animales.models import Animal
+
+
+class EvaluacionGenetica(models.Model):
+    """Ejecución del BLUP animal para un carácter (ver evaluaciones/blup.py)"""
+    caracter = models.CharField(max_length=50, db_index=True)
+    heredabilidad = models.FloatField()
+    version_pedigree = models.PositiveBigIntegerField()
+    num_animales = models.PositiveIntegerField(default=0)
+    num_registros = models.PositiveIntegerField(default=0)
+    iteraciones = models.PositiveIntegerField(default=0)
+    residuo = models.FloatField(null=True, blank=True)
+    convergio = models.BooleanField(default=False)
+    arranque_en_caliente = models.BooleanField(default=False)
+    duracion_segundos = models.FloatField(default=0)
+    # Soluciones de los grupos contemporáneos, para arrancar la siguiente evaluación
+    efectos_fijos = models.JSONField(default=dict, blank=True)
+    ejecutado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"BLUP {self.caracter} ({self.fecha:%Y-%m-%d %H:%M})"
+
+
+class ValorGenetico(models.Model):
+    """Valor genético estimado (EBV) vigente de un animal para un carácter"""
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='valores_geneticos')
+    caracter = models.CharField(max_length=50)
+    ebv = models.FloatField()
+    evaluacion = models.ForeignKey(EvaluacionGenetica, on_delete=models.SET_NULL, null=True, blank=True, related_name='valores')
+    fecha_actualizacion = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['animal', 'caracter'], name='valor_genetico_animal_caracter_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['caracter', '-ebv'], name='valor_genetico_ranking_idx'),
+        ]
+
+    def __str__(self):
+        return f"EBV {self.caracter} de {self.animal_id}: {self.ebv:.3f}"
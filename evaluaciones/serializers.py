@@ -0,0 +1,18 @@
+from rest_framework import serializers
+from .models import EvaluacionGenetica, ValorGenetico
+
+
+class EvaluacionGeneticaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EvaluacionGenetica
+        exclude = ['efectos_fijos']
+
+
+class ValorGeneticoSerializer(serializers.ModelSerializer):
+    chapeta = serializers.CharField(source='animal.chapeta', read_only=True)
+    nombre = serializers.CharField(source='animal.nombre', read_only=True)
+    sexo = serializers.CharField(source='animal.sexo', read_only=True)
+
+    class Meta:
+        model = ValorGenetico
+        fields = ['id', 'animal', 'chapeta', 'nombre', 'sexo', 'caracter', 'ebv', 'evaluacion', 'fecha_actualizacion']
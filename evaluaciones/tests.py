@@ -0,0 +1,194 @@
+from datetime import date
+from itertools import product
+
+import numpy as np
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from animales import parentesco
+from animales.models import Animal
+from usuarios.models import Usuario
+from .models import EvaluacionGenetica, ValorGenetico
+from . import apareamientos, blup
+
+# Ejemplo 3.1 de Mrode (Linear Models for the Prediction of Animal Breeding
+# Values): ganancia predestete de cinco terneros con el sexo como efecto fijo,
+# varianza aditiva 20 y residual 40 (h2 = 1/3).
+# animal: (sexo, padre, madre, registro)
+EJEMPLO = {
+    1: ('macho', None, None, None),
+    2: ('hembra', None, None, None),
+    3: ('macho', None, None, None),
+    4: ('macho', 1, None, 4.5),
+    5: ('hembra', 3, 2, 2.9),
+    6: ('hembra', 1, 2, 3.9),
+    7: ('macho', 4, 5, 3.5),
+    8: ('macho', 3, 6, 5.0),
+}
+# Soluciones del sistema a seis decimales (el libro las da a tres)
+SOLUCION_SEXO = {'macho': 4.358502, 'hembra': 3.404430}
+SOLUCION_ANIMALES = {
+    1: 0.098445, 2: -0.018770, 3: -0.041084, 4: -0.008663,
+    5: -0.185732, 6: 0.176872, 7: -0.249459, 8: 0.182615,
+}
+
+
+class BlupTests(TestCase):
+    """BLUP animal frente a las soluciones publicadas del ejemplo de Mrode"""
+
+    def setUp(self):
+        parentesco._motor = None
+        self.animales = {}
+        for numero, (sexo, padre, madre, registro) in EJEMPLO.items():
+            self.animales[numero] = Animal.objects.create(
+                chapeta=f'M{numero}',
+                sexo=sexo,
+                fecha_nacimiento=date(2020, 1, 1),
+                raza='Angus',
+                estado_reproductivo='vacío',
+                estado_productivo='activo',
+                peso_actual=registro
+            )
+            self.animales[numero].animal_set.add(*(self.animales[p] for p in (padre, madre) if p))
+
+    def tearDown(self):
+        parentesco._motor = None
+
+    def test_ejemplo_mrode(self):
+        evaluacion = blup.evaluar(blup.CARACTER_PESO, 1 / 3)
+        self.assertTrue(evaluacion.convergio)
+        self.assertEqual(evaluacion.num_registros, 5)
+        self.assertEqual(evaluacion.num_animales, 8)
+        for sexo, solucion in SOLUCION_SEXO.items():
+            self.assertAlmostEqual(evaluacion.efectos_fijos[sexo], solucion, places=5)
+
+        ebv = dict(ValorGenetico.objects.filter(caracter=blup.CARACTER_PESO).values_list('animal_id', 'ebv'))
+        for numero, solucion in SOLUCION_ANIMALES.items():
+            self.assertAlmostEqual(ebv[self.animales[numero].pk], solucion, places=5)
+
+    def test_inversa_de_henderson(self):
+        motor = parentesco.construir_motor()
+        ids = np.array(sorted(animal.pk for animal in self.animales.values()))
+        D = motor.D[motor.posiciones(ids)]
+        padres, hijos = [], []
+        for numero, (_, padre, madre, _) in EJEMPLO.items():
+            for progenitor in (padre, madre):
+                if progenitor:
+                    padres.append(np.searchsorted(ids, self.animales[progenitor].pk))
+                    hijos.append(np.searchsorted(ids, self.animales[numero].pk))
+        Ainv = blup.inversa_parentesco(ids, np.array(padres), np.array(hijos), D).toarray()
+
+        L = motor.L.toarray()
+        orden = motor.posiciones(ids)
+        A = (L @ np.diag(motor.D) @ L.T)[np.ix_(orden, orden)]
+        np.testing.assert_allclose(Ainv @ A, np.eye(len(ids)), atol=1e-10)
+
+    def test_arranque_en_caliente(self):
+        primera = blup.evaluar(blup.CARACTER_PESO, 1 / 3)
+        segunda = blup.evaluar(blup.CARACTER_PESO, 1 / 3)
+        self.assertFalse(primera.arranque_en_caliente)
+        self.assertTrue(segunda.arranque_en_caliente)
+        self.assertLessEqual(segunda.iteraciones, 1)
+        self.assertEqual(EvaluacionGenetica.objects.count(), 2)
+        self.assertEqual(ValorGenetico.objects.count(), len(EJEMPLO))
+
+    def test_heredabilidad_fuera_de_rango(self):
+        with self.assertRaises(ValueError):
+            blup.evaluar(blup.CARACTER_PESO, 1)
+
+
+def asignacion_exhaustiva(puntuacion, viable, max_por_macho):
+    """(asignadas, puntuación total) óptimas probando todas las combinaciones"""
+    hembras, machos = puntuacion.shape
+    mejor = (0, 0.0)
+    for eleccion in product(range(-1, machos), repeat=hembras):
+        usados = [m for m in eleccion if m >= 0]
+        if any(usados.count(m) > max_por_macho for m in set(usados)):
+            continue
+        if any(m >= 0 and not viable[h, m] for h, m in enumerate(eleccion)):
+            continue
+        total = sum(puntuacion[h, m] for h, m in enumerate(eleccion) if m >= 0)
+        mejor = max(mejor, (len(usados), round(total, 9)))
+    return mejor
+
+
+class ApareamientosTests(TestCase):
+    """Asignación hembra -> macho con y sin cupo por macho"""
+
+    def setUp(self):
+        parentesco._motor = None
+
+    def tearDown(self):
+        parentesco._motor = None
+
+    def test_sin_cupo(self):
+        merito = np.array([[1.0, 3.0, 2.0], [5.0, 1.0, 0.0], [1.0, 1.0, 1.0]])
+        consanguinidad = np.array([[0.0, 0.25, 0.0], [0.0, 0.0, 0.0], [0.125, 0.125, 0.25]])
+        asignacion = apareamientos.asignar(merito, consanguinidad, 0.0625)
+        # El mejor macho de la primera está emparentado; la tercera no tiene ninguno viable
+        np.testing.assert_array_equal(asignacion, [2, 0, -1])
+
+        # La penalización puede cambiar la elección entre machos viables
+        consanguinidad[0] = [0.0, 0.05, 0.0]
+        self.assertEqual(apareamientos.asignar(merito, consanguinidad, 0.0625)[0], 1)
+        self.assertEqual(apareamientos.asignar(merito, consanguinidad, 0.0625, penalizacion=40)[0], 2)
+
+    def test_con_cupo_frente_a_busqueda_exhaustiva(self):
+        rng = np.random.default_rng(5)
+        for _ in range(20):
+            merito = rng.normal(size=(5, 3))
+            consanguinidad = np.where(rng.random((5, 3)) < 0.3, 0.25, 0.0)
+            asignacion = apareamientos.asignar(merito, consanguinidad, 0.0625, max_por_macho=2)
+
+            usados = asignacion[asignacion >= 0]
+            self.assertTrue((np.bincount(usados, minlength=3) <= 2).all())
+            filas = np.flatnonzero(asignacion >= 0)
+            self.assertTrue((consanguinidad[filas, asignacion[filas]] <= 0.0625).all())
+            self.assertEqual(
+                (len(filas), round(float(merito[filas, asignacion[filas]].sum()), 9)),
+                asignacion_exhaustiva(merito, consanguinidad <= 0.0625, 2)
+            )
+
+    def test_endpoint(self):
+        usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        cliente = APIClient()
+        cliente.force_authenticate(usuario)
+
+        def crear(chapeta, sexo, ebv):
+            animal = Animal.objects.create(
+                chapeta=chapeta, sexo=sexo, fecha_nacimiento=date(2020, 1, 1), raza='Angus',
+                estado_reproductivo='vacío', estado_productivo='activo'
+            )
+            ValorGenetico.objects.create(animal=animal, caracter='peso', ebv=ebv)
+            return animal
+
+        toro = crear('T1', 'macho', 10.0)
+        otro = crear('T2', 'macho', 4.0)
+        # La hija del mejor toro no puede cubrirse con él
+        hija = crear('H1', 'hembra', 2.0)
+        hija.animal_set.add(toro)
+        hembras = [hija, crear('H2', 'hembra', 1.0), crear('H3', 'hembra', 0.0)]
+        ids = [hembra.pk for hembra in hembras]
+
+        respuesta = cliente.post('/api/evaluaciones/apareamientos/', {'caracter': 'peso', 'hembras': ids}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        elegidos = {fila['hembra']: fila['macho'] for fila in respuesta.json()['asignaciones']}
+        self.assertEqual(elegidos, {hija.pk: otro.pk, ids[1]: toro.pk, ids[2]: toro.pk})
+
+        # Con una hembra por macho, una queda sin asignar
+        respuesta = cliente.post('/api/evaluaciones/apareamientos/', {
+            'caracter': 'peso', 'hembras': ids, 'machos': [toro.pk, otro.pk], 'max_hembras_por_macho': 1
+        }, format='json')
+        datos = respuesta.json()
+        self.assertEqual(len(datos['asignaciones']), 2)
+        self.assertEqual(datos['resumen']['machos_usados'], 2)
+        self.assertEqual(len(datos['sin_asignar']), 1)
+        self.assertNotIn(hija.pk, datos['sin_asignar'])
+        self.assertTrue(all(fila['consanguinidad_cria'] <= 0.0625 for fila in datos['asignaciones']))
+
+        respuesta = cliente.post('/api/evaluaciones/apareamientos/', {
+            'caracter': 'peso', 'hembras': ids, 'max_hembras_por_macho': 0
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 400)
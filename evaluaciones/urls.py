@@ -0,0 +1,11 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import EvaluacionGeneticaViewSet, ValorGeneticoViewSet
+
+router = DefaultRouter()
+router.register(r'ebv', ValorGeneticoViewSet, basename='valor-genetico')
+router.register(r'', EvaluacionGeneticaViewSet, basename='evaluacion-genetica')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
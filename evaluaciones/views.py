@@ -0,0 +1,180 @@
+import traceback
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+from .models import EvaluacionGenetica, ValorGenetico
+from .serializers import EvaluacionGeneticaSerializer, ValorGeneticoSerializer
+from .blup import evaluar, TOLERANCIA, MAXIMO_ITERACIONES
+from .apareamientos import planificar
+from animales.models import Animal
+from grupos.models import Grupo
+from utils.permissions import IsAdminUser
+from utils.campos import CamposParcialesMixin
+from logs.utils import registrar_log
+
+MAXIMO_RANKING = 1000
+# Machos candidatos por defecto: los mejores por EBV del carácter
+MACHOS_POR_DEFECTO = 200
+MAXIMO_ANIMALES_APAREAMIENTO = 10000
+
+
+class EvaluacionGeneticaViewSet(CamposParcialesMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = EvaluacionGenetica.objects.order_by('-fecha')
+    serializer_class = EvaluacionGeneticaSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['caracter', 'convergio']
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def ejecutar(self, request):
+        """Lanzar el BLUP de un carácter: {"caracter", "heredabilidad"[, "tolerancia", "maximo_iteraciones"]}"""
+        try:
+            caracter = request.data.get('caracter')
+            if not caracter:
+                return Response({'error': 'Indica el carácter en "caracter"'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                heredabilidad = float(request.data.get('heredabilidad'))
+                tolerancia = float(request.data.get('tolerancia', TOLERANCIA))
+                maximo_iteraciones = int(request.data.get('maximo_iteraciones', MAXIMO_ITERACIONES))
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'heredabilidad, tolerancia y maximo_iteraciones deben ser numéricos'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            evaluacion = evaluar(
+                caracter,
+                heredabilidad,
+                usuario=request.user,
+                tolerancia=tolerancia,
+                maximo_iteraciones=maximo_iteraciones,
+                arranque_en_caliente=request.data.get('arranque_en_caliente', True) not in (False, 'false', '0')
+            )
+            registrar_log(
+                usuario=request.user,
+                tipo_accion='evaluar_blup',
+                entidad_afectada='evaluacion_genetica',
+                entidad_id=evaluacion.id,
+                observaciones=f'BLUP {caracter}: {evaluacion.num_animales} animales, {evaluacion.iteraciones} iteraciones'
+            )
+            return Response(EvaluacionGeneticaSerializer(evaluacion).data, status=status.HTTP_201_CREATED)
+
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error ejecutando BLUP: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error ejecutando BLUP: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def _animales_solicitados(self, datos, clave_lista, clave_grupo, sexo):
+        """(id, chapeta) de los animales del sexo indicado, desde una lista de ids o un Grupo"""
+        if datos.get(clave_grupo) is not None:
+            grupo = Grupo.objects.filter(pk=datos[clave_grupo]).first()
+            if grupo is None:
+                raise ValueError(f'Grupo {datos[clave_grupo]} no encontrado')
+            animales = grupo.animal_ids.all()
+        elif datos.get(clave_lista) is not None:
+            try:
+                animales = Animal.objects.filter(id__in=[int(a) for a in datos[clave_lista]])
+            except (TypeError, ValueError):
+                raise ValueError(f'{clave_lista} debe ser una lista de ids')
+        else:
+            return None
+        return list(animales.filter(sexo=sexo).order_by('id').values_list('id', 'chapeta'))
+
+    @action(detail=False, methods=['post'])
+    def apareamientos(self, request):
+        """
+        Asignar un macho a cada hembra maximizando el mérito esperado de la cría
+        sin superar max_consanguinidad. Hembras: "grupo" o "hembras"; machos:
+        "grupo_machos", "machos" o, por defecto, los mejores por EBV.
+        """
+        try:
+            datos = request.data if isinstance(request.data, dict) else {}
+            caracter = datos.get('caracter')
+            if not caracter:
+                return Response({'error': 'Indica el carácter en "caracter"'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                max_consanguinidad = float(datos.get('max_consanguinidad', 0.0625))
+                penalizacion = float(datos.get('penalizacion', 0.0))
+                max_por_macho = datos.get('max_hembras_por_macho')
+                max_por_macho = int(max_por_macho) if max_por_macho is not None else None
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'max_consanguinidad, penalizacion y max_hembras_por_macho deben ser numéricos'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if max_por_macho is not None and max_por_macho < 1:
+                return Response({'error': 'max_hembras_por_macho debe ser positivo'}, status=status.HTTP_400_BAD_REQUEST)
+
+            hembras = self._animales_solicitados(datos, 'hembras', 'grupo', 'hembra')
+            if not hembras:
+                return Response(
+                    {'error': 'Indica hembras con "grupo" o "hembras"'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            machos = self._animales_solicitados(datos, 'machos', 'grupo_machos', 'macho')
+            if machos is None:
+                machos = list(
+                    ValorGenetico.objects.filter(
+                        caracter=caracter,
+                        animal__sexo='macho',
+                        animal__fecha_baja_sistema__isnull=True
+                    ).order_by('-ebv').values_list('animal_id', 'animal__chapeta')[:MACHOS_POR_DEFECTO]
+                )
+            if not machos:
+                return Response({'error': 'No hay machos candidatos'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(hembras) > MAXIMO_ANIMALES_APAREAMIENTO or len(machos) > MAXIMO_ANIMALES_APAREAMIENTO:
+                return Response(
+                    {'error': f'Máximo {MAXIMO_ANIMALES_APAREAMIENTO} hembras y machos por petición'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            print(f"💞 Apareamientos {caracter}: {len(hembras)} hembras x {len(machos)} machos")
+            return Response(planificar(hembras, machos, caracter, max_consanguinidad, max_por_macho, penalizacion))
+
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error planificando apareamientos: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error planificando apareamientos: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class ValorGeneticoViewSet(CamposParcialesMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = ValorGenetico.objects.select_related('animal').order_by('caracter', '-ebv')
+    serializer_class = ValorGeneticoSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['animal', 'caracter', 'evaluacion']
+
+    @action(detail=False, methods=['get'])
+    def ranking(self, request):
+        """Mejores animales por EBV: ?caracter=&sexo=&estado_productivo=&limite="""
+        caracter = request.query_params.get('caracter')
+        if not caracter:
+            return Response({'error': 'Indica ?caracter='}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limite = max(1, min(int(request.query_params.get('limite', 50)), MAXIMO_RANKING))
+        except ValueError:
+            return Response({'error': 'limite debe ser un entero'}, status=status.HTTP_400_BAD_REQUEST)
+
+        valores = ValorGenetico.objects.select_related('animal').filter(caracter=caracter)
+        for campo in ('sexo', 'estado_productivo', 'raza'):
+            if request.query_params.get(campo):
+                valores = valores.filter(**{f'animal__{campo}': request.query_params[campo]})
+        if request.query_params.get('activos') in ('1', 'true'):
+            valores = valores.filter(animal__fecha_baja_sistema__isnull=True)
+
+        valores = valores.order_by('-ebv')[:limite]
+        return Response({
+            'caracter': caracter,
+            'resultados': ValorGeneticoSerializer(valores, many=True).data,
+        })
@@ -3,9 +3,10 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Evento
 from .serializers import EventoSerializer
 from utils.permissions import IsAdminUser
+from utils.campos import CamposParcialesMixin
 from logs.utils import registrar_log
 
-class EventoViewSet(viewsets.ModelViewSet):
+class EventoViewSet(CamposParcialesMixin, viewsets.ModelViewSet):
     queryset = Evento.objects.all()
     serializer_class = EventoSerializer
     permission_classes = [IsAdminUser]
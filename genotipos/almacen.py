@@ -0,0 +1,181 @@
+"""
+Almacén de genotipos SNP empaquetados a 2 bits por marcador.
+
+Cada panel tiene un archivo binario con una fila de longitud fija por animal
+(Genotipo.fila). Códigos: 0, 1, 2 = copias del alelo B; 3 = sin dato.
+El marcador j ocupa los bits 2*(j % 4) del byte j // 4 y cada fila se rellena
+hasta un múltiplo de 8 bytes para poder operar por palabras de 64 bits.
+Las lecturas se hacen sobre np.memmap: solo se copian los bytes pedidos.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Genotipo, PanelSNP
+
+FALTANTE = 3
+FILAS_POR_AMPLIACION = 1024
+BITS_BAJOS = np.uint64(0x5555555555555555)
+
+_DESPLAZAMIENTOS = np.array([0, 2, 4, 6], dtype=np.uint8)
+
+# Texto <-> códigos: '0', '1', '2' y cualquiera de '3-N.' como dato faltante
+_TEXTO = np.frombuffer(b'012-', dtype=np.uint8)
+_CODIGO_DE_CARACTER = np.full(256, 255, dtype=np.uint8)
+for _caracter, _codigo in ((b'0', 0), (b'1', 1), (b'2', 2), (b'3', 3), (b'-', 3), (b'N', 3), (b'.', 3)):
+    _CODIGO_DE_CARACTER[_caracter[0]] = _codigo
+
+
+def directorio():
+    """Carpeta donde viven los archivos de los paneles"""
+    return Path(getattr(settings, 'GENOTIPOS_ROOT', Path(settings.BASE_DIR) / 'genotipos_data'))
+
+
+def ruta_panel(panel):
+    return directorio() / f'panel_{panel.pk}.bin'
+
+
+def empaquetar(codigos, bytes_por_fila):
+    """Empaquetar códigos (..., marcadores) en filas de `bytes_por_fila` bytes"""
+    codigos = np.asarray(codigos, dtype=np.uint8)
+    forma = codigos.shape[:-1]
+    relleno = np.full(forma + (bytes_por_fila * 4,), FALTANTE, dtype=np.uint8)
+    relleno[..., :codigos.shape[-1]] = codigos
+    grupos = relleno.reshape(forma + (bytes_por_fila, 4)) << _DESPLAZAMIENTOS
+    return np.bitwise_or.reduce(grupos, axis=-1).astype(np.uint8)
+
+
+def desempaquetar(empaquetado, inicio, fin):
+    """Códigos de los marcadores [inicio, fin) de filas empaquetadas (..., bytes)"""
+    primer_byte = inicio // 4
+    ultimo_byte = -(-fin // 4)
+    trozo = np.asarray(empaquetado[..., primer_byte:ultimo_byte])
+    codigos = (trozo[..., None] >> _DESPLAZAMIENTOS) & 3
+    codigos = codigos.reshape(trozo.shape[:-1] + (-1,))
+    desfase = inicio - primer_byte * 4
+    return codigos[..., desfase:desfase + (fin - inicio)]
+
+
+def palabras(empaquetado):
+    """Ver filas empaquetadas (..., bytes) como palabras de 64 bits"""
+    return np.ascontiguousarray(empaquetado).view('<u8')
+
+
+def planos(palabras_):
+    """
+    Separar las palabras en (bit alto, bit bajo) de cada marcador, alineados
+    en las posiciones pares: 0 -> (0, 0), 1 -> (0, 1), 2 -> (1, 0), 3 -> (1, 1)
+    """
+    return (palabras_ >> np.uint64(1)) & BITS_BAJOS, palabras_ & BITS_BAJOS
+
+
+def leer_bloque(datos, filas, inicio, fin):
+    """Códigos (len(filas), fin - inicio) copiando del memmap solo los bytes de esos marcadores"""
+    primer_byte = inicio // 4
+    trozo = datos[np.asarray(filas), primer_byte:-(-fin // 4)]
+    return desempaquetar(trozo, inicio - primer_byte * 4, fin - primer_byte * 4)
+
+
+def texto_a_codigos(texto):
+    """Convertir '0121-...' en un array de códigos; ValueError si hay caracteres no válidos"""
+    codigos = _CODIGO_DE_CARACTER[np.frombuffer(texto.encode('ascii', 'replace'), dtype=np.uint8)]
+    if (codigos == 255).any():
+        posicion = int(np.argmax(codigos == 255))
+        raise ValueError(f'Carácter no válido en la posición {posicion}: {texto[posicion]!r}')
+    return codigos
+
+
+def codigos_a_texto(codigos):
+    return _TEXTO[np.asarray(codigos, dtype=np.uint8)].tobytes().decode('ascii')
+
+
+def abrir(panel, escritura=False):
+    """Memmap (filas, bytes_por_fila) del archivo del panel"""
+    ruta = ruta_panel(panel)
+    filas = os.path.getsize(ruta) // panel.bytes_por_fila if ruta.exists() else 0
+    if filas == 0:
+        return np.zeros((0, panel.bytes_por_fila), dtype=np.uint8)
+    return np.memmap(
+        ruta,
+        dtype=np.uint8,
+        mode='r+' if escritura else 'r',
+        shape=(filas, panel.bytes_por_fila)
+    )
+
+
+def mapear(ruta, forma):
+    """Memmap de solo lectura a partir de ruta y forma (para procesos auxiliares)"""
+    return np.memmap(ruta, dtype=np.uint8, mode='r', shape=forma)
+
+
+def forma_archivo(panel):
+    """(ruta, forma) del archivo del panel, para abrirlo con mapear() en otro proceso"""
+    ruta = ruta_panel(panel)
+    return str(ruta), (os.path.getsize(ruta) // panel.bytes_por_fila, panel.bytes_por_fila)
+
+
+def _asegurar_capacidad(panel, filas):
+    """Ampliar el archivo del panel para que quepan `filas` filas"""
+    ruta = ruta_panel(panel)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.touch(exist_ok=True)
+    filas = -(-filas // FILAS_POR_AMPLIACION) * FILAS_POR_AMPLIACION
+    necesario = filas * panel.bytes_por_fila
+    if os.path.getsize(ruta) < necesario:
+        os.truncate(ruta, necesario)
+
+
+@transaction.atomic
+def reservar_filas(panel_id, cantidad):
+    """Reservar `cantidad` filas consecutivas. Devuelve (panel, primera fila)"""
+    panel = PanelSNP.objects.select_for_update().get(pk=panel_id)
+    primera = panel.num_muestras
+    panel.num_muestras += cantidad
+    panel.version += 1
+    panel.save(update_fields=['num_muestras', 'version'])
+    _asegurar_capacidad(panel, panel.num_muestras)
+    return panel, primera
+
+
+def marcar_modificado(panel_id):
+    """Cambiar la versión del panel tras sobrescribir filas existentes"""
+    PanelSNP.objects.filter(pk=panel_id).update(version=F('version') + 1)
+
+
+def escribir_filas(panel, filas, empaquetados):
+    """Escribir filas completas ya empaquetadas"""
+    datos = abrir(panel, escritura=True)
+    datos[np.asarray(filas)] = empaquetados
+    datos.flush()
+
+
+def leer_filas(panel, filas, inicio=0, fin=None):
+    """Códigos (len(filas), fin - inicio) leídos del memmap"""
+    if fin is None:
+        fin = panel.num_marcadores
+    datos = abrir(panel)
+    return desempaquetar(datos[np.asarray(filas)], inicio, fin)
+
+
+@transaction.atomic
+def guardar_genotipo(animal, panel, codigos, usuario=None):
+    """Guardar (o sustituir) el genotipo de un animal en un panel"""
+    genotipo = Genotipo.objects.select_for_update().filter(animal=animal, panel=panel).first()
+    if genotipo is None:
+        panel, fila = reservar_filas(panel.pk, 1)
+    else:
+        fila = genotipo.fila
+        marcar_modificado(panel.pk)
+
+    escribir_filas(panel, [fila], empaquetar(codigos, panel.bytes_por_fila)[None, :])
+
+    if genotipo is None:
+        return Genotipo.objects.create(animal=animal, panel=panel, fila=fila, cargado_por=usuario)
+
+    genotipo.cargado_por = usuario
+    genotipo.save(update_fields=['cargado_por'])
+    return genotipo
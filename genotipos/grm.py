@@ -0,0 +1,178 @@
+"""
+Matriz de parentesco genómico (GRM) de VanRaden (método 1):
+
+    G = Z Z' / (2 * sum(p (1 - p))),   Z = M - 2p
+
+La matriz se calcula por bloques de animales (y, dentro de cada bloque, por
+trozos de marcadores) leyendo el almacén con np.memmap, de modo que la
+memoria máxima depende del tamaño de bloque. Los bloques son independientes
+y se pueden repartir en un pool de procesos; cada uno escribe su región en
+un .npy mapeado en disco, que queda como caché para la versión del panel.
+
+Del último control de calidad se toman tanto la máscara de marcadores como
+las muestras excluidas por call rate: esos animales no entran en la matriz
+ni en las frecuencias alélicas.
+"""
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .models import Genotipo
+from .almacen import FALTANTE, desempaquetar, leer_bloque, directorio, mapear, forma_archivo
+from .qc import obtener_mascara, muestras_excluidas, ultimo_control_panel
+
+TAMANO_BLOQUE = 2048
+MARCADORES_POR_TROZO = 8192
+
+
+def ruta_cache(panel, version=None):
+    version = panel.version if version is None else version
+    return directorio() / 'grm' / f'panel_{panel.pk}' / f'v{version}'
+
+
+def frecuencias_alelicas(ruta, forma, filas, num_marcadores, filas_por_trozo=TAMANO_BLOQUE):
+    """Frecuencia del alelo B por marcador, ignorando datos faltantes"""
+    datos = mapear(ruta, forma)
+    suma = np.zeros(num_marcadores)
+    cuenta = np.zeros(num_marcadores)
+    for inicio in range(0, len(filas), filas_por_trozo):
+        codigos = desempaquetar(datos[filas[inicio:inicio + filas_por_trozo]], 0, num_marcadores)
+        validos = codigos != FALTANTE
+        suma += np.where(validos, codigos, 0).sum(axis=0)
+        cuenta += validos.sum(axis=0)
+    return np.divide(suma, 2 * cuenta, out=np.zeros(num_marcadores), where=cuenta > 0)
+
+
+def _centrar(datos, filas, inicio, fin, p, mascara):
+    """
+    Z = M - 2p para un trozo de marcadores; los faltantes quedan en 0 (media)
+    y los marcadores que no pasaron el control de calidad no aportan
+    """
+    codigos = leer_bloque(datos, filas, inicio, fin)
+    Z = codigos.astype(np.float32) - 2 * p[inicio:fin].astype(np.float32)
+    Z[codigos == FALTANTE] = 0
+    Z[:, ~mascara[inicio:fin]] = 0
+    return Z
+
+
+def _calcular_bloque(tarea):
+    """Calcular G[I, J] y escribirlo (con su simétrico) en la matriz de salida"""
+    ruta, forma, ruta_salida, filas, (i0, i1), (j0, j1), p, mascara, escala, por_trozo = tarea
+    datos = mapear(ruta, forma)
+    bloque = np.zeros((i1 - i0, j1 - j0), dtype=np.float64)
+    for inicio in range(0, len(p), por_trozo):
+        fin = min(inicio + por_trozo, len(p))
+        Zi = _centrar(datos, filas[i0:i1], inicio, fin, p, mascara)
+        Zj = Zi if (i0, i1) == (j0, j1) else _centrar(datos, filas[j0:j1], inicio, fin, p, mascara)
+        bloque += Zi @ Zj.T
+    bloque /= escala
+
+    salida = np.load(ruta_salida, mmap_mode='r+')
+    salida[i0:i1, j0:j1] = bloque
+    salida[j0:j1, i0:i1] = bloque.T
+    salida.flush()
+    return (i1 - i0) * (j1 - j0)
+
+
+def calcular_grm(panel, procesos=1, tamano_bloque=TAMANO_BLOQUE, marcadores_por_trozo=MARCADORES_POR_TROZO):
+    """
+    Calcular y cachear en disco la GRM de los animales genotipados del panel
+    cuya muestra superó el último control de calidad
+    """
+    mascara, control = obtener_mascara(panel)
+    if mascara is None:
+        mascara = np.ones(panel.num_marcadores, dtype=bool)
+    excluidas = muestras_excluidas(control) if control else set()
+
+    genotipos = [
+        (animal_id, fila)
+        for animal_id, fila in Genotipo.objects.filter(panel=panel).order_by('fila').values_list('animal_id', 'fila')
+        if animal_id not in excluidas
+    ]
+    if not genotipos:
+        raise ValueError('El panel no tiene genotipos que hayan superado el control de calidad')
+
+    animales = np.array([a for a, _ in genotipos], dtype=np.int64)
+    filas = np.array([f for _, f in genotipos], dtype=np.int64)
+    n = len(animales)
+    ruta, forma = forma_archivo(panel)
+
+    # Las frecuencias, como la matriz, solo con las muestras aprobadas
+    p = frecuencias_alelicas(ruta, forma, filas, panel.num_marcadores)
+    escala = 2 * float(np.sum((p * (1 - p))[mascara]))
+    if escala == 0:
+        raise ValueError('Todos los marcadores son monomórficos')
+
+    destino = ruta_cache(panel)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporal = Path(tempfile.mkdtemp(dir=destino.parent))
+    ruta_salida = str(temporal / 'grm.npy')
+    np.lib.format.open_memmap(ruta_salida, mode='w+', dtype=np.float32, shape=(n, n)).flush()
+
+    limites = [(i, min(i + tamano_bloque, n)) for i in range(0, n, tamano_bloque)]
+    tareas = [
+        (ruta, forma, ruta_salida, filas, limites[a], limites[b], p, mascara, escala, marcadores_por_trozo)
+        for a in range(len(limites))
+        for b in range(a, len(limites))
+    ]
+    print(f"🧬 GRM del panel {panel.nombre}: {n} animales, {len(tareas)} bloques, {procesos} procesos")
+
+    if procesos > 1 and len(tareas) > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            list(pool.map(_calcular_bloque, tareas))
+    else:
+        for tarea in tareas:
+            _calcular_bloque(tarea)
+
+    np.save(temporal / 'animales.npy', animales)
+    np.save(temporal / 'frecuencias.npy', p)
+    info = {
+        'panel': panel.pk,
+        'version_panel': panel.version,
+        'num_animales': n,
+        'num_marcadores': int(mascara.sum()),
+        'muestras_excluidas': len(excluidas),
+        'control_calidad': control.id if control else None,
+    }
+    (temporal / 'info.json').write_text(json.dumps(info))
+
+    # Publicar la nueva versión y retirar las anteriores
+    if destino.exists():
+        shutil.rmtree(destino)
+    os.replace(temporal, destino)
+    for anterior in destino.parent.iterdir():
+        if anterior != destino and anterior.name.startswith('v'):
+            shutil.rmtree(anterior, ignore_errors=True)
+    return info
+
+
+def cargar_grm(panel):
+    """
+    (ids de animales, GRM mapeada en disco) para la versión vigente del panel
+    y su último control de calidad, o None si no existe
+    """
+    destino = ruta_cache(panel)
+    if not (destino / 'info.json').exists():
+        return None
+    control = ultimo_control_panel(panel)
+    if json.loads((destino / 'info.json').read_text()).get('control_calidad') != (control.id if control else None):
+        return None
+    animales = np.load(destino / 'animales.npy')
+    matriz = np.load(destino / 'grm.npy', mmap_mode='r')
+    return animales, matriz
+
+
+def submatriz(animales, matriz, animal_ids):
+    """
+    Submatriz de la GRM para los animales pedidos. Devuelve los ids
+    encontrados (en el orden pedido) y su matriz.
+    """
+    posicion = {int(a): i for i, a in enumerate(animales)}
+    encontrados = [int(a) for a in animal_ids if int(a) in posicion]
+    indices = np.array([posicion[a] for a in encontrados], dtype=np.int64)
+    return encontrados, np.asarray(matriz[np.ix_(indices, indices)])
@@ -0,0 +1,184 @@
+"""
+GWAS marcador a marcador: regresión simple y = mu + b * g + e para cada SNP.
+
+Los genotipos se leen del memmap por trozos de columnas (marcadores) y, para
+cada trozo, todas las regresiones se resuelven a la vez con sumas
+matriciales (mínimos cuadrados en lote), descartando en cada marcador los
+animales sin dato. Los trozos son independientes y pueden repartirse en un
+pool de procesos. Los resultados se guardan en un .npy estructurado en el
+orden de los marcadores del panel.
+"""
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.db.models import Count, Sum
+from scipy import stats
+
+from animales.models import Animal
+from incidencias.models import Incidencia
+from produccion.models import RegistroProduccion
+from .models import Genotipo, AnalisisGWAS
+from .almacen import FALTANTE, leer_bloque, directorio, mapear, forma_archivo
+from .qc import obtener_mascara
+
+MARCADORES_POR_TROZO = 4096
+MINIMO_ANIMALES = 10
+
+RESULTADO = np.dtype([
+    ('efecto', '<f4'),
+    ('error', '<f4'),
+    ('p', '<f8'),
+    ('n', '<i4'),
+    ('frecuencia', '<f4'),
+])
+
+
+def ruta_resultados(analisis):
+    return directorio() / 'gwas' / f'analisis_{analisis.pk}.npy'
+
+
+def fenotipos(caracter, animal_ids):
+    """
+    Valor del carácter para los animales indicados:
+    'peso' (peso_actual), 'produccion:<tipo>' (suma de los registros de
+    producción de ese tipo), 'incidencias' o 'incidencias:<tipo>' (número
+    de incidencias; los animales sin ninguna cuentan 0).
+    """
+    animal_ids = list(animal_ids)
+    nombre, _, tipo = caracter.partition(':')
+
+    if nombre == 'peso':
+        return dict(
+            Animal.objects.filter(id__in=animal_ids, peso_actual__isnull=False).values_list('id', 'peso_actual')
+        )
+
+    if nombre == 'produccion' and tipo:
+        return dict(
+            RegistroProduccion.objects.filter(animal_id__in=animal_ids, tipo=tipo)
+            .values('animal_id').annotate(total=Sum('valor')).values_list('animal_id', 'total')
+        )
+
+    if nombre == 'incidencias':
+        incidencias = Incidencia.objects.filter(animal_id__in=animal_ids)
+        if tipo:
+            incidencias = incidencias.filter(tipo=tipo)
+        cuentas = Counter(dict(incidencias.values('animal_id').annotate(n=Count('id')).values_list('animal_id', 'n')))
+        return {animal_id: float(cuentas[animal_id]) for animal_id in animal_ids}
+
+    raise ValueError("Carácter no válido: usa 'peso', 'produccion:<tipo>', 'incidencias' o 'incidencias:<tipo>'")
+
+
+def _asociar_trozo(tarea):
+    """Regresiones de y sobre los marcadores [inicio, fin) para las filas dadas"""
+    ruta, forma, filas, y, inicio, fin = tarea
+    codigos = leer_bloque(mapear(ruta, forma), filas, inicio, fin)
+    con_dato = codigos != FALTANTE
+    g = np.where(con_dato, codigos, 0).astype(np.float64)
+    v = con_dato.astype(np.float64)
+
+    n = v.sum(axis=0)
+    sx = g.sum(axis=0)
+    sy = y @ v
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx = (g * g).sum(axis=0) - sx * sx / n
+        sxy = y @ g - sx * sy / n
+        syy = (y * y) @ v - sy * sy / n
+        efecto = sxy / sxx
+        libertad = n - 2
+        error = np.sqrt((syy - efecto * sxy) / libertad / sxx)
+        t = efecto / error
+        frecuencia = sx / (2 * n)
+
+    validos = (n >= 3) & (sxx > 1e-12)
+    resultado = np.zeros(fin - inicio, dtype=RESULTADO)
+    resultado['n'] = n
+    resultado['frecuencia'] = frecuencia
+    resultado['efecto'] = np.where(validos, efecto, np.nan)
+    resultado['error'] = np.where(validos, error, np.nan)
+    resultado['p'] = np.where(validos, 2 * stats.t.sf(np.abs(t), np.maximum(libertad, 1)), np.nan)
+    return inicio, resultado
+
+
+def ejecutar(panel, caracter, usuario=None, procesos=1, marcadores_por_trozo=MARCADORES_POR_TROZO):
+    """Ejecutar un GWAS del carácter sobre todos los animales genotipados del panel con fenotipo"""
+    inicio_reloj = time.monotonic()
+    analisis = AnalisisGWAS.objects.create(
+        panel=panel,
+        caracter=caracter,
+        version_panel=panel.version,
+        num_marcadores=panel.num_marcadores,
+        ejecutado_por=usuario
+    )
+    try:
+        genotipos = dict(Genotipo.objects.filter(panel=panel).values_list('animal_id', 'fila'))
+        valores = fenotipos(caracter, genotipos.keys())
+        animales = sorted(valores, key=genotipos.get)
+        if len(animales) < MINIMO_ANIMALES:
+            raise ValueError(f'Se necesitan al menos {MINIMO_ANIMALES} animales genotipados con fenotipo')
+
+        filas = np.array([genotipos[a] for a in animales], dtype=np.int64)
+        y = np.array([valores[a] for a in animales], dtype=np.float64)
+        y -= y.mean()
+        ruta, forma = forma_archivo(panel)
+
+        por_trozo = max(4, marcadores_por_trozo // 4 * 4)
+        tareas = [
+            (ruta, forma, filas, y, inicio, min(inicio + por_trozo, panel.num_marcadores))
+            for inicio in range(0, panel.num_marcadores, por_trozo)
+        ]
+        print(f"🧬 GWAS {caracter} en {panel.nombre}: {len(animales)} animales, {len(tareas)} trozos, {procesos} procesos")
+
+        resultados = np.zeros(panel.num_marcadores, dtype=RESULTADO)
+        if procesos > 1 and len(tareas) > 1:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                partes = list(pool.map(_asociar_trozo, tareas))
+        else:
+            partes = [_asociar_trozo(tarea) for tarea in tareas]
+        for inicio, parte in partes:
+            resultados[inicio:inicio + len(parte)] = parte
+
+        # Los marcadores que no pasaron el control de calidad quedan sin resultado
+        mascara, _ = obtener_mascara(panel)
+        if mascara is not None:
+            for campo in ('efecto', 'error', 'p'):
+                resultados[campo][~mascara] = np.nan
+            analisis.num_marcadores = int(mascara.sum())
+
+        destino = ruta_resultados(analisis)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        np.save(destino, resultados)
+
+        # Inflación (control genómico): mediana de chi2 observada / esperada
+        p = resultados['p'][np.isfinite(resultados['p'])]
+        inflacion = None
+        if len(p):
+            inflacion = float(np.median(stats.chi2.isf(p, 1)) / stats.chi2.ppf(0.5, 1))
+
+        analisis.estado = 'completado'
+        analisis.num_animales = len(animales)
+        analisis.inflacion = inflacion
+    except Exception as e:
+        analisis.estado = 'error'
+        analisis.mensaje_error = str(e)
+        raise
+    finally:
+        analisis.duracion_segundos = time.monotonic() - inicio_reloj
+        analisis.save()
+    return analisis
+
+
+def cargar_resultados(analisis):
+    """Resultados del análisis mapeados en disco, o None si no existen"""
+    ruta = ruta_resultados(analisis)
+    if not ruta.exists():
+        return None
+    return np.load(ruta, mmap_mode='r')
+
+
+def eliminar_resultados(analisis):
+    ruta = ruta_resultados(analisis)
+    if ruta.exists():
+        os.remove(ruta)
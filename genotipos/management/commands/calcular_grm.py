@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from genotipos.models import PanelSNP
+from genotipos.grm import calcular_grm, TAMANO_BLOQUE, MARCADORES_POR_TROZO
+
+
+class Command(BaseCommand):
+    help = 'Calcula y cachea en disco la matriz de parentesco genómico (VanRaden) de un panel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--panel', required=True, help='Nombre del panel')
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos para repartir los bloques')
+        parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help='Animales por bloque')
+        parser.add_argument(
+            '--marcadores-por-trozo',
+            type=int,
+            default=MARCADORES_POR_TROZO,
+            help='Marcadores leídos a la vez dentro de cada bloque'
+        )
+
+    def handle(self, *args, **options):
+        panel = PanelSNP.objects.filter(nombre=options['panel']).first()
+        if panel is None:
+            raise CommandError(f'No existe el panel {options["panel"]}')
+
+        try:
+            info = calcular_grm(
+                panel,
+                procesos=options['procesos'],
+                tamano_bloque=options['bloque'],
+                marcadores_por_trozo=options['marcadores_por_trozo']
+            )
+        except (ValueError, OSError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ GRM del panel {panel.nombre}: {info["num_animales"]} animales (versión {info["version_panel"]})'
+        ))
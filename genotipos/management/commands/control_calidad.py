@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from genotipos.models import PanelSNP
+from genotipos.qc import controlar, UMBRALES_POR_DEFECTO
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta el control de calidad (call rate, MAF, HWE) de todas las muestras de un panel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--panel', required=True, help='Nombre del panel')
+        for clave, valor in UMBRALES_POR_DEFECTO.items():
+            parser.add_argument(f'--{clave.replace("_", "-")}', type=float, default=valor)
+
+    def handle(self, *args, **options):
+        panel = PanelSNP.objects.filter(nombre=options['panel']).first()
+        if panel is None:
+            raise CommandError(f'No existe el panel {options["panel"]}')
+
+        control = controlar(panel, umbrales={clave: options[clave] for clave in UMBRALES_POR_DEFECTO})
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ QC del panel {panel.nombre}: {control.marcadores_excluidos} de {control.num_marcadores} SNPs '
+            f'y {control.muestras_excluidas} de {control.num_muestras} muestras excluidos'
+        ))
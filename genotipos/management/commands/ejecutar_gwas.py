@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from genotipos.models import PanelSNP
+from genotipos.gwas import ejecutar, MARCADORES_POR_TROZO
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta un GWAS marcador a marcador de un carácter sobre un panel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('caracter', help="'peso', 'produccion:<tipo>', 'incidencias' o 'incidencias:<tipo>'")
+        parser.add_argument('--panel', required=True, help='Nombre del panel')
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos para repartir los trozos de marcadores')
+        parser.add_argument('--marcadores-por-trozo', type=int, default=MARCADORES_POR_TROZO)
+
+    def handle(self, *args, **options):
+        panel = PanelSNP.objects.filter(nombre=options['panel']).first()
+        if panel is None:
+            raise CommandError(f'No existe el panel {options["panel"]}')
+
+        try:
+            analisis = ejecutar(
+                panel,
+                options['caracter'],
+                procesos=options['procesos'],
+                marcadores_por_trozo=options['marcadores_por_trozo']
+            )
+        except (ValueError, OSError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ GWAS {analisis.id}: {analisis.num_animales} animales x {analisis.num_marcadores} SNPs '
+            f'en {analisis.duracion_segundos:.1f} s (lambda {analisis.inflacion or 0:.3f})'
+        ))
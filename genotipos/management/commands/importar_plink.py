@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from genotipos.plink import importar_plink, ErrorPlink, MEMORIA_BLOQUE
+
+
+class Command(BaseCommand):
+    help = 'Importa un conjunto PLINK (.bed/.bim/.fam) al almacén de genotipos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('prefijo', help='Ruta común de los archivos, sin extensión')
+        parser.add_argument('--panel', required=True, help='Nombre del panel (se crea si no existe)')
+        parser.add_argument(
+            '--bloque-mb',
+            type=int,
+            default=MEMORIA_BLOQUE // (1024 * 1024),
+            help='Memoria aproximada por bloque de SNPs, en MB'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            lote = importar_plink(
+                options['prefijo'],
+                options['panel'],
+                memoria_bloque=options['bloque_mb'] * 1024 * 1024
+            )
+        except (ErrorPlink, OSError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Lote {lote.id}: {lote.num_asignadas} de {lote.num_muestras} muestras importadas en el panel {lote.panel.nombre}'
+        ))
+        if lote.no_encontrados:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ {lote.num_muestras - lote.num_asignadas} identificadores sin animal con esa chapeta'
+            ))
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('animales', '0004_fila_parentesco'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PanelSNP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('descripcion', models.TextField(blank=True, null=True)),
+                ('num_marcadores', models.PositiveIntegerField()),
+                ('num_muestras', models.PositiveIntegerField(default=0)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MarcadorSNP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indice', models.PositiveIntegerField()),
+                ('nombre', models.CharField(max_length=100)),
+                ('cromosoma', models.CharField(blank=True, default='', max_length=10)),
+                ('posicion', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('alelo_a', models.CharField(blank=True, default='', max_length=20)),
+                ('alelo_b', models.CharField(blank=True, default='', max_length=20)),
+                ('panel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='marcadores', to='genotipos.panelsnp')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('panel', 'indice'), name='marcador_panel_indice_unico'), models.UniqueConstraint(fields=('panel', 'nombre'), name='marcador_panel_nombre_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Genotipo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fila', models.PositiveIntegerField()),
+                ('fecha_carga', models.DateTimeField(auto_now_add=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genotipos', to='animales.animal')),
+                ('cargado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('panel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genotipos', to='genotipos.panelsnp')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('animal', 'panel'), name='genotipo_animal_panel_unico'), models.UniqueConstraint(fields=('panel', 'fila'), name='genotipo_panel_fila_unica')],
+            },
+        ),
+    ]
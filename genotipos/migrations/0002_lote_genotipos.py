@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genotipos', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteGenotipos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origen', models.CharField(max_length=255)),
+                ('fecha_carga', models.DateTimeField(auto_now_add=True)),
+                ('num_muestras', models.PositiveIntegerField(default=0)),
+                ('num_asignadas', models.PositiveIntegerField(default=0)),
+                ('no_encontrados', models.JSONField(blank=True, default=list)),
+                ('cargado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('panel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='genotipos.panelsnp')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='genotipo',
+            name='lote',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='genotipos', to='genotipos.lotegenotipos'),
+        ),
+    ]
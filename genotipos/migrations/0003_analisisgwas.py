@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genotipos', '0002_lote_genotipos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalisisGWAS',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caracter', models.CharField(max_length=150)),
+                ('estado', models.CharField(choices=[('ejecutando', 'Ejecutando'), ('completado', 'Completado'), ('error', 'Error')], default='ejecutando', max_length=20)),
+                ('version_panel', models.PositiveIntegerField(default=0)),
+                ('num_animales', models.PositiveIntegerField(default=0)),
+                ('num_marcadores', models.PositiveIntegerField(default=0)),
+                ('inflacion', models.FloatField(blank=True, null=True)),
+                ('mensaje_error', models.TextField(blank=True, null=True)),
+                ('duracion_segundos', models.FloatField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('ejecutado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('panel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analisis_gwas', to='genotipos.panelsnp')),
+            ],
+        ),
+    ]
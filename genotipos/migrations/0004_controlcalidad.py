@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genotipos', '0003_analisisgwas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ControlCalidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version_panel', models.PositiveIntegerField(default=0)),
+                ('num_muestras', models.PositiveIntegerField(default=0)),
+                ('num_marcadores', models.PositiveIntegerField(default=0)),
+                ('marcadores_excluidos', models.PositiveIntegerField(default=0)),
+                ('muestras_excluidas', models.PositiveIntegerField(default=0)),
+                ('umbrales', models.JSONField(default=dict)),
+                ('resumen', models.JSONField(blank=True, default=dict)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('lote', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='controles_calidad', to='genotipos.lotegenotipos')),
+                ('panel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='controles_calidad', to='genotipos.panelsnp')),
+            ],
+        ),
+    ]
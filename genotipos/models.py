@@ -0,0 +1,126 @@
+from django.db import models
+from django.conf import settings
+from animales.models import Animal
+
+
+class PanelSNP(models.Model):
+    """
+    Chip o panel de marcadores. Los genotipos de todos los animales del panel
+    se guardan en un único archivo binario (ver genotipos/almacen.py).
+    """
+    nombre = models.CharField(max_length=100, unique=True)
+    descripcion = models.TextField(blank=True, null=True)
+    num_marcadores = models.PositiveIntegerField()
+    num_muestras = models.PositiveIntegerField(default=0)
+    version = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def bytes_por_fila(self):
+        """4 marcadores por byte, fila alineada a palabras de 64 bits"""
+        return -(-self.num_marcadores // 32) * 8
+
+    def __str__(self):
+        return f"{self.nombre} ({self.num_marcadores} SNPs)"
+
+
+class MarcadorSNP(models.Model):
+    panel = models.ForeignKey(PanelSNP, on_delete=models.CASCADE, related_name='marcadores')
+    indice = models.PositiveIntegerField()
+    nombre = models.CharField(max_length=100)
+    cromosoma = models.CharField(max_length=10, blank=True, default='')
+    posicion = models.PositiveBigIntegerField(null=True, blank=True)
+    alelo_a = models.CharField(max_length=20, blank=True, default='')
+    alelo_b = models.CharField(max_length=20, blank=True, default='')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['panel', 'indice'], name='marcador_panel_indice_unico'),
+            models.UniqueConstraint(fields=['panel', 'nombre'], name='marcador_panel_nombre_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} ({self.panel_id}:{self.indice})"
+
+
+class Genotipo(models.Model):
+    """Índice de la fila que ocupa el genotipo de un animal en el archivo del panel"""
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='genotipos')
+    panel = models.ForeignKey(PanelSNP, on_delete=models.CASCADE, related_name='genotipos')
+    fila = models.PositiveIntegerField()
+    fecha_carga = models.DateTimeField(auto_now_add=True)
+    cargado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    lote = models.ForeignKey('LoteGenotipos', on_delete=models.SET_NULL, null=True, blank=True, related_name='genotipos')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['animal', 'panel'], name='genotipo_animal_panel_unico'),
+            models.UniqueConstraint(fields=['panel', 'fila'], name='genotipo_panel_fila_unica'),
+        ]
+
+    def __str__(self):
+        return f"Genotipo de {self.animal_id} en panel {self.panel_id}"
+
+
+class LoteGenotipos(models.Model):
+    """Importación de un conjunto de genotipos (por ejemplo un archivo PLINK del laboratorio)"""
+    panel = models.ForeignKey(PanelSNP, on_delete=models.CASCADE, related_name='lotes')
+    origen = models.CharField(max_length=255)
+    fecha_carga = models.DateTimeField(auto_now_add=True)
+    cargado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    num_muestras = models.PositiveIntegerField(default=0)
+    num_asignadas = models.PositiveIntegerField(default=0)
+    no_encontrados = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return f"Lote {self.origen} ({self.num_asignadas}/{self.num_muestras})"
+
+
+class AnalisisGWAS(models.Model):
+    """
+    Análisis de asociación marcador a marcador de un carácter. Los resultados
+    (efecto, error, p, n, frecuencia por marcador) se guardan en un .npy
+    junto al almacén (ver genotipos/gwas.py).
+    """
+    ESTADO_CHOICES = [
+        ('ejecutando', 'Ejecutando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    panel = models.ForeignKey(PanelSNP, on_delete=models.CASCADE, related_name='analisis_gwas')
+    caracter = models.CharField(max_length=150)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='ejecutando')
+    version_panel = models.PositiveIntegerField(default=0)
+    num_animales = models.PositiveIntegerField(default=0)
+    num_marcadores = models.PositiveIntegerField(default=0)
+    inflacion = models.FloatField(null=True, blank=True)
+    mensaje_error = models.TextField(blank=True, null=True)
+    duracion_segundos = models.FloatField(default=0)
+    ejecutado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"GWAS {self.caracter} en {self.panel_id} ({self.estado})"
+
+
+class ControlCalidad(models.Model):
+    """
+    Control de calidad de un lote importado o de todo el panel (lote nulo).
+    Las estadísticas por marcador y por muestra y la máscara de marcadores
+    aprobados se guardan en disco (ver genotipos/qc.py).
+    """
+    panel = models.ForeignKey(PanelSNP, on_delete=models.CASCADE, related_name='controles_calidad')
+    lote = models.ForeignKey(LoteGenotipos, on_delete=models.CASCADE, null=True, blank=True, related_name='controles_calidad')
+    version_panel = models.PositiveIntegerField(default=0)
+    num_muestras = models.PositiveIntegerField(default=0)
+    num_marcadores = models.PositiveIntegerField(default=0)
+    marcadores_excluidos = models.PositiveIntegerField(default=0)
+    muestras_excluidas = models.PositiveIntegerField(default=0)
+    umbrales = models.JSONField(default=dict)
+    resumen = models.JSONField(default=dict, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        ambito = f"lote {self.lote_id}" if self.lote_id else "panel"
+        return f"QC {ambito} de {self.panel_id} ({self.marcadores_excluidos} SNPs excluidos)"
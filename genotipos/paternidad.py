@@ -0,0 +1,109 @@
+"""
+Verificación de paternidad por homocigotos opuestos.
+
+Un progenitor verdadero nunca es homocigoto para el alelo contrario al de la
+cría (0 frente a 2). Las filas empaquetadas se leen como palabras de 64 bits
+(32 marcadores por palabra) y, para cada marcador, bit alto = código & 2 y
+bit bajo = código & 1:
+
+    0 -> (0, 0)   1 -> (0, 1)   2 -> (1, 0)   3 sin dato -> (1, 1)
+
+Homocigotos opuestos: (alto_x ^ alto_y) & ~bajo_x & ~bajo_y, y se cuentan
+con popcount sobre todos los candidatos a la vez.
+"""
+import numpy as np
+
+from animales.models import Animal
+from .models import Genotipo
+from .almacen import abrir, palabras, planos
+from .qc import obtener_mascara, mascara_palabras
+
+# Umbrales de decisión: tasa máxima de homocigotos opuestos de un progenitor
+# verdadero (errores de genotipado) y mínimo de marcadores comparables.
+TASA_EXCLUSION = 0.01
+MINIMO_COMPARADOS = 100
+FILAS_POR_TROZO = 4096
+
+
+def homocigotos_opuestos(cria, candidatos, mascara):
+    """
+    Para una cría (palabras,) y candidatos (k, palabras) devuelve dos arrays
+    (k,): homocigotos opuestos y marcadores con dato en ambos. `mascara` son
+    palabras con el bit bajo de cada marcador utilizable a 1.
+    """
+    alto_c, bajo_c = planos(cria)
+    alto, bajo = planos(candidatos)
+    opuestos = (alto ^ alto_c) & ~bajo & ~bajo_c & mascara
+    con_dato = ~(alto & bajo) & ~(alto_c & bajo_c) & mascara
+    return (
+        np.bitwise_count(opuestos).sum(axis=-1, dtype=np.int64),
+        np.bitwise_count(con_dato).sum(axis=-1, dtype=np.int64),
+    )
+
+
+def dictamen(opuestos, comparados):
+    if comparados < MINIMO_COMPARADOS:
+        return 'sin_datos'
+    return 'excluido' if opuestos / comparados > TASA_EXCLUSION else 'compatible'
+
+
+def _resultado(animal_id, opuestos, comparados):
+    return {
+        'candidato': int(animal_id),
+        'homocigotos_opuestos': int(opuestos),
+        'marcadores_comparados': int(comparados),
+        'tasa': float(opuestos / comparados) if comparados else None,
+        'dictamen': dictamen(opuestos, comparados),
+    }
+
+
+def _mascara(panel):
+    """Marcadores aprobados en el último control de calidad (todos si no hay control)"""
+    mascara, _ = obtener_mascara(panel, reescanear=False)
+    if mascara is None:
+        mascara = np.ones(panel.num_marcadores, dtype=bool)
+    return mascara_palabras(mascara, panel.bytes_por_fila)
+
+
+def _escanear(datos, cria, genotipos, mascara):
+    """Contar homocigotos opuestos para [(animal_id, fila), ...] por trozos de filas"""
+    resultados = []
+    for inicio in range(0, len(genotipos), FILAS_POR_TROZO):
+        trozo = genotipos[inicio:inicio + FILAS_POR_TROZO]
+        filas = np.array([fila for _, fila in trozo], dtype=np.int64)
+        opuestos, comparados = homocigotos_opuestos(cria, palabras(datos[filas]), mascara)
+        resultados.extend(_resultado(a, o, c) for (a, _), o, c in zip(trozo, opuestos, comparados))
+    return resultados
+
+
+def verificar(genotipo, candidato_ids):
+    """Comparar la cría con los candidatos indicados que estén genotipados en su panel"""
+    panel = genotipo.panel
+    genotipos = list(
+        Genotipo.objects.filter(panel=panel, animal_id__in=candidato_ids).values_list('animal_id', 'fila')
+    )
+    datos = abrir(panel)
+    cria = palabras(datos[genotipo.fila])
+    resultados = {r['candidato']: r for r in _escanear(datos, cria, genotipos, _mascara(panel))}
+    return [resultados.get(a) or _resultado(a, 0, 0) | {'dictamen': 'sin_genotipo'} for a in candidato_ids]
+
+
+def buscar_padre(genotipo, sexo='macho', limite=10):
+    """
+    Ordenar todos los animales del sexo indicado, genotipados en el panel y
+    nacidos antes que la cría, por tasa de homocigotos opuestos.
+    """
+    animal = genotipo.animal
+    candidatos = Animal.objects.filter(
+        sexo=sexo,
+        fecha_nacimiento__lt=animal.fecha_nacimiento
+    ).exclude(pk=animal.pk)
+    genotipos = list(
+        Genotipo.objects.filter(panel=genotipo.panel, animal__in=candidatos)
+        .order_by('fila')
+        .values_list('animal_id', 'fila')
+    )
+    datos = abrir(genotipo.panel)
+    resultados = _escanear(datos, palabras(datos[genotipo.fila]), genotipos, _mascara(genotipo.panel))
+    resultados.sort(key=lambda r: (r['dictamen'] == 'sin_datos', r['tasa'] if r['tasa'] is not None else 1.0))
+    return len(genotipos), resultados[:limite]
@@ -0,0 +1,204 @@
+"""
+Importación de archivos binarios PLINK (.bed/.bim/.fam) al almacén de genotipos.
+
+El .bed se recorre con np.memmap en bloques de SNPs (formato SNP-major), se
+decodifica solo el bloque en curso, se traspone a filas por animal y se
+escribe directamente en las columnas correspondientes del archivo del panel.
+La memoria máxima depende del tamaño de bloque, no del número de muestras
+ni de marcadores.
+"""
+from pathlib import Path
+
+import numpy as np
+from django.db import transaction
+
+from animales.models import Animal
+from .models import PanelSNP, MarcadorSNP, Genotipo, LoteGenotipos
+from .almacen import abrir, empaquetar, reservar_filas, marcar_modificado
+from .qc import controlar_lote_importado
+
+CABECERA_BED = b'\x6c\x1b\x01'
+MEMORIA_BLOQUE = 64 * 1024 * 1024
+TAMANO_CONSULTA = 5000
+MAXIMO_NO_ENCONTRADOS = 1000
+
+# PLINK: 00 homocigoto A1, 01 faltante, 10 heterocigoto, 11 homocigoto A2.
+# En el almacén el alelo B es A1, así que el código es el número de copias de A1.
+_CODIGO_PLINK = np.array([2, 3, 1, 0], dtype=np.uint8)
+_DESPLAZAMIENTOS = np.array([0, 2, 4, 6], dtype=np.uint8)
+
+
+class ErrorPlink(ValueError):
+    pass
+
+
+def rutas(prefijo):
+    """Rutas .bed/.bim/.fam a partir del prefijo común"""
+    prefijo = str(prefijo)
+    for extension in ('.bed', '.bim', '.fam'):
+        if prefijo.endswith(extension):
+            prefijo = prefijo[:-len(extension)]
+    return Path(prefijo + '.bed'), Path(prefijo + '.bim'), Path(prefijo + '.fam')
+
+
+def leer_fam(ruta):
+    """Identificadores de individuo (segunda columna) en el orden del archivo"""
+    with open(ruta, encoding='utf-8') as archivo:
+        return [linea.split()[1] for linea in archivo if linea.strip()]
+
+
+def leer_bim(ruta):
+    """Definición de marcadores en el orden del archivo"""
+    marcadores = []
+    with open(ruta, encoding='utf-8') as archivo:
+        for linea in archivo:
+            campos = linea.split()
+            if not campos:
+                continue
+            if len(campos) < 6:
+                raise ErrorPlink(f'Línea .bim no válida: {linea.strip()!r}')
+            marcadores.append({
+                'cromosoma': campos[0][:10],
+                'nombre': campos[1][:100],
+                'posicion': int(campos[3]) if campos[3].isdigit() else None,
+                'alelo_b': campos[4][:20],
+                'alelo_a': campos[5][:20],
+            })
+    return marcadores
+
+
+def _resolver_chapetas(identificadores):
+    """Mapa chapeta -> id de animal para los identificadores del .fam"""
+    mapa = {}
+    unicos = list(dict.fromkeys(identificadores))
+    for inicio in range(0, len(unicos), TAMANO_CONSULTA):
+        mapa.update(
+            Animal.objects.filter(chapeta__in=unicos[inicio:inicio + TAMANO_CONSULTA]).values_list('chapeta', 'id')
+        )
+    return mapa
+
+
+def _obtener_panel(nombre, marcadores):
+    """Panel existente compatible con el .bim, o uno nuevo con esos marcadores"""
+    panel = PanelSNP.objects.filter(nombre=nombre).first()
+    if panel is None:
+        with transaction.atomic():
+            panel = PanelSNP.objects.create(nombre=nombre, num_marcadores=len(marcadores))
+            MarcadorSNP.objects.bulk_create(
+                [MarcadorSNP(panel=panel, indice=indice, **datos) for indice, datos in enumerate(marcadores)],
+                batch_size=1000
+            )
+        return panel
+
+    if panel.num_marcadores != len(marcadores):
+        raise ErrorPlink(
+            f'El panel {nombre} tiene {panel.num_marcadores} marcadores y el .bim {len(marcadores)}'
+        )
+    existentes = list(panel.marcadores.order_by('indice').values_list('nombre', flat=True))
+    if existentes and existentes != [m['nombre'] for m in marcadores]:
+        raise ErrorPlink(f'Los marcadores del .bim no coinciden con los del panel {nombre}')
+    return panel
+
+
+def decodificar_bloque(crudo, num_muestras):
+    """Bytes SNP-major (snps, bytes_por_snp) -> códigos (snps, muestras)"""
+    codigos = _CODIGO_PLINK[(crudo[..., None] >> _DESPLAZAMIENTOS) & 3]
+    return codigos.reshape(crudo.shape[0], -1)[:, :num_muestras]
+
+
+def importar_plink(prefijo, nombre_panel, usuario=None, memoria_bloque=MEMORIA_BLOQUE, origen=None):
+    """
+    Importar un conjunto PLINK al panel `nombre_panel` (se crea si no existe).
+    Solo se guardan las muestras cuyo identificador coincide con una chapeta.
+    Devuelve el LoteGenotipos creado.
+    """
+    ruta_bed, ruta_bim, ruta_fam = rutas(prefijo)
+    identificadores = leer_fam(ruta_fam)
+    marcadores = leer_bim(ruta_bim)
+    num_muestras = len(identificadores)
+    num_marcadores = len(marcadores)
+    if not num_muestras or not num_marcadores:
+        raise ErrorPlink('El .fam o el .bim están vacíos')
+
+    bytes_por_snp = -(-num_muestras // 4)
+    with open(ruta_bed, 'rb') as archivo:
+        if archivo.read(3) != CABECERA_BED:
+            raise ErrorPlink('El .bed no es un archivo PLINK en modo SNP-major')
+    if ruta_bed.stat().st_size != 3 + bytes_por_snp * num_marcadores:
+        raise ErrorPlink('El tamaño del .bed no corresponde con el .bim y el .fam')
+
+    mapa = _resolver_chapetas(identificadores)
+    columnas, animal_ids, vistos = [], [], set()
+    for columna, identificador in enumerate(identificadores):
+        animal_id = mapa.get(identificador)
+        if animal_id is not None and animal_id not in vistos:
+            vistos.add(animal_id)
+            columnas.append(columna)
+            animal_ids.append(animal_id)
+    no_encontrados = [i for i in identificadores if i not in mapa]
+
+    panel = _obtener_panel(nombre_panel, marcadores)
+    version_anterior = panel.version
+    lote = LoteGenotipos.objects.create(
+        panel=panel,
+        origen=origen or ruta_bed.stem,
+        cargado_por=usuario,
+        num_muestras=num_muestras,
+        num_asignadas=len(animal_ids),
+        no_encontrados=no_encontrados[:MAXIMO_NO_ENCONTRADOS]
+    )
+    if not animal_ids:
+        return lote
+
+    # Reutilizar la fila de los animales ya genotipados en el panel
+    existentes = dict(
+        Genotipo.objects.filter(panel=panel, animal_id__in=animal_ids).values_list('animal_id', 'fila')
+    )
+    nuevos = [a for a in animal_ids if a not in existentes]
+    filas_nuevas = {}
+    if nuevos:
+        panel, primera = reservar_filas(panel.pk, len(nuevos))
+        filas_nuevas = {animal_id: primera + i for i, animal_id in enumerate(nuevos)}
+    if existentes:
+        marcar_modificado(panel.pk)
+
+    filas = np.array([existentes.get(a, filas_nuevas.get(a)) for a in animal_ids], dtype=np.int64)
+    columnas = np.array(columnas, dtype=np.int64)
+    orden = np.argsort(filas)
+    filas, columnas = filas[orden], columnas[orden]
+
+    bed = np.memmap(ruta_bed, dtype=np.uint8, mode='r', offset=3, shape=(num_marcadores, bytes_por_snp))
+    datos = abrir(panel, escritura=True)
+    snps_por_bloque = max(4, (memoria_bloque // max(num_muestras, 1)) // 4 * 4)
+    print(f"🧬 Importando {len(filas)} muestras x {num_marcadores} SNPs en bloques de {snps_por_bloque}")
+
+    for inicio in range(0, num_marcadores, snps_por_bloque):
+        fin = min(inicio + snps_por_bloque, num_marcadores)
+        codigos = decodificar_bloque(bed[inicio:fin], num_muestras)[:, columnas]
+        empaquetado = empaquetar(codigos.T, -(-(fin - inicio) // 4))
+        primer_byte = inicio // 4
+        datos[filas, primer_byte:primer_byte + empaquetado.shape[1]] = empaquetado
+
+    # Relleno de las filas más allá del último marcador: sin dato
+    relleno = -(-num_marcadores // 4)
+    if relleno < panel.bytes_por_fila:
+        datos[filas, relleno:] = 0xFF
+    datos.flush()
+    del datos, bed
+
+    with transaction.atomic():
+        Genotipo.objects.filter(panel=panel, animal_id__in=list(existentes)).update(
+            lote=lote,
+            cargado_por=usuario
+        )
+        Genotipo.objects.bulk_create(
+            [
+                Genotipo(animal_id=a, panel=panel, fila=fila, lote=lote, cargado_por=usuario)
+                for a, fila in filas_nuevas.items()
+            ],
+            batch_size=1000
+        )
+
+    # Control de calidad del lote (y del panel, si se puede actualizar sin recorrerlo)
+    controlar_lote_importado(lote, version_anterior, reescritas=len(existentes))
+    return lote
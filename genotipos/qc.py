@@ -0,0 +1,276 @@
+"""
+Control de calidad de genotipos: tasa de llamada por muestra y por marcador,
+frecuencia del alelo menor (MAF) y equilibrio de Hardy-Weinberg (chi2, 1 gl).
+
+Todo sale de un único recorrido por bloques de filas empaquetadas:
+- por marcador se cuentan las cuatro clases de genotipo con un bincount
+  sobre el bloque desempaquetado;
+- por muestra, los faltantes y heterocigotos se cuentan con popcount sobre
+  las palabras de 64 bits, sin desempaquetar.
+
+Cada control guarda en disco los conteos, las estadísticas por marcador y
+por muestra y la máscara de marcadores aprobados; los análisis posteriores
+leen la máscara del último control del panel en lugar de recalcularla.
+"""
+import numpy as np
+from scipy import stats
+
+from .models import Genotipo, PanelSNP, ControlCalidad
+from .almacen import BITS_BAJOS, abrir, desempaquetar, directorio, empaquetar, palabras, planos
+
+UMBRALES_POR_DEFECTO = {
+    'call_rate_marcador': 0.90,
+    'maf': 0.01,
+    'hwe_p': 1e-6,
+    'call_rate_muestra': 0.90,
+}
+# Celdas (filas x marcadores) desempaquetadas a la vez
+CELDAS_POR_BLOQUE = 4 * 1024 * 1024
+
+MARCADOR = np.dtype([
+    ('call_rate', '<f4'),
+    ('maf', '<f4'),
+    ('hwe_p', '<f8'),
+])
+MUESTRA = np.dtype([
+    ('animal', '<i8'),
+    ('faltantes', '<i4'),
+    ('heterocigotos', '<i4'),
+    ('call_rate', '<f4'),
+    ('heterocigosidad', '<f4'),
+])
+
+
+def ruta_control(control):
+    return directorio() / 'qc' / f'control_{control.pk}'
+
+
+def cargar(control, nombre):
+    """Array guardado de un control ('conteos', 'marcadores', 'muestras' o 'mascara')"""
+    ruta = ruta_control(control) / f'{nombre}.npy'
+    return np.load(ruta, mmap_mode='r') if ruta.exists() else None
+
+
+def contar(datos, filas, num_marcadores):
+    """
+    Conteos (marcadores, 4) de cada código por marcador y, por fila,
+    número de faltantes y de heterocigotos.
+    """
+    filas = np.asarray(filas, dtype=np.int64)
+    relleno = datos.shape[1] * 4 - num_marcadores
+    conteos = np.zeros(4 * num_marcadores, dtype=np.int64)
+    faltantes = np.zeros(len(filas), dtype=np.int64)
+    heterocigotos = np.zeros(len(filas), dtype=np.int64)
+    desplazamiento = 4 * np.arange(num_marcadores)
+    por_bloque = max(1, CELDAS_POR_BLOQUE // max(num_marcadores, 1))
+
+    for inicio in range(0, len(filas), por_bloque):
+        fin = min(inicio + por_bloque, len(filas))
+        bloque = np.ascontiguousarray(datos[filas[inicio:fin]])
+        alto, bajo = planos(palabras(bloque))
+        faltantes[inicio:fin] = np.bitwise_count(alto & bajo).sum(axis=1, dtype=np.int64) - relleno
+        heterocigotos[inicio:fin] = np.bitwise_count(bajo & ~alto).sum(axis=1, dtype=np.int64)
+
+        codigos = desempaquetar(bloque, 0, num_marcadores)
+        conteos += np.bincount((codigos + desplazamiento).ravel(), minlength=4 * num_marcadores)
+
+    return conteos.reshape(num_marcadores, 4), faltantes, heterocigotos
+
+
+def estadisticas_marcadores(conteos):
+    """Call rate, MAF y p de Hardy-Weinberg por marcador a partir de los conteos"""
+    conteos = np.asarray(conteos, dtype=np.float64)
+    n0, n1, n2, faltan = conteos.T
+    n = n0 + n1 + n2
+    total = n + faltan
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = (n1 + 2 * n2) / (2 * n)
+        q = 1 - p
+        esperados = np.stack([n * q * q, 2 * n * p * q, n * p * p])
+        observados = np.stack([n0, n1, n2])
+        chi2 = np.where(esperados > 0, (observados - esperados) ** 2 / esperados, 0).sum(axis=0)
+
+    resultado = np.zeros(len(conteos), dtype=MARCADOR)
+    resultado['call_rate'] = np.where(total > 0, n / np.maximum(total, 1), 0)
+    resultado['maf'] = np.where(n > 0, np.minimum(p, q), 0)
+    resultado['hwe_p'] = np.where((n > 0) & (p > 0) & (p < 1), stats.chi2.sf(chi2, 1), 1.0)
+    return resultado
+
+
+def aplicar_umbrales(marcadores, umbrales):
+    """Máscara booleana de los marcadores que superan el control"""
+    return (
+        (marcadores['call_rate'] >= umbrales['call_rate_marcador'])
+        & (marcadores['maf'] >= umbrales['maf'])
+        & (marcadores['hwe_p'] >= umbrales['hwe_p'])
+    )
+
+
+def _guardar(panel, lote, version, animales, conteos, faltantes, heterocigotos, umbrales):
+    """Crear el ControlCalidad y escribir sus arrays en disco"""
+    num_marcadores = len(conteos)
+    marcadores = estadisticas_marcadores(conteos)
+    mascara = aplicar_umbrales(marcadores, umbrales)
+
+    muestras = np.zeros(len(animales), dtype=MUESTRA)
+    muestras['animal'] = animales
+    muestras['faltantes'] = faltantes
+    muestras['heterocigotos'] = heterocigotos
+    llamados = num_marcadores - faltantes
+    muestras['call_rate'] = llamados / max(num_marcadores, 1)
+    muestras['heterocigosidad'] = np.divide(
+        heterocigotos, llamados, out=np.zeros(len(animales)), where=llamados > 0
+    )
+    excluidas = muestras['call_rate'] < umbrales['call_rate_muestra']
+
+    control = ControlCalidad.objects.create(
+        panel=panel,
+        lote=lote,
+        version_panel=version,
+        num_muestras=len(animales),
+        num_marcadores=num_marcadores,
+        marcadores_excluidos=int((~mascara).sum()),
+        muestras_excluidas=int(excluidas.sum()),
+        umbrales=umbrales,
+        resumen={
+            'excluidos_call_rate': int((marcadores['call_rate'] < umbrales['call_rate_marcador']).sum()),
+            'excluidos_maf': int((marcadores['maf'] < umbrales['maf']).sum()),
+            'excluidos_hwe': int((marcadores['hwe_p'] < umbrales['hwe_p']).sum()),
+            'call_rate_medio_marcadores': float(marcadores['call_rate'].mean()) if num_marcadores else None,
+            'call_rate_medio_muestras': float(muestras['call_rate'].mean()) if len(animales) else None,
+            'maf_media': float(marcadores['maf'].mean()) if num_marcadores else None,
+        }
+    )
+
+    destino = ruta_control(control)
+    destino.mkdir(parents=True, exist_ok=True)
+    np.save(destino / 'conteos.npy', np.asarray(conteos, dtype=np.int64))
+    np.save(destino / 'marcadores.npy', marcadores)
+    np.save(destino / 'muestras.npy', muestras)
+    np.save(destino / 'mascara.npy', mascara)
+    return control
+
+
+def _umbrales(umbrales):
+    resultado = dict(UMBRALES_POR_DEFECTO)
+    for clave, valor in (umbrales or {}).items():
+        if clave not in resultado:
+            raise ValueError(f'Umbral desconocido: {clave}')
+        resultado[clave] = float(valor)
+    return resultado
+
+
+def controlar(panel, lote=None, umbrales=None):
+    """Control de calidad de las muestras de un lote o, sin lote, de todo el panel"""
+    umbrales = _umbrales(umbrales)
+    panel = PanelSNP.objects.get(pk=panel.pk)
+    genotipos = Genotipo.objects.filter(panel=panel)
+    if lote is not None:
+        genotipos = genotipos.filter(lote=lote)
+    genotipos = list(genotipos.order_by('fila').values_list('animal_id', 'fila'))
+
+    animales = np.array([a for a, _ in genotipos], dtype=np.int64)
+    filas = np.array([f for _, f in genotipos], dtype=np.int64)
+    conteos, faltantes, heterocigotos = contar(abrir(panel), filas, panel.num_marcadores)
+    print(f"🧪 QC {'lote ' + str(lote.id) if lote else 'panel'} {panel.nombre}: {len(filas)} muestras")
+    return _guardar(panel, lote, panel.version, animales, conteos, faltantes, heterocigotos, umbrales)
+
+
+def ultimo_control_panel(panel):
+    return ControlCalidad.objects.filter(panel=panel, lote__isnull=True).order_by('-id').first()
+
+
+def controlar_lote_importado(lote, version_anterior, reescritas=0):
+    """
+    QC de un lote recién importado. Si el lote solo añadió filas nuevas y el
+    último control del panel estaba al día antes de la importación, el control
+    del panel se actualiza sumando los conteos del lote, sin recorrer el panel.
+    Si el lote reescribió `reescritas` filas ya existentes, sus conteos
+    anteriores no se pueden restar y el panel se controla de nuevo entero.
+    """
+    panel = PanelSNP.objects.get(pk=lote.panel_id)
+    anterior = ultimo_control_panel(panel)
+    umbrales = anterior.umbrales if anterior else None
+    control_lote = controlar(panel, lote=lote, umbrales=umbrales)
+
+    if anterior is not None and reescritas:
+        return control_lote, controlar(panel, umbrales=anterior.umbrales)
+    if anterior is None or anterior.version_panel != version_anterior or panel.version != version_anterior + 1:
+        return control_lote, None
+
+    conteos = cargar(anterior, 'conteos')
+    muestras_previas = cargar(anterior, 'muestras')
+    conteos_lote = cargar(control_lote, 'conteos')
+    muestras_lote = cargar(control_lote, 'muestras')
+    if conteos is None or muestras_previas is None:
+        return control_lote, None
+
+    muestras = np.concatenate([muestras_previas, muestras_lote])
+    control_panel = _guardar(
+        panel,
+        None,
+        panel.version,
+        muestras['animal'],
+        conteos + conteos_lote,
+        muestras['faltantes'].astype(np.int64),
+        muestras['heterocigotos'].astype(np.int64),
+        anterior.umbrales
+    )
+    return control_lote, control_panel
+
+
+def obtener_mascara(panel, reescanear=True):
+    """
+    Máscara de marcadores aprobados según el último control del panel, o None
+    si el panel nunca pasó el control. Si el control está desfasado respecto a
+    la versión del panel se repite con los mismos umbrales (o, con
+    reescanear=False, se usa la máscara anterior).
+    """
+    control = ultimo_control_panel(panel)
+    if control is None:
+        return None, None
+    version = PanelSNP.objects.filter(pk=panel.pk).values_list('version', flat=True).first()
+    if control.version_panel != version and reescanear:
+        control = controlar(panel, umbrales=control.umbrales)
+    mascara = cargar(control, 'mascara')
+    return (np.asarray(mascara) if mascara is not None else None), control
+
+
+def muestras_excluidas(control):
+    """Ids de los animales cuya muestra no alcanzó el call rate mínimo en el control"""
+    muestras = cargar(control, 'muestras')
+    if muestras is None:
+        return set()
+    umbral = control.umbrales.get('call_rate_muestra', UMBRALES_POR_DEFECTO['call_rate_muestra'])
+    return {int(animal) for animal in muestras['animal'][muestras['call_rate'] < umbral]}
+
+
+def mascara_palabras(mascara, bytes_por_fila):
+    """Máscara empaquetada como palabras con el bit bajo de cada marcador aprobado a 1"""
+    return palabras(empaquetar(np.where(mascara, 3, 0), bytes_por_fila)) & BITS_BAJOS
+
+
+def calidad_genotipo(genotipo):
+    """Call rate y heterocigosidad de un genotipo, y su situación en el último control del panel"""
+    panel = genotipo.panel
+    _, faltantes, heterocigotos = contar(abrir(panel), [genotipo.fila], panel.num_marcadores)
+    llamados = panel.num_marcadores - int(faltantes[0])
+    resultado = {
+        'animal': genotipo.animal_id,
+        'panel': panel.id,
+        'call_rate': llamados / max(panel.num_marcadores, 1),
+        'heterocigosidad': int(heterocigotos[0]) / llamados if llamados else None,
+        'control': None,
+    }
+
+    control = ultimo_control_panel(panel)
+    if control is not None:
+        umbral = control.umbrales.get('call_rate_muestra', UMBRALES_POR_DEFECTO['call_rate_muestra'])
+        resultado['control'] = {
+            'id': control.id,
+            'vigente': control.version_panel == panel.version,
+            'aprobada': resultado['call_rate'] >= umbral,
+            'marcadores_excluidos_panel': control.marcadores_excluidos,
+        }
+    return resultado
@@ -0,0 +1,101 @@
+from rest_framework import serializers
+from .models import PanelSNP, MarcadorSNP, Genotipo, LoteGenotipos, AnalisisGWAS, ControlCalidad
+from .almacen import texto_a_codigos, guardar_genotipo
+
+
+class MarcadorSNPSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MarcadorSNP
+        exclude = ['panel']
+        read_only_fields = ['indice']
+
+
+class PanelSNPSerializer(serializers.ModelSerializer):
+    # Definición opcional de los marcadores en el mismo orden que los genotipos
+    marcadores = MarcadorSNPSerializer(many=True, write_only=True, required=False)
+
+    class Meta:
+        model = PanelSNP
+        fields = '__all__'
+        read_only_fields = ['num_muestras', 'version', 'fecha_creacion']
+        extra_kwargs = {'num_marcadores': {'required': False}}
+
+    def validate(self, attrs):
+        marcadores = attrs.get('marcadores')
+        if self.instance is not None:
+            if marcadores is not None or attrs.get('num_marcadores', self.instance.num_marcadores) != self.instance.num_marcadores:
+                raise serializers.ValidationError('Los marcadores de un panel no se pueden modificar')
+            return attrs
+
+        if marcadores:
+            if attrs.setdefault('num_marcadores', len(marcadores)) != len(marcadores):
+                raise serializers.ValidationError('num_marcadores no coincide con la lista de marcadores')
+        elif not attrs.get('num_marcadores'):
+            raise serializers.ValidationError('Indica num_marcadores o la lista de marcadores')
+        return attrs
+
+    def create(self, validated_data):
+        marcadores = validated_data.pop('marcadores', None)
+        panel = super().create(validated_data)
+        if marcadores:
+            MarcadorSNP.objects.bulk_create(
+                [MarcadorSNP(panel=panel, indice=indice, **datos) for indice, datos in enumerate(marcadores)],
+                batch_size=1000
+            )
+        return panel
+
+
+class GenotipoSerializer(serializers.ModelSerializer):
+    # Cadena con un carácter por marcador: 0/1/2 copias del alelo B, '-' sin dato
+    genotipos = serializers.CharField(write_only=True)
+
+    class Meta:
+        model = Genotipo
+        fields = '__all__'
+        read_only_fields = ['fila', 'fecha_carga', 'cargado_por']
+        # Subir de nuevo el genotipo de un animal sustituye al anterior
+        validators = []
+
+    def validate(self, attrs):
+        try:
+            codigos = texto_a_codigos(attrs['genotipos'])
+        except ValueError as e:
+            raise serializers.ValidationError({'genotipos': str(e)})
+
+        panel = attrs['panel']
+        if len(codigos) != panel.num_marcadores:
+            raise serializers.ValidationError({
+                'genotipos': f'Se esperaban {panel.num_marcadores} marcadores y llegaron {len(codigos)}'
+            })
+        attrs['codigos'] = codigos
+        return attrs
+
+    def create(self, validated_data):
+        return guardar_genotipo(
+            validated_data['animal'],
+            validated_data['panel'],
+            validated_data['codigos'],
+            usuario=validated_data.get('cargado_por')
+        )
+
+
+class LoteGenotiposSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoteGenotipos
+        fields = '__all__'
+
+
+class AnalisisGWASSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AnalisisGWAS
+        fields = '__all__'
+        read_only_fields = [
+            'estado', 'version_panel', 'num_animales', 'num_marcadores', 'inflacion',
+            'mensaje_error', 'duracion_segundos', 'ejecutado_por', 'fecha_creacion'
+        ]
+
+
+class ControlCalidadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ControlCalidad
+        fields = '__all__'
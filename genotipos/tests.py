@@ -0,0 +1,548 @@
+import os
+import shutil
+import tempfile
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from scipy import stats
+
+from animales.models import Animal
+from usuarios.models import Usuario
+from .models import AnalisisGWAS, ControlCalidad, Genotipo, PanelSNP
+from . import almacen, grm, gwas, paternidad, plink, qc, views
+
+# Código propio (copias del alelo B = A1 del .bim) -> pareja de bits del .bed
+_BITS_PLINK = np.array([3, 2, 0, 1], dtype=np.uint8)
+
+
+def crear_animal(chapeta, sexo='hembra', **campos):
+    datos = {
+        'chapeta': chapeta,
+        'sexo': sexo,
+        'fecha_nacimiento': date(2020, 1, 1),
+        'raza': 'Angus',
+        'estado_reproductivo': 'vacío',
+        'estado_productivo': 'activo',
+    }
+    datos.update(campos)
+    return Animal.objects.create(**datos)
+
+
+def escribir_plink(prefijo, codigos, identificadores):
+    """Escribir un conjunto PLINK SNP-major con los códigos (marcadores, muestras)"""
+    num_marcadores, num_muestras = codigos.shape
+    bytes_por_snp = -(-num_muestras // 4)
+    bits = np.zeros((num_marcadores, bytes_por_snp * 4), dtype=np.uint8)
+    bits[:, :num_muestras] = _BITS_PLINK[codigos]
+    grupos = bits.reshape(num_marcadores, bytes_por_snp, 4) << np.array([0, 2, 4, 6], dtype=np.uint8)
+    bed = np.bitwise_or.reduce(grupos, axis=-1).astype(np.uint8)
+    Path(f'{prefijo}.bed').write_bytes(plink.CABECERA_BED + bed.tobytes())
+    Path(f'{prefijo}.fam').write_text(''.join(f'F {i} 0 0 0 -9\n' for i in identificadores))
+    Path(f'{prefijo}.bim').write_text(''.join(f'1 snp{j} 0 {j * 10} A G\n' for j in range(num_marcadores)))
+
+
+def simular(rng, num_marcadores, num_muestras, faltantes=0.02):
+    """Códigos (marcadores, muestras) en equilibrio de Hardy-Weinberg con algún dato faltante"""
+    p = rng.uniform(0.05, 0.95, num_marcadores)
+    codigos = rng.binomial(2, p[:, None], (num_marcadores, num_muestras)).astype(np.uint8)
+    codigos[rng.random(codigos.shape) < faltantes] = almacen.FALTANTE
+    return codigos
+
+
+def grm_referencia(codigos, mascara):
+    """VanRaden densa sobre (marcadores, animales): faltantes a la media, marcadores fuera de la máscara fuera"""
+    M = codigos.T.astype(np.float64)
+    validos = M != almacen.FALTANTE
+    p = np.where(validos, M, 0).sum(axis=0) / (2 * validos.sum(axis=0))
+    Z = np.where(validos & mascara, M - 2 * p, 0)
+    return Z @ Z.T / (2 * np.sum((p * (1 - p))[mascara]))
+
+
+class GenotiposTestCase(TestCase):
+    """Cada prueba escribe los archivos de los paneles en una carpeta temporal propia"""
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajuste = override_settings(GENOTIPOS_ROOT=self.directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.rng = np.random.default_rng(7)
+
+    def importar(self, codigos, animales, nombre='lote', **opciones):
+        """Importar al panel 'chip' un .bed con los códigos (marcadores, muestras) de esos animales"""
+        prefijo = os.path.join(self.directorio, nombre)
+        escribir_plink(prefijo, codigos, [animal.chapeta for animal in animales])
+        return plink.importar_plink(prefijo, 'chip', **opciones)
+
+    def leer(self, panel, animales):
+        """Códigos (marcadores, animales) guardados en el panel"""
+        filas = dict(Genotipo.objects.filter(panel=panel).values_list('animal_id', 'fila'))
+        return almacen.leer_filas(panel, [filas[animal.pk] for animal in animales]).T
+
+
+class AlmacenTests(GenotiposTestCase):
+    """Empaquetado a 2 bits frente a los códigos originales"""
+
+    def test_disposicion_de_los_bits(self):
+        # Marcador j en los bits 2 * (j % 4) del byte j // 4; el relleno queda sin dato
+        empaquetado = almacen.empaquetar([[1, 2, 3, 0, 2]], 8)
+        self.assertEqual(empaquetado.shape, (1, 8))
+        self.assertEqual(empaquetado[0, 0], 1 | 2 << 2 | 3 << 4 | 0 << 6)
+        self.assertEqual(empaquetado[0, 1], 2 | 3 << 2 | 3 << 4 | 3 << 6)
+        self.assertTrue((empaquetado[0, 2:] == 0xFF).all())
+
+    def test_ida_y_vuelta(self):
+        codigos = self.rng.integers(0, 4, size=(5, 37), dtype=np.uint8)
+        bytes_por_fila = PanelSNP(num_marcadores=37).bytes_por_fila
+        self.assertEqual(bytes_por_fila, 16)
+        empaquetado = almacen.empaquetar(codigos, bytes_por_fila)
+
+        np.testing.assert_array_equal(almacen.desempaquetar(empaquetado, 0, 37), codigos)
+        np.testing.assert_array_equal(almacen.desempaquetar(empaquetado, 5, 30), codigos[:, 5:30])
+        np.testing.assert_array_equal(almacen.desempaquetar(empaquetado[2], 13, 14), codigos[2, 13:14])
+        self.assertTrue((almacen.desempaquetar(empaquetado, 37, 64) == almacen.FALTANTE).all())
+
+        # Planos de bits por palabras de 64 bits: código = 2 * alto + bajo
+        alto, bajo = almacen.planos(almacen.palabras(empaquetado))
+        desplazamientos = 2 * np.arange(32, dtype=np.uint64)
+        reconstruidos = (
+            2 * ((alto[..., None] >> desplazamientos) & np.uint64(1))
+            + ((bajo[..., None] >> desplazamientos) & np.uint64(1))
+        ).reshape(5, -1)
+        np.testing.assert_array_equal(reconstruidos[:, :37], codigos)
+
+    def test_texto(self):
+        codigos = almacen.texto_a_codigos('012-N.3')
+        np.testing.assert_array_equal(codigos, [0, 1, 2, 3, 3, 3, 3])
+        self.assertEqual(almacen.codigos_a_texto(codigos), '012----')
+        with self.assertRaises(ValueError):
+            almacen.texto_a_codigos('01x2')
+
+    def test_guardar_genotipo(self):
+        panel = PanelSNP.objects.create(nombre='chip', num_marcadores=37)
+        vaca, toro = crear_animal('V1'), crear_animal('T1', sexo='macho')
+        codigos = self.rng.integers(0, 4, size=(3, 37), dtype=np.uint8)
+
+        primero = almacen.guardar_genotipo(vaca, panel, codigos[0])
+        segundo = almacen.guardar_genotipo(toro, panel, codigos[1])
+        self.assertEqual((primero.fila, segundo.fila), (0, 1))
+        panel.refresh_from_db()
+        self.assertEqual((panel.num_muestras, panel.version), (2, 2))
+
+        # Sustituir un genotipo reutiliza su fila y cambia la versión del panel
+        sustituido = almacen.guardar_genotipo(vaca, panel, codigos[2])
+        self.assertEqual(sustituido.pk, primero.pk)
+        panel.refresh_from_db()
+        self.assertEqual((panel.num_muestras, panel.version), (2, 3))
+        self.assertEqual(Genotipo.objects.filter(panel=panel).count(), 2)
+
+        np.testing.assert_array_equal(almacen.leer_filas(panel, [0, 1]), codigos[[2, 1]])
+        np.testing.assert_array_equal(
+            almacen.leer_bloque(almacen.abrir(panel), [1, 0], 3, 20), codigos[[1, 2], 3:20]
+        )
+
+
+class PlinkTests(GenotiposTestCase):
+    """Decodificación del .bed frente a los códigos con los que se escribió"""
+
+    def test_decodificar_bloque(self):
+        # 00 -> 2, 01 -> sin dato, 10 -> 1, 11 -> 0
+        crudo = np.array([[0b11100100, 0b11100100]], dtype=np.uint8)
+        np.testing.assert_array_equal(plink.decodificar_bloque(crudo, 6), [[2, 3, 1, 0, 2, 3]])
+
+    def test_importar(self):
+        animales = [crear_animal(f'G{i}') for i in range(9)]
+        codigos = simular(self.rng, 45, 11)
+        # Una muestra sin animal y otra repetida: se guarda solo la primera aparición
+        identificadores = [animal.chapeta for animal in animales] + ['X1', animales[0].chapeta]
+        prefijo = os.path.join(self.directorio, 'lote')
+        escribir_plink(prefijo, codigos, identificadores)
+
+        # Bloques de 4 SNPs: el último queda a medias
+        lote = plink.importar_plink(prefijo, 'chip', memoria_bloque=40)
+        self.assertEqual((lote.num_muestras, lote.num_asignadas, lote.no_encontrados), (11, 9, ['X1']))
+        panel = PanelSNP.objects.get(nombre='chip')
+        self.assertEqual((panel.num_marcadores, panel.num_muestras), (45, 9))
+        self.assertEqual(panel.marcadores.count(), 45)
+        np.testing.assert_array_equal(self.leer(panel, animales), codigos[:, :9])
+
+        # El relleno tras el último marcador queda sin dato
+        filas = list(Genotipo.objects.filter(panel=panel).values_list('fila', flat=True))
+        relleno = almacen.leer_filas(panel, filas, 45, panel.bytes_por_fila * 4)
+        self.assertTrue((relleno == almacen.FALTANTE).all())
+
+    def test_reimportar_reutiliza_las_filas(self):
+        animales = [crear_animal(f'G{i}') for i in range(6)]
+        self.importar(simular(self.rng, 40, 6), animales)
+        panel = PanelSNP.objects.get(nombre='chip')
+        filas = dict(Genotipo.objects.filter(panel=panel).values_list('animal_id', 'fila'))
+
+        nuevos = simular(self.rng, 40, 3)
+        lote = self.importar(nuevos, animales[2:5], nombre='repeticion')
+        panel.refresh_from_db()
+        self.assertEqual(panel.num_muestras, 6)
+        self.assertEqual(dict(Genotipo.objects.filter(panel=panel).values_list('animal_id', 'fila')), filas)
+        self.assertEqual(Genotipo.objects.filter(lote=lote).count(), 3)
+        np.testing.assert_array_equal(self.leer(panel, animales[2:5]), nuevos)
+
+    def test_archivos_no_validos(self):
+        animales = [crear_animal(f'G{i}') for i in range(5)]
+        prefijo = os.path.join(self.directorio, 'lote')
+        escribir_plink(prefijo, simular(self.rng, 12, 5), [animal.chapeta for animal in animales])
+        bed = Path(f'{prefijo}.bed').read_bytes()
+
+        Path(f'{prefijo}.bed').write_bytes(bed[:-1])
+        with self.assertRaises(plink.ErrorPlink):
+            plink.importar_plink(prefijo, 'chip')
+        Path(f'{prefijo}.bed').write_bytes(b'\x6c\x1b\x00' + bed[3:])
+        with self.assertRaises(plink.ErrorPlink):
+            plink.importar_plink(prefijo, 'chip')
+
+        # Un .bim con otros marcadores no entra en un panel existente
+        Path(f'{prefijo}.bed').write_bytes(bed)
+        plink.importar_plink(prefijo, 'chip')
+        Path(f'{prefijo}.bim').write_text(''.join(f'1 otro{j} 0 {j} A G\n' for j in range(12)))
+        with self.assertRaises(plink.ErrorPlink):
+            plink.importar_plink(prefijo, 'chip')
+
+
+class GrmTests(GenotiposTestCase):
+    """GRM por bloques y trozos de marcadores frente al cálculo denso"""
+
+    def setUp(self):
+        super().setUp()
+        self.animales = [crear_animal(f'G{i}') for i in range(23)]
+
+    def test_frente_a_referencia(self):
+        codigos = simular(self.rng, 70, 23)
+        self.importar(codigos, self.animales)
+        panel = PanelSNP.objects.get(nombre='chip')
+
+        # Bloques de 5 animales (el último incompleto) y trozos de 16 marcadores
+        info = grm.calcular_grm(panel, tamano_bloque=5, marcadores_por_trozo=16)
+        self.assertEqual((info['num_animales'], info['num_marcadores']), (23, 70))
+        animales, matriz = grm.cargar_grm(panel)
+        self.assertEqual(list(animales), [animal.pk for animal in self.animales])
+        np.testing.assert_allclose(matriz, grm_referencia(codigos, np.ones(70, dtype=bool)), atol=1e-5)
+
+        pareja, valores = grm.submatriz(animales, matriz, [self.animales[7].pk, 999999, self.animales[2].pk])
+        self.assertEqual(pareja, [self.animales[7].pk, self.animales[2].pk])
+        self.assertEqual(valores[0, 1], matriz[7, 2])
+
+    def test_control_de_calidad(self):
+        codigos = simular(self.rng, 70, 23, faltantes=0)
+        codigos[10] = 0
+        codigos[20, :12] = almacen.FALTANTE
+        codigos[:, 4][self.rng.random(70) < 0.6] = almacen.FALTANTE
+        self.importar(codigos, self.animales)
+        panel = PanelSNP.objects.get(nombre='chip')
+        control = qc.controlar(panel)
+        mascara = np.asarray(qc.cargar(control, 'mascara'))
+        self.assertFalse(mascara[10] or mascara[20])
+        self.assertEqual(qc.muestras_excluidas(control), {self.animales[4].pk})
+
+        # Ni la muestra excluida ni los marcadores rechazados entran en la matriz
+        info = grm.calcular_grm(panel, tamano_bloque=8, marcadores_por_trozo=32)
+        self.assertEqual((info['muestras_excluidas'], info['num_marcadores']), (1, int(mascara.sum())))
+        animales, matriz = grm.cargar_grm(panel)
+        aprobados = [i for i in range(23) if i != 4]
+        self.assertEqual(list(animales), [self.animales[i].pk for i in aprobados])
+        np.testing.assert_allclose(matriz, grm_referencia(codigos[:, aprobados], mascara), atol=1e-5)
+
+        # Un control nuevo deja la caché desactualizada
+        qc.controlar(panel, umbrales={'maf': 0.2})
+        self.assertIsNone(grm.cargar_grm(panel))
+
+
+class GrmApiTests(GenotiposTestCase):
+    def setUp(self):
+        super().setUp()
+        self.usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+        self.animales = [crear_animal(f'G{i}') for i in range(12)]
+        self.importar(simular(self.rng, 40, 12), self.animales)
+        self.panel = PanelSNP.objects.get(nombre='chip')
+        self.url = f'/api/genotipos/paneles/{self.panel.pk}/grm/'
+
+    def test_calcular_y_consultar(self):
+        respuesta = self.cliente.post(self.url, {}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['num_animales'], 12)
+
+        _, matriz = grm.cargar_grm(self.panel)
+        respuesta = self.cliente.get(self.url, {'animal_a': self.animales[1].pk, 'animal_b': self.animales[3].pk})
+        self.assertAlmostEqual(respuesta.json()['parentesco_genomico'], float(matriz[1, 3]), places=6)
+
+    @override_settings(GENOTIPOS_PROCESOS_PETICION=2)
+    def test_procesos_acotados(self):
+        for nucleos, esperados in ((8, 2), (1, 1)):
+            with mock.patch.object(views.os, 'cpu_count', return_value=nucleos), \
+                    mock.patch.object(views, 'calcular_grm', return_value={'num_animales': 12}) as calcular:
+                respuesta = self.cliente.post(self.url, {'procesos': 64}, format='json')
+            self.assertEqual(respuesta.status_code, 201)
+            self.assertEqual(calcular.call_args.kwargs['procesos'], esperados)
+        self.assertEqual(self.cliente.post(self.url, {'procesos': 'muchos'}, format='json').status_code, 400)
+
+    def test_panel_demasiado_grande(self):
+        with mock.patch.object(views, 'MAXIMO_ANIMALES_GRM_SINCRONA', 10):
+            respuesta = self.cliente.post(self.url, {}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('manage.py calcular_grm', respuesta.json()['error'])
+        self.assertIsNone(grm.cargar_grm(self.panel))
+
+
+class PaternidadTests(GenotiposTestCase):
+    """Homocigotos opuestos por palabras de 64 bits frente al conteo marcador a marcador"""
+
+    def test_frente_a_conteo_directo(self):
+        num_marcadores = 150
+        bytes_por_fila = PanelSNP(num_marcadores=num_marcadores).bytes_por_fila
+        cria = simular(self.rng, num_marcadores, 1, faltantes=0.1)[:, 0]
+        candidatos = simular(self.rng, num_marcadores, 6, faltantes=0.1).T
+        mascara = self.rng.random(num_marcadores) < 0.8
+
+        opuestos, comparados = paternidad.homocigotos_opuestos(
+            almacen.palabras(almacen.empaquetar(cria, bytes_por_fila)),
+            almacen.palabras(almacen.empaquetar(candidatos, bytes_por_fila)),
+            qc.mascara_palabras(mascara, bytes_por_fila)
+        )
+        con_dato = (cria != almacen.FALTANTE) & (candidatos != almacen.FALTANTE) & mascara
+        contrarios = ((cria == 0) & (candidatos == 2)) | ((cria == 2) & (candidatos == 0))
+        np.testing.assert_array_equal(comparados, con_dato.sum(axis=1))
+        np.testing.assert_array_equal(opuestos, (contrarios & con_dato).sum(axis=1))
+        self.assertTrue(opuestos.any())
+
+    def test_verificar_y_buscar_padre(self):
+        num_marcadores = 400
+        padre = crear_animal('P1', sexo='macho', fecha_nacimiento=date(2018, 1, 1))
+        otros = [crear_animal(f'T{i}', sexo='macho', fecha_nacimiento=date(2018, 1, 1)) for i in range(3)]
+        madre = crear_animal('M1', fecha_nacimiento=date(2018, 1, 1))
+        cria = crear_animal('C1', fecha_nacimiento=date(2022, 1, 1))
+        joven = crear_animal('J1', sexo='macho', fecha_nacimiento=date(2023, 1, 1))
+        sin_genotipo = crear_animal('S1', sexo='macho', fecha_nacimiento=date(2018, 1, 1))
+
+        # La cría hereda un alelo B de cada progenitor con probabilidad código / 2
+        progenitores = simular(self.rng, num_marcadores, 6, faltantes=0)
+        heredados = self.rng.random((num_marcadores, 2)) < progenitores[:, :2] / 2
+        codigos = np.column_stack([progenitores, heredados.sum(axis=1)]).astype(np.uint8)
+        animales = [padre, madre, *otros, joven, cria]
+        self.importar(codigos, animales)
+        genotipo = Genotipo.objects.get(animal=cria)
+
+        resultados = paternidad.verificar(genotipo, [padre.pk, otros[0].pk, sin_genotipo.pk])
+        self.assertEqual(
+            [(r['candidato'], r['dictamen']) for r in resultados],
+            [(padre.pk, 'compatible'), (otros[0].pk, 'excluido'), (sin_genotipo.pk, 'sin_genotipo')]
+        )
+        self.assertEqual(resultados[0]['homocigotos_opuestos'], 0)
+        self.assertEqual(resultados[0]['marcadores_comparados'], num_marcadores)
+        contrarios = ((codigos[:, 6] == 0) & (codigos[:, 2] == 2)) | ((codigos[:, 6] == 2) & (codigos[:, 2] == 0))
+        self.assertEqual(resultados[1]['homocigotos_opuestos'], int(contrarios.sum()))
+
+        # Solo machos nacidos antes que la cría; el padre verdadero, primero
+        total, mejores = paternidad.buscar_padre(genotipo)
+        self.assertEqual(total, 4)
+        self.assertEqual(mejores[0]['candidato'], padre.pk)
+        self.assertNotIn(joven.pk, [r['candidato'] for r in mejores])
+
+
+class GwasTests(GenotiposTestCase):
+    """Regresiones en lote frente a mínimos cuadrados marcador a marcador"""
+
+    def setUp(self):
+        super().setUp()
+        self.animales = [crear_animal(f'G{i}') for i in range(30)]
+        self.pesar(self.rng.normal(400, 40, 30))
+
+    def pesar(self, pesos):
+        self.pesos = pesos
+        for animal, peso in zip(self.animales, pesos):
+            Animal.objects.filter(pk=animal.pk).update(peso_actual=peso)
+
+    def test_frente_a_lstsq(self):
+        codigos = simular(self.rng, 50, 30, faltantes=0.1)
+        codigos[7] = 1
+        codigos[8, :28] = almacen.FALTANTE
+        # Un marcador con efecto real
+        self.pesar(self.pesos + 30 * np.where(codigos[3] == almacen.FALTANTE, 0, codigos[3]))
+        self.importar(codigos, self.animales)
+        panel = PanelSNP.objects.get(nombre='chip')
+
+        analisis = gwas.ejecutar(panel, 'peso', marcadores_por_trozo=12)
+        self.assertEqual((analisis.estado, analisis.num_animales), ('completado', 30))
+        resultados = gwas.cargar_resultados(analisis)
+
+        for j in range(50):
+            con_dato = codigos[j] != almacen.FALTANTE
+            g, y = codigos[j][con_dato].astype(np.float64), self.pesos[con_dato]
+            self.assertEqual(resultados['n'][j], con_dato.sum())
+            self.assertAlmostEqual(float(resultados['frecuencia'][j]), g.mean() / 2, places=6)
+            if j in (7, 8):
+                # Sin variación o con menos de 3 animales: sin resultado
+                self.assertTrue(np.isnan(resultados['efecto'][j]))
+                continue
+            X = np.column_stack([np.ones(len(g)), g])
+            (_, efecto), _, _, _ = np.linalg.lstsq(X, y, rcond=None)
+            regresion = stats.linregress(g, y)
+            np.testing.assert_allclose(resultados['efecto'][j], efecto, rtol=1e-5)
+            np.testing.assert_allclose(resultados['error'][j], regresion.stderr, rtol=1e-5)
+            np.testing.assert_allclose(resultados['p'][j], regresion.pvalue, rtol=1e-6)
+        self.assertEqual(int(np.nanargmin(resultados['p'])), 3)
+
+    def test_mascara_y_minimo_de_animales(self):
+        codigos = simular(self.rng, 40, 30)
+        codigos[5] = 0
+        self.importar(codigos, self.animales)
+        panel = PanelSNP.objects.get(nombre='chip')
+        qc.controlar(panel)
+
+        analisis = gwas.ejecutar(panel, 'peso')
+        resultados = gwas.cargar_resultados(analisis)
+        self.assertTrue(np.isnan(resultados['p'][5]))
+        self.assertEqual(analisis.num_marcadores, 39)
+
+        Animal.objects.filter(pk__in=[animal.pk for animal in self.animales[9:]]).update(peso_actual=None)
+        with self.assertRaises(ValueError):
+            gwas.ejecutar(panel, 'peso')
+        self.assertEqual(AnalisisGWAS.objects.filter(estado='error').count(), 1)
+
+
+class GwasApiTests(GenotiposTestCase):
+    def setUp(self):
+        super().setUp()
+        usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(usuario)
+        animales = [crear_animal(f'G{i}', peso_actual=400 + i) for i in range(12)]
+        self.importar(simular(self.rng, 40, 12), animales)
+        self.panel = PanelSNP.objects.get(nombre='chip')
+
+    @override_settings(GENOTIPOS_PROCESOS_PETICION=2)
+    def test_ejecutar(self):
+        with mock.patch.object(views.os, 'cpu_count', return_value=8), \
+                mock.patch.object(views, 'ejecutar_gwas', wraps=gwas.ejecutar) as ejecutar:
+            respuesta = self.cliente.post(
+                '/api/genotipos/gwas/', {'panel': self.panel.pk, 'caracter': 'peso', 'procesos': 16}, format='json'
+            )
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(ejecutar.call_args.kwargs['procesos'], 2)
+        self.assertEqual(respuesta.json()['num_animales'], 12)
+
+    def test_panel_demasiado_grande(self):
+        # 12 animales x 40 marcadores
+        with mock.patch.object(views, 'MAXIMO_GENOTIPOS_GWAS_SINCRONO', 479):
+            respuesta = self.cliente.post(
+                '/api/genotipos/gwas/', {'panel': self.panel.pk, 'caracter': 'peso'}, format='json'
+            )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('manage.py ejecutar_gwas peso --panel "chip"', respuesta.json()['error'])
+        self.assertFalse(AnalisisGWAS.objects.exists())
+
+
+class ControlCalidadTests(GenotiposTestCase):
+    """Conteos y estadísticas del control frente al recuento directo, y control incremental frente a reescaneo"""
+
+    def setUp(self):
+        super().setUp()
+        self.animales = [crear_animal(f'G{i}') for i in range(40)]
+
+    def assertControlCompleto(self, panel, control):
+        completo = qc.controlar(panel, umbrales=control.umbrales)
+        self.assertEqual(control.num_muestras, completo.num_muestras)
+        self.assertEqual(control.version_panel, PanelSNP.objects.get(pk=panel.pk).version)
+        for nombre in ('conteos', 'marcadores', 'muestras', 'mascara'):
+            np.testing.assert_array_equal(qc.cargar(control, nombre), qc.cargar(completo, nombre))
+
+    def test_frente_a_referencia(self):
+        codigos = simular(self.rng, 200, 40)
+        codigos[10] = 0
+        codigos[20, :20] = almacen.FALTANTE
+        codigos[30] = 1
+        codigos[:, 5][self.rng.random(200) < 0.5] = almacen.FALTANTE
+        self.importar(codigos, self.animales)
+        panel = PanelSNP.objects.get(nombre='chip')
+        control = qc.controlar(panel)
+
+        conteos = np.stack([(codigos == codigo).sum(axis=1) for codigo in range(4)], axis=1)
+        np.testing.assert_array_equal(qc.cargar(control, 'conteos'), conteos)
+
+        marcadores = qc.cargar(control, 'marcadores')
+        for j in range(200):
+            g = codigos[j][codigos[j] != almacen.FALTANTE]
+            n = len(g)
+            p = g.sum() / (2 * n)
+            observados = np.array([(g == 0).sum(), (g == 1).sum(), (g == 2).sum()])
+            esperados = n * np.array([(1 - p) ** 2, 2 * p * (1 - p), p ** 2])
+            chi2 = sum((o - e) ** 2 / e for o, e in zip(observados, esperados) if e > 0)
+            self.assertAlmostEqual(float(marcadores['call_rate'][j]), n / 40, places=6)
+            self.assertAlmostEqual(float(marcadores['maf'][j]), min(p, 1 - p), places=6)
+            self.assertAlmostEqual(
+                float(marcadores['hwe_p'][j]), stats.chi2.sf(chi2, 1) if 0 < p < 1 else 1.0, places=6
+            )
+
+        muestras = qc.cargar(control, 'muestras')
+        self.assertEqual(list(muestras['animal']), [animal.pk for animal in self.animales])
+        np.testing.assert_array_equal(muestras['faltantes'], (codigos == almacen.FALTANTE).sum(axis=0))
+        np.testing.assert_array_equal(muestras['heterocigotos'], (codigos == 1).sum(axis=0))
+        self.assertEqual(qc.muestras_excluidas(control), {self.animales[5].pk})
+
+        # Monomórfico, call rate bajo y fuera de Hardy-Weinberg
+        mascara = qc.cargar(control, 'mascara')
+        self.assertFalse(mascara[10] or mascara[20] or mascara[30])
+        self.assertEqual(control.marcadores_excluidos, int((~mascara).sum()))
+        np.testing.assert_array_equal(mascara, qc.aplicar_umbrales(marcadores, control.umbrales))
+
+    def test_lote_nuevo_suma_al_control_del_panel(self):
+        self.importar(simular(self.rng, 60, 25), self.animales[:25])
+        panel = PanelSNP.objects.get(nombre='chip')
+        qc.controlar(panel, umbrales={'maf': 0.05})
+
+        lote = self.importar(simular(self.rng, 60, 15), self.animales[25:], nombre='nuevos')
+        incremental = qc.ultimo_control_panel(panel)
+        self.assertEqual(ControlCalidad.objects.filter(lote=lote).count(), 1)
+        self.assertEqual((incremental.num_muestras, incremental.umbrales['maf']), (40, 0.05))
+        self.assertControlCompleto(panel, incremental)
+
+    def test_reimportacion_no_cuenta_dos_veces(self):
+        self.importar(simular(self.rng, 60, 25), self.animales[:25])
+        panel = PanelSNP.objects.get(nombre='chip')
+        qc.controlar(panel)
+
+        # Diez animales ya genotipados con genotipos nuevos y cinco animales nuevos
+        codigos = simular(self.rng, 60, 15)
+        self.importar(codigos, self.animales[15:30], nombre='repeticion')
+        control = qc.ultimo_control_panel(panel)
+        self.assertEqual(control.num_muestras, 30)
+        self.assertControlCompleto(panel, control)
+        conteos = qc.cargar(control, 'conteos')
+        self.assertEqual(int(conteos[0].sum()), 30)
+        np.testing.assert_array_equal(
+            conteos[:, 1], (self.leer(panel, self.animales[:30]) == 1).sum(axis=1)
+        )
+
+    def test_api(self):
+        usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        cliente = APIClient()
+        cliente.force_authenticate(usuario)
+        self.importar(simular(self.rng, 60, 40), self.animales)
+        panel = PanelSNP.objects.get(nombre='chip')
+
+        respuesta = cliente.post(f'/api/genotipos/paneles/{panel.pk}/calidad/', {'umbrales': {'maf': 0.2}}, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        control = ControlCalidad.objects.get(pk=respuesta.json()['id'])
+        marcadores = qc.cargar(control, 'marcadores')
+        self.assertEqual(respuesta.json()['marcadores_excluidos'], int((marcadores['maf'] < 0.2).sum()))
+        respuesta = cliente.post(f'/api/genotipos/paneles/{panel.pk}/calidad/', {'umbrales': {'otro': 1}}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
@@ -0,0 +1,14 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import PanelSNPViewSet, GenotipoViewSet, LoteGenotiposViewSet, AnalisisGWASViewSet, ControlCalidadViewSet
+
+router = DefaultRouter()
+router.register(r'paneles', PanelSNPViewSet, basename='panel-snp')
+router.register(r'lotes', LoteGenotiposViewSet, basename='lote-genotipos')
+router.register(r'gwas', AnalisisGWASViewSet, basename='analisis-gwas')
+router.register(r'calidad', ControlCalidadViewSet, basename='control-calidad')
+router.register(r'', GenotipoViewSet, basename='genotipo')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
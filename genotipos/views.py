@@ -0,0 +1,659 @@
+import os
+import shutil
+import tempfile
+import traceback
+import numpy as np
+from django.conf import settings
+from rest_framework import viewsets, mixins, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
+from django_filters.rest_framework import DjangoFilterBackend
+from .models import PanelSNP, MarcadorSNP, Genotipo, LoteGenotipos, AnalisisGWAS, ControlCalidad
+from .serializers import (
+    PanelSNPSerializer,
+    MarcadorSNPSerializer,
+    GenotipoSerializer,
+    LoteGenotiposSerializer,
+    AnalisisGWASSerializer,
+    ControlCalidadSerializer,
+)
+from .almacen import leer_filas, codigos_a_texto, ruta_panel, directorio, marcar_modificado
+from .plink import importar_plink as importar_archivos_plink, ErrorPlink
+from .grm import calcular_grm, cargar_grm, submatriz, ruta_cache
+from .gwas import ejecutar as ejecutar_gwas, cargar_resultados, eliminar_resultados
+from .qc import controlar, cargar as cargar_control, calidad_genotipo, ultimo_control_panel, ruta_control
+from animales.models import Animal
+from grupos.models import Grupo
+from utils.permissions import IsAdminUser
+from utils.campos import CamposParcialesMixin
+from logs.utils import registrar_log
+
+# Máximo de marcadores por respuesta al pedir rangos
+MAXIMO_MARCADORES_RANGO = 100000
+# Máximo de animales en una submatriz de la GRM devuelta por la API
+MAXIMO_ANIMALES_GRM = 2000
+# Máximo de animales genotipados de un panel para calcular su GRM dentro de
+# la petición; para más, manage.py calcular_grm (la matriz crece con n²)
+MAXIMO_ANIMALES_GRM_SINCRONA = 5000
+# Máximo de genotipos (animales genotipados x marcadores) de un panel para
+# ejecutar un GWAS dentro de la petición; para más, manage.py ejecutar_gwas
+MAXIMO_GENOTIPOS_GWAS_SINCRONO = 250_000_000
+
+
+def _procesos(request):
+    """
+    Procesos pedidos en el cuerpo, entre 1 y los que puede lanzar una petición
+    (núcleos disponibles y GENOTIPOS_PROCESOS_PETICION). ValueError si no es un entero.
+    """
+    procesos = int(request.data.get('procesos', 1))
+    maximo = min(os.cpu_count() or 1, getattr(settings, 'GENOTIPOS_PROCESOS_PETICION', 1))
+    return min(max(1, procesos), maximo)
+
+
+def leer_rango(request, total):
+    """Leer ?inicio=&fin= y validarlos contra el número de marcadores"""
+    try:
+        inicio = int(request.query_params.get('inicio', 0))
+        fin = int(request.query_params.get('fin', min(total, inicio + MAXIMO_MARCADORES_RANGO)))
+    except (TypeError, ValueError):
+        return None, 'inicio y fin deben ser enteros'
+
+    if inicio < 0 or fin > total or inicio >= fin:
+        return None, f'Rango no válido: debe cumplirse 0 <= inicio < fin <= {total}'
+    if fin - inicio > MAXIMO_MARCADORES_RANGO:
+        return None, f'Máximo {MAXIMO_MARCADORES_RANGO} marcadores por petición'
+    return (inicio, fin), None
+
+
+class PanelSNPViewSet(CamposParcialesMixin, viewsets.ModelViewSet):
+    queryset = PanelSNP.objects.order_by('id')
+    serializer_class = PanelSNPSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['nombre', 'num_marcadores']
+
+    def get_permissions(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return [permissions.IsAuthenticated()]
+        return [IsAdminUser()]
+
+    def perform_create(self, serializer):
+        panel = serializer.save()
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='crear',
+            entidad_afectada='panel_snp',
+            entidad_id=panel.id,
+            observaciones=f'Panel {panel.nombre} creado con {panel.num_marcadores} marcadores'
+        )
+
+    def perform_destroy(self, instance):
+        panel_id = instance.id
+        ruta = ruta_panel(instance)
+        cache_grm = ruta_cache(instance).parent
+        for analisis in instance.analisis_gwas.all():
+            eliminar_resultados(analisis)
+        for control in instance.controles_calidad.all():
+            shutil.rmtree(ruta_control(control), ignore_errors=True)
+        instance.delete()
+        if ruta.exists():
+            ruta.unlink()
+        if cache_grm.exists():
+            shutil.rmtree(cache_grm, ignore_errors=True)
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='eliminar',
+            entidad_afectada='panel_snp',
+            entidad_id=panel_id,
+            observaciones='Panel SNP y sus genotipos eliminados'
+        )
+
+    @action(detail=True, methods=['get'])
+    def marcadores(self, request, pk=None):
+        """Definición de los marcadores del panel en un rango de índices"""
+        panel = self.get_object()
+        rango, error = leer_rango(request, panel.num_marcadores)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        marcadores = MarcadorSNP.objects.filter(
+            panel=panel,
+            indice__gte=rango[0],
+            indice__lt=rango[1]
+        ).order_by('indice')
+        return Response({
+            'inicio': rango[0],
+            'fin': rango[1],
+            'marcadores': MarcadorSNPSerializer(marcadores, many=True).data,
+        })
+
+    @action(detail=True, methods=['get', 'post'], permission_classes=[permissions.IsAuthenticated])
+    def calidad(self, request, pk=None):
+        """
+        GET: último control de calidad del panel completo. POST: repetirlo
+        (admin) con umbrales opcionales en "umbrales".
+        """
+        try:
+            panel = self.get_object()
+
+            if request.method == 'POST':
+                if not IsAdminUser().has_permission(request, self):
+                    return Response(
+                        {'error': 'Solo los administradores pueden lanzar el control de calidad'},
+                        status=status.HTTP_403_FORBIDDEN
+                    )
+                umbrales = request.data.get('umbrales') or {}
+                if not isinstance(umbrales, dict):
+                    return Response({'error': 'umbrales debe ser un objeto'}, status=status.HTTP_400_BAD_REQUEST)
+                control = controlar(panel, umbrales=umbrales)
+                registrar_log(
+                    usuario=request.user,
+                    tipo_accion='control_calidad',
+                    entidad_afectada='panel_snp',
+                    entidad_id=panel.id,
+                    observaciones=f'QC: {control.marcadores_excluidos} SNPs y {control.muestras_excluidas} muestras excluidos'
+                )
+                return Response(ControlCalidadSerializer(control).data, status=status.HTTP_201_CREATED)
+
+            control = ultimo_control_panel(panel)
+            if control is None:
+                return Response(
+                    {'error': 'El panel no tiene control de calidad'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            datos = ControlCalidadSerializer(control).data
+            datos['vigente'] = control.version_panel == panel.version
+            return Response(datos)
+
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error en el control de calidad: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error en el control de calidad: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=True, methods=['get', 'post'], permission_classes=[permissions.IsAuthenticated])
+    def grm(self, request, pk=None):
+        """
+        GET: consultar la GRM cacheada por pareja (?animal_a=&animal_b=) o por
+        subconjunto (?animales=1,2,3 o ?grupo=ID). POST: recalcularla (admin).
+        """
+        try:
+            panel = self.get_object()
+
+            if request.method == 'POST':
+                if not IsAdminUser().has_permission(request, self):
+                    return Response(
+                        {'error': 'Solo los administradores pueden calcular la GRM'},
+                        status=status.HTTP_403_FORBIDDEN
+                    )
+                try:
+                    procesos = _procesos(request)
+                except (TypeError, ValueError):
+                    return Response({'error': 'procesos debe ser un entero'}, status=status.HTTP_400_BAD_REQUEST)
+                genotipados = Genotipo.objects.filter(panel=panel).count()
+                if genotipados > MAXIMO_ANIMALES_GRM_SINCRONA:
+                    return Response(
+                        {'error': (
+                            f'El panel tiene {genotipados} animales genotipados (máximo {MAXIMO_ANIMALES_GRM_SINCRONA} '
+                            f'por petición); calcula la GRM con manage.py calcular_grm --panel "{panel.nombre}"'
+                        )},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                info = calcular_grm(panel, procesos=procesos)
+                registrar_log(
+                    usuario=request.user,
+                    tipo_accion='calcular_grm',
+                    entidad_afectada='panel_snp',
+                    entidad_id=panel.id,
+                    observaciones=f'GRM calculada para {info["num_animales"]} animales'
+                )
+                return Response(info, status=status.HTTP_201_CREATED)
+
+            cargada = cargar_grm(panel)
+            if cargada is None:
+                return Response(
+                    {'error': 'La GRM de este panel no está calculada o está desactualizada'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            animales, matriz = cargada
+
+            params = request.query_params
+            if 'animal_a' in params or 'animal_b' in params:
+                try:
+                    pareja = [int(params['animal_a']), int(params['animal_b'])]
+                except (KeyError, ValueError):
+                    return Response(
+                        {'error': 'animal_a y animal_b deben ser ids de animal'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                encontrados, valores = submatriz(animales, matriz, pareja)
+                if len(encontrados) != 2:
+                    faltan = [a for a in pareja if a not in encontrados]
+                    return Response(
+                        {'error': f'Animales sin genotipo en el panel: {faltan}'},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+                return Response({
+                    'animal_a': pareja[0],
+                    'animal_b': pareja[1],
+                    'parentesco_genomico': float(valores[0, 1]),
+                })
+
+            if 'grupo' in params:
+                grupo = Grupo.objects.filter(pk=params['grupo']).first()
+                if grupo is None:
+                    return Response({'error': 'Grupo no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+                pedidos = list(grupo.animal_ids.order_by('id').values_list('id', flat=True))
+            elif 'animales' in params:
+                try:
+                    pedidos = [int(a) for a in params['animales'].split(',') if a.strip()]
+                except ValueError:
+                    return Response(
+                        {'error': 'animales debe ser una lista de ids separados por comas'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            else:
+                return Response(
+                    {'error': 'Indica animal_a y animal_b, animales o grupo'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if len(pedidos) > MAXIMO_ANIMALES_GRM:
+                return Response(
+                    {'error': f'Máximo {MAXIMO_ANIMALES_GRM} animales por consulta'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            encontrados, valores = submatriz(animales, matriz, pedidos)
+            genotipados = set(encontrados)
+            return Response({
+                'animales': encontrados,
+                'sin_genotipo': [a for a in pedidos if a not in genotipados],
+                'matriz': valores.astype(float).round(6).tolist(),
+            })
+
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error en la GRM: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error en la GRM: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class GenotipoViewSet(CamposParcialesMixin,
+                      mixins.CreateModelMixin,
+                      mixins.RetrieveModelMixin,
+                      mixins.ListModelMixin,
+                      mixins.DestroyModelMixin,
+                      viewsets.GenericViewSet):
+    queryset = Genotipo.objects.select_related('panel').order_by('id')
+    serializer_class = GenotipoSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['animal', 'panel']
+
+    def get_permissions(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return [permissions.IsAuthenticated()]
+        return [IsAdminUser()]
+
+    def perform_create(self, serializer):
+        genotipo = serializer.save(cargado_por=self.request.user)
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='subir_genotipo',
+            entidad_afectada='animal',
+            entidad_id=genotipo.animal_id,
+            observaciones=f'Genotipo cargado en panel {genotipo.panel.nombre}'
+        )
+
+    def perform_destroy(self, instance):
+        animal_id = instance.animal_id
+        panel_id = instance.panel_id
+        instance.delete()
+        # La GRM y demás resultados por versión dejan de incluir a este animal
+        marcar_modificado(panel_id)
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='eliminar_genotipo',
+            entidad_afectada='animal',
+            entidad_id=animal_id,
+            observaciones='Genotipo eliminado'
+        )
+
+    @action(detail=True, methods=['get'])
+    def marcadores(self, request, pk=None):
+        """Genotipo del animal para un rango de marcadores (?inicio=&fin=)"""
+        try:
+            genotipo = self.get_object()
+            panel = genotipo.panel
+            rango, error = leer_rango(request, panel.num_marcadores)
+            if error:
+                return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+            codigos = leer_filas(panel, [genotipo.fila], rango[0], rango[1])[0]
+            return Response({
+                'animal': genotipo.animal_id,
+                'panel': panel.id,
+                'inicio': rango[0],
+                'fin': rango[1],
+                'genotipos': codigos_a_texto(codigos),
+            })
+
+        except Exception as e:
+            print(f"❌ Error leyendo genotipo: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error leyendo genotipo: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=True, methods=['get'])
+    def calidad(self, request, pk=None):
+        """Call rate y heterocigosidad del genotipo y su situación en el último control del panel"""
+        try:
+            return Response(calidad_genotipo(self.get_object()))
+
+        except Exception as e:
+            print(f"❌ Error calculando calidad del genotipo: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error calculando calidad del genotipo: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['post'], url_path='importar-plink')
+    def importar_plink(self, request):
+        """Importar un conjunto PLINK subido como archivos 'bed', 'bim' y 'fam'"""
+        try:
+            faltan = [nombre for nombre in ('bed', 'bim', 'fam') if nombre not in request.FILES]
+            if faltan:
+                return Response(
+                    {'error': f'Faltan archivos: {", ".join(faltan)}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            nombre_panel = request.data.get('panel')
+            if not nombre_panel:
+                return Response(
+                    {'error': 'Indica el nombre del panel en "panel"'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Copiar las subidas a disco por trozos y leerlas desde allí con memmap
+            directorio().mkdir(parents=True, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=directorio()) as temporal:
+                for extension in ('bed', 'bim', 'fam'):
+                    with open(f'{temporal}/datos.{extension}', 'wb') as destino:
+                        for trozo in request.FILES[extension].chunks():
+                            destino.write(trozo)
+
+                lote = importar_archivos_plink(
+                    f'{temporal}/datos',
+                    nombre_panel,
+                    usuario=request.user,
+                    origen=request.FILES['bed'].name
+                )
+
+            registrar_log(
+                usuario=request.user,
+                tipo_accion='importar_genotipos',
+                entidad_afectada='lote_genotipos',
+                entidad_id=lote.id,
+                observaciones=f'PLINK {lote.origen}: {lote.num_asignadas}/{lote.num_muestras} muestras asignadas'
+            )
+            return Response(LoteGenotiposSerializer(lote).data, status=status.HTTP_201_CREATED)
+
+        except ErrorPlink as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error importando PLINK: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error importando PLINK: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class LoteGenotiposViewSet(CamposParcialesMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = LoteGenotipos.objects.order_by('-fecha_carga')
+    serializer_class = LoteGenotiposSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['panel', 'cargado_por']
+
+    @action(detail=True, methods=['get'])
+    def calidad(self, request, pk=None):
+        """Último control de calidad del lote"""
+        lote = self.get_object()
+        control = lote.controles_calidad.order_by('-id').first()
+        if control is None:
+            return Response({'error': 'El lote no tiene control de calidad'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ControlCalidadSerializer(control).data)
+
+
+class PaginacionResultados(PageNumberPagination):
+    page_size = 1000
+    page_query_param = 'pagina'
+    page_size_query_param = 'tamano'
+    max_page_size = 10000
+
+
+class FilasPaginables:
+    """Secuencia paginable sobre un array en disco: solo se convierten a dict las filas de la página"""
+
+    def __init__(self, indices, convertir):
+        self.indices = indices
+        self.convertir = convertir
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, rebanada):
+        return self.convertir(self.indices[rebanada])
+
+
+def _decimal(valor):
+    return None if np.isnan(valor) else float(valor)
+
+
+def _definiciones_marcadores(panel, indices):
+    """Nombre, cromosoma y posición de los marcadores indicados"""
+    return {
+        m['indice']: m
+        for m in panel.marcadores.filter(indice__in=[int(i) for i in indices]).values(
+            'indice', 'nombre', 'cromosoma', 'posicion'
+        )
+    }
+
+
+def _paginar(vista, request, filas):
+    paginador = PaginacionResultados()
+    pagina = paginador.paginate_queryset(filas, request, view=vista)
+    return paginador.get_paginated_response(pagina)
+
+
+class AnalisisGWASViewSet(CamposParcialesMixin,
+                          mixins.CreateModelMixin,
+                          mixins.RetrieveModelMixin,
+                          mixins.ListModelMixin,
+                          mixins.DestroyModelMixin,
+                          viewsets.GenericViewSet):
+    queryset = AnalisisGWAS.objects.select_related('panel').order_by('-fecha_creacion')
+    serializer_class = AnalisisGWASSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['panel', 'caracter', 'estado']
+
+    def get_permissions(self):
+        if self.request.method in permissions.SAFE_METHODS:
+            return [permissions.IsAuthenticated()]
+        return [IsAdminUser()]
+
+    def create(self, request, *args, **kwargs):
+        """Ejecutar un GWAS: {"panel", "caracter"[, "procesos"]}"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            try:
+                procesos = _procesos(request)
+            except (TypeError, ValueError):
+                return Response({'error': 'procesos debe ser un entero'}, status=status.HTTP_400_BAD_REQUEST)
+
+            panel = serializer.validated_data['panel']
+            genotipos = Genotipo.objects.filter(panel=panel).count() * panel.num_marcadores
+            if genotipos > MAXIMO_GENOTIPOS_GWAS_SINCRONO:
+                return Response(
+                    {'error': (
+                        f'El panel tiene {genotipos} genotipos (máximo {MAXIMO_GENOTIPOS_GWAS_SINCRONO} por petición); '
+                        f'ejecuta el GWAS con manage.py ejecutar_gwas {serializer.validated_data["caracter"]} '
+                        f'--panel "{panel.nombre}"'
+                    )},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                analisis = ejecutar_gwas(
+                    panel,
+                    serializer.validated_data['caracter'],
+                    usuario=request.user,
+                    procesos=procesos
+                )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            registrar_log(
+                usuario=request.user,
+                tipo_accion='ejecutar_gwas',
+                entidad_afectada='analisis_gwas',
+                entidad_id=analisis.id,
+                observaciones=f'GWAS {analisis.caracter}: {analisis.num_animales} animales, {analisis.num_marcadores} SNPs'
+            )
+            return Response(self.get_serializer(analisis).data, status=status.HTTP_201_CREATED)
+
+        except Exception as e:
+            print(f"❌ Error ejecutando GWAS: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error ejecutando GWAS: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def perform_destroy(self, instance):
+        eliminar_resultados(instance)
+        instance.delete()
+
+    @action(detail=True, methods=['get'])
+    def resultados(self, request, pk=None):
+        """Resultados paginados: ?orden=p|indice&max_p=&pagina=&tamano="""
+        analisis = self.get_object()
+        resultados = cargar_resultados(analisis)
+        if resultados is None:
+            return Response({'error': 'El análisis no tiene resultados'}, status=status.HTTP_404_NOT_FOUND)
+
+        p = np.asarray(resultados['p'])
+        indices = np.flatnonzero(np.isfinite(p))
+        if request.query_params.get('max_p'):
+            try:
+                indices = indices[p[indices] <= float(request.query_params['max_p'])]
+            except ValueError:
+                return Response({'error': 'max_p debe ser numérico'}, status=status.HTTP_400_BAD_REQUEST)
+        orden = request.query_params.get('orden', 'p')
+        if orden == 'p':
+            indices = indices[np.argsort(p[indices], kind='stable')]
+        elif orden != 'indice':
+            return Response({'error': "orden debe ser 'p' o 'indice'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        def convertir(pagina):
+            definiciones = _definiciones_marcadores(analisis.panel, pagina)
+            return [
+                {
+                    'indice': int(indice),
+                    'marcador': definiciones.get(int(indice), {}).get('nombre'),
+                    'cromosoma': definiciones.get(int(indice), {}).get('cromosoma'),
+                    'posicion': definiciones.get(int(indice), {}).get('posicion'),
+                    'efecto': _decimal(fila['efecto']),
+                    'error': _decimal(fila['error']),
+                    'p': _decimal(fila['p']),
+                    'n': int(fila['n']),
+                    'frecuencia': float(fila['frecuencia']),
+                }
+                for indice, fila in zip(pagina, resultados[pagina])
+            ]
+
+        return _paginar(self, request, FilasPaginables(indices, convertir))
+
+
+class ControlCalidadViewSet(CamposParcialesMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = ControlCalidad.objects.order_by('-id')
+    serializer_class = ControlCalidadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['panel', 'lote']
+
+    @action(detail=True, methods=['get'])
+    def marcadores(self, request, pk=None):
+        """Estadísticas por marcador, paginadas (?excluidos=1 para ver solo los que no pasan)"""
+        control = self.get_object()
+        estadisticas = cargar_control(control, 'marcadores')
+        mascara = cargar_control(control, 'mascara')
+        if estadisticas is None or mascara is None:
+            return Response({'error': 'El control no tiene resultados'}, status=status.HTTP_404_NOT_FOUND)
+
+        mascara = np.asarray(mascara)
+        if request.query_params.get('excluidos') in ('1', 'true'):
+            indices = np.flatnonzero(~mascara)
+        else:
+            indices = np.arange(len(mascara))
+
+        def convertir(pagina):
+            definiciones = _definiciones_marcadores(control.panel, pagina)
+            return [
+                {
+                    'indice': int(indice),
+                    'marcador': definiciones.get(int(indice), {}).get('nombre'),
+                    'call_rate': float(fila['call_rate']),
+                    'maf': float(fila['maf']),
+                    'hwe_p': float(fila['hwe_p']),
+                    'aprobado': bool(mascara[indice]),
+                }
+                for indice, fila in zip(pagina, estadisticas[pagina])
+            ]
+
+        return _paginar(self, request, FilasPaginables(indices, convertir))
+
+    @action(detail=True, methods=['get'])
+    def muestras(self, request, pk=None):
+        """Estadísticas por muestra, paginadas (?excluidas=1 para ver solo las que no pasan)"""
+        control = self.get_object()
+        muestras = cargar_control(control, 'muestras')
+        if muestras is None:
+            return Response({'error': 'El control no tiene resultados'}, status=status.HTTP_404_NOT_FOUND)
+
+        umbral = control.umbrales.get('call_rate_muestra', 0)
+        aprobadas = np.asarray(muestras['call_rate']) >= umbral
+        if request.query_params.get('excluidas') in ('1', 'true'):
+            indices = np.flatnonzero(~aprobadas)
+        else:
+            indices = np.arange(len(muestras))
+
+        def convertir(pagina):
+            filas = muestras[pagina]
+            chapetas = dict(
+                Animal.objects.filter(id__in=filas['animal'].tolist()).values_list('id', 'chapeta')
+            )
+            return [
+                {
+                    'animal': int(fila['animal']),
+                    'chapeta': chapetas.get(int(fila['animal'])),
+                    'call_rate': float(fila['call_rate']),
+                    'heterocigosidad': float(fila['heterocigosidad']),
+                    'aprobada': bool(aprobadas[indice]),
+                }
+                for indice, fila in zip(pagina, filas)
+            ]
+
+        return _paginar(self, request, FilasPaginables(indices, convertir))
@@ -3,9 +3,10 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Grupo
 from .serializers import GrupoSerializer
 from utils.permissions import IsAdminUser
+from utils.campos import CamposParcialesMixin
 from logs.utils import registrar_log
 
-class GrupoViewSet(viewsets.ModelViewSet):
+class GrupoViewSet(CamposParcialesMixin, viewsets.ModelViewSet):
     queryset = Grupo.objects.all()
     serializer_class = GrupoSerializer
     permission_classes = [IsAdminUser]
@@ -2,11 +2,14 @@ from rest_framework import viewsets, permissions
 from .models import Incidencia
 from .serializers import IncidenciaSerializer
 from logs.utils import registrar_log
+from utils.campos import CamposParcialesMixin
+from utils.exportacion import ExportacionMixin
 
-class IncidenciaViewSet(viewsets.ModelViewSet):
+class IncidenciaViewSet(CamposParcialesMixin, ExportacionMixin, viewsets.ModelViewSet):
     queryset = Incidencia.objects.all()
     serializer_class = IncidenciaSerializer
     permission_classes = [permissions.IsAuthenticated]
+    campos_exportacion_extra = ('animal__chapeta',)
 
     def get_queryset(self):
         user = self.request.user
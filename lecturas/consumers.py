@@ -0,0 +1,108 @@
+import json
+import jwt
+from urllib.parse import parse_qs
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.conf import settings
+from usuarios.models import Usuario
+from .ingesta import buffer, parsear_lote, BufferLleno, MAXIMO_LOTE
+
+
+class LecturaConsumer(AsyncWebsocketConsumer):
+    """
+    Flujo de lecturas de una báscula o lector RFID. Cada mensaje es una lectura
+    ({"rfid" o "chapeta", "peso", "fecha"}), una lista o {"lecturas": [...]};
+    se encolan en el buffer de ingesta y se confirman sin esperar a guardarlas.
+    """
+
+    async def connect(self):
+        """Conectar un dispositivo autenticado (?token=...&dispositivo=...)"""
+        self.user = await self.get_user_from_token()
+
+        if self.user and not isinstance(self.user, AnonymousUser):
+            parametros = parse_qs(self.scope.get('query_string', b'').decode())
+            self.dispositivo = (parametros.get('dispositivo') or [f'ws-{self.user.id}'])[0]
+            await self.accept()
+
+            await self.send(text_data=json.dumps({
+                'type': 'connection_established',
+                'message': f'Conectado a la ingesta de lecturas como {self.dispositivo}'
+            }))
+        else:
+            await self.close(code=4001)
+
+    async def receive(self, text_data):
+        """Encolar las lecturas del mensaje"""
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'Formato JSON inválido'
+            }))
+            return
+
+        if isinstance(data, dict) and data.get('type') == 'ping':
+            await self.send(text_data=json.dumps({
+                'type': 'pong',
+                'timestamp': data.get('timestamp')
+            }))
+            return
+
+        if isinstance(data, dict) and isinstance(data.get('lecturas'), list):
+            data = data['lecturas']
+        if isinstance(data, list) and len(data) > MAXIMO_LOTE:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': f'Como máximo {MAXIMO_LOTE} lecturas por mensaje'
+            }))
+            return
+        lecturas, rechazadas = parsear_lote(data if isinstance(data, list) else [data], self.dispositivo, self.user.id)
+        try:
+            aceptadas = buffer.agregar(lecturas)
+        except BufferLleno as e:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': str(e)
+            }))
+            return
+
+        await self.send(text_data=json.dumps({
+            'type': 'lecturas_recibidas',
+            'aceptadas': aceptadas,
+            'rechazadas': rechazadas
+        }))
+
+    @database_sync_to_async
+    def get_user_from_token(self):
+        """Extraer usuario del token JWT"""
+        try:
+            query_string = self.scope.get('query_string', b'').decode()
+            token = None
+
+            if 'token=' in query_string:
+                token = query_string.split('token=')[1].split('&')[0]
+
+            if not token:
+                return AnonymousUser()
+
+            try:
+                decoded_token = jwt.decode(
+                    token,
+                    settings.SECRET_KEY,
+                    algorithms=['HS256']
+                )
+                user_id = decoded_token.get('user_id')
+
+                if user_id:
+                    return Usuario.objects.get(id=user_id)
+
+            except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, Usuario.DoesNotExist):
+                pass
+
+            return AnonymousUser()
+
+        except Exception as e:
+            print(f"Error en autenticación WebSocket: {e}")
+            return AnonymousUser()
@@ -0,0 +1,317 @@
+"""
+Ingesta de lecturas de básculas y lectores RFID.
+
+Las lecturas llegan por WebSocket (ws/lecturas/) o en lotes por HTTP y se
+acumulan en un buffer en memoria del proceso, sin tocar la base de datos. Un
+hilo las vuelca con bulk_create cada LECTURAS_INTERVALO_VOLCADO segundos o en
+cuanto hay LECTURAS_TAMANO_LOTE pendientes: una transacción por volcado, nunca
+una por lectura.
+
+Chapetas y RFID se traducen a ids con el mapa en memoria de
+animales.identificadores, sin consultas por lectura. Las lecturas de peso de animales identificados se
+guardan también como Pesaje (con su dispositivo, lo que los distingue de los
+pesajes a mano): uno por animal y día, que se actualiza con la última lectura
+en lugar de añadir otro en cada volcado, y actualizan Animal.peso_actual.
+
+Si un trozo no se puede guardar por un fallo de conexión vuelve entero al
+buffer; si falla por sus datos se parte hasta aislar las lecturas culpables,
+que se descartan (se guardan las últimas en memoria y se cuentan en estado())
+para que no bloqueen a las demás.
+"""
+import atexit
+import threading
+import traceback
+from collections import deque
+
+from django.conf import settings
+from django.db import IntegrityError, InterfaceError, OperationalError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from animales import identificadores
+from pesajes.models import Pesaje
+from pesajes.sesiones import actualizar_peso_actual
+from utils.websocket_utils import send_animal_bulk_update
+from .models import Lectura
+
+TAMANO_LOTE = getattr(settings, 'LECTURAS_TAMANO_LOTE', 500)
+INTERVALO_VOLCADO = getattr(settings, 'LECTURAS_INTERVALO_VOLCADO', 2.0)
+# Si la base de datos no admite escrituras el buffer no crece sin límite
+MAXIMO_PENDIENTES = getattr(settings, 'LECTURAS_MAXIMO_PENDIENTES', 100000)
+# Lecturas por petición HTTP o mensaje WebSocket
+MAXIMO_LOTE = 50000
+# Lecturas descartadas que se conservan para consultarlas en estado()
+MAXIMO_DESCARTADAS = 100
+TIPOS = ('rfid', 'peso')
+PREFIJO_BASCULA = 'Báscula '
+
+
+class BufferLleno(Exception):
+    pass
+
+
+class ErrorTransitorio(Exception):
+    """La base de datos no está disponible; `pendientes` son las lecturas del trozo aún sin guardar"""
+
+    def __init__(self, causa, pendientes):
+        super().__init__(str(causa))
+        self.pendientes = pendientes
+
+
+def parsear(dato, dispositivo=None, usuario_id=None):
+    """Lectura normalizada a partir de un mensaje del lector; ValueError si no es válida"""
+    if not isinstance(dato, dict):
+        raise ValueError('Cada lectura debe ser un objeto')
+    identificador = dato.get('rfid') or dato.get('chapeta') or dato.get('identificador')
+    if not identificador:
+        raise ValueError('Falta el identificador (rfid o chapeta)')
+
+    peso = dato.get('peso', dato.get('valor'))
+    if peso is not None:
+        try:
+            peso = float(peso)
+        except (TypeError, ValueError):
+            raise ValueError('El peso debe ser numérico')
+        if not peso > 0:
+            raise ValueError('El peso debe ser mayor que 0')
+    tipo = dato.get('tipo') or ('peso' if peso is not None else 'rfid')
+    if tipo not in TIPOS:
+        raise ValueError(f"tipo debe ser uno de: {', '.join(TIPOS)}")
+    if tipo == 'peso' and peso is None:
+        raise ValueError('Una lectura de peso necesita "peso"')
+
+    fecha = timezone.now()
+    if dato.get('fecha'):
+        fecha = parse_datetime(str(dato['fecha']))
+        if fecha is None:
+            raise ValueError('fecha debe ser una fecha y hora ISO 8601')
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+
+    return {
+        'dispositivo': str(dato.get('dispositivo') or dispositivo or 'desconocido')[:100],
+        'tipo': tipo,
+        'identificador': str(identificador).strip()[:64],
+        'valor': peso,
+        'fecha': fecha,
+        'usuario_id': usuario_id,
+    }
+
+
+def parsear_lote(datos, dispositivo=None, usuario_id=None):
+    """(lecturas válidas, [{indice, error}]) de una lista de mensajes"""
+    validas, rechazadas = [], []
+    for indice, dato in enumerate(datos):
+        try:
+            validas.append(parsear(dato, dispositivo, usuario_id))
+        except ValueError as e:
+            rechazadas.append({'indice': indice, 'error': str(e)})
+    return validas, rechazadas
+
+
+def _guardar_pesajes(pesos):
+    """
+    Crear o actualizar el Pesaje de báscula de cada (animal, día) con su
+    última lectura; los pesajes a mano del mismo día no se tocan
+    """
+    existentes = {
+        (animal_id, fecha): pesaje_id
+        for pesaje_id, animal_id, fecha in Pesaje.objects.select_for_update().filter(
+            animal_id__in={animal_id for animal_id, _ in pesos},
+            fecha__in={fecha for _, fecha in pesos},
+            sesion__isnull=True,
+            dispositivo__isnull=False,
+        ).values_list('id', 'animal_id', 'fecha')
+    }
+    nuevos, modificados = [], []
+    for (animal_id, fecha), lectura in pesos.items():
+        pesaje = Pesaje(
+            id=existentes.get((animal_id, fecha)),
+            animal_id=animal_id,
+            fecha=fecha,
+            peso=lectura['valor'],
+            observaciones=f"{PREFIJO_BASCULA}{lectura['dispositivo']}",
+            dispositivo=lectura['dispositivo'],
+            registrado_por_id=lectura['usuario_id']
+        )
+        (nuevos if pesaje.id is None else modificados).append(pesaje)
+    Pesaje.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE)
+    Pesaje.objects.bulk_update(modificados, ['peso', 'dispositivo', 'registrado_por'], batch_size=TAMANO_LOTE)
+
+
+def guardar(lecturas):
+    """Guardar un lote de lecturas en una sola transacción; devuelve un resumen"""
+    animales = identificadores.resolver_varios({lectura['identificador'] for lectura in lecturas})
+
+    # Para Pesaje basta la última lectura de peso de cada animal y día
+    pesos = {}
+    for lectura in lecturas:
+        animal_id = animales[lectura['identificador']]
+        if lectura['tipo'] == 'peso' and animal_id is not None:
+            pesos[(animal_id, timezone.localdate(lectura['fecha']))] = lectura
+
+    with transaction.atomic():
+        Lectura.objects.bulk_create(
+            [
+                Lectura(
+                    dispositivo=lectura['dispositivo'],
+                    tipo=lectura['tipo'],
+                    identificador=lectura['identificador'],
+                    animal_id=animales[lectura['identificador']],
+                    valor=lectura['valor'],
+                    fecha_lectura=lectura['fecha'],
+                    registrado_por_id=lectura['usuario_id']
+                )
+                for lectura in lecturas
+            ],
+            batch_size=TAMANO_LOTE
+        )
+        _guardar_pesajes(pesos)
+        pesados = {animal_id for animal_id, _ in pesos}
+        actualizar_peso_actual(pesados)
+
+    if pesados:
+        try:
+            send_animal_bulk_update('updated', pesados)
+        except Exception as e:
+            print(f"⚠️ Error notificando pesajes de báscula: {e}")
+    return {
+        'lecturas': len(lecturas),
+        'pesajes': len(pesos),
+        'sin_identificar': sum(1 for lectura in lecturas if animales[lectura['identificador']] is None),
+    }
+
+
+class BufferLecturas:
+    """Lecturas pendientes de guardar y el hilo que las vuelca"""
+
+    def __init__(self, tamano=TAMANO_LOTE, intervalo=INTERVALO_VOLCADO, maximo=MAXIMO_PENDIENTES):
+        self.tamano = tamano
+        self.intervalo = intervalo
+        self.maximo = maximo
+        self.pendientes = []
+        self.cerrojo = threading.Lock()
+        self.volcando = threading.Lock()
+        self.aviso = threading.Event()
+        self.hilo = None
+        self.estadisticas = {
+            'recibidas': 0, 'guardadas': 0, 'pesajes': 0, 'sin_identificar': 0,
+            'lotes': 0, 'errores': 0, 'descartadas': 0, 'ultimo_volcado': None,
+        }
+        self.descartadas = deque(maxlen=MAXIMO_DESCARTADAS)
+
+    def agregar(self, lecturas):
+        """Encolar lecturas ya validadas con parsear(); no toca la base de datos"""
+        with self.cerrojo:
+            if len(self.pendientes) + len(lecturas) > self.maximo:
+                raise BufferLleno(f'Hay {len(self.pendientes)} lecturas pendientes de guardar; reintenta más tarde')
+            self.pendientes.extend(lecturas)
+            self.estadisticas['recibidas'] += len(lecturas)
+            lleno = len(self.pendientes) >= self.tamano
+            if self.hilo is None or not self.hilo.is_alive():
+                self.hilo = threading.Thread(target=self._bucle, name='volcado-lecturas', daemon=True)
+                self.hilo.start()
+        if lleno:
+            self.aviso.set()
+        return len(lecturas)
+
+    def pendientes_actuales(self):
+        with self.cerrojo:
+            return len(self.pendientes)
+
+    def _bucle(self):
+        while True:
+            self.aviso.wait(self.intervalo)
+            self.aviso.clear()
+            try:
+                self.volcar()
+            except Exception as e:
+                print(f"❌ Error volcando lecturas: {e}")
+                traceback.print_exc()
+            finally:
+                close_old_connections()
+
+    def _guardar_aislando(self, trozo):
+        """
+        (resumen, descartadas) de guardar el trozo. Si falla por sus datos se
+        parte en mitades hasta aislar las lecturas que no se pueden guardar;
+        si falla la conexión lanza ErrorTransitorio con lo que falta por guardar.
+        """
+        total = {'lecturas': 0, 'pesajes': 0, 'sin_identificar': 0}
+        descartadas, partes = [], [trozo]
+        reintentado = False
+        while partes:
+            parte = partes.pop()
+            try:
+                resumen = guardar(parte)
+            except (OperationalError, InterfaceError) as e:
+                raise ErrorTransitorio(e, [lectura for resto in [parte] + partes[::-1] for lectura in resto])
+            except Exception as e:
+                if isinstance(e, IntegrityError) and not reintentado:
+                    # Algún animal del mapa se puede haber borrado: recargarlo y reintentar
+                    reintentado = True
+                    identificadores.invalidar()
+                    partes.append(parte)
+                elif len(parte) == 1:
+                    print(f"⚠️ Lectura descartada ({parte[0]['dispositivo']} {parte[0]['identificador']}): {e}")
+                    descartadas.append({**parte[0], 'error': str(e)})
+                else:
+                    mitad = len(parte) // 2
+                    partes.extend([parte[mitad:], parte[:mitad]])
+                continue
+            for clave in total:
+                total[clave] += resumen[clave]
+        return total, descartadas
+
+    def volcar(self):
+        """Guardar ahora todo lo pendiente, en trozos de `tamano` lecturas"""
+        with self.volcando:
+            with self.cerrojo:
+                lote, self.pendientes = self.pendientes, []
+            total = {'lecturas': 0, 'pesajes': 0, 'sin_identificar': 0}
+            for inicio in range(0, len(lote), self.tamano):
+                trozo = lote[inicio:inicio + self.tamano]
+                try:
+                    resumen, descartadas = self._guardar_aislando(trozo)
+                except ErrorTransitorio as e:
+                    # Lo no guardado vuelve al principio del buffer para el siguiente volcado
+                    with self.cerrojo:
+                        self.pendientes[:0] = e.pendientes + lote[inicio + self.tamano:]
+                        self.estadisticas['errores'] += 1
+                    raise
+                with self.cerrojo:
+                    self.estadisticas['guardadas'] += resumen['lecturas']
+                    self.estadisticas['pesajes'] += resumen['pesajes']
+                    self.estadisticas['sin_identificar'] += resumen['sin_identificar']
+                    self.estadisticas['descartadas'] += len(descartadas)
+                    self.descartadas.extend(descartadas)
+                    self.estadisticas['lotes'] += 1
+                    self.estadisticas['ultimo_volcado'] = timezone.now()
+                for clave in total:
+                    total[clave] += resumen[clave]
+
+            if total['lecturas']:
+                print(f"📡 Lecturas volcadas: {total['lecturas']} ({total['pesajes']} pesajes, "
+                      f"{total['sin_identificar']} sin identificar)")
+            return total
+
+    def estado(self):
+        with self.cerrojo:
+            return {
+                **self.estadisticas,
+                'pendientes': len(self.pendientes),
+                'ultimas_descartadas': list(self.descartadas),
+                'tamano_lote': self.tamano,
+                'intervalo_volcado': self.intervalo,
+            }
+
+
+buffer = BufferLecturas()
+
+
+@atexit.register
+def _volcar_al_salir():
+    try:
+        buffer.volcar()
+    except Exception as e:
+        print(f"⚠️ Lecturas sin guardar al salir: {e}")
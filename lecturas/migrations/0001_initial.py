@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('animales', '0007_animal_rfid'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lectura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dispositivo', models.CharField(max_length=100)),
+                ('tipo', models.CharField(choices=[('rfid', 'Lectura RFID'), ('peso', 'Peso en báscula')], max_length=10)),
+                ('identificador', models.CharField(max_length=64)),
+                ('valor', models.FloatField(blank=True, null=True)),
+                ('fecha_lectura', models.DateTimeField()),
+                ('fecha_recepcion', models.DateTimeField(auto_now_add=True)),
+                ('animal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lecturas', to='animales.animal')),
+                ('registrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['animal', 'fecha_lectura'], name='lectura_animal_fecha_idx'), models.Index(fields=['dispositivo', 'fecha_lectura'], name='lectura_dispositivo_fecha_idx')],
+            },
+        ),
+    ]
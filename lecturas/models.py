@@ -0,0 +1,30 @@
+from django.db import models
+from django.conf import settings
+from animales.models import Animal
+
+
+class Lectura(models.Model):
+    """Lectura en bruto de una báscula o un lector RFID, tal como llegó"""
+    TIPO_CHOICES = [
+        ('rfid', 'Lectura RFID'),
+        ('peso', 'Peso en báscula'),
+    ]
+
+    dispositivo = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    # Chapeta o RFID leídos; el animal queda vacío si no se pudo identificar
+    identificador = models.CharField(max_length=64)
+    animal = models.ForeignKey(Animal, on_delete=models.SET_NULL, null=True, blank=True, related_name='lecturas')
+    valor = models.FloatField(null=True, blank=True)
+    fecha_lectura = models.DateTimeField()
+    fecha_recepcion = models.DateTimeField(auto_now_add=True)
+    registrado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['animal', 'fecha_lectura'], name='lectura_animal_fecha_idx'),
+            models.Index(fields=['dispositivo', 'fecha_lectura'], name='lectura_dispositivo_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.dispositivo} {self.identificador} ({self.tipo}) {self.fecha_lectura}"
@@ -0,0 +1,8 @@
+from rest_framework import serializers
+from .models import Lectura
+
+
+class LecturaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lectura
+        fields = '__all__'
@@ -0,0 +1,191 @@
+import json
+from datetime import date
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import OperationalError
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from animales import identificadores
+from animales.models import Animal
+from pesajes.models import Pesaje
+from usuarios.models import Usuario
+from .consumers import LecturaConsumer
+from .models import Lectura
+from . import consumers, ingesta, views
+
+
+def crear_animal(chapeta, **campos):
+    datos = {
+        'chapeta': chapeta,
+        'sexo': 'macho',
+        'fecha_nacimiento': date(2023, 1, 1),
+        'raza': 'Angus',
+        'estado_reproductivo': 'vacío',
+        'estado_productivo': 'activo',
+    }
+    datos.update(campos)
+    return Animal.objects.create(**datos)
+
+
+def lectura(identificador, peso=None, fecha='2024-03-01T08:00:00', dispositivo='B1'):
+    dato = {'chapeta': identificador, 'fecha': fecha}
+    if peso is not None:
+        dato['peso'] = peso
+    return ingesta.parsear(dato, dispositivo)
+
+
+class BufferLecturasTests(TestCase):
+    """Volcado por trozos del buffer y aislamiento de las lecturas que no se pueden guardar"""
+
+    def setUp(self):
+        identificadores._local.update(version=None, mapa={})
+        self.toro = crear_animal('T1', rfid='982000000000001')
+        self.vaca = crear_animal('V1')
+        self.buffer = ingesta.BufferLecturas(tamano=3, intervalo=3600, maximo=20)
+        # Sin hilo de volcado: las pruebas vuelcan a mano
+        self.buffer.hilo = mock.Mock(is_alive=lambda: True)
+
+    def tearDown(self):
+        identificadores._local.update(version=None, mapa={})
+
+    def test_volcar(self):
+        self.buffer.agregar([
+            lectura('T1', 300),
+            lectura('982000000000001', 310, fecha='2024-03-01T18:00:00'),
+            lectura('V1'),
+            lectura('DESCONOCIDA', 250),
+        ])
+        self.assertEqual(Lectura.objects.count(), 0)
+        total = self.buffer.volcar()
+        self.assertEqual(total, {'lecturas': 4, 'pesajes': 1, 'sin_identificar': 1})
+        self.assertEqual(self.buffer.estado()['lotes'], 2)
+        self.assertEqual(self.buffer.pendientes_actuales(), 0)
+        self.assertEqual(
+            sorted(Lectura.objects.values_list('identificador', 'animal_id')),
+            [('982000000000001', self.toro.pk), ('DESCONOCIDA', None), ('T1', self.toro.pk), ('V1', self.vaca.pk)]
+        )
+
+        # Un pesaje de báscula por animal y día, con la última lectura
+        bascula = Pesaje.objects.get(animal=self.toro)
+        self.assertEqual((bascula.fecha, bascula.peso, bascula.dispositivo), (date(2024, 3, 1), 310, 'B1'))
+        self.assertEqual(Animal.objects.get(pk=self.toro.pk).peso_actual, 310)
+
+    def test_pesaje_de_bascula_sin_tocar_el_manual(self):
+        manual = Pesaje.objects.create(animal=self.toro, fecha=date(2024, 3, 1), peso=305)
+        self.buffer.agregar([lectura('T1', 300)])
+        self.buffer.volcar()
+        self.buffer.agregar([lectura('T1', 302, fecha='2024-03-01T09:00:00', dispositivo='B2')])
+        self.buffer.volcar()
+
+        self.assertEqual(Pesaje.objects.filter(animal=self.toro).count(), 2)
+        manual.refresh_from_db()
+        self.assertEqual((manual.peso, manual.dispositivo), (305, None))
+        bascula = Pesaje.objects.get(animal=self.toro, dispositivo__isnull=False)
+        self.assertEqual((bascula.peso, bascula.dispositivo), (302, 'B2'))
+
+    def test_descartar_la_lectura_culpable(self):
+        original = ingesta.guardar
+        llamadas = []
+
+        def guardar(lecturas):
+            llamadas.append(len(lecturas))
+            if any(l['identificador'] == 'MALA' for l in lecturas):
+                raise ValueError('lectura corrupta')
+            return original(lecturas)
+
+        self.buffer.tamano = 8
+        lote = [lectura(f'X{i}') for i in range(7)]
+        lote.insert(5, lectura('MALA'))
+        self.buffer.agregar(lote)
+        with mock.patch.object(ingesta, 'guardar', guardar):
+            total = self.buffer.volcar()
+
+        self.assertEqual(total['lecturas'], 7)
+        self.assertEqual(Lectura.objects.count(), 7)
+        estado = self.buffer.estado()
+        self.assertEqual((estado['guardadas'], estado['descartadas']), (7, 1))
+        self.assertEqual(estado['ultimas_descartadas'][0]['identificador'], 'MALA')
+        self.assertEqual(estado['ultimas_descartadas'][0]['error'], 'lectura corrupta')
+        # Solo se parten las mitades que fallan, no se guarda lectura a lectura
+        self.assertEqual(llamadas, [8, 4, 4, 2, 1, 1, 2])
+
+    def test_error_de_conexion_devuelve_las_lecturas(self):
+        original = ingesta.guardar
+        caidas = []
+
+        def guardar(lecturas):
+            if not caidas and any(l['identificador'] == 'X4' for l in lecturas):
+                caidas.append(1)
+                raise OperationalError('database is locked')
+            return original(lecturas)
+
+        lote = [lectura(f'X{i}') for i in range(8)]
+        self.buffer.agregar(lote)
+        with mock.patch.object(ingesta, 'guardar', guardar):
+            with self.assertRaises(ingesta.ErrorTransitorio):
+                self.buffer.volcar()
+            # El primer trozo se guardó; el resto vuelve al buffer en orden
+            self.assertEqual(Lectura.objects.count(), 3)
+            self.assertEqual(
+                [l['identificador'] for l in self.buffer.pendientes], [f'X{i}' for i in range(3, 8)]
+            )
+            self.assertEqual(self.buffer.estado()['errores'], 1)
+            self.buffer.volcar()
+        self.assertEqual(Lectura.objects.count(), 8)
+        self.assertEqual(self.buffer.estado()['descartadas'], 0)
+
+    def test_buffer_lleno(self):
+        self.buffer.agregar([lectura(f'X{i}') for i in range(20)])
+        with self.assertRaises(ingesta.BufferLleno):
+            self.buffer.agregar([lectura('X20')])
+        self.assertEqual(self.buffer.pendientes_actuales(), 20)
+
+
+class LecturasEntradaTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+    def test_parsear(self):
+        validas, rechazadas = ingesta.parsear_lote([
+            {'rfid': '982', 'peso': '312.5'}, {'peso': 10}, {'chapeta': 'T1', 'peso': -1}, 'T1', {'chapeta': 'T1'},
+        ], dispositivo='B1')
+        self.assertEqual(
+            [(l['tipo'], l['valor'], l['dispositivo']) for l in validas], [('peso', 312.5, 'B1'), ('rfid', None, 'B1')]
+        )
+        self.assertEqual([r['indice'] for r in rechazadas], [1, 2, 3])
+
+    def test_lote_http(self):
+        with mock.patch.object(views, 'MAXIMO_LOTE', 2), mock.patch.object(views, 'buffer') as buffer:
+            respuesta = self.cliente.post('/api/lecturas/lote/', [{'chapeta': 'T1'}] * 3, format='json')
+            self.assertEqual(respuesta.status_code, 400)
+            buffer.agregar.assert_not_called()
+
+            buffer.agregar.return_value = 2
+            buffer.pendientes_actuales.return_value = 2
+            respuesta = self.cliente.post(
+                '/api/lecturas/lote/', {'dispositivo': 'B1', 'lecturas': [{'chapeta': 'T1'}, {}]}, format='json'
+            )
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta.json()['rechazadas'][0]['indice'], 1)
+        self.assertEqual(buffer.agregar.call_args.args[0][0]['dispositivo'], 'B1')
+
+    def test_mensaje_websocket(self):
+        consumidor = LecturaConsumer()
+        consumidor.user, consumidor.dispositivo = self.usuario, 'ws-1'
+        consumidor.send = mock.AsyncMock()
+        with mock.patch.object(consumers, 'MAXIMO_LOTE', 2), mock.patch.object(consumers, 'buffer') as buffer:
+            async_to_sync(consumidor.receive)(json.dumps({'lecturas': [{'chapeta': 'T1'}] * 3}))
+            buffer.agregar.assert_not_called()
+            mensaje = json.loads(consumidor.send.call_args.kwargs['text_data'])
+            self.assertEqual(mensaje['type'], 'error')
+
+            buffer.agregar.return_value = 2
+            async_to_sync(consumidor.receive)(json.dumps([{'chapeta': 'T1'}, {'chapeta': 'T2', 'peso': 300}]))
+        mensaje = json.loads(consumidor.send.call_args.kwargs['text_data'])
+        self.assertEqual((mensaje['type'], mensaje['aceptadas']), ('lecturas_recibidas', 2))
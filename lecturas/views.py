@@ -0,0 +1,88 @@
+import traceback
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+from .models import Lectura
+from .serializers import LecturaSerializer
+from .ingesta import buffer, parsear_lote, BufferLleno, MAXIMO_LOTE
+from produccion.views import filtrar_fechas
+from utils.campos import CamposParcialesMixin
+from utils.exportacion import ExportacionMixin
+from utils.permissions import IsAdminUser
+
+
+class LecturaViewSet(CamposParcialesMixin, ExportacionMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Lectura.objects.all()
+    serializer_class = LecturaSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['dispositivo', 'tipo', 'animal', 'identificador']
+    ordenacion_cursor = ('fecha_lectura', 'id')
+    paginacion = 'cursor'
+
+    def get_queryset(self):
+        queryset = filtrar_fechas(super().get_queryset(), self.request.query_params, 'fecha_lectura__date')
+        sin_identificar = self.request.query_params.get('sin_identificar')
+        if sin_identificar in ('1', 'true'):
+            queryset = queryset.filter(animal__isnull=True)
+        return queryset.order_by(*self.ordenacion_cursor)
+
+    def get_permissions(self):
+        if self.action == 'volcar':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        """
+        Lecturas de un lector o báscula en una petición: [{"rfid" o "chapeta",
+        "peso", "fecha"[, "dispositivo"]}] o {"dispositivo", "lecturas": [...]}.
+        Se encolan y se guardan en el siguiente volcado (202).
+        """
+        try:
+            datos, dispositivo = request.data, None
+            if isinstance(datos, dict):
+                datos, dispositivo = datos.get('lecturas'), datos.get('dispositivo')
+            if not isinstance(datos, list) or not datos:
+                return Response({'error': 'Envía una lista de lecturas'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(datos) > MAXIMO_LOTE:
+                return Response(
+                    {'error': f'Como máximo {MAXIMO_LOTE} lecturas por petición'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            lecturas, rechazadas = parsear_lote(datos, dispositivo, request.user.id)
+            aceptadas = buffer.agregar(lecturas)
+            return Response(
+                {'aceptadas': aceptadas, 'rechazadas': rechazadas, 'pendientes': buffer.pendientes_actuales()},
+                status=status.HTTP_202_ACCEPTED
+            )
+
+        except BufferLleno as e:
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            print(f"❌ Error recibiendo lecturas: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error recibiendo lecturas: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['get'])
+    def estado(self, request):
+        """Lecturas pendientes y contadores del buffer de este proceso"""
+        return Response(buffer.estado())
+
+    @action(detail=False, methods=['post'])
+    def volcar(self, request):
+        """Guardar ya las lecturas pendientes (p. ej. antes de cerrar la jornada)"""
+        try:
+            return Response(buffer.volcar())
+        except Exception as e:
+            print(f"❌ Error volcando lecturas: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error volcando lecturas: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['fecha_hora', 'id'], name='log_fecha_hora_idx'),
+        ),
+    ]
@@ -10,6 +10,11 @@ class Log(models.Model):
     cambios = models.JSONField(blank=True, null=True)
     observaciones = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_hora', 'id'], name='log_fecha_hora_idx'),
+        ]
+
     def __str__(self):
         return f"{self.tipo_accion} en {self.entidad_afectada} ({self.entidad_id})"
 
@@ -3,10 +3,14 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Log
 from .serializers import LogSerializer
 from utils.permissions import IsAdminUser
+from utils.campos import CamposParcialesMixin
+from utils.exportacion import ExportacionMixin
 
-class LogViewSet(viewsets.ModelViewSet):
+class LogViewSet(CamposParcialesMixin, ExportacionMixin, viewsets.ModelViewSet):
     queryset = Log.objects.all()
     serializer_class = LogSerializer
     permission_classes = [IsAdminUser]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['tipo_accion', 'entidad_afectada', 'entidad_id', 'usuario', 'fecha_hora']
+    # ?paginacion=cursor recorre el registro completo en orden de inserción
+    ordenacion_cursor = ('fecha_hora', 'id')
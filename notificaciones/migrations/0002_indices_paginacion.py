@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='notificacion_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', 'fecha_creacion', 'id'], name='notificacion_usuario_fecha_idx'),
+        ),
+    ]
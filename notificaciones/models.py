@@ -18,6 +18,12 @@ class Notificacion(models.Model):
     relacionado_con_animal = models.ForeignKey(Animal, on_delete=models.SET_NULL, null=True, blank=True, related_name='notificaciones')
     relacionado_con_evento = models.ForeignKey(Evento, on_delete=models.SET_NULL, null=True, blank=True, related_name='notificaciones_evento')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'id'], name='notificacion_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha_creacion', 'id'], name='notificacion_usuario_fecha_idx'),
+        ]
+
     def __str__(self):
         return f"{self.tipo} - {self.mensaje[:30]}..."
 
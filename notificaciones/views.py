@@ -4,13 +4,15 @@ from .models import Notificacion
 from .serializers import NotificacionSerializer
 from logs.utils import registrar_log
 from utils.permissions import IsSelfOrAdmin
+from utils.campos import CamposParcialesMixin
 
-class NotificacionViewSet(viewsets.ModelViewSet):
+class NotificacionViewSet(CamposParcialesMixin, viewsets.ModelViewSet):
     queryset = Notificacion.objects.all()
     serializer_class = NotificacionSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['tipo', 'visto', 'usuario', 'relacionado_con_animal', 'relacionado_con_evento']
+    ordenacion_cursor = ('-fecha_creacion', '-id')
 
     def get_queryset(self):
         user = self.request.user
@@ -0,0 +1,159 @@
+"""
+Ganancia media diaria (GMD) y desviación de la curva de crecimiento para todo
+el rebaño a la vez.
+
+Los pesajes se cargan una vez en arrays de NumPy ordenados por (animal,
+fecha) y todas las cuentas por animal se hacen con sumas por grupo
+(np.bincount) sobre esos arrays, sin bucles por animal:
+
+- gmd_total: (último peso - primer peso) / días entre ambos.
+- gmd_regresion: pendiente de mínimos cuadrados del peso sobre la fecha.
+- gmd_ultima: entre los dos últimos pesajes.
+- desviacion: puntuación z del último pesaje frente a la curva del rebaño
+  (media y desviación típica del peso por sexo y tramo de edad de 30 días).
+"""
+from datetime import date
+
+import numpy as np
+
+from animales.models import Animal
+from .models import Pesaje
+
+DIAS_POR_TRAMO = 30
+MINIMO_POR_TRAMO = 5
+TAMANO_LOTE = 5000
+SEXOS = {'macho': 0, 'hembra': 1}
+
+
+def cargar(desde=None, hasta=None):
+    """Arrays (animal, dia, peso, edad, sexo) de los pesajes, ordenados por animal y fecha"""
+    pesajes = Pesaje.objects.all()
+    if desde:
+        pesajes = pesajes.filter(fecha__gte=desde)
+    if hasta:
+        pesajes = pesajes.filter(fecha__lte=hasta)
+    filas = pesajes.order_by('animal_id', 'fecha', 'id').values_list(
+        'animal_id', 'fecha', 'peso', 'animal__fecha_nacimiento', 'animal__sexo'
+    )
+
+    animal, dia, peso, nacimiento, sexo = [], [], [], [], []
+    for animal_id, fecha, kilos, fecha_nacimiento, sexo_animal in filas.iterator(chunk_size=TAMANO_LOTE):
+        animal.append(animal_id)
+        dia.append(fecha.toordinal())
+        peso.append(kilos)
+        nacimiento.append(fecha_nacimiento.toordinal())
+        sexo.append(SEXOS.get(sexo_animal, len(SEXOS)))
+
+    dia = np.asarray(dia, dtype=np.int64)
+    return (
+        np.asarray(animal, dtype=np.int64),
+        dia,
+        np.asarray(peso, dtype=np.float64),
+        dia - np.asarray(nacimiento, dtype=np.int64),
+        np.asarray(sexo, dtype=np.int64),
+    )
+
+
+def curva(edad, sexo, peso):
+    """Media y desviación típica del peso de cada pesaje en su tramo (sexo, edad)"""
+    tramo = np.maximum(edad, 0) // DIAS_POR_TRAMO
+    clave = tramo * (len(SEXOS) + 1) + sexo
+    niveles, indice = np.unique(clave, return_inverse=True)
+    n = np.bincount(indice, minlength=len(niveles)).astype(np.float64)
+    suma = np.bincount(indice, weights=peso, minlength=len(niveles))
+    suma2 = np.bincount(indice, weights=peso * peso, minlength=len(niveles))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = suma / n
+        varianza = (suma2 - n * media * media) / (n - 1)
+    desviacion = np.sqrt(np.maximum(varianza, 0))
+    suficientes = n >= MINIMO_POR_TRAMO
+    media = np.where(suficientes, media, np.nan)
+    desviacion = np.where(suficientes & (desviacion > 0), desviacion, np.nan)
+    return media[indice], desviacion[indice]
+
+
+def calcular(animal, dia, peso, edad, sexo):
+    """Indicadores por animal a partir de los arrays de cargar()"""
+    if len(animal) == 0:
+        return {}
+
+    ids, inicio, cuenta = np.unique(animal, return_index=True, return_counts=True)
+    fin = inicio + cuenta - 1
+    grupo = np.repeat(np.arange(len(ids)), cuenta)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dias = (dia[fin] - dia[inicio]).astype(np.float64)
+        gmd_total = np.where(dias > 0, (peso[fin] - peso[inicio]) / dias, np.nan)
+
+        anterior = np.maximum(fin - 1, inicio)
+        intervalo = (dia[fin] - dia[anterior]).astype(np.float64)
+        gmd_ultima = np.where(intervalo > 0, (peso[fin] - peso[anterior]) / intervalo, np.nan)
+
+        # Pendiente por animal con sumas por grupo (x centrado en el primer pesaje)
+        x = (dia - dia[inicio][grupo]).astype(np.float64)
+        n = cuenta.astype(np.float64)
+        sx = np.bincount(grupo, weights=x)
+        sy = np.bincount(grupo, weights=peso)
+        sxx = np.bincount(grupo, weights=x * x)
+        sxy = np.bincount(grupo, weights=x * peso)
+        denominador = n * sxx - sx * sx
+        gmd_regresion = np.where(denominador > 0, (n * sxy - sx * sy) / denominador, np.nan)
+
+        media, desviacion = curva(edad, sexo, peso)
+        z = (peso - media) / desviacion
+
+    return {
+        'animal': ids,
+        'pesajes': cuenta,
+        'primer_dia': dia[inicio],
+        'ultimo_dia': dia[fin],
+        'peso_inicial': peso[inicio],
+        'peso_ultimo': peso[fin],
+        'edad_dias': edad[fin],
+        'gmd_total': gmd_total,
+        'gmd_regresion': gmd_regresion,
+        'gmd_ultima': gmd_ultima,
+        'peso_esperado': media[fin],
+        'desviacion': z[fin],
+    }
+
+
+def _valor(valor, decimales):
+    valor = float(valor)
+    return None if np.isnan(valor) else round(valor, decimales)
+
+
+def crecimiento(animales=None, desde=None, hasta=None):
+    """
+    Indicadores de crecimiento por animal (lista de diccionarios). La curva de
+    referencia se calcula con todos los pesajes del intervalo; el queryset
+    `animales` solo limita los animales devueltos.
+    """
+    indicadores = calcular(*cargar(desde, hasta))
+    if not indicadores:
+        return []
+
+    animales = Animal.objects.all() if animales is None else animales
+    chapetas = dict(animales.values_list('id', 'chapeta').iterator(chunk_size=TAMANO_LOTE))
+    seleccion = np.isin(indicadores['animal'], np.fromiter(chapetas, dtype=np.int64, count=len(chapetas)))
+    posiciones = np.flatnonzero(seleccion)
+
+    return [
+        {
+            'animal': int(indicadores['animal'][i]),
+            'chapeta': chapetas.get(int(indicadores['animal'][i])),
+            'pesajes': int(indicadores['pesajes'][i]),
+            'primer_pesaje': date.fromordinal(int(indicadores['primer_dia'][i])),
+            'ultimo_pesaje': date.fromordinal(int(indicadores['ultimo_dia'][i])),
+            'peso_inicial': _valor(indicadores['peso_inicial'][i], 2),
+            'peso_ultimo': _valor(indicadores['peso_ultimo'][i], 2),
+            'edad_dias': int(indicadores['edad_dias'][i]),
+            'gmd_total': _valor(indicadores['gmd_total'][i], 4),
+            'gmd_regresion': _valor(indicadores['gmd_regresion'][i], 4),
+            'gmd_ultima': _valor(indicadores['gmd_ultima'][i], 4),
+            'peso_esperado': _valor(indicadores['peso_esperado'][i], 2),
+            'desviacion': _valor(indicadores['desviacion'][i], 3),
+        }
+        for i in posiciones
+    ]
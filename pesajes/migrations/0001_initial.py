@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('animales', '0006_indice_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SesionPesaje',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('ubicacion', models.CharField(blank=True, max_length=255, null=True)),
+                ('observaciones', models.TextField(blank=True, null=True)),
+                ('num_animales', models.PositiveIntegerField(default=0)),
+                ('peso_medio', models.FloatField(blank=True, null=True)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('registrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Pesaje',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('peso', models.FloatField()),
+                ('observaciones', models.TextField(blank=True, null=True)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pesajes', to='animales.animal')),
+                ('registrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('sesion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pesajes', to='pesajes.sesionpesaje')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['animal', 'fecha'], name='pesaje_animal_fecha_idx'), models.Index(fields=['fecha'], name='pesaje_fecha_idx')],
+            },
+        ),
+    ]
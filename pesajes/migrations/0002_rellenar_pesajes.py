@@ -0,0 +1,56 @@
+from django.db import migrations
+from django.utils import timezone
+
+TAMANO_LOTE = 1000
+
+
+def rellenar_pesajes(apps, schema_editor):
+    """
+    Pasar Animal.peso_actual a un Pesaje para que el historial y el peso actual
+    coincidan. Se omiten los animales cuyo último pesaje ya tiene ese peso; el
+    resto se pesa en la fecha de la migración (única fecha conocida), de modo
+    que un pesaje posterior con fecha anterior no pisa el peso de la ficha.
+    """
+    Animal = apps.get_model('animales', 'Animal')
+    Pesaje = apps.get_model('pesajes', 'Pesaje')
+    hoy = timezone.localdate()
+
+    creados = 0
+    consulta = Animal.objects.filter(peso_actual__isnull=False).order_by('id').values_list('id', 'peso_actual')
+    lote = []
+
+    def volcar(lote):
+        ultimos = {}
+        for animal_id, peso in (
+            Pesaje.objects.filter(animal_id__in=[animal_id for animal_id, _ in lote])
+            .order_by('animal_id', 'fecha', 'id').values_list('animal_id', 'peso')
+        ):
+            ultimos[animal_id] = peso
+        nuevos = [
+            Pesaje(animal_id=animal_id, fecha=hoy, peso=peso, observaciones='Peso de la ficha del animal')
+            for animal_id, peso in lote
+            if ultimos.get(animal_id) != peso
+        ]
+        Pesaje.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE)
+        return len(nuevos)
+
+    for fila in consulta.iterator(chunk_size=TAMANO_LOTE):
+        lote.append(fila)
+        if len(lote) == TAMANO_LOTE:
+            creados += volcar(lote)
+            lote = []
+    if lote:
+        creados += volcar(lote)
+    if creados:
+        print(f"⚖️ Pesos migrados: {creados} pesajes")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pesajes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_pesajes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:49
+
+from django.db import migrations, models
+from django.db.models.functions import Substr
+
+PREFIJO_BASCULA = 'Báscula '
+
+
+def marcar_pesajes_bascula(apps, schema_editor):
+    """
+    Hasta ahora el origen de los pesajes de báscula solo constaba en sus
+    observaciones ('Báscula <dispositivo>'); se copia a la nueva columna
+    """
+    Pesaje = apps.get_model('pesajes', 'Pesaje')
+    Pesaje.objects.filter(sesion__isnull=True, observaciones__startswith=PREFIJO_BASCULA).update(
+        dispositivo=Substr('observaciones', len(PREFIJO_BASCULA) + 1, 100)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pesajes', '0002_rellenar_pesajes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pesaje',
+            name='dispositivo',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.RunPython(marcar_pesajes_bascula, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import models
+from django.conf import settings
+from animales.models import Animal
+
+
+class SesionPesaje(models.Model):
+    """Una jornada de pesaje (báscula de manga, cebadero, ...)"""
+    fecha = models.DateField()
+    ubicacion = models.CharField(max_length=255, blank=True, null=True)
+    observaciones = models.TextField(blank=True, null=True)
+    num_animales = models.PositiveIntegerField(default=0)
+    peso_medio = models.FloatField(null=True, blank=True)
+    registrado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pesaje {self.fecha} ({self.num_animales} animales)"
+
+
+class Pesaje(models.Model):
+    """Peso de un animal en una fecha; Animal.peso_actual guarda el más reciente"""
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='pesajes')
+    sesion = models.ForeignKey(SesionPesaje, on_delete=models.SET_NULL, null=True, blank=True, related_name='pesajes')
+    fecha = models.DateField()
+    peso = models.FloatField()
+    observaciones = models.TextField(blank=True, null=True)
+    # Báscula que registró el pesaje desde la ingesta de lecturas; vacío en los pesajes a mano
+    dispositivo = models.CharField(max_length=100, blank=True, null=True)
+    registrado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['animal', 'fecha'], name='pesaje_animal_fecha_idx'),
+            models.Index(fields=['fecha'], name='pesaje_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.animal_id} el {self.fecha}: {self.peso} kg"
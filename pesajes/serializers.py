@@ -0,0 +1,50 @@
+from rest_framework import serializers
+from .models import Pesaje, SesionPesaje
+
+MAXIMO_PESAJES_SESION = 10000
+
+
+class PesajeSerializer(serializers.ModelSerializer):
+    chapeta = serializers.CharField(source='animal.chapeta', read_only=True)
+
+    class Meta:
+        model = Pesaje
+        fields = '__all__'
+        read_only_fields = ['sesion', 'dispositivo', 'registrado_por', 'fecha_registro']
+
+    def validate_peso(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('El peso debe ser mayor que 0')
+        return value
+
+
+class SesionPesajeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SesionPesaje
+        fields = '__all__'
+        read_only_fields = ['num_animales', 'peso_medio', 'registrado_por', 'fecha_registro']
+
+
+class PesajeSesionSerializer(serializers.Serializer):
+    """Un pesaje dentro de una sesión: el animal por id o por chapeta"""
+    animal = serializers.IntegerField(min_value=1, required=False)
+    chapeta = serializers.CharField(max_length=50, required=False)
+    peso = serializers.FloatField()
+    observaciones = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+    def validate_peso(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('El peso debe ser mayor que 0')
+        return value
+
+    def validate(self, data):
+        if not data.get('animal') and not data.get('chapeta'):
+            raise serializers.ValidationError('Indica el animal (id) o su chapeta')
+        return data
+
+
+class SesionEntradaSerializer(serializers.Serializer):
+    fecha = serializers.DateField()
+    ubicacion = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    observaciones = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    pesajes = PesajeSesionSerializer(many=True, allow_empty=False, max_length=MAXIMO_PESAJES_SESION)
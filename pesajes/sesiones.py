@@ -0,0 +1,121 @@
+"""
+Registro de una sesión de pesaje completa en una sola operación.
+
+Los animales se identifican por id o por chapeta (lo que lee la báscula) y se
+resuelven con una consulta por lote. Los pesajes se insertan con bulk_create
+y Animal.peso_actual, que es una copia del último pesaje de cada animal, se
+actualiza con un único UPDATE por lote. Una sesión con fecha anterior a otro
+pesaje del animal no cambia su peso_actual, y un animal sin pesajes conserva
+el que tenga.
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from animales.models import Animal
+from .models import Pesaje, SesionPesaje
+
+TAMANO_LOTE = 1000
+MAXIMO_ERRORES = 1000
+
+
+class ErrorPesaje(ValueError):
+    def __init__(self, mensaje, errores=None):
+        super().__init__(mensaje)
+        self.errores = errores or []
+
+
+def actualizar_peso_actual(animal_ids):
+    """Copiar en Animal.peso_actual el último pesaje (por fecha) de cada animal"""
+    animal_ids = list(animal_ids)
+    ultimo = Pesaje.objects.filter(animal_id=OuterRef('pk')).order_by('-fecha', '-id').values('peso')[:1]
+    for inicio in range(0, len(animal_ids), TAMANO_LOTE):
+        Animal.objects.filter(id__in=animal_ids[inicio:inicio + TAMANO_LOTE]).update(
+            peso_actual=Coalesce(Subquery(ultimo), F('peso_actual'))
+        )
+    return len(animal_ids)
+
+
+def registrar_altas(animal_ids):
+    """Primer pesaje de animales creados con un peso_actual (el peso de alta)"""
+    animal_ids = list(animal_ids)
+    for inicio in range(0, len(animal_ids), TAMANO_LOTE):
+        altas = (
+            Animal.objects.filter(id__in=animal_ids[inicio:inicio + TAMANO_LOTE], peso_actual__isnull=False)
+            .values_list('id', 'peso_actual', 'fecha_alta_sistema', 'creado_por_id')
+        )
+        Pesaje.objects.bulk_create([
+            Pesaje(
+                animal_id=animal_id,
+                fecha=timezone.localdate(alta),
+                peso=peso,
+                observaciones='Peso de alta',
+                registrado_por_id=usuario_id
+            )
+            for animal_id, peso, alta, usuario_id in altas
+        ])
+
+
+def _resolver(filas):
+    """(animal_id por fila, errores) identificando cada fila por 'animal' o 'chapeta'"""
+    chapetas = [fila['chapeta'] for fila in filas if not fila.get('animal') and fila.get('chapeta')]
+    ids = [fila['animal'] for fila in filas if fila.get('animal')]
+    por_chapeta, existentes = {}, set()
+    for inicio in range(0, len(chapetas), TAMANO_LOTE):
+        por_chapeta.update(
+            Animal.objects.filter(chapeta__in=chapetas[inicio:inicio + TAMANO_LOTE]).values_list('chapeta', 'id')
+        )
+    for inicio in range(0, len(ids), TAMANO_LOTE):
+        existentes.update(
+            Animal.objects.filter(id__in=ids[inicio:inicio + TAMANO_LOTE]).values_list('id', flat=True)
+        )
+
+    resueltos, errores, vistos = [], [], set()
+    for numero, fila in enumerate(filas, start=1):
+        animal_id = fila['animal'] if fila.get('animal') else por_chapeta.get(fila.get('chapeta'))
+        if animal_id is None or (fila.get('animal') and animal_id not in existentes):
+            errores.append({'fila': numero, 'error': f"Animal no encontrado: {fila.get('animal') or fila.get('chapeta')}"})
+        elif animal_id in vistos:
+            errores.append({'fila': numero, 'error': f'Animal {animal_id} pesado dos veces en la sesión'})
+        else:
+            vistos.add(animal_id)
+            resueltos.append(animal_id)
+    return resueltos, errores
+
+
+@transaction.atomic
+def registrar_sesion(fecha, filas, usuario=None, ubicacion=None, observaciones=None):
+    """
+    Guardar la sesión y sus pesajes (filas validadas con animal o chapeta,
+    peso y observaciones). Si alguna fila no se puede resolver no se guarda nada.
+    """
+    animal_ids, errores = _resolver(filas)
+    if errores:
+        raise ErrorPesaje(f'{len(errores)} pesajes con errores: no se ha guardado la sesión', errores[:MAXIMO_ERRORES])
+
+    pesos = [fila['peso'] for fila in filas]
+    sesion = SesionPesaje.objects.create(
+        fecha=fecha,
+        ubicacion=ubicacion,
+        observaciones=observaciones,
+        num_animales=len(filas),
+        peso_medio=sum(pesos) / len(pesos) if pesos else None,
+        registrado_por=usuario
+    )
+    Pesaje.objects.bulk_create(
+        [
+            Pesaje(
+                animal_id=animal_id,
+                sesion=sesion,
+                fecha=fecha,
+                peso=fila['peso'],
+                observaciones=fila.get('observaciones'),
+                registrado_por=usuario
+            )
+            for animal_id, fila in zip(animal_ids, filas)
+        ],
+        batch_size=TAMANO_LOTE
+    )
+    actualizar_peso_actual(animal_ids)
+    return sesion, animal_ids
@@ -0,0 +1,202 @@
+from datetime import date, timedelta
+from importlib import import_module
+
+import numpy as np
+from django.apps import apps
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from animales.models import Animal
+from usuarios.models import Usuario
+from .models import Pesaje, SesionPesaje
+from . import crecimiento
+
+rellenar_pesajes = import_module('pesajes.migrations.0002_rellenar_pesajes').rellenar_pesajes
+
+
+def crear_animal(chapeta, sexo='macho', **campos):
+    datos = {
+        'chapeta': chapeta,
+        'sexo': sexo,
+        'fecha_nacimiento': date(2024, 1, 1),
+        'raza': 'Angus',
+        'estado_reproductivo': 'vacío',
+        'estado_productivo': 'activo',
+    }
+    datos.update(campos)
+    return Animal.objects.create(**datos)
+
+
+def peso_actual(animal):
+    return Animal.objects.values_list('peso_actual', flat=True).get(pk=animal.pk)
+
+
+class CrecimientoTests(TestCase):
+    """Indicadores vectorizados frente a las cuentas animal por animal"""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(3)
+        self.animales = [crear_animal(f'B{i}', sexo='macho' if i % 2 else 'hembra') for i in range(9)]
+        inicio = date(2024, 3, 1)
+        for i, animal in enumerate(self.animales):
+            # De 1 a 6 pesajes; el último animal, dos el mismo día
+            dias = sorted(self.rng.choice(120, size=i % 6 + 1, replace=False))
+            if i == 8:
+                dias = [10, 10]
+            for dia in dias:
+                Pesaje.objects.create(
+                    animal=animal, fecha=inicio + timedelta(days=int(dia)), peso=float(self.rng.uniform(80, 200))
+                )
+
+    def referencia(self, animal, desde=None, hasta=None):
+        pesajes = Pesaje.objects.filter(animal=animal).order_by('fecha', 'id')
+        if desde:
+            pesajes = pesajes.filter(fecha__gte=desde)
+        if hasta:
+            pesajes = pesajes.filter(fecha__lte=hasta)
+        fechas, pesos = zip(*pesajes.values_list('fecha', 'peso'))
+        dias = np.array([(fecha - fechas[0]).days for fecha in fechas], dtype=np.float64)
+        resultado = {'pesajes': len(pesos), 'gmd_total': None, 'gmd_regresion': None, 'gmd_ultima': None}
+        if dias[-1] > 0:
+            resultado['gmd_total'] = (pesos[-1] - pesos[0]) / dias[-1]
+            resultado['gmd_regresion'] = np.polyfit(dias, pesos, 1)[0]
+        if len(pesos) > 1 and dias[-1] > dias[-2]:
+            resultado['gmd_ultima'] = (pesos[-1] - pesos[-2]) / (dias[-1] - dias[-2])
+        return resultado
+
+    def assertCoincide(self, filas, desde=None, hasta=None):
+        for fila in filas:
+            esperado = self.referencia(fila['animal'], desde, hasta)
+            self.assertEqual(fila['pesajes'], esperado['pesajes'])
+            for campo in ('gmd_total', 'gmd_regresion', 'gmd_ultima'):
+                if esperado[campo] is None:
+                    self.assertIsNone(fila[campo], (fila['chapeta'], campo))
+                else:
+                    self.assertAlmostEqual(fila[campo], esperado[campo], places=4, msg=(fila['chapeta'], campo))
+
+    def test_frente_a_bucle_por_animal(self):
+        filas = crecimiento.crecimiento()
+        self.assertEqual([fila['animal'] for fila in filas], [animal.pk for animal in self.animales])
+        self.assertCoincide(filas)
+        self.assertIsNone(filas[0]['gmd_total'])
+
+        desde, hasta = date(2024, 4, 1), date(2024, 6, 1)
+        filas = crecimiento.crecimiento(desde=desde, hasta=hasta)
+        self.assertTrue(all(desde <= fila['primer_pesaje'] <= fila['ultimo_pesaje'] <= hasta for fila in filas))
+        self.assertCoincide(filas, desde, hasta)
+
+        # El queryset solo limita los animales devueltos
+        machos = crecimiento.crecimiento(Animal.objects.filter(sexo='macho'))
+        self.assertEqual({fila['animal'] for fila in machos}, {a.pk for a in self.animales if a.sexo == 'macho'})
+
+    def test_desviacion_de_la_curva(self):
+        Pesaje.objects.all().delete()
+        terneros = [crear_animal(f'T{i}') for i in range(6)]
+        pesos = [100.0, 110.0, 120.0, 130.0, 140.0, 150.0]
+        for animal, peso in zip(terneros, pesos):
+            Pesaje.objects.create(animal=animal, fecha=date(2024, 3, 10), peso=peso)
+        # Un tramo de edad con menos de MINIMO_POR_TRAMO pesajes no tiene curva
+        Pesaje.objects.create(animal=self.animales[1], fecha=date(2024, 9, 1), peso=300.0)
+
+        filas = {fila['animal']: fila for fila in crecimiento.crecimiento()}
+        media, desviacion = np.mean(pesos), np.std(pesos, ddof=1)
+        for animal, peso in zip(terneros, pesos):
+            self.assertAlmostEqual(filas[animal.pk]['peso_esperado'], media, places=2)
+            self.assertAlmostEqual(filas[animal.pk]['desviacion'], (peso - media) / desviacion, places=3)
+        self.assertIsNone(filas[self.animales[1].pk]['desviacion'])
+
+
+class PesoActualTests(TestCase):
+    """Animal.peso_actual como copia del último pesaje"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+        self.animal = crear_animal('A1')
+
+    def pesar(self, fecha, peso):
+        respuesta = self.cliente.post(
+            '/api/pesajes/', {'animal': self.animal.pk, 'fecha': fecha, 'peso': peso}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        return respuesta.json()['id']
+
+    def test_crear_editar_y_borrar(self):
+        primero = self.pesar('2024-03-01', 100)
+        self.assertEqual(peso_actual(self.animal), 100)
+        ultimo = self.pesar('2024-04-01', 120)
+        # Un pesaje con fecha anterior no pisa el último
+        self.pesar('2024-02-01', 90)
+        self.assertEqual(peso_actual(self.animal), 120)
+
+        self.cliente.patch(f'/api/pesajes/{ultimo}/', {'peso': 125}, format='json')
+        self.assertEqual(peso_actual(self.animal), 125)
+        self.cliente.patch(f'/api/pesajes/{ultimo}/', {'fecha': '2024-01-01'}, format='json')
+        self.assertEqual(peso_actual(self.animal), 100)
+
+        self.cliente.delete(f'/api/pesajes/{primero}/')
+        self.assertEqual(peso_actual(self.animal), 90)
+
+        # Sin pesajes, el animal conserva su último peso
+        for pesaje_id in Pesaje.objects.values_list('id', flat=True):
+            self.assertEqual(self.cliente.delete(f'/api/pesajes/{pesaje_id}/').status_code, 204)
+        self.assertEqual(peso_actual(self.animal), 90)
+
+    def test_mover_pesaje_a_otro_animal(self):
+        otro = crear_animal('A2')
+        pesaje_id = self.pesar('2024-03-01', 100)
+        self.pesar('2024-02-01', 80)
+        self.cliente.patch(f'/api/pesajes/{pesaje_id}/', {'animal': otro.pk}, format='json')
+        self.assertEqual((peso_actual(self.animal), peso_actual(otro)), (80, 100))
+
+    def test_sesion(self):
+        otro = crear_animal('A2')
+        respuesta = self.cliente.post('/api/pesajes/sesiones/', {
+            'fecha': '2024-03-01',
+            'pesajes': [{'animal': self.animal.pk, 'peso': 100}, {'chapeta': 'A2', 'peso': 140}],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual((respuesta.json()['num_animales'], respuesta.json()['peso_medio']), (2, 120))
+        self.assertEqual((peso_actual(self.animal), peso_actual(otro)), (100, 140))
+
+        # Un animal desconocido o repetido: no se guarda nada
+        respuesta = self.cliente.post('/api/pesajes/sesiones/', {
+            'fecha': '2024-04-01',
+            'pesajes': [{'chapeta': 'NO', 'peso': 1}, {'animal': self.animal.pk, 'peso': 2}, {'chapeta': 'A1', 'peso': 3}],
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual([error['fila'] for error in respuesta.json()['errores']], [1, 3])
+        self.assertEqual(SesionPesaje.objects.count(), 1)
+        self.assertEqual(peso_actual(self.animal), 100)
+
+    def test_peso_de_alta_y_solo_lectura(self):
+        respuesta = self.cliente.post('/api/animales/', {
+            'chapeta': 'N1', 'sexo': 'hembra', 'fecha_nacimiento': '2024-01-01', 'raza': 'Angus',
+            'estado_reproductivo': 'vacío', 'estado_productivo': 'activo', 'peso_actual': 35,
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        alta = Pesaje.objects.get(animal_id=respuesta.json()['id'])
+        self.assertEqual((alta.peso, alta.observaciones), (35, 'Peso de alta'))
+
+        respuesta = self.cliente.patch(f'/api/animales/{alta.animal_id}/', {'peso_actual': 50}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('peso_actual', respuesta.json())
+        self.assertEqual(Animal.objects.get(pk=alta.animal_id).peso_actual, 35)
+
+    def test_migracion_de_pesos(self):
+        con_historial = crear_animal('H1')
+        Pesaje.objects.create(animal=con_historial, fecha=date(2024, 1, 1), peso=200)
+        desfasado = crear_animal('H2')
+        Pesaje.objects.create(animal=desfasado, fecha=date(2024, 1, 1), peso=200)
+        Animal.objects.filter(pk__in=[con_historial.pk, self.animal.pk]).update(peso_actual=200)
+        Animal.objects.filter(pk=desfasado.pk).update(peso_actual=230)
+
+        rellenar_pesajes(apps, None)
+        nuevos = Pesaje.objects.filter(observaciones='Peso de la ficha del animal')
+        self.assertEqual(
+            sorted(nuevos.values_list('animal_id', 'peso')), [(self.animal.pk, 200), (desfasado.pk, 230)]
+        )
+        self.assertEqual(Pesaje.objects.filter(animal=con_historial).count(), 1)
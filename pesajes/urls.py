@@ -0,0 +1,11 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import PesajeViewSet, SesionPesajeViewSet
+
+router = DefaultRouter()
+router.register(r'sesiones', SesionPesajeViewSet, basename='sesion-pesaje')
+router.register(r'', PesajeViewSet, basename='pesaje')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,205 @@
+import traceback
+from datetime import date
+from django.db import transaction
+from rest_framework import mixins, viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+from .models import Pesaje, SesionPesaje
+from .serializers import PesajeSerializer, SesionPesajeSerializer, SesionEntradaSerializer
+from . import crecimiento, sesiones
+from animales.models import Animal
+from produccion.views import filtrar_fechas
+from utils.campos import CamposParcialesMixin
+from utils.exportacion import ExportacionMixin
+from utils.websocket_utils import send_animal_bulk_update
+from logs.utils import registrar_log
+
+# Indicadores por los que se puede ordenar el informe de crecimiento
+ORDENES_CRECIMIENTO = (
+    'chapeta', 'pesajes', 'peso_ultimo', 'edad_dias', 'gmd_total', 'gmd_regresion', 'gmd_ultima', 'desviacion',
+)
+
+
+class PaginacionCrecimiento(PageNumberPagination):
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 10000
+
+
+def _notificar(animal_ids):
+    try:
+        send_animal_bulk_update('updated', list(animal_ids))
+    except Exception as e:
+        print(f"⚠️ Error notificando pesajes: {e}")
+
+
+class PesajeViewSet(CamposParcialesMixin, ExportacionMixin, viewsets.ModelViewSet):
+    queryset = Pesaje.objects.select_related('animal')
+    serializer_class = PesajeSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['animal', 'sesion', 'fecha']
+    ordenacion_cursor = ('fecha', 'id')
+    campos_exportacion_extra = ('animal__chapeta',)
+
+    def get_queryset(self):
+        queryset = filtrar_fechas(super().get_queryset(), self.request.query_params, 'fecha')
+        return queryset.order_by(*self.ordenacion_cursor)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            pesaje = serializer.save(registrado_por=self.request.user)
+            sesiones.actualizar_peso_actual([pesaje.animal_id])
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='crear',
+            entidad_afectada='pesaje',
+            entidad_id=pesaje.id,
+            observaciones=f'Pesaje del animal {pesaje.animal.chapeta} el {pesaje.fecha}: {pesaje.peso} kg'
+        )
+        _notificar([pesaje.animal_id])
+
+    def perform_update(self, serializer):
+        animal_anterior = serializer.instance.animal_id
+        with transaction.atomic():
+            pesaje = serializer.save()
+            animales = {animal_anterior, pesaje.animal_id}
+            sesiones.actualizar_peso_actual(animales)
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='editar',
+            entidad_afectada='pesaje',
+            entidad_id=pesaje.id,
+            observaciones='Pesaje actualizado'
+        )
+        _notificar(animales)
+
+    def perform_destroy(self, instance):
+        pesaje_id, animal_id = instance.id, instance.animal_id
+        with transaction.atomic():
+            instance.delete()
+            sesiones.actualizar_peso_actual([animal_id])
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='eliminar',
+            entidad_afectada='pesaje',
+            entidad_id=pesaje_id,
+            observaciones='Pesaje eliminado'
+        )
+        _notificar([animal_id])
+
+    @action(detail=False, methods=['get'], url_path='crecimiento')
+    def crecimiento(self, request):
+        """
+        Ganancia media diaria y desviación de la curva de crecimiento de todo el
+        rebaño (o de ?grupo=, ?sexo=, ?animal=) con los pesajes entre ?desde= y
+        ?hasta=. ?orden=-gmd_total ordena por cualquier indicador.
+        """
+        try:
+            parametros = request.query_params
+            try:
+                desde, hasta = (
+                    date.fromisoformat(parametros[clave]) if parametros.get(clave) else None
+                    for clave in ('desde', 'hasta')
+                )
+            except ValueError:
+                return Response({'error': 'desde y hasta deben ser fechas AAAA-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+            orden = parametros.get('orden', 'chapeta')
+            if orden.lstrip('-') not in ORDENES_CRECIMIENTO:
+                return Response(
+                    {'error': f"orden debe ser uno de: {', '.join(ORDENES_CRECIMIENTO)} (con '-' para descendente)"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            animales = Animal.objects.all()
+            if parametros.get('grupo'):
+                animales = animales.filter(grupos__id=parametros['grupo'])
+            if parametros.get('sexo'):
+                animales = animales.filter(sexo=parametros['sexo'])
+            if parametros.get('animal'):
+                animales = animales.filter(id=parametros['animal'])
+
+            filas = crecimiento.crecimiento(animales, desde=desde, hasta=hasta)
+            campo = orden.lstrip('-')
+            # Los animales sin el indicador (None) van siempre al final
+            con_valor = [fila for fila in filas if fila[campo] is not None]
+            sin_valor = [fila for fila in filas if fila[campo] is None]
+            con_valor.sort(key=lambda fila: fila[campo], reverse=orden.startswith('-'))
+            filas = con_valor + sin_valor
+            print(f"📈 Crecimiento calculado para {len(filas)} animales")
+
+            paginador = PaginacionCrecimiento()
+            pagina = paginador.paginate_queryset(filas, request, view=self)
+            return paginador.get_paginated_response(pagina)
+
+        except Exception as e:
+            print(f"❌ Error calculando crecimiento: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error calculando crecimiento: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class SesionPesajeViewSet(CamposParcialesMixin,
+                          mixins.CreateModelMixin,
+                          mixins.RetrieveModelMixin,
+                          mixins.ListModelMixin,
+                          viewsets.GenericViewSet):
+    queryset = SesionPesaje.objects.all()
+    serializer_class = SesionPesajeSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['fecha', 'ubicacion']
+    ordenacion_cursor = ('fecha', 'id')
+
+    def get_queryset(self):
+        queryset = filtrar_fechas(super().get_queryset(), self.request.query_params, 'fecha')
+        return queryset.order_by(*self.ordenacion_cursor)
+
+    def create(self, request, *args, **kwargs):
+        """
+        Registrar una sesión de báscula completa:
+        {"fecha", "ubicacion", "observaciones", "pesajes": [{"animal" o "chapeta", "peso"[, "observaciones"]}]}.
+        Si algún animal no existe o se repite no se guarda nada.
+        """
+        try:
+            entrada = SesionEntradaSerializer(data=request.data)
+            if not entrada.is_valid():
+                return Response(entrada.errors, status=status.HTTP_400_BAD_REQUEST)
+            datos = entrada.validated_data
+
+            sesion, animal_ids = sesiones.registrar_sesion(
+                datos['fecha'],
+                datos['pesajes'],
+                usuario=request.user,
+                ubicacion=datos.get('ubicacion'),
+                observaciones=datos.get('observaciones')
+            )
+            try:
+                registrar_log(
+                    usuario=request.user,
+                    tipo_accion='registrar_pesajes',
+                    entidad_afectada='sesion_pesaje',
+                    entidad_id=sesion.id,
+                    cambios={'animales': sesion.num_animales, 'peso_medio': sesion.peso_medio},
+                    observaciones=f'Sesión de pesaje del {sesion.fecha}: {sesion.num_animales} animales'
+                )
+            except Exception as log_error:
+                print(f"⚠️ Error registrando log: {log_error}")
+            _notificar(animal_ids)
+
+            print(f"⚖️ Sesión de pesaje {sesion.id}: {sesion.num_animales} animales, media {sesion.peso_medio:.1f} kg")
+            return Response(self.get_serializer(sesion).data, status=status.HTTP_201_CREATED)
+
+        except sesiones.ErrorPesaje as e:
+            return Response({'error': str(e), 'errores': e.errores}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error registrando sesión de pesaje: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error registrando sesión de pesaje: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
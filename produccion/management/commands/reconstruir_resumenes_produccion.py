@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from produccion.resumenes import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los acumulados diarios, semanales y mensuales de producción desde los registros'
+
+    def handle(self, *args, **options):
+        total = reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'✅ Acumulados de producción recalculados: {total}'))
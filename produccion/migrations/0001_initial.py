@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('animales', '0006_indice_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroProduccion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(max_length=50)),
+                ('valor', models.FloatField()),
+                ('unidad', models.CharField(blank=True, max_length=20, null=True)),
+                ('observaciones', models.TextField(blank=True, null=True)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registros_produccion', to='animales.animal')),
+                ('registrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['animal', 'fecha'], name='produccion_animal_fecha_idx'), models.Index(fields=['tipo', 'fecha'], name='produccion_tipo_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenProduccion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('periodo', models.CharField(choices=[('dia', 'Día'), ('semana', 'Semana'), ('mes', 'Mes')], max_length=10)),
+                ('inicio', models.DateField()),
+                ('total', models.FloatField(default=0)),
+                ('registros', models.PositiveIntegerField(default=0)),
+                ('minimo', models.FloatField(blank=True, null=True)),
+                ('maximo', models.FloatField(blank=True, null=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_produccion', to='animales.animal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tipo', 'periodo', 'inicio'], name='resumen_produccion_periodo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('animal', 'tipo', 'periodo', 'inicio'), name='resumen_produccion_unico')],
+            },
+        ),
+    ]
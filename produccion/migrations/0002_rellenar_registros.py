@@ -0,0 +1,78 @@
+from datetime import date
+
+from django.db import migrations
+
+TAMANO_LOTE = 1000
+
+
+def _fecha(valor, por_defecto):
+    try:
+        return date.fromisoformat(str(valor)[:10])
+    except (TypeError, ValueError):
+        return por_defecto
+
+
+def rellenar_registros(apps, schema_editor):
+    """
+    Pasar las entradas de Animal.produccion ({tipo, valor o cantidad, fecha,
+    unidad}) a RegistroProduccion y calcular sus acumulados. Las entradas sin
+    tipo o sin valor numérico se omiten; sin fecha válida se usa la de alta.
+    """
+    from produccion.resumenes import acumular
+
+    Animal = apps.get_model('animales', 'Animal')
+    RegistroProduccion = apps.get_model('produccion', 'RegistroProduccion')
+    ResumenProduccion = apps.get_model('produccion', 'ResumenProduccion')
+
+    def volcar(registros):
+        RegistroProduccion.objects.bulk_create(registros, batch_size=TAMANO_LOTE)
+        acumulados = acumular((r.animal_id, r.tipo, r.fecha, r.valor) for r in registros)
+        ResumenProduccion.objects.bulk_create(
+            (
+                ResumenProduccion(
+                    animal_id=animal_id, tipo=tipo, periodo=periodo, inicio=inicio,
+                    total=total, registros=cuenta, minimo=minimo, maximo=maximo
+                )
+                for (animal_id, tipo, periodo, inicio), (total, cuenta, minimo, maximo) in acumulados.items()
+            ),
+            batch_size=TAMANO_LOTE
+        )
+        return len(registros)
+
+    # Se vuelca al terminar un animal: sus acumulados no dependen de los demás
+    registros, migradas, omitidas = [], 0, 0
+    consulta = Animal.objects.exclude(produccion=[]).order_by('id').values_list('id', 'produccion', 'fecha_alta_sistema')
+    for animal_id, produccion, alta in consulta.iterator(chunk_size=TAMANO_LOTE):
+        for entrada in produccion if isinstance(produccion, list) else []:
+            try:
+                tipo = str(entrada['tipo'])[:50]
+                valor = float(entrada.get('valor', entrada.get('cantidad')))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                omitidas += 1
+                continue
+            unidad = entrada.get('unidad')
+            registros.append(RegistroProduccion(
+                animal_id=animal_id,
+                fecha=_fecha(entrada.get('fecha'), alta.date()),
+                tipo=tipo,
+                valor=valor,
+                unidad=str(unidad)[:20] if unidad else None,
+                observaciones=entrada.get('observaciones')
+            ))
+        if len(registros) >= TAMANO_LOTE * 10:
+            migradas += volcar(registros)
+            registros = []
+    migradas += volcar(registros)
+    if migradas or omitidas:
+        print(f"🥛 Producción migrada: {migradas} registros, {omitidas} entradas omitidas")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produccion', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_registros, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+from django.db import models
+from django.conf import settings
+from animales.models import Animal
+
+
+class RegistroProduccion(models.Model):
+    """Una medida de producción (leche, lana, ...) de un animal en una fecha"""
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='registros_produccion')
+    fecha = models.DateField()
+    tipo = models.CharField(max_length=50)
+    valor = models.FloatField()
+    unidad = models.CharField(max_length=20, blank=True, null=True)
+    observaciones = models.TextField(blank=True, null=True)
+    registrado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['animal', 'fecha'], name='produccion_animal_fecha_idx'),
+            models.Index(fields=['tipo', 'fecha'], name='produccion_tipo_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} de {self.animal_id} el {self.fecha}: {self.valor}"
+
+
+class ResumenProduccion(models.Model):
+    """
+    Acumulado de producción de un animal por tipo y periodo (día, semana que
+    empieza en lunes o mes). Se mantiene al registrar producción
+    (ver produccion/resumenes.py).
+    """
+    PERIODO_CHOICES = [
+        ('dia', 'Día'),
+        ('semana', 'Semana'),
+        ('mes', 'Mes'),
+    ]
+
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='resumenes_produccion')
+    tipo = models.CharField(max_length=50)
+    periodo = models.CharField(max_length=10, choices=PERIODO_CHOICES)
+    inicio = models.DateField()
+    total = models.FloatField(default=0)
+    registros = models.PositiveIntegerField(default=0)
+    minimo = models.FloatField(null=True, blank=True)
+    maximo = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['animal', 'tipo', 'periodo', 'inicio'], name='resumen_produccion_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['tipo', 'periodo', 'inicio'], name='resumen_produccion_periodo_idx'),
+        ]
+
+    @property
+    def promedio(self):
+        return self.total / self.registros if self.registros else None
+
+    def __str__(self):
+        return f"{self.tipo} de {self.animal_id} ({self.periodo} {self.inicio}): {self.total}"
@@ -0,0 +1,232 @@
+"""
+Acumulados de producción por animal, tipo y periodo (día, semana, mes).
+
+Al añadir registros los acumulados se actualizan por diferencia: se agrupan
+los registros nuevos por (animal, tipo, periodo, inicio), se leen solo esos
+acumulados y se suman total, número de registros, mínimo y máximo. Al editar
+o borrar un registro el mínimo y el máximo no se pueden deshacer por
+diferencia, así que los periodos afectados se recalculan desde los registros.
+
+select_for_update no bloquea acumulados que aún no existen: si dos peticiones
+crean a la vez el mismo (animal, tipo, periodo, inicio), la segunda choca con
+resumen_produccion_unico y repite la suma (o el recálculo) en un savepoint, sobre la
+fila que ya ha creado la primera.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+
+from .models import RegistroProduccion, ResumenProduccion
+
+PERIODOS = ('dia', 'semana', 'mes')
+TAMANO_LOTE = 1000
+REINTENTOS = 3
+
+
+def inicio_periodo(fecha, periodo):
+    """Primer día del periodo que contiene la fecha (la semana empieza en lunes)"""
+    if periodo == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if periodo == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def fin_periodo(inicio, periodo):
+    """Primer día del periodo siguiente"""
+    if periodo == 'semana':
+        return inicio + timedelta(days=7)
+    if periodo == 'mes':
+        return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return inicio + timedelta(days=1)
+
+
+def acumular(registros):
+    """
+    {(animal_id, tipo, periodo, inicio): [total, registros, minimo, maximo]}
+    de los registros (animal_id, tipo, fecha, valor)
+    """
+    acumulados = {}
+    for animal_id, tipo, fecha, valor in registros:
+        for periodo in PERIODOS:
+            clave = (animal_id, tipo, periodo, inicio_periodo(fecha, periodo))
+            actual = acumulados.get(clave)
+            if actual is None:
+                acumulados[clave] = [valor, 1, valor, valor]
+            else:
+                actual[0] += valor
+                actual[1] += 1
+                actual[2] = min(actual[2], valor)
+                actual[3] = max(actual[3], valor)
+    return acumulados
+
+
+def _existentes(claves):
+    """Acumulados guardados para las claves, leídos con una consulta por periodo y trozo"""
+    por_periodo = defaultdict(list)
+    for clave in claves:
+        por_periodo[clave[2]].append(clave)
+
+    resultado = {}
+    for periodo, lista in por_periodo.items():
+        for inicio in range(0, len(lista), TAMANO_LOTE):
+            trozo = lista[inicio:inicio + TAMANO_LOTE]
+            consulta = ResumenProduccion.objects.select_for_update().filter(
+                periodo=periodo,
+                animal_id__in={clave[0] for clave in trozo},
+                tipo__in={clave[1] for clave in trozo},
+                inicio__range=(min(clave[3] for clave in trozo), max(clave[3] for clave in trozo)),
+            )
+            buscadas = set(trozo)
+            for resumen in consulta:
+                clave = (resumen.animal_id, resumen.tipo, resumen.periodo, resumen.inicio)
+                if clave in buscadas:
+                    resultado[clave] = resumen
+    return resultado
+
+
+def _reintentar(funcion, *args):
+    """Ejecutar en un savepoint, repitiendo si otra transacción creó antes el mismo acumulado"""
+    for intento in range(REINTENTOS):
+        try:
+            with transaction.atomic():
+                return funcion(*args)
+        except IntegrityError:
+            if intento == REINTENTOS - 1:
+                raise
+
+
+@transaction.atomic
+def sumar(registros):
+    """Incorporar a los acumulados los registros (animal_id, tipo, fecha, valor) recién creados"""
+    return _reintentar(_sumar, acumular(registros))
+
+
+def _sumar(acumulados):
+    existentes = _existentes(acumulados)
+
+    nuevos, modificados = [], []
+    for clave, (total, cuenta, minimo, maximo) in acumulados.items():
+        resumen = existentes.get(clave)
+        if resumen is None:
+            animal_id, tipo, periodo, inicio = clave
+            nuevos.append(ResumenProduccion(
+                animal_id=animal_id, tipo=tipo, periodo=periodo, inicio=inicio,
+                total=total, registros=cuenta, minimo=minimo, maximo=maximo
+            ))
+        else:
+            resumen.total += total
+            resumen.registros += cuenta
+            resumen.minimo = minimo if resumen.minimo is None else min(resumen.minimo, minimo)
+            resumen.maximo = maximo if resumen.maximo is None else max(resumen.maximo, maximo)
+            modificados.append(resumen)
+
+    ResumenProduccion.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE)
+    ResumenProduccion.objects.bulk_update(modificados, ['total', 'registros', 'minimo', 'maximo'], batch_size=TAMANO_LOTE)
+    return len(nuevos) + len(modificados)
+
+
+@transaction.atomic
+def recalcular(puntos):
+    """
+    Recalcular desde los registros los periodos que contienen los puntos
+    (animal_id, tipo, fecha), p. ej. tras editar o borrar un registro
+    """
+    claves = {
+        (animal_id, tipo, periodo, inicio_periodo(fecha, periodo))
+        for animal_id, tipo, fecha in puntos
+        for periodo in PERIODOS
+    }
+    if not claves:
+        return 0
+
+    # Por serie (animal, tipo), el intervalo que cubre todos los periodos afectados
+    por_serie = {}
+    for animal_id, tipo, periodo, inicio in claves:
+        desde, hasta = por_serie.get((animal_id, tipo), (inicio, inicio))
+        por_serie[(animal_id, tipo)] = (min(desde, inicio), max(hasta, fin_periodo(inicio, periodo)))
+    filas = []
+    for (animal_id, tipo), (desde, hasta) in por_serie.items():
+        filas.extend(
+            RegistroProduccion.objects.filter(animal_id=animal_id, tipo=tipo, fecha__gte=desde, fecha__lt=hasta)
+            .values_list('animal_id', 'tipo', 'fecha', 'valor')
+        )
+    return _reintentar(_reemplazar, claves, acumular(filas))
+
+
+def _reemplazar(claves, acumulados):
+    existentes = _existentes(claves)
+    vacios = [resumen.pk for clave, resumen in existentes.items() if clave not in acumulados]
+    ResumenProduccion.objects.filter(pk__in=vacios).delete()
+
+    nuevos, modificados = [], []
+    for clave in claves & acumulados.keys():
+        total, cuenta, minimo, maximo = acumulados[clave]
+        resumen = existentes.get(clave)
+        if resumen is None:
+            animal_id, tipo, periodo, inicio = clave
+            resumen = ResumenProduccion(animal_id=animal_id, tipo=tipo, periodo=periodo, inicio=inicio)
+            nuevos.append(resumen)
+        else:
+            modificados.append(resumen)
+        resumen.total, resumen.registros, resumen.minimo, resumen.maximo = total, cuenta, minimo, maximo
+
+    ResumenProduccion.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE)
+    ResumenProduccion.objects.bulk_update(modificados, ['total', 'registros', 'minimo', 'maximo'], batch_size=TAMANO_LOTE)
+    return len(claves)
+
+
+@transaction.atomic
+def reconstruir():
+    """Vaciar y recalcular todos los acumulados, animal a animal"""
+    ResumenProduccion.objects.all().delete()
+    total, lote, animal_actual = 0, [], None
+    consulta = RegistroProduccion.objects.order_by('animal_id').values_list('animal_id', 'tipo', 'fecha', 'valor')
+    for fila in consulta.iterator(chunk_size=TAMANO_LOTE):
+        # Los acumulados de un animal no dependen de los demás: se vuelcan al cambiar de animal
+        if fila[0] != animal_actual and len(lote) >= TAMANO_LOTE:
+            total += _guardar(acumular(lote))
+            lote = []
+        animal_actual = fila[0]
+        lote.append(fila)
+    return total + _guardar(acumular(lote))
+
+
+def _guardar(acumulados):
+    ResumenProduccion.objects.bulk_create(
+        (
+            ResumenProduccion(
+                animal_id=animal_id, tipo=tipo, periodo=periodo, inicio=inicio,
+                total=total, registros=cuenta, minimo=minimo, maximo=maximo
+            )
+            for (animal_id, tipo, periodo, inicio), (total, cuenta, minimo, maximo) in acumulados.items()
+        ),
+        batch_size=TAMANO_LOTE
+    )
+    return len(acumulados)
+
+
+@transaction.atomic
+def registrar(filas, usuario=None):
+    """
+    Crear con bulk_create los registros validados (dicts con animal, fecha,
+    tipo, valor, unidad y observaciones) y sumarlos a los acumulados
+    """
+    registros = RegistroProduccion.objects.bulk_create(
+        [
+            RegistroProduccion(
+                animal_id=fila['animal'],
+                fecha=fila['fecha'],
+                tipo=fila['tipo'],
+                valor=fila['valor'],
+                unidad=fila.get('unidad'),
+                observaciones=fila.get('observaciones'),
+                registrado_por=usuario
+            )
+            for fila in filas
+        ],
+        batch_size=TAMANO_LOTE
+    )
+    sumar((registro.animal_id, registro.tipo, registro.fecha, registro.valor) for registro in registros)
+    return registros
@@ -0,0 +1,32 @@
+from rest_framework import serializers
+from .models import RegistroProduccion, ResumenProduccion
+
+
+class RegistroProduccionSerializer(serializers.ModelSerializer):
+    chapeta = serializers.CharField(source='animal.chapeta', read_only=True)
+
+    class Meta:
+        model = RegistroProduccion
+        fields = '__all__'
+        read_only_fields = ['registrado_por', 'fecha_registro']
+
+
+class RegistroLoteSerializer(serializers.Serializer):
+    """
+    Fila de un alta por lotes: el animal va como id y su existencia se
+    comprueba para todo el lote con una sola consulta
+    """
+    animal = serializers.IntegerField(min_value=1)
+    fecha = serializers.DateField()
+    tipo = serializers.CharField(max_length=50)
+    valor = serializers.FloatField()
+    unidad = serializers.CharField(max_length=20, required=False, allow_null=True, allow_blank=True)
+    observaciones = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+
+class ResumenProduccionSerializer(serializers.ModelSerializer):
+    promedio = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ResumenProduccion
+        fields = ['id', 'animal', 'tipo', 'periodo', 'inicio', 'total', 'registros', 'promedio', 'minimo', 'maximo']
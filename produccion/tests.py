@@ -0,0 +1,162 @@
+from datetime import date
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from animales.models import Animal
+from usuarios.models import Usuario
+from .models import RegistroProduccion, ResumenProduccion
+from . import resumenes
+
+
+def crear_animal(chapeta):
+    return Animal.objects.create(
+        chapeta=chapeta,
+        sexo='hembra',
+        fecha_nacimiento=date(2020, 1, 1),
+        raza='Holstein',
+        estado_reproductivo='lactante',
+        estado_productivo='activo'
+    )
+
+
+def acumulados():
+    """{(animal, tipo, periodo, inicio): (total, registros, minimo, maximo)}"""
+    return {
+        (animal_id, tipo, periodo, inicio): (round(total, 9), registros, minimo, maximo)
+        for animal_id, tipo, periodo, inicio, total, registros, minimo, maximo in ResumenProduccion.objects.values_list(
+            'animal_id', 'tipo', 'periodo', 'inicio', 'total', 'registros', 'minimo', 'maximo'
+        )
+    }
+
+
+class ResumenesTests(TestCase):
+    """Acumulados por diferencia (sumar) y por recálculo frente a reconstruir()"""
+
+    def setUp(self):
+        self.vaca = crear_animal('V1')
+        self.otra = crear_animal('V2')
+
+    def registrar(self, animal, fecha, valor, tipo='leche'):
+        registro = RegistroProduccion.objects.create(animal=animal, fecha=fecha, tipo=tipo, valor=valor)
+        resumenes.sumar([(animal.pk, tipo, fecha, valor)])
+        return registro
+
+    def assertCoincideConReconstruccion(self):
+        incremental = acumulados()
+        resumenes.reconstruir()
+        self.assertEqual(acumulados(), incremental)
+
+    def test_periodos(self):
+        self.assertEqual(resumenes.inicio_periodo(date(2024, 3, 10), 'semana'), date(2024, 3, 4))
+        self.assertEqual(resumenes.inicio_periodo(date(2024, 3, 10), 'mes'), date(2024, 3, 1))
+        self.assertEqual(resumenes.fin_periodo(date(2024, 12, 1), 'mes'), date(2025, 1, 1))
+        self.assertEqual(resumenes.fin_periodo(date(2024, 2, 26), 'semana'), date(2024, 3, 4))
+
+    def test_sumar(self):
+        # Lunes, martes y domingo de la misma semana
+        resumenes.sumar([
+            (self.vaca.pk, 'leche', date(2024, 3, 4), 10.0),
+            (self.vaca.pk, 'leche', date(2024, 3, 5), 20.0),
+            (self.vaca.pk, 'leche', date(2024, 3, 10), 5.0),
+        ])
+        resumenes.sumar([(self.vaca.pk, 'leche', date(2024, 3, 4), 1.0)])
+
+        filas = acumulados()
+        self.assertEqual(filas[(self.vaca.pk, 'leche', 'dia', date(2024, 3, 4))], (11.0, 2, 1.0, 10.0))
+        self.assertEqual(filas[(self.vaca.pk, 'leche', 'semana', date(2024, 3, 4))], (36.0, 4, 1.0, 20.0))
+        self.assertEqual(filas[(self.vaca.pk, 'leche', 'mes', date(2024, 3, 1))], (36.0, 4, 1.0, 20.0))
+        self.assertEqual(len(filas), 3 + 1 + 1)
+
+    def test_recalcular_tras_editar_y_borrar(self):
+        maximo = self.registrar(self.vaca, date(2024, 3, 5), 20.0)
+        self.registrar(self.vaca, date(2024, 3, 4), 10.0)
+        self.registrar(self.vaca, date(2024, 3, 10), 5.0)
+        unico = self.registrar(self.otra, date(2024, 3, 31), 7.0)
+
+        # Borrar el máximo: no se puede deshacer por diferencia
+        maximo.delete()
+        resumenes.recalcular([(self.vaca.pk, 'leche', maximo.fecha)])
+        filas = acumulados()
+        self.assertNotIn((self.vaca.pk, 'leche', 'dia', date(2024, 3, 5)), filas)
+        self.assertEqual(filas[(self.vaca.pk, 'leche', 'semana', date(2024, 3, 4))], (15.0, 2, 5.0, 10.0))
+        self.assertCoincideConReconstruccion()
+
+        # Cambiar de mes un registro: se recalculan el periodo de antes y el de después
+        anterior = (unico.animal_id, unico.tipo, unico.fecha)
+        unico.fecha = date(2024, 4, 1)
+        unico.save()
+        resumenes.recalcular([anterior, (unico.animal_id, unico.tipo, unico.fecha)])
+        filas = acumulados()
+        self.assertNotIn((self.otra.pk, 'leche', 'mes', date(2024, 3, 1)), filas)
+        self.assertEqual(filas[(self.otra.pk, 'leche', 'mes', date(2024, 4, 1))], (7.0, 1, 7.0, 7.0))
+        self.assertCoincideConReconstruccion()
+
+    def test_reintento_si_otro_crea_el_acumulado(self):
+        original = resumenes._existentes
+        llamadas = []
+
+        def existentes(claves):
+            # La primera lectura no ve el acumulado que otra transacción crea justo después
+            resultado = original(claves)
+            llamadas.append(len(claves))
+            if len(llamadas) == 1:
+                ResumenProduccion.objects.create(
+                    animal=self.vaca, tipo='leche', periodo='dia', inicio=date(2024, 3, 4),
+                    total=0, registros=0
+                )
+            return resultado
+
+        with mock.patch.object(resumenes, '_existentes', existentes):
+            resumenes.sumar([(self.vaca.pk, 'leche', date(2024, 3, 4), 10.0)])
+        self.assertEqual(len(llamadas), 2)
+        self.assertEqual(acumulados()[(self.vaca.pk, 'leche', 'dia', date(2024, 3, 4))], (10.0, 1, 10.0, 10.0))
+        self.assertEqual(ResumenProduccion.objects.count(), 3)
+
+
+class ProduccionApiTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+        self.vaca = crear_animal('V1')
+
+    def test_lote(self):
+        filas = [
+            {'animal': self.vaca.pk, 'fecha': f'2024-03-0{dia}', 'tipo': 'leche', 'valor': 10 * dia}
+            for dia in range(1, 4)
+        ]
+        respuesta = self.cliente.post('/api/produccion/registros/lote/', filas + [
+            {'animal': self.vaca.pk, 'fecha': '2024-03-04', 'tipo': 'leche', 'valor': 'mucha'}
+        ], format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['errores'][0]['fila'], 4)
+        self.assertFalse(RegistroProduccion.objects.exists())
+
+        respuesta = self.cliente.post('/api/produccion/registros/lote/', filas, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['creados'], 3)
+        self.assertEqual(acumulados()[(self.vaca.pk, 'leche', 'mes', date(2024, 3, 1))], (60.0, 3, 10.0, 30.0))
+
+    def test_editar_y_borrar(self):
+        respuesta = self.cliente.post('/api/produccion/registros/', {
+            'animal': self.vaca.pk, 'fecha': '2024-03-31', 'tipo': 'leche', 'valor': 12
+        }, format='json')
+        registro_id = respuesta.json()['id']
+        self.cliente.patch(f'/api/produccion/registros/{registro_id}/', {'fecha': '2024-04-01'}, format='json')
+        meses = {clave[3]: valor for clave, valor in acumulados().items() if clave[2] == 'mes'}
+        self.assertEqual(meses, {date(2024, 4, 1): (12.0, 1, 12.0, 12.0)})
+
+        self.cliente.delete(f'/api/produccion/registros/{registro_id}/')
+        self.assertFalse(ResumenProduccion.objects.exists())
+
+    def test_produccion_del_animal_es_de_solo_lectura(self):
+        respuesta = self.cliente.patch(
+            f'/api/animales/{self.vaca.pk}/', {'produccion': [{'tipo': 'leche', 'valor': 1}]}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('produccion', respuesta.json())
+        self.assertEqual(Animal.objects.get(pk=self.vaca.pk).produccion, [])
@@ -0,0 +1,11 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import RegistroProduccionViewSet, ResumenProduccionViewSet
+
+router = DefaultRouter()
+router.register(r'registros', RegistroProduccionViewSet, basename='registro-produccion')
+router.register(r'resumenes', ResumenProduccionViewSet, basename='resumen-produccion')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,201 @@
+import traceback
+from datetime import date
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+from .models import RegistroProduccion, ResumenProduccion
+from .serializers import RegistroProduccionSerializer, RegistroLoteSerializer, ResumenProduccionSerializer
+from . import resumenes
+from animales.models import Animal
+from utils.campos import CamposParcialesMixin
+from utils.exportacion import ExportacionMixin
+from logs.utils import registrar_log
+
+MAXIMO_LOTE = 50000
+MAXIMO_ERRORES = 1000
+
+
+def filtrar_fechas(queryset, parametros, campo):
+    """?desde= y ?hasta= (AAAA-MM-DD, ambos incluidos) sobre el campo de fecha indicado"""
+    for parametro, operador in (('desde', 'gte'), ('hasta', 'lte')):
+        valor = parametros.get(parametro)
+        if not valor:
+            continue
+        try:
+            queryset = queryset.filter(**{f'{campo}__{operador}': date.fromisoformat(valor)})
+        except ValueError:
+            raise ValidationError({'error': f'{parametro} debe ser una fecha AAAA-MM-DD'})
+    return queryset
+
+
+class RegistroProduccionViewSet(CamposParcialesMixin, ExportacionMixin, viewsets.ModelViewSet):
+    queryset = RegistroProduccion.objects.select_related('animal')
+    serializer_class = RegistroProduccionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['animal', 'tipo', 'fecha']
+    ordenacion_cursor = ('fecha', 'id')
+    campos_exportacion_extra = ('animal__chapeta',)
+
+    def get_queryset(self):
+        queryset = filtrar_fechas(super().get_queryset(), self.request.query_params, 'fecha')
+        return queryset.order_by(*self.ordenacion_cursor)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            registro = serializer.save(registrado_por=self.request.user)
+            resumenes.sumar([(registro.animal_id, registro.tipo, registro.fecha, registro.valor)])
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='crear',
+            entidad_afectada='registro_produccion',
+            entidad_id=registro.id,
+            observaciones=f'{registro.tipo} del animal {registro.animal_id} el {registro.fecha}: {registro.valor}'
+        )
+
+    def perform_update(self, serializer):
+        anterior = serializer.instance
+        punto_anterior = (anterior.animal_id, anterior.tipo, anterior.fecha)
+        with transaction.atomic():
+            registro = serializer.save()
+            resumenes.recalcular([punto_anterior, (registro.animal_id, registro.tipo, registro.fecha)])
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='editar',
+            entidad_afectada='registro_produccion',
+            entidad_id=registro.id,
+            observaciones='Registro de producción actualizado'
+        )
+
+    def perform_destroy(self, instance):
+        registro_id = instance.id
+        with transaction.atomic():
+            instance.delete()
+            resumenes.recalcular([(instance.animal_id, instance.tipo, instance.fecha)])
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='eliminar',
+            entidad_afectada='registro_produccion',
+            entidad_id=registro_id,
+            observaciones='Registro de producción eliminado'
+        )
+
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        """
+        Alta de muchos registros en una petición (p. ej. el control lechero del
+        día): [{animal, fecha, tipo, valor[, unidad, observaciones]}] o
+        {"registros": [...]}. Si alguna fila no es válida no se guarda ninguna.
+        """
+        try:
+            filas = request.data.get('registros') if isinstance(request.data, dict) else request.data
+            if not isinstance(filas, list) or not filas:
+                return Response({'error': 'Envía una lista de registros'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(filas) > MAXIMO_LOTE:
+                return Response(
+                    {'error': f'Como máximo {MAXIMO_LOTE} registros por petición'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            serializer = RegistroLoteSerializer(data=filas, many=True)
+            if not serializer.is_valid():
+                errores = [
+                    {'fila': numero, 'errores': error}
+                    for numero, error in enumerate(serializer.errors, start=1) if error
+                ]
+                return Response(
+                    {'error': f'{len(errores)} registros no válidos', 'errores': errores[:MAXIMO_ERRORES]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            datos = serializer.validated_data
+            animal_ids = {fila['animal'] for fila in datos}
+            desconocidos = sorted(animal_ids - set(Animal.objects.filter(id__in=animal_ids).values_list('id', flat=True)))
+            if desconocidos:
+                return Response(
+                    {'error': f'Animales no encontrados: {desconocidos[:MAXIMO_ERRORES]}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            registros = resumenes.registrar(datos, usuario=request.user)
+            fechas = [fila['fecha'] for fila in datos]
+            resumen = {
+                'creados': len(registros),
+                'animales': len(animal_ids),
+                'tipos': sorted({fila['tipo'] for fila in datos}),
+                'desde': min(fechas),
+                'hasta': max(fechas),
+            }
+            try:
+                registrar_log(
+                    usuario=request.user,
+                    tipo_accion='registrar_produccion',
+                    entidad_afectada='registro_produccion',
+                    entidad_id=f'{registros[0].id}-{registros[-1].id}',
+                    cambios={clave: str(valor) for clave, valor in resumen.items()},
+                    observaciones=f"{len(registros)} registros de producción de {len(animal_ids)} animales"
+                )
+            except Exception as log_error:
+                print(f"⚠️ Error registrando log: {log_error}")
+
+            print(f"🥛 Producción registrada: {len(registros)} registros de {len(animal_ids)} animales")
+            return Response(resumen, status=status.HTTP_201_CREATED)
+
+        except Exception as e:
+            print(f"❌ Error registrando producción: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error registrando producción: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class ResumenProduccionViewSet(CamposParcialesMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = ResumenProduccion.objects.all()
+    serializer_class = ResumenProduccionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['animal', 'tipo', 'periodo']
+    ordenacion_cursor = ('inicio', 'id')
+
+    def get_queryset(self):
+        queryset = filtrar_fechas(super().get_queryset(), self.request.query_params, 'inicio')
+        return queryset.order_by(*self.ordenacion_cursor)
+
+    @action(detail=False, methods=['get'])
+    def rebano(self, request):
+        """Totales del rebaño (o de ?grupo=) por periodo: ?tipo=leche&periodo=mes[&desde=&hasta=]"""
+        tipo = request.query_params.get('tipo')
+        periodo = request.query_params.get('periodo', 'mes')
+        if not tipo:
+            return Response({'error': 'Indica el tipo de producción en "tipo"'}, status=status.HTTP_400_BAD_REQUEST)
+        if periodo not in resumenes.PERIODOS:
+            return Response(
+                {'error': f"periodo debe ser uno de: {', '.join(resumenes.PERIODOS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = filtrar_fechas(
+            ResumenProduccion.objects.filter(tipo=tipo, periodo=periodo), request.query_params, 'inicio'
+        )
+        grupo = request.query_params.get('grupo')
+        if grupo:
+            queryset = queryset.filter(animal__grupos__id=grupo)
+        filas = list(
+            queryset.values('inicio')
+            .annotate(
+                total=Sum('total'),
+                registros=Sum('registros'),
+                animales=Count('animal', distinct=True),
+                minimo=Min('minimo'),
+                maximo=Max('maximo'),
+            )
+            .order_by('inicio')
+        )
+        for fila in filas:
+            fila['promedio'] = fila['total'] / fila['registros'] if fila['registros'] else None
+        return Response({'tipo': tipo, 'periodo': periodo, 'resultados': filas})
@@ -3,14 +3,17 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Tratamiento
 from .serializers import TratamientoSerializer
 from utils.permissions import IsAdminUser
+from utils.campos import CamposParcialesMixin
+from utils.exportacion import ExportacionMixin
 from logs.utils import registrar_log
 
-class TratamientoViewSet(viewsets.ModelViewSet):
+class TratamientoViewSet(CamposParcialesMixin, ExportacionMixin, viewsets.ModelViewSet):
     queryset = Tratamiento.objects.all()
     serializer_class = TratamientoSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['animal', 'fecha', 'medicamento', 'administrado_por']
+    campos_exportacion_extra = ('animal__chapeta',)
 
     def get_queryset(self):
         user = self.request.user
@@ -0,0 +1,132 @@
+"""
+Árbol de ubicaciones (finca > sección > potrero > corral) con ruta materializada.
+
+Cada ubicación guarda en `ruta` los ids desde la raíz ('/3/17/42/'), así que
+todo lo que cuelga de un nodo son las rutas que empiezan por la suya
+(subarbol()): una sola consulta, sin recorrer el árbol nivel a nivel. Un rango
+[ruta, ruta con el último '/' cambiado por '0') solo equivale al prefijo con
+intercalación binaria; en PostgreSQL, con intercalaciones lingüísticas que
+ignoran la puntuación, dejaría fuera nodos o metería otros. En PostgreSQL
+LIKE 'ruta%' usa el índice varchar_pattern_ops (*_like) que Django crea para
+un CharField único; en SQLite recorre el índice de ruta.
+
+`animales` (estancias abiertas en el propio nodo) y `animales_subarbol` (en el
+nodo y sus descendientes) son contadores que ajustar_conteos() actualiza por
+diferencia en cada traslado; recalcular_conteos() los rehace desde los
+movimientos.
+"""
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Concat, Substr
+
+from .models import Movimiento, Ubicacion
+
+SEPARADOR = '/'
+
+
+class ErrorArbol(ValueError):
+    pass
+
+
+def _ruta(padre, ubicacion_id):
+    return (padre.ruta if padre else SEPARADOR) + f'{ubicacion_id}{SEPARADOR}'
+
+
+def ancestros(ruta):
+    """Ids desde la raíz hasta el propio nodo"""
+    return [int(parte) for parte in ruta.strip(SEPARADOR).split(SEPARADOR)]
+
+
+def subarbol(ruta, campo='ruta'):
+    """Q de los nodos (o filas relacionadas, con `campo`) del subárbol de `ruta`, incluido él"""
+    return Q(**{f'{campo}__startswith': ruta})
+
+
+@transaction.atomic
+def crear(nombre, padre=None, tipo=None):
+    # La ruta depende del id: se guarda una provisional y se corrige
+    ubicacion = Ubicacion.objects.create(nombre=nombre, tipo=tipo, padre=padre, ruta=f'{SEPARADOR}{uuid.uuid4().hex}')
+    ubicacion.ruta = _ruta(padre, ubicacion.pk)
+    ubicacion.nivel = ubicacion.ruta.count(SEPARADOR) - 2
+    Ubicacion.objects.filter(pk=ubicacion.pk).update(ruta=ubicacion.ruta, nivel=ubicacion.nivel)
+    return ubicacion
+
+
+def resolver(ubicacion):
+    """Ubicacion a partir de una instancia, un id o un nombre (que se crea como raíz si no existe)"""
+    if ubicacion is None or isinstance(ubicacion, Ubicacion):
+        return ubicacion
+    if isinstance(ubicacion, int):
+        return Ubicacion.objects.get(pk=ubicacion)
+    nombre = str(ubicacion).strip()
+    if not nombre:
+        return None
+    existente = Ubicacion.objects.filter(nombre=nombre).first()
+    return existente or crear(nombre)
+
+
+def ajustar_conteos(deltas):
+    """Sumar {ubicacion_id: diferencia de estancias abiertas} al nodo y a todos sus ancestros"""
+    deltas = {ubicacion_id: delta for ubicacion_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    en_subarbol = defaultdict(int)
+    for ubicacion_id, ruta in Ubicacion.objects.filter(id__in=deltas).values_list('id', 'ruta'):
+        for ancestro in ancestros(ruta):
+            en_subarbol[ancestro] += deltas[ubicacion_id]
+
+    # Una sentencia por cada valor distinto de la diferencia
+    for campo, cambios in (('animales', deltas), ('animales_subarbol', en_subarbol)):
+        por_delta = defaultdict(list)
+        for ubicacion_id, delta in cambios.items():
+            if delta:
+                por_delta[delta].append(ubicacion_id)
+        for delta, ids in por_delta.items():
+            Ubicacion.objects.filter(id__in=ids).update(**{campo: F(campo) + delta})
+
+
+@transaction.atomic
+def mover_nodo(ubicacion, padre):
+    """Colgar la ubicación (con todo su subárbol) de otro padre, o hacerla raíz"""
+    ubicacion = Ubicacion.objects.select_for_update().get(pk=ubicacion.pk)
+    if padre is not None and padre.ruta.startswith(ubicacion.ruta):
+        raise ErrorArbol('Una ubicación no puede colgar de sí misma ni de sus descendientes')
+    vieja, nueva = ubicacion.ruta, _ruta(padre, ubicacion.pk)
+    if vieja == nueva:
+        return ubicacion
+
+    total = ubicacion.animales_subarbol
+    Ubicacion.objects.filter(id__in=ancestros(vieja)[:-1]).update(animales_subarbol=F('animales_subarbol') - total)
+    Ubicacion.objects.filter(subarbol(vieja)).update(
+        ruta=Concat(Value(nueva), Substr('ruta', len(vieja) + 1)),
+        nivel=F('nivel') + (nueva.count(SEPARADOR) - vieja.count(SEPARADOR))
+    )
+    Ubicacion.objects.filter(id__in=ancestros(nueva)[:-1]).update(animales_subarbol=F('animales_subarbol') + total)
+    Ubicacion.objects.filter(pk=ubicacion.pk).update(padre=padre)
+    ubicacion.refresh_from_db()
+    return ubicacion
+
+
+@transaction.atomic
+def recalcular_conteos():
+    """Rehacer los contadores de todo el árbol desde las estancias abiertas"""
+    directos = dict(
+        Movimiento.objects.filter(salida__isnull=True)
+        .values('ubicacion_id').annotate(total=Count('id')).values_list('ubicacion_id', 'total')
+    )
+    en_subarbol = defaultdict(int)
+    nodos = list(Ubicacion.objects.values_list('id', 'ruta', 'animales', 'animales_subarbol'))
+    for ubicacion_id, ruta, _, _ in nodos:
+        for ancestro in ancestros(ruta):
+            en_subarbol[ancestro] += directos.get(ubicacion_id, 0)
+
+    cambiados = [
+        Ubicacion(id=ubicacion_id, animales=directos.get(ubicacion_id, 0), animales_subarbol=en_subarbol[ubicacion_id])
+        for ubicacion_id, _, animales, total in nodos
+        if (animales, total) != (directos.get(ubicacion_id, 0), en_subarbol[ubicacion_id])
+    ]
+    Ubicacion.objects.bulk_update(cambiados, ['animales', 'animales_subarbol'], batch_size=1000)
+    return len(cambiados)
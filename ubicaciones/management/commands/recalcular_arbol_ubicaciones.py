@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ubicaciones.arbol import recalcular_conteos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de animales del árbol de ubicaciones desde los movimientos'
+
+    def handle(self, *args, **options):
+        total = recalcular_conteos()
+        self.stdout.write(self.style.SUCCESS(f'✅ Ubicaciones con contadores corregidos: {total}'))
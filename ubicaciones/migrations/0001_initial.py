@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('animales', '0007_animal_rfid'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Movimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ubicacion', models.CharField(max_length=255)),
+                ('entrada', models.DateTimeField()),
+                ('salida', models.DateTimeField(blank=True, null=True)),
+                ('motivo', models.CharField(blank=True, max_length=100, null=True)),
+                ('observaciones', models.TextField(blank=True, null=True)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='animales.animal')),
+                ('registrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ubicacion', 'entrada'], name='movimiento_ubicacion_idx'), models.Index(fields=['animal', 'entrada'], name='movimiento_animal_idx'), models.Index(condition=models.Q(('salida__isnull', True)), fields=['ubicacion'], name='movimiento_abiertos_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('salida__isnull', True)), fields=('animal',), name='movimiento_un_abierto_por_animal')],
+            },
+        ),
+    ]
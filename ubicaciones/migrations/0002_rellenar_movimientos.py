@@ -0,0 +1,87 @@
+from datetime import datetime, time
+
+from django.db import migrations
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+TAMANO_LOTE = 1000
+CLAVES_UBICACION = ('ubicacion', 'ubicacion_nueva', 'destino', 'hacia')
+CLAVES_FECHA = ('fecha', 'fecha_entrada', 'entrada', 'fecha_movimiento')
+
+
+def _momento(valor):
+    valor = str(valor or '')
+    momento = parse_datetime(valor)
+    if momento is None:
+        dia = parse_date(valor[:10]) if len(valor) >= 10 else None
+        if dia is None:
+            return None
+        momento = datetime.combine(dia, time.min)
+    return timezone.make_aware(momento) if timezone.is_naive(momento) else momento
+
+
+def _primero(entrada, claves):
+    return next((entrada[clave] for clave in claves if entrada.get(clave)), None)
+
+
+def rellenar_movimientos(apps, schema_editor):
+    """
+    Pasar Animal.historial_movimientos (llegadas {ubicacion o destino, fecha})
+    y ubicacion_actual a estancias. Cada llegada dura hasta la siguiente; la
+    ubicación actual queda abierta. Si no coincide con la última llegada del
+    historial, la estancia actual empieza al migrar (única fecha conocida).
+    """
+    Animal = apps.get_model('animales', 'Animal')
+    Movimiento = apps.get_model('ubicaciones', 'Movimiento')
+    ahora = timezone.now()
+
+    movimientos, migrados, omitidas = [], 0, 0
+    consulta = Animal.objects.order_by('id').values_list(
+        'id', 'historial_movimientos', 'ubicacion_actual', 'fecha_alta_sistema'
+    )
+    for animal_id, historial, actual, alta in consulta.iterator(chunk_size=TAMANO_LOTE):
+        llegadas = []
+        for entrada in historial if isinstance(historial, list) else []:
+            lugar = _primero(entrada, CLAVES_UBICACION) if isinstance(entrada, dict) else None
+            momento = _momento(_primero(entrada, CLAVES_FECHA)) if lugar else None
+            if momento is None or momento > ahora:
+                omitidas += 1
+                continue
+            llegadas.append((momento, str(lugar).strip()[:255]))
+        llegadas.sort(key=lambda llegada: llegada[0])
+        # Dos llegadas seguidas al mismo sitio son la misma estancia
+        llegadas = [llegada for indice, llegada in enumerate(llegadas) if indice == 0 or llegadas[indice - 1][1] != llegada[1]]
+
+        actual = (actual or '').strip() or None
+        if actual and (not llegadas or llegadas[-1][1] != actual):
+            llegadas.append((ahora if llegadas else alta, actual))
+
+        for indice, (momento, lugar) in enumerate(llegadas):
+            siguiente = llegadas[indice + 1][0] if indice + 1 < len(llegadas) else None
+            if siguiente is None and not actual:
+                # Sin ubicación actual: la última estancia del historial ya terminó
+                siguiente = momento
+            movimientos.append(Movimiento(
+                animal_id=animal_id, ubicacion=lugar, entrada=momento, salida=siguiente, motivo='historial'
+            ))
+
+        if len(movimientos) >= TAMANO_LOTE * 10:
+            Movimiento.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE)
+            migrados += len(movimientos)
+            movimientos = []
+    Movimiento.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE)
+    migrados += len(movimientos)
+    if migrados or omitidas:
+        print(f"🚚 Movimientos migrados: {migrados} estancias, {omitidas} entradas omitidas")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ubicaciones', '0001_initial'),
+        ('animales', '0007_animal_rfid'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_movimientos, migrations.RunPython.noop),
+    ]
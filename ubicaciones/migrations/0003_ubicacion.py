@@ -0,0 +1,34 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ubicaciones', '0002_rellenar_movimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ubicacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True)),
+                ('tipo', models.CharField(blank=True, choices=[('finca', 'Finca'), ('seccion', 'Sección'), ('potrero', 'Potrero'), ('corral', 'Corral')], max_length=20, null=True)),
+                ('ruta', models.CharField(editable=False, max_length=255, unique=True)),
+                ('nivel', models.PositiveSmallIntegerField(default=0, editable=False)),
+                ('animales', models.PositiveIntegerField(default=0, editable=False)),
+                ('animales_subarbol', models.PositiveIntegerField(default=0, editable=False)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('padre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='hijos', to='ubicaciones.ubicacion')),
+            ],
+            options={
+                'ordering': ['ruta'],
+            },
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='ubicacion_nodo',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='ubicaciones.ubicacion'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+import uuid
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def rellenar_ubicaciones(apps, schema_editor):
+    """
+    Crear una ubicación raíz por cada texto de ubicación usado en los
+    movimientos (se pueden colgar después de su finca o sección), enlazar
+    los movimientos y contar las estancias abiertas de cada una.
+    """
+    Movimiento = apps.get_model('ubicaciones', 'Movimiento')
+    Ubicacion = apps.get_model('ubicaciones', 'Ubicacion')
+
+    nombres = Movimiento.objects.order_by('ubicacion').values_list('ubicacion', flat=True).distinct()
+    for nombre in nombres.iterator():
+        ubicacion = Ubicacion.objects.create(nombre=nombre, ruta=f'/{uuid.uuid4().hex}')
+        Ubicacion.objects.filter(pk=ubicacion.pk).update(ruta=f'/{ubicacion.pk}/')
+        Movimiento.objects.filter(ubicacion=nombre).update(ubicacion_nodo=ubicacion)
+
+    abiertas = (
+        Movimiento.objects.filter(salida__isnull=True)
+        .values('ubicacion_nodo').annotate(total=Count('id')).values_list('ubicacion_nodo', 'total')
+    )
+    for ubicacion_id, total in abiertas:
+        Ubicacion.objects.filter(pk=ubicacion_id).update(animales=total, animales_subarbol=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ubicaciones', '0003_ubicacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_ubicaciones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ubicaciones', '0004_rellenar_ubicaciones'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='movimiento',
+            name='movimiento_ubicacion_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='movimiento',
+            name='movimiento_abiertos_idx',
+        ),
+        migrations.RemoveField(
+            model_name='movimiento',
+            name='ubicacion',
+        ),
+        migrations.RenameField(
+            model_name='movimiento',
+            old_name='ubicacion_nodo',
+            new_name='ubicacion',
+        ),
+        migrations.AlterField(
+            model_name='movimiento',
+            name='ubicacion',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='ubicaciones.ubicacion'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['ubicacion', 'entrada'], name='movimiento_ubicacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(condition=models.Q(('salida__isnull', True)), fields=['ubicacion'], name='movimiento_abiertos_idx'),
+        ),
+    ]
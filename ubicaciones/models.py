@@ -0,0 +1,67 @@
+from django.db import models
+from django.conf import settings
+from animales.models import Animal
+
+
+class Ubicacion(models.Model):
+    """
+    Nodo del árbol de ubicaciones (finca > sección > potrero > corral). `ruta`
+    guarda los ids desde la raíz ('/3/17/42/') y los contadores de animales se
+    mantienen al mover animales (ver ubicaciones/arbol.py).
+    """
+    TIPO_CHOICES = [
+        ('finca', 'Finca'),
+        ('seccion', 'Sección'),
+        ('potrero', 'Potrero'),
+        ('corral', 'Corral'),
+    ]
+
+    # Único: es el texto que se copia en Animal.ubicacion_actual
+    nombre = models.CharField(max_length=255, unique=True)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, blank=True, null=True)
+    padre = models.ForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='hijos')
+    ruta = models.CharField(max_length=255, unique=True, editable=False)
+    nivel = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Estancias abiertas en la propia ubicación y en todo su subárbol
+    animales = models.PositiveIntegerField(default=0, editable=False)
+    animales_subarbol = models.PositiveIntegerField(default=0, editable=False)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['ruta']
+
+    def __str__(self):
+        return self.nombre
+
+
+class Movimiento(models.Model):
+    """
+    Estancia de un animal en una ubicación, de `entrada` a `salida`. La
+    estancia actual tiene la salida vacía y Animal.ubicacion_actual la copia.
+    """
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='movimientos')
+    ubicacion = models.ForeignKey(Ubicacion, on_delete=models.PROTECT, related_name='movimientos')
+    entrada = models.DateTimeField()
+    salida = models.DateTimeField(null=True, blank=True)
+    motivo = models.CharField(max_length=100, blank=True, null=True)
+    observaciones = models.TextField(blank=True, null=True)
+    registrado_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ubicacion', 'entrada'], name='movimiento_ubicacion_idx'),
+            models.Index(fields=['animal', 'entrada'], name='movimiento_animal_idx'),
+            # Ocupación actual: solo las estancias abiertas
+            models.Index(
+                fields=['ubicacion'], condition=models.Q(salida__isnull=True), name='movimiento_abiertos_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['animal'], condition=models.Q(salida__isnull=True), name='movimiento_un_abierto_por_animal'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.animal_id} en {self.ubicacion} desde {self.entrada}"
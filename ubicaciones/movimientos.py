@@ -0,0 +1,161 @@
+"""
+Historial de ubicaciones como intervalos (ubicacion, entrada, salida).
+
+Cada animal tiene como mucho un Movimiento abierto (salida vacía): el de su
+ubicación actual, que Animal.ubicacion_actual copia. Mover un grupo son unas
+pocas sentencias por lote de ids: cerrar las estancias abiertas, crear las
+nuevas con bulk_create y copiar el nombre de la ubicación en Animal. Los
+contadores de animales del árbol se ajustan por diferencia en la misma
+transacción (ver arbol.py).
+
+La ocupación en un momento o un día sale de una consulta por intervalos
+(entrada < fin y salida vacía o posterior al inicio) sobre el índice
+(ubicacion, entrada); la actual, del índice parcial de estancias abiertas.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from animales.models import Animal
+from animales import busqueda
+from .models import Movimiento
+from . import arbol
+
+TAMANO_LOTE = 1000
+MAXIMO_ERRORES = 1000
+
+
+class ErrorMovimiento(ValueError):
+    def __init__(self, mensaje, errores=None):
+        super().__init__(mensaje)
+        self.errores = errores or []
+
+
+def intervalo(valor):
+    """
+    (inicio, fin) de un parámetro de fecha: un día AAAA-MM-DD abarca el día
+    entero; una fecha y hora ISO es un instante. ValueError si no es válido.
+    """
+    dia = parse_date(valor) if len(valor) == 10 else None
+    if dia is not None:
+        inicio = timezone.make_aware(datetime.combine(dia, time.min))
+        return inicio, timezone.make_aware(datetime.combine(dia + timedelta(days=1), time.min))
+    momento = parse_datetime(valor)
+    if momento is None:
+        raise ValueError('La fecha debe ser AAAA-MM-DD o una fecha y hora ISO 8601')
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento, momento + timedelta(microseconds=1)
+
+
+def presentes(inicio, fin, estancias=None):
+    """Estancias (de todas o del queryset `estancias`) que se solapan con [inicio, fin)"""
+    estancias = Movimiento.objects.all() if estancias is None else estancias
+    return estancias.filter(entrada__lt=fin).filter(Q(salida__isnull=True) | Q(salida__gt=inicio))
+
+
+def ocupacion(inicio=None, fin=None, ubicaciones=None, raiz=None):
+    """
+    [{ubicacion, nombre, animales}] ahora (sin inicio) o en el intervalo
+    [inicio, fin), de las ubicaciones indicadas o del subárbol de `raiz`
+    """
+    estancias = Movimiento.objects.filter(salida__isnull=True) if inicio is None else presentes(inicio, fin)
+    if ubicaciones:
+        estancias = estancias.filter(ubicacion__in=ubicaciones)
+    if raiz is not None:
+        estancias = estancias.filter(arbol.subarbol(raiz.ruta, 'ubicacion__ruta'))
+    return list(
+        estancias.values('ubicacion', nombre=F('ubicacion__nombre'))
+        .annotate(animales=Count('animal_id', distinct=True))
+        .order_by('ubicacion__ruta')
+    )
+
+
+def mover(animal_ids, ubicacion, momento=None, usuario=None, motivo=None, observaciones=None,
+          actualizar_animales=True):
+    """
+    Llevar los animales a `ubicacion` (Ubicacion, id o nombre; vacía:
+    sacarlos de la que tengan) en `momento` (ahora por defecto). Los que ya
+    están allí no se tocan. Con actualizar_animales=False no se copia la
+    ubicación en Animal (el que llama ya la ha guardado). Devuelve los ids
+    movidos.
+    """
+    momento = momento or timezone.now()
+    animal_ids = list(dict.fromkeys(animal_ids))
+
+    movidos, deltas = [], defaultdict(int)
+    with transaction.atomic():
+        ubicacion = arbol.resolver(ubicacion)
+        destino = ubicacion.pk if ubicacion else None
+        for inicio in range(0, len(animal_ids), TAMANO_LOTE):
+            trozo = animal_ids[inicio:inicio + TAMANO_LOTE]
+            abiertos = {
+                animal_id: (lugar, entrada)
+                for animal_id, lugar, entrada in Movimiento.objects.select_for_update()
+                .filter(animal_id__in=trozo, salida__isnull=True)
+                .values_list('animal_id', 'ubicacion_id', 'entrada')
+            }
+            posteriores = [
+                {'animal': animal_id, 'ubicacion': lugar, 'entrada': entrada}
+                for animal_id, (lugar, entrada) in abiertos.items() if entrada > momento
+            ]
+            if posteriores:
+                raise ErrorMovimiento(
+                    f'{len(posteriores)} animales entraron en su ubicación actual después de la fecha indicada',
+                    posteriores[:MAXIMO_ERRORES]
+                )
+
+            trozo = [animal_id for animal_id in trozo if abiertos.get(animal_id, (None,))[0] != destino]
+            if not trozo:
+                continue
+            for animal_id in trozo:
+                if animal_id in abiertos:
+                    deltas[abiertos[animal_id][0]] -= 1
+            Movimiento.objects.filter(animal_id__in=trozo, salida__isnull=True).update(salida=momento)
+            if ubicacion:
+                Movimiento.objects.bulk_create([
+                    Movimiento(
+                        animal_id=animal_id,
+                        ubicacion=ubicacion,
+                        entrada=momento,
+                        motivo=motivo,
+                        observaciones=observaciones,
+                        registrado_por=usuario
+                    )
+                    for animal_id in trozo
+                ])
+                deltas[destino] += len(trozo)
+            if actualizar_animales:
+                Animal.objects.filter(id__in=trozo).update(ubicacion_actual=ubicacion.nombre if ubicacion else None)
+            movidos.extend(trozo)
+
+        arbol.ajustar_conteos(deltas)
+        if actualizar_animales:
+            busqueda.indexar_animales(movidos)
+    return movidos
+
+
+def registrar_altas(animal_ids):
+    """Abrir la estancia inicial de animales creados con bulk_create que ya tienen ubicación"""
+    animal_ids = list(animal_ids)
+    with transaction.atomic():
+        deltas, ubicaciones = defaultdict(int), {}
+        for inicio in range(0, len(animal_ids), TAMANO_LOTE):
+            altas = (
+                Animal.objects.filter(id__in=animal_ids[inicio:inicio + TAMANO_LOTE])
+                .exclude(ubicacion_actual__isnull=True)
+                .exclude(ubicacion_actual='')
+                .values_list('id', 'ubicacion_actual', 'fecha_alta_sistema', 'creado_por_id')
+            )
+            nuevos = []
+            for animal_id, nombre, alta, usuario_id in altas:
+                if nombre not in ubicaciones:
+                    ubicaciones[nombre] = arbol.resolver(nombre).pk
+                nuevos.append(Movimiento(animal_id=animal_id, ubicacion_id=ubicaciones[nombre], entrada=alta, registrado_por_id=usuario_id))
+                deltas[ubicaciones[nombre]] += 1
+            Movimiento.objects.bulk_create(nuevos)
+        arbol.ajustar_conteos(deltas)
@@ -0,0 +1,33 @@
+from rest_framework import serializers
+from .models import Movimiento, Ubicacion
+
+
+class UbicacionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Ubicacion
+        fields = '__all__'
+        read_only_fields = ['ruta', 'nivel', 'animales', 'animales_subarbol', 'fecha_creacion']
+
+
+class MovimientoSerializer(serializers.ModelSerializer):
+    chapeta = serializers.CharField(source='animal.chapeta', read_only=True)
+    ubicacion_nombre = serializers.CharField(source='ubicacion.nombre', read_only=True)
+
+    class Meta:
+        model = Movimiento
+        fields = '__all__'
+
+
+class MoverSerializer(serializers.Serializer):
+    """Traslado de un grupo: destino y animales (ids o el mismo filtro que la edición masiva)"""
+    ubicacion = serializers.PrimaryKeyRelatedField(queryset=Ubicacion.objects.all(), allow_null=True)
+    animales = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    filtro = serializers.DictField(required=False)
+    fecha = serializers.DateTimeField(required=False)
+    motivo = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+    observaciones = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+    def validate(self, data):
+        if ('animales' in data) == ('filtro' in data):
+            raise serializers.ValidationError('Indica "animales" (lista de ids) o "filtro", no ambos')
+        return data
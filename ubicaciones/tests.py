@@ -0,0 +1,273 @@
+from datetime import date, datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from animales.models import Animal
+from usuarios.models import Usuario
+from .models import Movimiento, Ubicacion
+from . import arbol, movimientos
+
+
+def momento(*partes):
+    return timezone.make_aware(datetime(*partes))
+
+
+def crear_animal(chapeta):
+    return Animal.objects.create(
+        chapeta=chapeta,
+        sexo='hembra',
+        fecha_nacimiento=date(2020, 1, 1),
+        raza='Angus',
+        estado_reproductivo='vacío',
+        estado_productivo='activo'
+    )
+
+
+def rutas():
+    """{ubicacion_id: (ruta, nivel)}"""
+    return {
+        ubicacion_id: (ruta, nivel)
+        for ubicacion_id, ruta, nivel in Ubicacion.objects.values_list('id', 'ruta', 'nivel')
+    }
+
+
+def contadores():
+    """{ubicacion_id: (animales, animales_subarbol)}"""
+    return {
+        ubicacion_id: (animales, total)
+        for ubicacion_id, animales, total in Ubicacion.objects.values_list('id', 'animales', 'animales_subarbol')
+    }
+
+
+class MovimientosTests(TestCase):
+    """Estancias como intervalos y contadores del árbol frente a recalcular_conteos()"""
+
+    def setUp(self):
+        # finca > (norte > potrero 1, sur)
+        self.finca = arbol.crear('Finca')
+        self.norte = arbol.crear('Norte', self.finca)
+        self.potrero = arbol.crear('Potrero 1', self.norte)
+        self.sur = arbol.crear('Sur', self.finca)
+        self.animales = [crear_animal(f'A{i}') for i in range(4)]
+        self.ids = [animal.pk for animal in self.animales]
+
+    def assertCoincideConRecalculo(self):
+        incrementales = contadores()
+        self.assertEqual(arbol.recalcular_conteos(), 0)
+        self.assertEqual(contadores(), incrementales)
+
+    def test_mover_abre_y_cierra_estancias(self):
+        movidos = movimientos.mover(self.ids, self.potrero, momento(2024, 1, 1))
+        self.assertEqual(movidos, self.ids)
+        movidos = movimientos.mover(self.ids[:2], self.sur, momento(2024, 2, 1), motivo='rotacion')
+        self.assertEqual(movidos, self.ids[:2])
+        # Los que ya están en el destino no se tocan
+        self.assertEqual(movimientos.mover(self.ids, self.sur, momento(2024, 2, 2)), self.ids[2:])
+
+        estancias = list(
+            Movimiento.objects.filter(animal_id=self.ids[0]).order_by('entrada')
+            .values_list('ubicacion_id', 'entrada', 'salida')
+        )
+        self.assertEqual(estancias, [
+            (self.potrero.pk, momento(2024, 1, 1), momento(2024, 2, 1)),
+            (self.sur.pk, momento(2024, 2, 1), None),
+        ])
+        self.assertEqual(Movimiento.objects.filter(salida__isnull=True).count(), len(self.ids))
+        self.assertEqual(set(Animal.objects.values_list('ubicacion_actual', flat=True)), {'Sur'})
+
+        # Sacarlos de toda ubicación
+        movimientos.mover(self.ids[:1], None, momento(2024, 3, 1))
+        self.assertIsNone(Animal.objects.get(pk=self.ids[0]).ubicacion_actual)
+        self.assertFalse(Movimiento.objects.filter(animal_id=self.ids[0], salida__isnull=True).exists())
+
+    def test_no_se_mueve_antes_de_la_entrada(self):
+        movimientos.mover(self.ids, self.potrero, momento(2024, 1, 1))
+        with self.assertRaises(movimientos.ErrorMovimiento) as error:
+            movimientos.mover(self.ids, self.sur, momento(2023, 12, 31))
+        self.assertEqual(len(error.exception.errores), len(self.ids))
+        self.assertEqual(Movimiento.objects.count(), len(self.ids))
+
+    def test_contadores(self):
+        movimientos.mover(self.ids, self.potrero, momento(2024, 1, 1))
+        movimientos.mover(self.ids[:1], self.sur, momento(2024, 2, 1))
+        movimientos.mover(self.ids[1:2], self.finca, momento(2024, 2, 1))
+        self.assertEqual(contadores(), {
+            self.finca.pk: (1, 4),
+            self.norte.pk: (0, 2),
+            self.potrero.pk: (2, 2),
+            self.sur.pk: (1, 1),
+        })
+        self.assertCoincideConRecalculo()
+
+        # Colgar el potrero del sur se lleva sus animales al otro subárbol
+        arbol.mover_nodo(self.potrero, self.sur)
+        self.assertEqual(contadores()[self.norte.pk], (0, 0))
+        self.assertEqual(contadores()[self.sur.pk], (1, 3))
+        self.assertCoincideConRecalculo()
+
+        # Un contador desajustado se corrige al recalcular
+        Ubicacion.objects.filter(pk=self.finca.pk).update(animales_subarbol=99)
+        self.assertEqual(arbol.recalcular_conteos(), 1)
+        self.assertEqual(contadores()[self.finca.pk], (1, 4))
+
+    def assertRutasCoherentes(self):
+        """Cada ruta es la del padre más el propio id y el nivel sale de ella"""
+        for ubicacion in Ubicacion.objects.select_related('padre'):
+            esperada = (ubicacion.padre.ruta if ubicacion.padre else '/') + f'{ubicacion.pk}/'
+            self.assertEqual(ubicacion.ruta, esperada, ubicacion.nombre)
+            self.assertEqual(ubicacion.nivel, esperada.count('/') - 2, ubicacion.nombre)
+
+    def test_mover_nodo_reescribe_rutas(self):
+        corral = arbol.crear('Corral', self.potrero)
+        movimientos.mover(self.ids[:3], corral, momento(2024, 1, 1))
+        movimientos.mover(self.ids[3:], self.norte, momento(2024, 1, 1))
+
+        # norte (con potrero > corral) pasa a colgar del sur
+        movido = arbol.mover_nodo(self.norte, self.sur)
+        self.assertEqual(
+            (movido.ruta, movido.nivel, movido.padre_id), (f'{self.sur.ruta}{self.norte.pk}/', 2, self.sur.pk)
+        )
+        self.assertEqual(rutas()[corral.pk], (f'{self.sur.ruta}{self.norte.pk}/{self.potrero.pk}/{corral.pk}/', 4))
+        self.assertRutasCoherentes()
+        nodos = set(Ubicacion.objects.filter(arbol.subarbol(self.sur.ruta)).values_list('id', flat=True))
+        self.assertEqual(nodos, {self.sur.pk, self.norte.pk, self.potrero.pk, corral.pk})
+        self.assertEqual(contadores()[self.sur.pk], (0, 4))
+        self.assertEqual(contadores()[self.finca.pk], (0, 4))
+        self.assertCoincideConRecalculo()
+        # Las consultas por subárbol siguen a los nodos movidos
+        sur = movimientos.ocupacion(raiz=Ubicacion.objects.get(pk=self.sur.pk))
+        self.assertEqual({fila['ubicacion']: fila['animales'] for fila in sur}, {corral.pk: 3, self.norte.pk: 1})
+
+        # Sacar el potrero como raíz se lleva su subárbol y sus animales fuera de la finca
+        arbol.mover_nodo(self.potrero, None)
+        self.assertEqual(rutas()[self.potrero.pk], (f'/{self.potrero.pk}/', 0))
+        self.assertEqual(rutas()[corral.pk], (f'/{self.potrero.pk}/{corral.pk}/', 1))
+        self.assertRutasCoherentes()
+        self.assertEqual(contadores()[self.finca.pk], (0, 1))
+        self.assertEqual(contadores()[self.potrero.pk], (0, 3))
+        self.assertCoincideConRecalculo()
+
+        # Moverlo a donde ya está no cambia nada; a sí mismo o a un descendiente, error
+        antes = rutas()
+        arbol.mover_nodo(self.potrero, None)
+        for destino in (self.potrero, corral):
+            with self.assertRaises(arbol.ErrorArbol):
+                arbol.mover_nodo(self.potrero, Ubicacion.objects.get(pk=destino.pk))
+        self.assertEqual(rutas(), antes)
+
+    def test_subarbol(self):
+        otra = arbol.crear('Otra finca')
+        # Un id que empieza igual que el de la finca no es de su subárbol
+        vecina = Ubicacion.objects.create(nombre='Vecina', ruta=f'{self.finca.ruta[:-1]}9/', nivel=0)
+        nodos = set(Ubicacion.objects.filter(arbol.subarbol(self.norte.ruta)).values_list('id', flat=True))
+        self.assertEqual(nodos, {self.norte.pk, self.potrero.pk})
+        nodos = set(Ubicacion.objects.filter(arbol.subarbol(self.finca.ruta)).values_list('id', flat=True))
+        self.assertEqual(nodos, {self.finca.pk, self.norte.pk, self.potrero.pk, self.sur.pk})
+        self.assertNotIn(otra.pk, nodos)
+        self.assertNotIn(vecina.pk, nodos)
+
+        with self.assertRaises(arbol.ErrorArbol):
+            arbol.mover_nodo(self.norte, self.potrero)
+
+    def test_ocupacion_y_presentes(self):
+        movimientos.mover(self.ids, self.potrero, momento(2024, 1, 1))
+        movimientos.mover(self.ids[:3], self.sur, momento(2024, 2, 1, 12))
+
+        actual = {fila['ubicacion']: fila['animales'] for fila in movimientos.ocupacion()}
+        self.assertEqual(actual, {self.potrero.pk: 1, self.sur.pk: 3})
+
+        # El día del traslado estuvieron en los dos sitios; a las 9:00, solo en el potrero
+        dia = {fila['ubicacion']: fila['animales'] for fila in movimientos.ocupacion(*movimientos.intervalo('2024-02-01'))}
+        self.assertEqual(dia, {self.potrero.pk: 4, self.sur.pk: 3})
+        antes = movimientos.ocupacion(*movimientos.intervalo('2024-02-01T09:00:00'))
+        self.assertEqual([(fila['ubicacion'], fila['animales']) for fila in antes], [(self.potrero.pk, 4)])
+        self.assertEqual(movimientos.ocupacion(*movimientos.intervalo('2023-12-31')), [])
+
+        norte = movimientos.ocupacion(raiz=self.norte)
+        self.assertEqual([(fila['ubicacion'], fila['animales']) for fila in norte], [(self.potrero.pk, 1)])
+        presentes = movimientos.presentes(*movimientos.intervalo('2024-01-15'))
+        self.assertEqual(set(presentes.values_list('animal_id', flat=True)), set(self.ids))
+
+
+class MovimientosApiTests(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin'
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+        self.finca = arbol.crear('Finca')
+        self.corral = arbol.crear('Corral', self.finca)
+        self.animales = [crear_animal(f'A{i}') for i in range(3)]
+        self.ids = [animal.pk for animal in self.animales]
+
+    def test_mover(self):
+        respuesta = self.cliente.post('/api/ubicaciones/movimientos/mover/', {
+            'ubicacion': self.corral.pk, 'animales': self.ids, 'fecha': '2024-01-01T00:00:00Z', 'motivo': 'rotacion'
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['movidos'], 3)
+        self.assertEqual(
+            set(Movimiento.objects.filter(salida__isnull=True).values_list('registrado_por', flat=True)),
+            {self.usuario.pk}
+        )
+
+        respuesta = self.cliente.post('/api/ubicaciones/movimientos/mover/', {
+            'ubicacion': self.corral.pk, 'animales': self.ids + [999999]
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        respuesta = self.cliente.post('/api/ubicaciones/movimientos/mover/', {
+            'ubicacion': self.finca.pk, 'animales': self.ids, 'fecha': '2023-01-01T00:00:00Z'
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Movimiento.objects.count(), 3)
+
+    def test_ocupacion_y_presentes(self):
+        movimientos.mover(self.ids, self.corral, momento(2024, 1, 1))
+        respuesta = self.cliente.get('/api/ubicaciones/movimientos/ocupacion/', {'subarbol': self.finca.pk})
+        self.assertEqual(respuesta.json()['total'], 3)
+        self.assertEqual(
+            self.cliente.get('/api/ubicaciones/movimientos/ocupacion/', {'fecha': 'ayer'}).status_code, 400
+        )
+
+        respuesta = self.cliente.get('/api/ubicaciones/movimientos/presentes/', {'ubicacion': self.finca.pk})
+        self.assertEqual(respuesta.json()['count'], 0)
+        respuesta = self.cliente.get(
+            '/api/ubicaciones/movimientos/presentes/', {'ubicacion': self.finca.pk, 'subarbol': '1'}
+        )
+        self.assertEqual(respuesta.json()['count'], 3)
+        respuesta = self.cliente.get(f'/api/ubicaciones/arbol/{self.finca.pk}/subarbol/')
+        self.assertEqual([nodo['id'] for nodo in respuesta.json()['results']], [self.finca.pk, self.corral.pk])
+
+    def test_cambiar_padre(self):
+        movimientos.mover(self.ids, self.corral, momento(2024, 1, 1))
+        otra = arbol.crear('Otra finca')
+        respuesta = self.cliente.patch(
+            f'/api/ubicaciones/arbol/{self.corral.pk}/', {'padre': otra.pk}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.json()['ruta'], respuesta.json()['nivel']), (f'{otra.ruta}{self.corral.pk}/', 1))
+        self.assertEqual(Ubicacion.objects.get(pk=otra.pk).animales_subarbol, 3)
+        self.assertEqual(Ubicacion.objects.get(pk=self.finca.pk).animales_subarbol, 0)
+
+        respuesta = self.cliente.patch(f'/api/ubicaciones/arbol/{otra.pk}/', {'padre': self.corral.pk}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Ubicacion.objects.get(pk=otra.pk).ruta, otra.ruta)
+
+    def test_historial_es_de_solo_lectura(self):
+        animal = self.animales[0]
+        respuesta = self.cliente.patch(
+            f'/api/animales/{animal.pk}/', {'historial_movimientos': [{'ubicacion': 'Corral'}]}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Animal.objects.get(pk=animal.pk).historial_movimientos, [])
+
+    def test_cambiar_ubicacion_del_animal(self):
+        animal = self.animales[0]
+        respuesta = self.cliente.patch(f'/api/animales/{animal.pk}/', {'ubicacion_actual': 'Corral'}, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        abierta = Movimiento.objects.get(animal=animal, salida__isnull=True)
+        self.assertEqual((abierta.ubicacion_id, abierta.registrado_por_id), (self.corral.pk, self.usuario.pk))
+        self.assertEqual(Ubicacion.objects.get(pk=self.finca.pk).animales_subarbol, 1)
@@ -0,0 +1,11 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import MovimientoViewSet, UbicacionViewSet
+
+router = DefaultRouter()
+router.register(r'movimientos', MovimientoViewSet, basename='movimiento')
+router.register(r'arbol', UbicacionViewSet, basename='ubicacion')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
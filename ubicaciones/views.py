@@ -0,0 +1,305 @@
+import traceback
+from django.db import transaction
+from django.db.models import ProtectedError
+from django.utils import timezone
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+from .models import Movimiento, Ubicacion
+from .serializers import MovimientoSerializer, MoverSerializer, UbicacionSerializer
+from . import arbol, movimientos
+from animales.models import Animal
+from animales.serializers import AnimalListaSerializer
+from animales import busqueda
+from animales.edicion_masiva import filtrar, ErrorEdicionMasiva
+from produccion.views import filtrar_fechas
+from utils.campos import CamposParcialesMixin
+from utils.exportacion import ExportacionMixin
+from utils.permissions import IsAdminUser
+from utils.websocket_utils import send_animal_bulk_update
+from logs.utils import registrar_log
+
+MAXIMO_ANIMALES = 50000
+
+
+def _intervalo(parametros):
+    """(inicio, fin) de ?fecha= o (None, None) si no se indica"""
+    valor = parametros.get('fecha')
+    if not valor:
+        return None, None
+    try:
+        return movimientos.intervalo(valor)
+    except ValueError as e:
+        raise ValidationError({'error': str(e)})
+
+
+def _ubicacion(valor, parametro='ubicacion'):
+    """Ubicacion del id de un parámetro; 400 si no es un id o no existe"""
+    try:
+        return Ubicacion.objects.get(pk=int(valor))
+    except (TypeError, ValueError, Ubicacion.DoesNotExist):
+        raise ValidationError({'error': f'"{parametro}" debe ser el id de una ubicación existente'})
+
+
+class UbicacionViewSet(CamposParcialesMixin, viewsets.ModelViewSet):
+    """
+    Árbol de ubicaciones. Cambiar el padre mueve todo el subárbol; cambiar el
+    nombre lo cambia también en la ubicación actual de sus animales.
+    """
+    queryset = Ubicacion.objects.all()
+    serializer_class = UbicacionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['padre', 'tipo', 'nivel']
+    ordenacion_cursor = ('ruta',)
+
+    def get_queryset(self):
+        return super().get_queryset().order_by(*self.ordenacion_cursor)
+
+    def get_permissions(self):
+        if self.action == 'recalcular':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def perform_create(self, serializer):
+        serializer.instance = arbol.crear(**serializer.validated_data)
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='crear',
+            entidad_afectada='ubicacion',
+            entidad_id=serializer.instance.id,
+            observaciones=f'Ubicación {serializer.instance.nombre} creada en {serializer.instance.ruta}'
+        )
+
+    def perform_update(self, serializer):
+        ubicacion, datos = serializer.instance, serializer.validated_data
+        anterior = {'nombre': ubicacion.nombre, 'tipo': ubicacion.tipo, 'padre': ubicacion.padre_id}
+        try:
+            with transaction.atomic():
+                if 'padre' in datos and getattr(datos['padre'], 'pk', None) != ubicacion.padre_id:
+                    arbol.mover_nodo(ubicacion, datos['padre'])
+                # Sin save(): los contadores y la ruta solo los tocan las funciones de arbol
+                campos = {campo: datos[campo] for campo in ('nombre', 'tipo') if campo in datos}
+                if campos:
+                    Ubicacion.objects.filter(pk=ubicacion.pk).update(**campos)
+                renombrados = []
+                if campos.get('nombre', ubicacion.nombre) != ubicacion.nombre:
+                    renombrados = list(
+                        Animal.objects.filter(movimientos__ubicacion=ubicacion, movimientos__salida__isnull=True)
+                        .values_list('id', flat=True)
+                    )
+                    for inicio in range(0, len(renombrados), movimientos.TAMANO_LOTE):
+                        Animal.objects.filter(id__in=renombrados[inicio:inicio + movimientos.TAMANO_LOTE]).update(
+                            ubicacion_actual=campos['nombre']
+                        )
+                    busqueda.indexar_animales(renombrados)
+        except arbol.ErrorArbol as e:
+            raise ValidationError({'error': str(e)})
+
+        ubicacion.refresh_from_db()
+        nuevo = {'nombre': ubicacion.nombre, 'tipo': ubicacion.tipo, 'padre': ubicacion.padre_id}
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='editar',
+            entidad_afectada='ubicacion',
+            entidad_id=ubicacion.id,
+            cambios={
+                campo: {'antes': anterior[campo], 'despues': nuevo[campo]}
+                for campo in nuevo if anterior[campo] != nuevo[campo]
+            },
+            observaciones=f'Ubicación {ubicacion.nombre} modificada'
+        )
+        if renombrados:
+            try:
+                send_animal_bulk_update('updated', renombrados)
+            except Exception as e:
+                print(f"⚠️ Error notificando el cambio de nombre: {e}")
+
+    def perform_destroy(self, instance):
+        ubicacion_id, nombre = instance.id, instance.nombre
+        try:
+            instance.delete()
+        except ProtectedError:
+            raise ValidationError({'error': 'La ubicación tiene ubicaciones hijas o historial de movimientos'})
+        registrar_log(
+            usuario=self.request.user,
+            tipo_accion='eliminar',
+            entidad_afectada='ubicacion',
+            entidad_id=ubicacion_id,
+            observaciones=f'Ubicación {nombre} eliminada'
+        )
+
+    @action(detail=True, methods=['get'])
+    def subarbol(self, request, pk=None):
+        """La ubicación y todas las que cuelgan de ella, con sus contadores de animales"""
+        ubicacion = self.get_object()
+        nodos = self.filter_queryset(self.get_queryset()).filter(arbol.subarbol(ubicacion.ruta))
+        pagina = self.paginate_queryset(nodos)
+        return self.get_paginated_response(self.get_serializer(pagina, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def animales(self, request, pk=None):
+        """Animales que están ahora en la ubicación o en cualquiera de sus descendientes"""
+        ubicacion = self.get_object()
+        animales = Animal.objects.filter(
+            arbol.subarbol(ubicacion.ruta, 'movimientos__ubicacion__ruta'),
+            movimientos__salida__isnull=True
+        ).prefetch_related('composicion_racial').order_by('id')
+        pagina = self.paginate_queryset(animales)
+        return self.get_paginated_response(AnimalListaSerializer(pagina, many=True).data)
+
+    @action(detail=False, methods=['post'])
+    def recalcular(self, request):
+        """Rehacer los contadores de animales de todo el árbol desde los movimientos"""
+        try:
+            corregidas = arbol.recalcular_conteos()
+            print(f"🌳 Contadores del árbol de ubicaciones recalculados: {corregidas} corregidas")
+            return Response({'corregidas': corregidas})
+        except Exception as e:
+            print(f"❌ Error recalculando el árbol de ubicaciones: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error recalculando el árbol de ubicaciones: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class MovimientoViewSet(CamposParcialesMixin, ExportacionMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Movimiento.objects.select_related('animal', 'ubicacion')
+    serializer_class = MovimientoSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['animal', 'ubicacion', 'motivo']
+    ordenacion_cursor = ('entrada', 'id')
+    campos_exportacion_extra = ('animal__chapeta', 'ubicacion__nombre')
+
+    def get_queryset(self):
+        queryset = filtrar_fechas(super().get_queryset(), self.request.query_params, 'entrada__date')
+        return queryset.order_by(*self.ordenacion_cursor)
+
+    @action(detail=False, methods=['post'])
+    def mover(self, request):
+        """
+        Trasladar un grupo de animales: {"ubicacion" (id), "animales": [ids] o
+        "filtro": {"grupo", "ubicacion_actual", ...}[, "fecha", "motivo",
+        "observaciones"]}. Una ubicación nula los saca de la que tengan.
+        """
+        try:
+            entrada = MoverSerializer(data=request.data)
+            if not entrada.is_valid():
+                return Response(entrada.errors, status=status.HTTP_400_BAD_REQUEST)
+            datos = entrada.validated_data
+            momento = datos.get('fecha') or timezone.now()
+            if momento > timezone.now():
+                return Response({'error': 'La fecha del traslado no puede ser futura'}, status=status.HTTP_400_BAD_REQUEST)
+
+            if 'filtro' in datos:
+                animal_ids = list(filtrar(datos['filtro']).values_list('id', flat=True)[:MAXIMO_ANIMALES + 1])
+            else:
+                animal_ids = list(dict.fromkeys(datos['animales']))
+                existentes = set()
+                for inicio in range(0, len(animal_ids), movimientos.TAMANO_LOTE):
+                    existentes.update(
+                        Animal.objects.filter(id__in=animal_ids[inicio:inicio + movimientos.TAMANO_LOTE])
+                        .values_list('id', flat=True)
+                    )
+                desconocidos = [animal_id for animal_id in animal_ids if animal_id not in existentes]
+                if desconocidos:
+                    return Response(
+                        {'error': f'Animales no encontrados: {desconocidos[:movimientos.MAXIMO_ERRORES]}'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            if len(animal_ids) > MAXIMO_ANIMALES:
+                return Response(
+                    {'error': f'Como máximo {MAXIMO_ANIMALES} animales por traslado'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            movidos = movimientos.mover(
+                animal_ids,
+                datos['ubicacion'],
+                momento=momento,
+                usuario=request.user,
+                motivo=datos.get('motivo'),
+                observaciones=datos.get('observaciones')
+            )
+            destino = datos['ubicacion']
+            resumen = {
+                'ubicacion': destino.pk if destino else None,
+                'nombre': destino.nombre if destino else None,
+                'fecha': momento,
+                'seleccionados': len(animal_ids),
+                'movidos': len(movidos),
+                'sin_cambios': len(animal_ids) - len(movidos),
+            }
+            if movidos:
+                try:
+                    registrar_log(
+                        usuario=request.user,
+                        tipo_accion='mover',
+                        entidad_afectada='animal',
+                        entidad_id=f'{len(movidos)} animales',
+                        cambios={clave: str(valor) for clave, valor in resumen.items()},
+                        observaciones=f"{len(movidos)} animales trasladados a {resumen['nombre'] or 'ninguna ubicación'}"
+                    )
+                except Exception as log_error:
+                    print(f"⚠️ Error registrando log: {log_error}")
+                try:
+                    send_animal_bulk_update('updated', movidos)
+                except Exception as e:
+                    print(f"⚠️ Error notificando el traslado: {e}")
+
+            print(f"🚚 Traslado a {resumen['nombre']}: {len(movidos)} de {len(animal_ids)} animales")
+            return Response(resumen)
+
+        except (ErrorEdicionMasiva, movimientos.ErrorMovimiento) as e:
+            return Response({'error': str(e), 'errores': e.errores}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"❌ Error trasladando animales: {e}")
+            traceback.print_exc()
+            return Response(
+                {'error': f'Error trasladando animales: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    @action(detail=False, methods=['get'])
+    def ocupacion(self, request):
+        """
+        Animales por ubicación ahora o, con ?fecha=, en ese día (AAAA-MM-DD) o
+        instante (ISO 8601). ?ubicacion= (ids, repetible) limita las
+        ubicaciones y ?subarbol=<id> las deja en las que cuelgan de una.
+        """
+        inicio, fin = _intervalo(request.query_params)
+        ubicaciones = [_ubicacion(valor).pk for valor in request.query_params.getlist('ubicacion')]
+        raiz = request.query_params.get('subarbol')
+        raiz = _ubicacion(raiz, 'subarbol') if raiz else None
+        filas = movimientos.ocupacion(inicio, fin, ubicaciones, raiz)
+        return Response({
+            'fecha': request.query_params.get('fecha'),
+            'total': sum(fila['animales'] for fila in filas),
+            'resultados': filas,
+        })
+
+    @action(detail=False, methods=['get'])
+    def presentes(self, request):
+        """
+        Estancias en ?ubicacion=<id> (con ?subarbol=1, también en sus
+        descendientes) ahora o en ?fecha= (día o instante)
+        """
+        if not request.query_params.get('ubicacion'):
+            return Response({'error': 'Indica la ubicación en ?ubicacion='}, status=status.HTTP_400_BAD_REQUEST)
+        ubicacion = _ubicacion(request.query_params['ubicacion'])
+        inicio, fin = _intervalo(request.query_params)
+        if request.query_params.get('subarbol') in ('1', 'true'):
+            estancias = self.get_queryset().filter(arbol.subarbol(ubicacion.ruta, 'ubicacion__ruta'))
+        else:
+            estancias = self.get_queryset().filter(ubicacion=ubicacion)
+        if inicio is None:
+            estancias = estancias.filter(salida__isnull=True)
+        else:
+            estancias = movimientos.presentes(inicio, fin, estancias)
+
+        pagina = self.paginate_queryset(estancias)
+        return self.get_paginated_response(self.get_serializer(pagina, many=True).data)
@@ -0,0 +1,43 @@
+"""
+Campos parciales (sparse fieldsets) para cualquier viewset: en las lecturas,
+?fields=a,b deja solo esos campos de la respuesta y ?omit=c,d los quita.
+Los nombres desconocidos se ignoran.
+"""
+from rest_framework import permissions
+
+PARAMETRO_CAMPOS = 'fields'
+PARAMETRO_OMITIR = 'omit'
+
+
+def _lista(request, parametro):
+    valor = request.query_params.get(parametro)
+    if not valor:
+        return None
+    return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+
+def campos_solicitados(request):
+    """(campos a incluir o None, campos a omitir o None) de la petición"""
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None, None
+    return _lista(request, PARAMETRO_CAMPOS), _lista(request, PARAMETRO_OMITIR)
+
+
+def recortar_campos(serializer, incluir=None, omitir=None):
+    """Quitar del serializer (o de su hijo si many=True) los campos no pedidos"""
+    destino = getattr(serializer, 'child', serializer)
+    for nombre in list(destino.fields):
+        if (incluir is not None and nombre not in incluir) or (omitir and nombre in omitir):
+            destino.fields.pop(nombre)
+    return serializer
+
+
+class CamposParcialesMixin:
+    """Aplicar ?fields= y ?omit= a los serializers del viewset"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        incluir, omitir = campos_solicitados(getattr(self, 'request', None))
+        if incluir is not None or omitir:
+            recortar_campos(serializer, incluir, omitir)
+        return serializer
@@ -0,0 +1,162 @@
+"""
+Exportación en streaming (CSV o NDJSON) para cualquier viewset.
+
+GET /api/<recurso>/export/?format=csv|ndjson recorre el queryset del viewset
+(con sus permisos y filtros) con values_list().iterator(chunk_size=...), de
+modo que la memoria no crece con el tamaño de la exportación y los primeros
+bytes salen en cuanto llega el primer trozo. ?fields= y ?omit= eligen las
+columnas.
+
+Bajo ASGI (core.asgi) Django no envía un iterador síncrono a medida que se
+genera: lo consume entero con sync_to_async(list) antes del primer byte.
+contenido_streaming() lo envuelve en un iterador asíncrono que pide cada
+trozo al hilo síncrono de la petición; bajo WSGI lo deja como está.
+"""
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import renderers
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+from utils.campos import campos_solicitados
+
+TAMANO_TROZO_EXPORTACION = 2000
+# Líneas que se agrupan en cada envío al cliente
+LINEAS_POR_ENVIO = 200
+
+
+class RenderizadorCSV(renderers.BaseRenderer):
+    """Solo para la negociación de ?format=csv; los errores se devuelven como JSON"""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode(self.charset)
+
+
+class RenderizadorNDJSON(RenderizadorCSV):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve lo escrito en lugar de guardarlo"""
+
+    def write(self, valor):
+        return valor
+
+
+def _celda(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, cls=DjangoJSONEncoder, ensure_ascii=False)
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return valor
+
+
+def filas_csv(columnas, filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(columnas)
+    for fila in filas:
+        yield escritor.writerow([_celda(valor) for valor in fila])
+
+
+def filas_ndjson(columnas, filas):
+    for fila in filas:
+        yield json.dumps(dict(zip(columnas, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def _agrupar(lineas, tamano=LINEAS_POR_ENVIO):
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) == tamano:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+async def _iterar_en_hilo(contenido):
+    """Iterador asíncrono sobre uno síncrono, avanzándolo siempre en el mismo hilo (el de la conexión a la BD)"""
+    iterador, fin = iter(contenido), object()
+    siguiente = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            parte = await siguiente(iterador, fin)
+            if parte is fin:
+                return
+            yield parte
+    finally:
+        if hasattr(iterador, 'close'):
+            await sync_to_async(iterador.close, thread_sensitive=True)()
+
+
+def contenido_streaming(request, contenido):
+    """Contenido para StreamingHttpResponse que se envía a medida que se genera con WSGI y con ASGI"""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return _iterar_en_hilo(contenido)
+    return contenido
+
+
+FORMATOS = {
+    'csv': (filas_csv, RenderizadorCSV.media_type),
+    'ndjson': (filas_ndjson, RenderizadorNDJSON.media_type),
+}
+
+
+def respuesta_exportacion(request, queryset, columnas, formato, nombre, tamano_trozo=TAMANO_TROZO_EXPORTACION):
+    """StreamingHttpResponse con las columnas del queryset en el formato pedido"""
+    generar, tipo = FORMATOS[formato]
+    filas = queryset.values_list(*columnas).iterator(chunk_size=tamano_trozo)
+    respuesta = StreamingHttpResponse(
+        contenido_streaming(request, _agrupar(generar(columnas, filas))),
+        content_type=f'{tipo}; charset=utf-8'
+    )
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}_{timezone.now():%Y%m%d}.{formato}"'
+    return respuesta
+
+
+class ExportacionMixin:
+    """
+    Acción `export` para el viewset. `campos_exportacion` fija las columnas por
+    defecto (todas las del modelo si es None); también se pueden pedir con
+    ?fields= otras columnas del modelo o de `campos_exportacion_extra`.
+    """
+    campos_exportacion = None
+    campos_exportacion_extra = ()
+
+    def columnas_exportacion(self, modelo):
+        disponibles = [campo.attname for campo in modelo._meta.concrete_fields]
+        disponibles += [campo for campo in self.campos_exportacion_extra if campo not in disponibles]
+        por_defecto = list(self.campos_exportacion or disponibles)
+
+        incluir, omitir = campos_solicitados(self.request)
+        columnas = por_defecto if incluir is None else [campo for campo in disponibles if campo in incluir]
+        return [campo for campo in columnas if not omitir or campo not in omitir]
+
+    @action(detail=False, methods=['get'], url_path='export',
+            renderer_classes=[RenderizadorCSV, RenderizadorNDJSON])
+    def exportar(self, request):
+        """Exportar el recurso completo (con los filtros aplicados) en CSV o NDJSON"""
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+        if not queryset.ordered:
+            queryset = queryset.order_by(*(getattr(self, 'ordenacion_cursor', None) or ('pk',)))
+
+        columnas = self.columnas_exportacion(queryset.model)
+        if not columnas:
+            raise ValidationError({'error': 'No hay columnas que exportar'})
+        formato = request.accepted_renderer.format
+        return respuesta_exportacion(request, queryset, columnas, formato, queryset.model._meta.model_name)
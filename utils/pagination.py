@@ -0,0 +1,68 @@
+"""
+Paginación por defecto de la API.
+
+Por defecto se pagina por número de página (?page=), como hasta ahora. Con
+?paginacion=cursor, o siguiendo un enlace con ?cursor=, se usa paginación por
+cursor sobre claves indexadas: no hay COUNT(*) ni OFFSET, cada página cuesta
+lo mismo sea cual sea su profundidad y las inserciones concurrentes no
+desplazan las páginas siguientes.
+
+Cada viewset puede fijar su orden de cursor con `ordenacion_cursor` (el
+primer campo debe estar indexado y no cambiar) y elegir el cursor como modo
+por defecto con `paginacion = 'cursor'`.
+"""
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.settings import api_settings
+
+MODO_PAGINA = 'pagina'
+MODO_CURSOR = 'cursor'
+
+
+class PaginacionCursor(CursorPagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordenacion = getattr(view, 'ordenacion_cursor', None) or self.ordering
+        if isinstance(ordenacion, str):
+            return (ordenacion,)
+        return tuple(ordenacion)
+
+
+class PaginacionHibrida(PageNumberPagination):
+    """Página numerada por defecto; cursor bajo demanda o por viewset"""
+    parametro_modo = 'paginacion'
+
+    def __init__(self):
+        self.cursor = None
+
+    def modo(self, request, view):
+        if request.query_params.get(PaginacionCursor.cursor_query_param):
+            return MODO_CURSOR
+        modo = request.query_params.get(self.parametro_modo) or getattr(view, 'paginacion', MODO_PAGINA)
+        return MODO_CURSOR if modo == MODO_CURSOR else MODO_PAGINA
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if self.modo(request, view) == MODO_CURSOR:
+            self.cursor = PaginacionCursor()
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parametros = super().get_schema_operation_parameters(view)
+        parametros.append({
+            'name': self.parametro_modo,
+            'required': False,
+            'in': 'query',
+            'description': "'cursor' para paginar por cursor en lugar de por número de página",
+            'schema': {'type': 'string', 'enum': [MODO_PAGINA, MODO_CURSOR]},
+        })
+        return parametros + PaginacionCursor().get_schema_operation_parameters(view)
@@ -1,6 +1,10 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models import Q, prefetch_related_objects
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from animales.models import Animal
+from animales import pedigree, parentesco, composicion, busqueda, identificadores
+from ubicaciones import movimientos
+from pesajes import sesiones
 from incidencias.models import Incidencia
 from tratamientos.models import Tratamiento
 from eventos.models import Evento
@@ -21,9 +25,64 @@ from notificaciones.serializers import NotificacionSerializer
 from logs.serializers import LogSerializer
 
 
+@receiver(pre_save, sender=Animal)
+def animal_pre_save(sender, instance, **kwargs):
+    """Recordar raza, identificadores y ubicación anteriores (composición, chapetas y movimientos)"""
+    instance._raza_anterior = None
+    instance._identificadores_anteriores = None
+    instance._ubicacion_anterior = None
+    if not instance.pk:
+        return
+    # Los valores se anotan al leer el animal; solo si se creó a mano o con
+    # campos diferidos hace falta consultarlos
+    anterior = instance.valores_guardados()
+    if anterior is None:
+        anterior = Animal.objects.filter(pk=instance.pk).values('raza', 'chapeta', 'rfid', 'ubicacion_actual').first()
+    if anterior:
+        instance._raza_anterior = anterior['raza']
+        instance._identificadores_anteriores = (anterior['chapeta'], anterior['rfid'])
+        instance._ubicacion_anterior = anterior['ubicacion_actual']
+
+
+@receiver(post_save, sender=Animal)
+def animal_composicion(sender, instance, created, **kwargs):
+    """Calcular la composición racial del animal nuevo o propagar un cambio de raza"""
+    if created or instance.raza != getattr(instance, '_raza_anterior', None):
+        composicion.actualizar_composicion([instance.pk])
+        # La composición prefetcheada en la instancia ya no es válida: se vuelve
+        # a leer una vez para los serializers que la usan tras el save()
+        getattr(instance, '_prefetched_objects_cache', {}).pop('composicion_racial', None)
+        prefetch_related_objects([instance], 'composicion_racial')
+
+
+@receiver(post_save, sender=Animal)
+def animal_movimiento(sender, instance, created, **kwargs):
+    """Registrar en el historial de movimientos el cambio de ubicación del animal"""
+    if (instance.ubicacion_actual or None) != (getattr(instance, '_ubicacion_anterior', None) or None):
+        movimientos.mover(
+            [instance.pk],
+            instance.ubicacion_actual,
+            momento=instance.fecha_alta_sistema if created else None,
+            usuario=instance.creado_por if created else instance.modificado_por,
+            actualizar_animales=False
+        )
+
+
+@receiver(post_save, sender=Animal)
+def animal_pesaje_alta(sender, instance, created, **kwargs):
+    """El peso con el que se da de alta un animal es su primer pesaje"""
+    if created and instance.peso_actual is not None:
+        sesiones.registrar_altas([instance.pk])
+
+
 @receiver(post_save, sender=Animal)
 def animal_saved(sender, instance, created, **kwargs):
     """Enviar actualización cuando se crea o modifica un animal"""
+    busqueda.indexar_animal(instance)
+    anteriores = getattr(instance, '_identificadores_anteriores', None)
+    if created or anteriores != (instance.chapeta, instance.rfid):
+        identificadores.actualizar(instance.pk, anteriores, (instance.chapeta, instance.rfid))
+
     serializer = AnimalSerializer(instance)
     action = 'created' if created else 'updated'
     
@@ -34,9 +93,20 @@ def animal_saved(sender, instance, created, **kwargs):
     )
 
 
+@receiver(post_save, sender=Animal)
+def animal_valores_guardados(sender, instance, update_fields, **kwargs):
+    """Lo guardado pasa a ser la referencia del siguiente save() (va tras los demás receptores)"""
+    instance.recordar_valores(update_fields)
+
+
 @receiver(post_delete, sender=Animal)
 def animal_deleted(sender, instance, **kwargs):
     """Enviar notificación cuando se elimina un animal"""
+    busqueda.desindexar(instance.pk)
+    identificadores.actualizar(instance.pk, (instance.chapeta, instance.rfid), None)
+    # Las crías pierden un progenitor: su composición racial cambia
+    composicion.actualizar_composicion(getattr(instance, '_hijos_eliminados', []))
+
     send_animal_update(
         animal_id=instance.id,
         action='deleted',
@@ -44,6 +114,58 @@ def animal_deleted(sender, instance, **kwargs):
     )
 
 
+def _pares_descendencia(instance, reverse, pk_set):
+    """Traducir los argumentos de m2m_changed a pares (padre, hijo)"""
+    if reverse:
+        return [(padre_id, instance.pk) for padre_id in pk_set]
+    return [(instance.pk, hijo_id) for hijo_id in pk_set]
+
+
+@receiver(m2m_changed, sender=Animal.descendencia.through)
+def descendencia_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mantener la tabla de cierre del pedigrí al cambiar la descendencia"""
+    if action == 'pre_add':
+        pedigree.validar_enlaces(_pares_descendencia(instance, reverse, pk_set))
+
+    elif action == 'post_add':
+        pares = _pares_descendencia(instance, reverse, pk_set)
+        version = pedigree.agregar_enlaces(pares)
+        # Si los hijos no tienen descendencia basta con añadir sus filas de parentesco
+        parentesco.actualizar_almacen({hijo_id for _, hijo_id in pares}, version)
+        composicion.actualizar_composicion({hijo_id for _, hijo_id in pares})
+
+    elif action in ('pre_remove', 'pre_clear'):
+        # pk_set puede traer ids que no estaban enlazados: quedarse con los reales
+        campo = 'to_animal_id' if reverse else 'from_animal_id'
+        filtro = Q(**{campo: instance.pk})
+        if action == 'pre_remove':
+            otro = 'from_animal_id' if reverse else 'to_animal_id'
+            filtro &= Q(**{f'{otro}__in': pk_set})
+        instance._enlaces_eliminados = pedigree.enlaces_existentes(filtro)
+
+    elif action in ('post_remove', 'post_clear'):
+        pares = getattr(instance, '_enlaces_eliminados', [])
+        version = pedigree.eliminar_enlaces(pares)
+        parentesco.actualizar_almacen({hijo_id for _, hijo_id in pares}, version)
+        composicion.actualizar_composicion({hijo_id for _, hijo_id in pares})
+        instance._enlaces_eliminados = []
+
+
+@receiver(pre_delete, sender=Animal)
+def animal_pre_delete(sender, instance, **kwargs):
+    """Retirar del pedigrí los enlaces del animal y sacarlo de su ubicación antes de borrarlo"""
+    enlaces = pedigree.enlaces_existentes(
+        Q(from_animal_id=instance.pk) | Q(to_animal_id=instance.pk)
+    )
+    version = pedigree.eliminar_enlaces(enlaces)
+    instance._hijos_eliminados = [hijo_id for padre_id, hijo_id in enlaces if padre_id == instance.pk]
+    # Las crías pierden un progenitor; su fila (y la del propio animal, por CASCADE) cambian
+    if version is not None:
+        parentesco.actualizar_almacen(set(instance._hijos_eliminados), version)
+    # Cerrar su estancia abierta para descontarlo del árbol de ubicaciones
+    movimientos.mover([instance.pk], None, actualizar_animales=False)
+
+
 @receiver(post_save, sender=Incidencia)
 def incidencia_saved(sender, instance, created, **kwargs):
     """Enviar alerta cuando se crea una nueva incidencia"""
@@ -0,0 +1,266 @@
+import csv
+import io
+import json
+import threading
+from datetime import date, timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from animales.models import Animal
+from animales.serializers import AnimalListaSerializer, AnimalSerializer
+from animales.views import CAMPOS_PESADOS, AnimalViewSet
+from logs.models import Log
+from usuarios.models import Usuario
+from utils import exportacion
+
+
+def crear_animal(chapeta, sexo='macho', **campos):
+    datos = {
+        'chapeta': chapeta,
+        'sexo': sexo,
+        'fecha_nacimiento': date(2023, 1, 1),
+        'raza': 'Angus',
+        'estado_reproductivo': 'vacío',
+        'estado_productivo': 'activo',
+    }
+    datos.update(campos)
+    return Animal.objects.create(**datos)
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            email='admin@example.com', password='clave', nombre='Admin', apellidos='Test', rol='admin',
+            is_staff=True,
+        )
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+    def get(self, url, **parametros):
+        respuesta = self.cliente.get(url, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+
+class PaginacionTests(ApiTestCase):
+    """Paginación numerada por defecto y por cursor bajo demanda"""
+
+    def recorrer(self, url, entre_paginas=None, **parametros):
+        ids, paginas = [], 0
+        datos = self.get(url, **parametros).json()
+        while True:
+            self.assertNotIn('count', datos)
+            ids.extend(fila['id'] for fila in datos['results'])
+            paginas += 1
+            if entre_paginas:
+                entre_paginas(paginas)
+            if not datos['next']:
+                return ids, paginas
+            datos = self.get(datos['next']).json()
+
+    def test_por_defecto_pagina_numerada(self):
+        for i in range(25):
+            crear_animal(f'P{i}')
+        datos = self.get('/api/animales/').json()
+        self.assertEqual(datos['count'], 25)
+        self.assertEqual(len(datos['results']), 20)
+        self.assertIn('page=2', datos['next'])
+
+    def test_cursor_estable_con_inserciones(self):
+        originales = [crear_animal(f'C{i}').pk for i in range(23)]
+        nuevos = []
+
+        def insertar(pagina):
+            # Altas concurrentes mientras se recorre: van al final, no desplazan nada
+            nuevos.append(crear_animal(f'N{pagina}').pk)
+
+        ids, paginas = self.recorrer('/api/animales/', insertar, paginacion='cursor', page_size=5)
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(ids[:len(originales)], originales)
+        # Las altas anteriores a la última página aparecen; ninguna se salta
+        self.assertEqual(ids[len(originales):], nuevos[:len(ids) - len(originales)])
+        self.assertEqual(Animal.objects.count(), len(originales) + paginas)
+
+    def test_cursor_con_bajas_entre_paginas(self):
+        animales = [crear_animal(f'B{i}').pk for i in range(12)]
+        datos = self.get('/api/animales/', paginacion='cursor', page_size=4).json()
+        primera = [fila['id'] for fila in datos['results']]
+        self.assertEqual(primera, animales[:4])
+
+        # Borrar un animal ya leído no hace repetir el siguiente
+        Animal.objects.filter(pk__in=[animales[3], animales[6]]).delete()
+        segunda = [fila['id'] for fila in self.get(datos['next']).json()['results']]
+        self.assertEqual(segunda, [animales[4], animales[5], animales[7], animales[8]])
+
+    def test_cursor_desempata_por_id(self):
+        Log.objects.all().delete()
+        Log.objects.bulk_create([
+            Log(tipo_accion='prueba', entidad_afectada='Animal', entidad_id=str(i)) for i in range(7)
+        ])
+        Log.objects.update(fecha_hora=timezone.now())
+        esperados = list(Log.objects.order_by('id').values_list('id', flat=True))
+
+        ids, paginas = self.recorrer('/api/logs/', paginacion='cursor', page_size=2)
+        self.assertEqual(ids, esperados)
+        self.assertEqual(paginas, 4)
+
+    def test_cursor_hacia_atras(self):
+        Log.objects.all().delete()
+        Log.objects.bulk_create([
+            Log(tipo_accion='prueba', entidad_afectada='Animal', entidad_id=str(i)) for i in range(7)
+        ])
+        inicio = timezone.now()
+        for i, log in enumerate(Log.objects.order_by('id')):
+            Log.objects.filter(pk=log.pk).update(fecha_hora=inicio + timedelta(seconds=i))
+        esperados = list(Log.objects.order_by('id').values_list('id', flat=True))
+
+        # Desde la última página siguiendo previous, sin huecos ni repetidos
+        datos = self.get('/api/logs/', paginacion='cursor', page_size=2).json()
+        while datos['next']:
+            datos = self.get(datos['next']).json()
+        atras = [fila['id'] for fila in datos['results']]
+        while datos['previous']:
+            datos = self.get(datos['previous']).json()
+            atras = [fila['id'] for fila in datos['results']] + atras
+        self.assertEqual(atras, esperados)
+
+
+class CamposParcialesTests(ApiTestCase):
+    """?fields= y ?omit= en las lecturas; las escrituras devuelven el serializer completo"""
+
+    def setUp(self):
+        super().setUp()
+        self.animal = crear_animal('F1', salud=[{'tipo': 'vacuna'}], notas='Cojea')
+
+    def consulta_animales(self, **parametros):
+        with CaptureQueriesContext(connection) as consultas:
+            filas = self.get('/api/animales/', **parametros).json()['results']
+        sql = next(
+            c['sql'] for c in consultas.captured_queries
+            if c['sql'].startswith('SELECT') and 'FROM "animales_animal"' in c['sql'] and 'LIMIT' in c['sql']
+        )
+        return filas, sql
+
+    def test_listado_compacto_por_defecto(self):
+        filas, sql = self.consulta_animales()
+        self.assertEqual(list(filas[0]), AnimalListaSerializer.Meta.fields)
+        for campo in CAMPOS_PESADOS:
+            self.assertNotIn(f'"animales_animal"."{campo}"', sql)
+
+    def test_fields(self):
+        filas, sql = self.consulta_animales(fields='id,chapeta,salud,inexistente')
+        self.assertEqual(filas, [{'id': self.animal.pk, 'chapeta': 'F1', 'salud': [{'tipo': 'vacuna'}]}])
+        # Solo se lee la columna pesada pedida
+        self.assertIn('"animales_animal"."salud"', sql)
+        self.assertNotIn('"animales_animal"."notas"', sql)
+
+        detalle = self.get(f'/api/animales/{self.animal.pk}/', fields='chapeta,notas').json()
+        self.assertEqual(detalle, {'chapeta': 'F1', 'notas': 'Cojea'})
+
+    def test_omit(self):
+        filas, _ = self.consulta_animales(omit='composicion_racial, foto_perfil_url,rfid')
+        self.assertEqual(
+            set(filas[0]), set(AnimalListaSerializer.Meta.fields) - {'composicion_racial', 'foto_perfil_url', 'rfid'}
+        )
+        filas, _ = self.consulta_animales(fields='id,chapeta,nombre', omit='nombre')
+        self.assertEqual(set(filas[0]), {'id', 'chapeta'})
+
+        Log.objects.create(tipo_accion='prueba', entidad_afectada='Animal', entidad_id='1')
+        logs = self.get('/api/logs/', fields='id,tipo_accion').json()['results']
+        self.assertTrue(logs)
+        self.assertTrue(all(set(log) == {'id', 'tipo_accion'} for log in logs))
+
+    def test_ignorado_en_escrituras(self):
+        respuesta = self.cliente.post('/api/animales/?fields=id', {
+            'chapeta': 'F2', 'sexo': 'hembra', 'fecha_nacimiento': '2024-01-01', 'raza': 'Angus',
+            'estado_reproductivo': 'vacío', 'estado_productivo': 'activo',
+        }, format='json')
+        self.assertEqual(respuesta.status_code, 201)
+        legibles = {nombre for nombre, campo in AnimalSerializer().fields.items() if not campo.write_only}
+        self.assertEqual(set(respuesta.json()), legibles)
+
+        respuesta = self.cliente.patch(
+            f'/api/animales/{self.animal.pk}/?omit=notas', {'notas': 'Curada'}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['notas'], 'Curada')
+
+
+class ExportacionTests(ApiTestCase):
+    """Exportación en streaming: contenido CSV y NDJSON, columnas y filtros"""
+
+    def setUp(self):
+        super().setUp()
+        self.toro = crear_animal('X1', nombre='Toro, "el grande"', peso_actual=520.5, notas='Línea 1\nLínea 2')
+        self.vaca = crear_animal('X2', sexo='hembra', salud=[{'tipo': 'vacuna'}])
+
+    def exportar(self, formato, **parametros):
+        respuesta = self.get('/api/animales/export/', format=formato, **parametros)
+        self.assertTrue(respuesta.streaming)
+        return respuesta, b''.join(respuesta.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        respuesta, contenido = self.exportar('csv')
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertRegex(respuesta['Content-Disposition'], r'attachment; filename="animal_\d{8}\.csv"')
+
+        filas = list(csv.reader(io.StringIO(contenido)))
+        self.assertEqual(filas[0], list(AnimalViewSet.campos_exportacion))
+        self.assertEqual([fila[0] for fila in filas[1:]], [str(self.toro.pk), str(self.vaca.pk)])
+        toro = dict(zip(filas[0], filas[1]))
+        self.assertEqual(toro['nombre'], 'Toro, "el grande"')
+        self.assertEqual((toro['fecha_nacimiento'], toro['peso_actual'], toro['rfid']), ('2023-01-01', '520.5', ''))
+
+        # Columnas en el orden del modelo; JSON en una celda y saltos de línea entrecomillados
+        _, contenido = self.exportar('csv', fields='id,notas,salud', omit='id')
+        self.assertEqual(list(csv.reader(io.StringIO(contenido))), [
+            ['salud', 'notas'], ['[]', 'Línea 1\nLínea 2'], ['[{"tipo": "vacuna"}]', ''],
+        ])
+
+    def test_ndjson(self):
+        respuesta, contenido = self.exportar('ndjson', sexo='hembra', fields='id,chapeta,salud,fecha_nacimiento')
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertTrue(contenido.endswith('\n'))
+        self.assertEqual([json.loads(linea) for linea in contenido.splitlines()], [{
+            'id': self.vaca.pk, 'chapeta': 'X2', 'salud': [{'tipo': 'vacuna'}], 'fecha_nacimiento': '2023-01-01',
+        }])
+
+        _, contenido = self.exportar('ndjson', raza='Hereford')
+        self.assertEqual(contenido, '')
+
+    def test_sin_columnas(self):
+        respuesta = self.cliente.get('/api/animales/export/', {'format': 'csv', 'fields': 'inexistente'})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('error', json.loads(respuesta.content))
+
+    def test_envio_por_bloques(self):
+        self.assertEqual(list(exportacion._agrupar(iter('abcde'), 2)), ['ab', 'cd', 'e'])
+        self.assertEqual(list(exportacion._agrupar(iter(''), 2)), [])
+
+    def test_streaming_bajo_asgi(self):
+        hilos = []
+
+        def generar():
+            for parte in ('a', 'b', 'c'):
+                hilos.append(threading.get_ident())
+                yield parte
+
+        async def recoger(contenido):
+            return [parte async for parte in contenido]
+
+        # Bajo WSGI el iterador se entrega tal cual
+        contenido = generar()
+        self.assertIs(exportacion.contenido_streaming(mock.Mock(), contenido), contenido)
+
+        with mock.patch.object(exportacion, 'ASGIRequest', mock.Mock):
+            contenido = exportacion.contenido_streaming(mock.Mock(), generar())
+        self.assertEqual(async_to_sync(recoger)(contenido), ['a', 'b', 'c'])
+        # Cada trozo se genera en el mismo hilo síncrono
+        self.assertEqual(len(set(hilos)), 1)
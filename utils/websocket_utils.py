@@ -180,4 +180,23 @@ def send_system_notification(mensaje, usuarios=None):
             usuario=usuario,
             mensaje=mensaje,
             tipo='informativa'
-        )
\ No newline at end of file
+        )
+
+def send_animal_bulk_update(action, animal_ids):
+    """
+    Enviar un único evento con los ids afectados por una operación masiva,
+    en lugar de una actualización por animal
+    """
+    channel_layer = get_channel_layer()
+
+    async_to_sync(channel_layer.group_send)(
+        'animal_updates',
+        {
+            'type': f'animal_bulk_{action}',
+            'data': {
+                'action': f'bulk_{action}',
+                'total': len(animal_ids),
+                'ids': list(animal_ids)
+            }
+        }
+    )